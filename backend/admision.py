@@ -0,0 +1,118 @@
+"""
+Control de admisión: límite de pedidos en curso por clase de ruta.
+
+Cuando Mongo o el LLM se ponen lentos, los pedidos se acumulan en el loop
+hasta que todos vencen. Acá cada clase de ruta (lecturas, escrituras con
+LLM, pagos, auth) tiene un límite de concurrencia; si está lleno el pedido
+se rechaza en el acto con 503 + Retry-After, sin encolarlo.
+
+El límite se adapta con AIMD sobre la latencia observada:
+- si un pedido tarda más que `objetivo_ms` o termina en 5xx, el límite
+  baja un 10% (a lo sumo una vez por latencia típica, para no desplomarse
+  con una ráfaga de respuestas lentas);
+- si los pedidos andan bien y se está usando el límite, sube 1/limite por
+  pedido (≈ +1 por "vuelta" completa).
+
+Las rutas sin clase (health, métricas, SSE) nunca se rechazan.
+"""
+import math
+import time
+from typing import Callable, Dict, Optional
+
+import orjson
+
+
+class ClaseAdmision:
+    def __init__(self, limite_inicial: float, minimo: float, maximo: float, objetivo_ms: float):
+        self.limite = limite_inicial
+        self.minimo = minimo
+        self.maximo = maximo
+        self.objetivo = objetivo_ms / 1e3
+        self.en_curso = 0
+        self.rechazados = 0
+        self.latencia = self.objetivo / 2
+        self._ultima_baja = 0.0
+
+    def admitir(self) -> bool:
+        if self.en_curso >= int(self.limite):
+            self.rechazados += 1
+            return False
+        self.en_curso += 1
+        return True
+
+    def terminar(self, duracion: float, fallo: bool) -> None:
+        self.en_curso -= 1
+        self.latencia += 0.2 * (duracion - self.latencia)
+        ahora = time.monotonic()
+        if fallo or duracion > self.objetivo:
+            if ahora - self._ultima_baja > self.latencia:
+                self.limite = max(self.minimo, self.limite * 0.9)
+                self._ultima_baja = ahora
+        elif self.en_curso + 1 >= self.limite * 0.8:
+            self.limite = min(self.maximo, self.limite + 1 / self.limite)
+
+    def reintentar_en(self) -> int:
+        return max(1, min(30, math.ceil(self.latencia)))
+
+    def estado(self) -> dict:
+        return {
+            "limite": round(self.limite, 2),
+            "en_curso": self.en_curso,
+            "rechazados": self.rechazados,
+            "latencia_ms": round(self.latencia * 1e3, 1),
+            "objetivo_ms": self.objetivo * 1e3,
+        }
+
+
+class ControlAdmision:
+    def __init__(self, clases: Dict[str, ClaseAdmision], clasificar: Callable[[str, str], Optional[str]]):
+        self.clases = clases
+        self.clasificar = clasificar
+
+    def estado(self) -> dict:
+        return {nombre: clase.estado() for nombre, clase in self.clases.items()}
+
+
+class AdmisionMiddleware:
+    def __init__(self, app, control: ControlAdmision):
+        self.app = app
+        self.control = control
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        nombre = self.control.clasificar(scope["method"], scope["path"])
+        clase = self.control.clases.get(nombre) if nombre else None
+        if clase is None:
+            await self.app(scope, receive, send)
+            return
+        if not clase.admitir():
+            await self._rechazar(send, clase.reintentar_en())
+            return
+
+        estado = {"status": 500}
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start":
+                estado["status"] = mensaje["status"]
+            await send(mensaje)
+
+        inicio = time.monotonic()
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            clase.terminar(time.monotonic() - inicio, estado["status"] >= 500)
+
+    async def _rechazar(self, send, segundos: int):
+        cuerpo = orjson.dumps({"detail": "Servicio saturado, intentá de nuevo en unos segundos"})
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(cuerpo)).encode()),
+                (b"retry-after", str(segundos).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": cuerpo})
@@ -0,0 +1,243 @@
+"""
+Archivo de solicitudes cerradas.
+
+`solicitudes` sólo crece, pero una solicitud completada o cancelada casi
+no se vuelve a leer pasado un mes. Lo que hay que recorrer en cada listado
+y en las métricas del admin es lo abierto y lo reciente: eso es lo que
+tiene que entrar en el caché de Mongo.
+
+La tarea "archivar_cerradas" del planificador (una réplica, ARCHIVO_CRON)
+mueve de a ARCHIVO_LOTE las cerradas sin cambios hace ARCHIVO_DIAS (las
+anteriores a updated_at, por su created_at), por el índice
+{estado, updated_at} de mantenimiento.py, a una colección por mes de
+creación (`solicitudes_archivo_AAAA_MM`, con compresión zstd de WiredTiger
+si el servidor la acepta). Cada lote se copia (reemplazo por `_id`: un lote
+cortado a la mitad se puede repetir), se borra de `solicitudes` si no
+cambió mientras tanto (misma `version`) y deja una baja "archivada" para la
+sincronización incremental.
+
+Las lecturas no ven el archivo salvo que lo pidan: listar_solicitudes y
+buscar_solicitud de datos.py con `archivadas=True`, que después de la
+colección caliente recorren las particiones de la más nueva a la más vieja
+por sus índices (id, cliente y profesional). Los totales de cada partición
+quedan en `archivo_resumen` (cada lote suma lo que archivó), así las
+métricas del admin suman lo archivado sin leerlo.
+
+Configuración por entorno:
+    ARCHIVO_DIAS=30               0 lo apaga
+    ARCHIVO_CRON="15 4 * * *"
+    ARCHIVO_LOTE=500
+    ARCHIVO_MAX_LOTES=200         por corrida
+    ARCHIVO_COMPRESOR=zstd        vacío: la compresión por defecto del servidor
+"""
+import logging
+import os
+import re
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set
+
+from pymongo import DeleteOne, ReplaceOne
+from pymongo.errors import CollectionInvalid
+
+from fechas import a_fecha, ahora, anterior_a
+from nucleo import db, planificador
+from plazos import etapa, max_time_ms
+from sincronizacion import registrar_bajas
+
+logger = logging.getLogger(__name__)
+
+DIAS = float(os.environ.get("ARCHIVO_DIAS", "30"))
+CRON = os.environ.get("ARCHIVO_CRON", "15 4 * * *")
+LOTE = int(os.environ.get("ARCHIVO_LOTE", "500"))
+MAX_LOTES = int(os.environ.get("ARCHIVO_MAX_LOTES", "200"))
+COMPRESOR = os.environ.get("ARCHIVO_COMPRESOR", "zstd")
+
+ESTADOS_CERRADOS = ["completado", "cancelado"]
+PREFIJO = "solicitudes_archivo_"
+PARTICION = re.compile(rf"^{PREFIJO}\d{{4}}_\d{{2}}$")
+
+# Acumuladores de los totales de las métricas del admin, para un $group
+RESUMEN = {
+    "total": {"$sum": 1},
+    "completadas": {"$sum": {"$cond": [{"$eq": ["$estado", "completado"]}, 1, 0]}},
+    "ingresos": {"$sum": {"$ifNull": ["$precio_total", 0]}},
+    "comisiones": {"$sum": {"$ifNull": ["$comision_changared", 0]}},
+}
+
+def totales_de(solicitudes: List[dict]) -> Dict[str, float]:
+    """
+    RESUMEN calculado sobre `solicitudes` en memoria.
+    """
+    return {
+        "total": len(solicitudes),
+        "completadas": sum(1 for sol in solicitudes if sol.get("estado") == "completado"),
+        "ingresos": sum(sol.get("precio_total") or 0 for sol in solicitudes),
+        "comisiones": sum(sol.get("comision_changared") or 0 for sol in solicitudes),
+    }
+
+# Particiones ya creadas con sus índices por este proceso
+particiones_listas = set()
+
+def particion_de(solicitud: dict) -> str:
+    fecha = a_fecha(solicitud.get("created_at"))
+    if not isinstance(fecha, datetime):
+        fecha = solicitud["updated_at"]
+    return f"{PREFIJO}{fecha:%Y_%m}"
+
+async def particiones() -> List[str]:
+    """
+    Las particiones existentes, de la más nueva a la más vieja.
+    """
+    nombres = await db.list_collection_names(filter={"name": {"$regex": f"^{PREFIJO}"}})
+    return sorted((nombre for nombre in nombres if PARTICION.match(nombre)), reverse=True)
+
+async def preparar_particion(nombre: str) -> None:
+    if nombre in particiones_listas:
+        return
+    opciones = {"storageEngine": {"wiredTiger": {"configString": f"block_compressor={COMPRESOR}"}}} if COMPRESOR else {}
+    try:
+        await db.create_collection(nombre, **opciones)
+    except CollectionInvalid:
+        # Ya existe
+        pass
+    except Exception as e:
+        # Hay servidores (Atlas compartido) que no aceptan opciones de almacenamiento
+        logger.warning("Partición %s sin compresión %s: %s", nombre, COMPRESOR, e)
+        try:
+            await db.create_collection(nombre)
+        except CollectionInvalid:
+            pass
+    await db[nombre].create_index("id", unique=True)
+    await db[nombre].create_index([("cliente_id", 1), ("created_at", -1)])
+    await db[nombre].create_index([("profesional_id", 1), ("created_at", -1)])
+    particiones_listas.add(nombre)
+
+# ─── ARCHIVADO ───────────────────────────────────────────────────────────────
+
+async def archivar(lote: List[dict]) -> int:
+    """
+    Mueve `lote` (documentos completos de `solicitudes`) a sus particiones,
+    suma a sus totales lo que archivó y devuelve cuántas se archivaron.
+    """
+    por_particion: Dict[str, List[dict]] = defaultdict(list)
+    for solicitud in lote:
+        por_particion[particion_de(solicitud)].append(solicitud)
+    momento = ahora()
+    for nombre, solicitudes in por_particion.items():
+        await preparar_particion(nombre)
+        async with etapa("mongo"):
+            # Los _id del lote: si se corta antes de borrar de caliente,
+            # resumir_particiones saca las copias de las que siguen ahí
+            await db.archivo_resumen.update_one(
+                {"_id": nombre}, {"$set": {"sucio": True, "en_curso": [sol["_id"] for sol in solicitudes]}}, upsert=True
+            )
+            await db[nombre].bulk_write([
+                ReplaceOne({"_id": sol["_id"]}, {**sol, "archivada": momento}, upsert=True) for sol in solicitudes
+            ], ordered=False)
+
+    async with etapa("mongo"):
+        borrado = await db.solicitudes.bulk_write([
+            DeleteOne({"_id": sol["_id"], "version": sol.get("version")}) for sol in lote
+        ], ordered=False)
+        if borrado.deleted_count < len(lote):
+            # Cambió mientras se copiaba: sigue en caliente y se saca del archivo
+            siguen = set()
+            for nombre, solicitudes in por_particion.items():
+                siguen |= await sacar_calientes(nombre, [sol["_id"] for sol in solicitudes])
+                por_particion[nombre] = [sol for sol in solicitudes if sol["_id"] not in siguen]
+            lote = [sol for sol in lote if sol["_id"] not in siguen]
+        await registrar_bajas(db, lote, "archivada")
+        # Lo borrado de caliente se suma una sola vez; si se corta antes, la
+        # marca queda y la próxima corrida recalcula la partición
+        for nombre, solicitudes in por_particion.items():
+            await db.archivo_resumen.update_one(
+                {"_id": nombre}, {"$inc": totales_de(solicitudes), "$set": {"sucio": False}, "$unset": {"en_curso": ""}}
+            )
+    return len(lote)
+
+async def sacar_calientes(nombre: str, ids: List) -> Set:
+    """
+    Borra de la partición las copias de `ids` que siguen en `solicitudes`
+    y devuelve sus _id.
+    """
+    siguen = {doc["_id"] for doc in await db.solicitudes.find({"_id": {"$in": ids}}, {"_id": 1}).to_list(None)}
+    if siguen:
+        await db[nombre].delete_many({"_id": {"$in": list(siguen)}})
+    return siguen
+
+async def resumir_particiones() -> None:
+    """
+    Recalcula los totales de las particiones marcadas. La marca se pone
+    antes de copiar y se saca al sumar el lote: sólo quedan las de un lote
+    cortado a la mitad. Lo copiado de ese lote que no llegó a borrarse de
+    caliente se saca primero; la próxima corrida lo vuelve a archivar.
+    """
+    async for doc in db.archivo_resumen.find({"sucio": True}, {"_id": 1, "en_curso": 1}):
+        if doc.get("en_curso"):
+            await sacar_calientes(doc["_id"], doc["en_curso"])
+        totales = await db[doc["_id"]].aggregate([{"$group": {"_id": None, **RESUMEN}}]).to_list(1)
+        totales = totales[0] if totales else {}
+        await db.archivo_resumen.update_one({"_id": doc["_id"]}, {"$set": {
+            **{campo: totales.get(campo, 0) for campo in RESUMEN}, "sucio": False,
+        }, "$unset": {"en_curso": ""}})
+
+async def archivar_cerradas() -> dict:
+    if DIAS <= 0:
+        return {"omitida": "ARCHIVO_DIAS=0"}
+    filtro = {"estado": {"$in": ESTADOS_CERRADOS}, **anterior_a(ahora() - timedelta(days=DIAS))}
+    # Lo que dejó marcado una corrida que se cayó a mitad de un lote
+    await resumir_particiones()
+    archivadas = 0
+    try:
+        for _ in range(MAX_LOTES):
+            async with etapa("mongo"):
+                lote = await db.solicitudes.find(filtro).limit(LOTE).to_list(LOTE)
+            if lote:
+                archivadas += await archivar(lote)
+            if len(lote) < LOTE:
+                break
+    finally:
+        # Cortada por el plazo de la tarea o por un error: el lote a medias
+        await resumir_particiones()
+    return {"archivadas": archivadas}
+
+planificador.tarea("archivar_cerradas", CRON, archivar_cerradas, plazo_s=900)
+
+# ─── LECTURA ─────────────────────────────────────────────────────────────────
+
+async def listar_archivadas(filtro: dict, proyeccion: dict, limite: Optional[int] = None) -> List[dict]:
+    """
+    Las archivadas que cumplen `filtro`, de la partición más nueva a la
+    más vieja y, dentro de cada una, de la más nueva a la más vieja.
+    """
+    resultado: List[dict] = []
+    async with etapa("mongo"):
+        for nombre in await particiones():
+            falta = limite - len(resultado) if limite else None
+            if falta == 0:
+                break
+            cursor = db[nombre].find(filtro, proyeccion, max_time_ms=max_time_ms()).sort("created_at", -1)
+            if falta:
+                cursor = cursor.limit(falta)
+            resultado += await cursor.to_list(falta)
+    return resultado
+
+async def buscar_archivada(solicitud_id: str) -> Optional[dict]:
+    async with etapa("mongo"):
+        for nombre in await particiones():
+            solicitud = await db[nombre].find_one({"id": solicitud_id}, {"_id": 0}, max_time_ms=max_time_ms())
+            if solicitud:
+                return solicitud
+    return None
+
+async def resumen_archivado() -> Dict[str, float]:
+    """
+    RESUMEN sumado sobre todas las particiones, desde `archivo_resumen`.
+    """
+    totales = {campo: 0 for campo in RESUMEN}
+    async with etapa("mongo"):
+        async for doc in db.archivo_resumen.find({}, {"_id": 0, "sucio": 0, "en_curso": 0}, max_time_ms=max_time_ms()):
+            for campo in RESUMEN:
+                totales[campo] += doc.get(campo, 0)
+    return totales
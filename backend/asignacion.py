@@ -0,0 +1,92 @@
+"""
+Asignación de profesionales por cercanía.
+
+Los profesionales guardan latitud/longitud (los que se registran solos
+toman la de su zona). Para una solicitud se buscan los disponibles del
+servicio, con una proyección mínima y sobre el índice
+(tipo_servicio, disponible), y se elige el más cercano por haversine.
+"""
+from math import radians, cos, sin, asin, sqrt
+from typing import List, Optional, Tuple
+
+from datos import listar_profesionales
+from nucleo import db
+
+# Tope de candidatos que se traen de Mongo por asignación
+MAX_CANDIDATOS = 500
+
+PROYECCION_CANDIDATO = {
+    "_id": 0, "id": 1, "nombre": 1, "telefono": 1, "email": 1,
+    "tipo_servicio": 1, "latitud": 1, "longitud": 1, "tarifa_base": 1,
+}
+
+COORDENADAS_ZONA = {
+    "Posadas":                (-27.3621, -55.8948),
+    "Garupá":                 (-27.4833, -55.8167),
+    "Candelaria":             (-27.4667, -55.7500),
+    "Santa Ana":              (-27.3667, -55.5833),
+    "San Ignacio":            (-27.2667, -55.5333),
+    "Jardín América":         (-27.0333, -55.2333),
+    "Oberá":                  (-27.4833, -55.1333),
+    "Apóstoles":              (-27.9167, -55.7500),
+    "Azara":                  (-28.0500, -55.6667),
+    "San José":               (-27.7667, -55.7833),
+    "Eldorado":               (-26.4000, -54.6333),
+    "Puerto Iguazú":          (-25.5972, -54.5789),
+    "Wanda":                  (-25.9667, -54.5667),
+    "Montecarlo":             (-26.5667, -54.7500),
+    "Puerto Rico":            (-26.8000, -55.0167),
+    "Leandro N. Alem":        (-27.6000, -55.3333),
+    "Campo Grande":           (-27.2167, -54.9667),
+    "Aristóbulo del Valle":   (-27.1000, -54.9000),
+    "San Vicente":            (-26.9667, -54.7333),
+    "Bernardo de Irigoyen":   (-26.2667, -53.6500),
+}
+
+def coordenadas_de_zona(zona: Optional[str]) -> Tuple[float, float]:
+    return COORDENADAS_ZONA.get(zona, COORDENADAS_ZONA["Posadas"])
+
+def haversine(lon1: float, lat1: float, lon2: float, lat2: float) -> float:
+    """
+    Distancia en km entre dos coordenadas.
+    """
+    lon1, lat1, lon2, lat2 = map(radians, [lon1, lat1, lon2, lat2])
+    dlon = lon2 - lon1
+    dlat = lat2 - lat1
+    a = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlon / 2) ** 2
+    return round(6371 * 2 * asin(sqrt(a)), 2)
+
+async def candidatos_para(servicio: Optional[str] = None) -> List[dict]:
+    """
+    Disponibles que hacen `servicio`; si no hay ninguno, los disponibles
+    de cualquiera.
+    """
+    candidatos = []
+    if servicio:
+        candidatos = await listar_profesionales(
+            {"tipo_servicio": servicio, "disponible": True}, PROYECCION_CANDIDATO, MAX_CANDIDATOS
+        )
+    if not candidatos:
+        candidatos = await listar_profesionales({"disponible": True}, PROYECCION_CANDIDATO, MAX_CANDIDATOS)
+    return candidatos
+
+def mas_cercano(candidatos: List[dict], lat: float, lon: float) -> Optional[Tuple[dict, float]]:
+    mejor = None
+    for profesional in candidatos:
+        if profesional.get("latitud") is None or profesional.get("longitud") is None:
+            continue
+        distancia = haversine(lon, lat, profesional["longitud"], profesional["latitud"])
+        if mejor is None or distancia < mejor[1]:
+            mejor = (profesional, distancia)
+    return mejor
+
+async def profesional_mas_cercano(lat: float, lon: float, servicio: Optional[str] = None) -> Optional[Tuple[dict, float]]:
+    """
+    (profesional, distancia_km) del disponible más cercano que hace
+    `servicio`; si no hay ninguno de ese servicio, el disponible más
+    cercano de cualquiera. None si no hay nadie disponible.
+    """
+    return mas_cercano(await candidatos_para(servicio), lat, lon)
+
+async def crear_indices_asignacion() -> None:
+    await db.profesionales.create_index([("tipo_servicio", 1), ("disponible", 1)])
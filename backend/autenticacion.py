@@ -0,0 +1,150 @@
+"""
+Autenticación y límites de tasa compartidos por las APIs.
+
+Un solo formato de token (JWT HS256 con `sub` y `rol`) y un solo hash de
+contraseñas para las dos APIs. Se aceptan también los tokens y usuarios
+del backend de deploy (claim `user_id`, hash en `password`) para no
+cerrar sesiones ni invalidar cuentas al migrar.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone, timedelta
+from typing import List, Optional, Tuple
+
+import jwt
+from fastapi import HTTPException, Depends
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+
+from asignacion import coordenadas_de_zona
+from datos import usuario_por_email, usuario_por_id
+from limites import LimitadorTasa, AlmacenMemoria, AlmacenRedis
+from modelos import UserRegister, User, Profesional
+from nucleo import (
+    recursos, PRECARGA, SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, LIMITES_TASA, LIMITES_REDIS_URL,
+    LIMITES_PROXIES, HASH_HILOS,
+)
+from recursos import Perezoso
+
+security = HTTPBearer()
+security_opcional = HTTPBearer(auto_error=False)
+
+def crear_contexto_password():
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+pwd_context = Perezoso(crear_contexto_password)
+recursos.cliente("pwd_context", pwd_context, precargar=PRECARGA)
+
+# Para hashear en lote (importaciones): bcrypt suelta el GIL, así que los
+# threads usan todos los núcleos sin pasar por el thread pool de asyncio
+pool_hash = Perezoso(lambda: ThreadPoolExecutor(HASH_HILOS, thread_name_prefix="bcrypt"), "pool_hash")
+recursos.cliente("pool_hash", pool_hash, cerrar=lambda pool: pool.shutdown(wait=False), precargar=False)
+
+# ─── HELPERS AUTH ────────────────────────────────────────────────────────────
+
+def hash_password(password: str) -> str:
+    return pwd_context.obtener().hash(password)
+
+def verify_password(plain: str, hashed: str) -> bool:
+    return pwd_context.obtener().verify(plain, hashed)
+
+async def hashear_en_lote(passwords: List[str]) -> List[str]:
+    contexto = await pwd_context.aobtener()
+    pool = await pool_hash.aobtener()
+    loop = asyncio.get_running_loop()
+    return await asyncio.gather(*(loop.run_in_executor(pool, contexto.hash, p) for p in passwords))
+
+async def verificar_credenciales(email: str, password: str) -> dict:
+    """
+    Devuelve el usuario (sin hash) o responde 401.
+    """
+    user = await usuario_por_email(email)
+    hashed = user and (user.get("password_hash") or user.get("password"))
+    # bcrypt tarda cientos de ms de CPU: fuera del event loop
+    if not hashed or not await asyncio.to_thread(verify_password, password, hashed):
+        raise HTTPException(status_code=401, detail="Credenciales inválidas")
+    return {k: v for k, v in user.items() if k not in ("password_hash", "password")}
+
+def create_token(user_id: str, rol: str) -> str:
+    expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    return jwt.encode({"sub": user_id, "rol": rol, "exp": expire}, SECRET_KEY, algorithm=ALGORITHM)
+
+async def usuario_desde_token(token: str) -> dict:
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        user_id = payload.get("sub") or payload.get("user_id")
+        if not user_id:
+            raise HTTPException(status_code=401, detail="Token inválido")
+        user = await usuario_por_id(user_id)
+        if not user:
+            raise HTTPException(status_code=401, detail="Usuario no encontrado")
+        return user
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(status_code=401, detail="Token expirado")
+    except jwt.InvalidTokenError:
+        raise HTTPException(status_code=401, detail="Token inválido")
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    return await usuario_desde_token(credentials.credentials)
+
+def usuario_de_token(token: str) -> Optional[str]:
+    # Sólo verifica la firma: no consulta Mongo
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except jwt.PyJWTError:
+        return None
+    return payload.get("sub") or payload.get("user_id")
+
+# ─── CUENTAS ─────────────────────────────────────────────────────────────────
+
+def armar_cuenta(datos: UserRegister, password_hash: str) -> Tuple[User, Optional[Profesional]]:
+    """
+    Usuario y, si es profesional, su perfil (mismo id), listos para
+    datos.registrar_usuario o datos.insertar_cuentas.
+    """
+    user = User(
+        nombre=datos.nombre,
+        telefono=datos.telefono,
+        email=datos.email,
+        password_hash=password_hash,
+        rol=datos.rol
+    )
+    if datos.rol != "profesional":
+        return user, None
+
+    lat, lon = coordenadas_de_zona(datos.zona)
+    profesional = Profesional(
+        id=user.id,
+        nombre=datos.nombre,
+        telefono=datos.telefono,
+        email=datos.email,
+        tipo_servicio=datos.tipo_servicio or "técnico general",
+        latitud=lat,
+        longitud=lon,
+        disponible=True,
+        tarifa_base=15000.0,
+        zona=datos.zona or "Posadas"
+    )
+    return user, profesional
+
+# ─── LÍMITES DE TASA ─────────────────────────────────────────────────────────
+
+# "por:capacidad/segundos". Las IPs móviles suelen estar detrás de CGNAT: los
+# límites por IP son holgados y los estrictos van por usuario. Las reglas
+# son por acción: las dos APIs comparten cubetas.
+REGLAS_LIMITES = {
+    "register": ["ip:20/3600"],
+    "login": ["ip:20/60"],
+    "solicitudes": ["usuario:10/3600", "ip:60/3600"],
+    "pago": ["usuario:20/3600"],
+}
+
+limitador = LimitadorTasa(
+    {**REGLAS_LIMITES, **LIMITES_TASA},
+    almacen=AlmacenRedis(LIMITES_REDIS_URL) if LIMITES_REDIS_URL else AlmacenMemoria(),
+    usuario_de_token=usuario_de_token,
+    proxies=LIMITES_PROXIES,
+)
+
+if isinstance(limitador.almacen, AlmacenRedis):
+    recursos.registrar("limites_redis", detener=limitador.almacen.cerrar)
@@ -0,0 +1,57 @@
+"""
+La app de ChangaRed preparada para benchmarks.
+
+Con BENCH_MONGO=mock usa mongomock-motor en memoria en lugar de MongoDB.
+En ambos casos crea al arrancar un admin con BENCH_ADMIN_EMAIL /
+BENCH_ADMIN_PASSWORD, porque el registro público no permite ese rol.
+API_RUTAS elige qué API se monta, igual que en server.
+
+Uso:
+    BENCH_MONGO=mock uvicorn benchmarks.app_bench:app --port 8000
+    BENCH_MONGO=mock API_RUTAS=deploy uvicorn benchmarks.app_bench:app --port 8000
+"""
+import asyncio
+import os
+import uuid
+
+if os.environ.get("BENCH_MONGO") == "mock":
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+
+import nucleo  # noqa: E402
+
+if os.environ.get("BENCH_MONGO") == "mock":
+    from mongomock_motor import AsyncMongoMockClient
+
+    # Antes de importar server: los módulos de rutas toman nucleo.db al importarse
+    nucleo.db = AsyncMongoMockClient(tz_aware=True).changared
+    nucleo.motor_tarifas.db = nucleo.db
+    nucleo.deduplicador.db = nucleo.db
+    nucleo.planificador.db = nucleo.db
+    # Sin MongoDB no hay pool que calentar: se saca del ciclo de vida
+    del nucleo.recursos.componentes["mongo"]
+
+import server  # noqa: E402
+from autenticacion import hash_password  # noqa: E402
+
+app = server.app
+
+ADMIN_EMAIL = os.environ.get("BENCH_ADMIN_EMAIL", "admin@bench.changared")
+ADMIN_PASSWORD = os.environ.get("BENCH_ADMIN_PASSWORD", "bench-admin")
+
+
+async def crear_admin_bench():
+    await nucleo.db.users.update_one(
+        {"email": ADMIN_EMAIL},
+        {"$setOnInsert": {
+            "id": str(uuid.uuid4()),
+            "nombre": "Admin Bench",
+            "telefono": "",
+            "email": ADMIN_EMAIL,
+            "password_hash": await asyncio.to_thread(hash_password, ADMIN_PASSWORD),
+            "rol": "admin",
+        }},
+        upsert=True,
+    )
+
+
+nucleo.recursos.registrar("admin_bench", iniciar=crear_admin_bench)
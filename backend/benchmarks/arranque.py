@@ -0,0 +1,120 @@
+"""
+Cold start del backend.
+
+Mide, en procesos nuevos cada vez:
+
+- el tiempo de importar `server` con `python -X importtime`, y qué paquetes
+  pesan más (acumulado por paquete raíz);
+- qué módulos pesados quedaron cargados sólo por importar `server`;
+- el tiempo desde lanzar `uvicorn server:app` hasta el primer 200 de
+  /api/health. El arranque no espera a Mongo (los índices se crean en
+  segundo plano), así que no hace falta un MongoDB corriendo.
+
+Con PRECARGA=false se mide el arranque sin calentar los clientes en
+segundo plano, como conviene en serverless.
+
+Uso:
+    python benchmarks/arranque.py --repeticiones 5
+    PRECARGA=false python benchmarks/arranque.py
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import httpx
+
+BACKEND = Path(__file__).resolve().parent.parent
+PESADOS = ["openai", "httpx", "passlib", "bcrypt", "mercadopago", "smtplib", "email.mime.multipart", "redis"]
+
+
+def tiempos_de_import(env):
+    """
+    Devuelve (ms de `import server`, {paquete raíz: ms acumulados}).
+    """
+    r = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import server"],
+        cwd=BACKEND, env=env, capture_output=True, text=True, check=True,
+    )
+    total, por_paquete = 0.0, defaultdict(float)
+    for linea in r.stderr.splitlines():
+        if not linea.startswith("import time:") or "cumulative" in linea:
+            continue
+        _, acumulado, nombre = linea[len("import time:"):].split("|")
+        profundidad = len(nombre) - len(nombre.lstrip())
+        nombre = nombre.strip()
+        ms = int(acumulado) / 1e3
+        if nombre == "server":
+            total = ms
+        elif profundidad <= 3:
+            # Importados directamente por server (o por un módulo propio)
+            raiz = nombre.split(".")[0]
+            por_paquete[raiz] = max(por_paquete[raiz], ms)
+    return total, por_paquete
+
+
+def modulos_cargados(env):
+    codigo = f"import json, sys, server; print(json.dumps([m for m in {PESADOS!r} if m in sys.modules]))"
+    r = subprocess.run([sys.executable, "-c", codigo], cwd=BACKEND, env=env, capture_output=True, text=True, check=True)
+    return json.loads(r.stdout.strip().splitlines()[-1])
+
+
+def primer_health(env, puerto):
+    inicio = time.perf_counter()
+    proceso = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--port", str(puerto), "--log-level", "warning"],
+        cwd=BACKEND, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - inicio < 60:
+            try:
+                if httpx.get(f"http://127.0.0.1:{puerto}/api/health", timeout=1).status_code == 200:
+                    return time.perf_counter() - inicio
+            except httpx.HTTPError:
+                if proceso.poll() is not None:
+                    raise RuntimeError("server:app terminó al arrancar")
+            time.sleep(0.005)
+        raise RuntimeError("/api/health no respondió en 60 s")
+    finally:
+        # Sólo interesa el arranque: no hace falta esperar el cierre ordenado
+        proceso.kill()
+        proceso.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--puerto", type=int, default=8098)
+    parser.add_argument("--top", type=int, default=12, help="paquetes a listar en el desglose")
+    args = parser.parse_args()
+
+    env = {**os.environ, "MONGO_URL": os.environ.get("MONGO_URL", "mongodb://localhost:27017")}
+
+    imports, paquetes = [], defaultdict(list)
+    for _ in range(args.repeticiones):
+        total, por_paquete = tiempos_de_import(env)
+        imports.append(total)
+        for nombre, ms in por_paquete.items():
+            paquetes[nombre].append(ms)
+    health = [primer_health(env, args.puerto) * 1e3 for _ in range(args.repeticiones)]
+
+    medianas = {nombre: statistics.median(v) for nombre, v in paquetes.items()}
+    print(json.dumps({
+        "repeticiones": args.repeticiones,
+        "precarga": env.get("PRECARGA", "true"),
+        "import_server_ms": {"mediana": round(statistics.median(imports), 1), "min": round(min(imports), 1)},
+        "primer_health_ms": {"mediana": round(statistics.median(health), 1), "min": round(min(health), 1)},
+        "modulos_pesados_cargados": modulos_cargados(env),
+        "import_por_paquete_ms": {
+            nombre: round(ms, 1) for nombre, ms in sorted(medianas.items(), key=lambda x: -x[1])[:args.top]
+        },
+    }, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
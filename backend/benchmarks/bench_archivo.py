@@ -0,0 +1,171 @@
+"""
+Archivo de solicitudes cerradas: tamaño de la colección caliente y
+latencia de las lecturas antes y después de archivar.
+
+Siembra --documentos solicitudes de --meses meses, con --cerradas de
+ellas completadas o canceladas (las abiertas son del último mes), crea los
+índices y mide:
+- el listado de un cliente como GET /api/solicitudes (--repeticiones
+  clientes al azar, p50/p95 en ms) y el agregado de las métricas del admin,
+- la corrida de archivar_cerradas: solicitudes/s y particiones creadas,
+- las mismas lecturas después, más el listado con `archivadas=True`, y
+  que los totales del admin (caliente + resumen del archivo) no cambiaron.
+
+Con un MongoDB real (--mongo) también reporta tamaño de datos e índices de
+`solicitudes` antes y después (collStats), que es lo que tiene que entrar
+en el caché de WiredTiger. Con mongomock (por defecto) cada consulta
+recorre la colección, así que la latencia sigue al tamaño más que con
+índices. La base --db se vacía al empezar.
+
+Uso:
+    python benchmarks/bench_archivo.py --documentos 20000
+    python benchmarks/bench_archivo.py --mongo mongodb://localhost:27017 --documentos 500000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+SERVICIOS = ["electricista", "plomero", "gasista", "pintor", "cerrajero"]
+ZONAS = ["Posadas", "Oberá", "Garupá", "Eldorado", "Apóstoles"]
+
+
+def documento(i, ahora, args):
+    cerrada = random.random() < args.cerradas
+    dias = random.uniform(0, args.meses * 30) if cerrada else random.uniform(0, 30)
+    creada = ahora - timedelta(days=dias)
+    return {
+        "id": str(uuid.uuid4()),
+        "cliente_id": f"cliente-{random.randrange(args.clientes)}",
+        "cliente_nombre": "Cliente Bench",
+        "mensaje": "pedido de prueba " * random.randint(1, 8),
+        "servicio": random.choice(SERVICIOS),
+        "zona": random.choice(ZONAS),
+        "estado": random.choice(["completado", "cancelado"]) if cerrada else random.choice(["pendiente_admin", "esperando_pago"]),
+        "precio_total": random.randint(10, 40) * 1000,
+        "comision_changared": random.randint(2, 8) * 1000,
+        "version": i + 1,
+        "created_at": creada,
+        "updated_at": creada + timedelta(days=random.uniform(0, 2)),
+    }
+
+
+async def sembrar(db, args, lote=5000):
+    ahora = datetime.now(timezone.utc)
+    for nombre in await db.list_collection_names():
+        await db.drop_collection(nombre)
+    for inicio in range(0, args.documentos, lote):
+        await db.solicitudes.insert_many(
+            [documento(i, ahora, args) for i in range(inicio, min(args.documentos, inicio + lote))], ordered=False
+        )
+    await db.contadores.insert_one({"_id": "solicitudes", "valor": args.documentos})
+
+
+def ms(tiempos):
+    tiempos = sorted(tiempos)
+    return {
+        "p50_ms": round(tiempos[len(tiempos) // 2] * 1e3, 2),
+        "p95_ms": round(tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.95))] * 1e3, 2),
+    }
+
+
+async def tamano(db):
+    try:
+        stats = await db.command("collStats", "solicitudes")
+    except Exception:
+        # mongomock no implementa collStats
+        return None
+    return {campo: round(stats[campo] / 1e6, 1) for campo in ("size", "storageSize", "totalIndexSize")}
+
+
+async def medir(db, args, archivadas=False):
+    from archivo import RESUMEN, resumen_archivado
+    from datos import listar_solicitudes
+
+    tiempos, encontradas = [], 0
+    for _ in range(args.repeticiones):
+        inicio = time.perf_counter()
+        encontradas += len(await listar_solicitudes(
+            {"cliente_id": f"cliente-{random.randrange(args.clientes)}"}, archivadas=archivadas
+        ))
+        tiempos.append(time.perf_counter() - inicio)
+    inicio = time.perf_counter()
+    caliente = await db.solicitudes.aggregate([{"$group": {"_id": None, **RESUMEN}}]).to_list(1)
+    archivado = await resumen_archivado()
+    metricas_s = time.perf_counter() - inicio
+    caliente = caliente[0] if caliente else {}
+    return {
+        "documentos_calientes": await db.solicitudes.count_documents({}),
+        "tamano_mb": await tamano(db),
+        "listado_cliente": {**ms(tiempos), "solicitudes_por_cliente": round(encontradas / args.repeticiones, 1)},
+        "metricas_admin_ms": round(metricas_s * 1e3, 2),
+        "totales_admin": {campo: caliente.get(campo, 0) + archivado[campo] for campo in RESUMEN},
+    }
+
+
+async def correr(args):
+    from benchmarks import app_bench  # noqa: F401  (apunta nucleo.db a mongomock con --mongo mock)
+    import archivo
+    from mantenimiento import crear_indices_mantenimiento
+    from nucleo import db
+    from sincronizacion import crear_indices
+
+    archivo.LOTE = args.lote
+    archivo.MAX_LOTES = args.documentos // args.lote + 1
+    await sembrar(db, args)
+    await crear_indices(db)
+    await crear_indices_mantenimiento()
+
+    antes = await medir(db, args)
+    inicio = time.perf_counter()
+    resultado = await archivo.archivar_cerradas()
+    duracion = time.perf_counter() - inicio
+    despues = await medir(db, args)
+    return {
+        "documentos": args.documentos,
+        "antes": antes,
+        "archivado": {
+            **resultado,
+            "duracion_s": round(duracion, 2),
+            "solicitudes_por_s": round(resultado["archivadas"] / duracion),
+            "particiones": len(await archivo.particiones()),
+        },
+        "despues": despues,
+        "despues_con_archivadas": (await medir(db, args, archivadas=True))["listado_cliente"],
+        "totales_iguales": antes["totales_admin"] == despues["totales_admin"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documentos", type=int, default=20000)
+    parser.add_argument("--meses", type=int, default=24, help="antigüedad máxima de las cerradas")
+    parser.add_argument("--cerradas", type=float, default=0.85, help="fracción de solicitudes cerradas")
+    parser.add_argument("--clientes", type=int, default=2000)
+    parser.add_argument("--repeticiones", type=int, default=50)
+    parser.add_argument("--lote", type=int, default=500)
+    parser.add_argument("--mongo", default="mock", help="'mock' (mongomock-motor) o una URL de MongoDB")
+    parser.add_argument("--db", default="changared_bench_archivo", help="base a usar con --mongo")
+    parser.add_argument("--semilla", type=int, default=42)
+    args = parser.parse_args()
+    random.seed(args.semilla)
+
+    os.environ.update({"DB_NAME": args.db, "LOG_NIVEL": os.environ.get("LOG_NIVEL", "WARNING")})
+    if args.mongo == "mock":
+        os.environ["BENCH_MONGO"] = "mock"
+    else:
+        os.environ["BENCH_MONGO"] = "real"
+        os.environ["MONGO_URL"] = args.mongo
+    print(json.dumps(asyncio.run(correr(args)), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
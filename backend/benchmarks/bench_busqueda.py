@@ -0,0 +1,147 @@
+"""
+Búsqueda de texto de solicitudes: latencia con el índice de texto en
+español a escala.
+
+Necesita un MongoDB real (mongomock no implementa $text). Siembra
+--documentos solicitudes sintéticas en la base --db (sólo si la colección
+no tiene ya esa cantidad: la siembra de un millón tarda minutos), crea el
+índice de busqueda.py y corre cada consulta --repeticiones veces con
+buscar_solicitudes, tal como la ruta del admin. Reporta p50/p95/máx en ms
+por consulta, cuántos resultados trajo y las etapas del plan ganador
+(tiene que haber un TEXT_MATCH, no un COLLSCAN).
+
+Uso:
+    python benchmarks/bench_busqueda.py --mongo mongodb://localhost:27017 --documentos 1000000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+SERVICIOS = {
+    "electricista": ["se cortó la luz", "chispazo en el tablero", "enchufe quemado", "térmica que salta"],
+    "plomero": ["pérdida de agua en el baño", "caño roto en la cocina", "inodoro tapado", "canilla que gotea"],
+    "gasista": ["fuga de gas en la cocina", "olor a gas", "calefón que no enciende", "revisión de la instalación de gas"],
+    "cerrajero": ["me quedé afuera", "cambio de cerradura", "llave rota en la puerta"],
+    "pintor": ["pintar el living", "humedad en la pared", "pintura de frente"],
+    "albañil": ["revoque caído", "ampliación de una pieza", "grieta en la pared"],
+}
+ZONAS = ["Posadas", "Oberá", "Garupá", "Eldorado", "Apóstoles", "Puerto Iguazú", "Leandro N. Alem", "Jardín América"]
+NOMBRES = ["María", "José", "Lucía", "Martín", "Sofía", "Joaquín", "Valentina", "Ramón", "Inés", "Agustín"]
+APELLIDOS = ["González", "Rodríguez", "Fernández", "López", "Martínez", "Benítez", "Núñez", "Acuña"]
+ESTADOS = ["pendiente_admin", "esperando_pago", "completado", "cancelado"]
+EXTRAS = ["urgente por favor", "desde ayer", "a la tarde", "es un departamento", "hay chicos en la casa", ""]
+
+CONSULTAS = [
+    {"texto": "fuga de gas obera"},
+    {"texto": "fuga de gas", "zona": "Oberá"},
+    {"texto": "perdida agua baño"},
+    {"texto": "\"caño roto\""},
+    {"texto": "luz -tablero", "estado": "pendiente_admin"},
+    {"texto": "gonzalez"},
+    {"texto": "humedad pared", "servicio": "pintor"},
+    {"texto": "calefon", "desde": "semana"},
+]
+
+
+def documento(i, ahora):
+    servicio = random.choice(list(SERVICIOS))
+    return {
+        "id": str(uuid.uuid4()),
+        "cliente_id": f"cliente-{i % 50000}",
+        "cliente_nombre": f"{random.choice(NOMBRES)} {random.choice(APELLIDOS)}",
+        "mensaje": f"{random.choice(SERVICIOS[servicio])}, {random.choice(EXTRAS)}".strip(", "),
+        "servicio": servicio,
+        "zona": random.choice(ZONAS),
+        "urgente": random.random() < 0.1,
+        "estado": random.choice(ESTADOS),
+        "created_at": ahora - timedelta(minutes=random.randint(0, 60 * 24 * 365)),
+    }
+
+
+async def sembrar(db, documentos, lote=10000):
+    if await db.solicitudes.estimated_document_count() == documentos:
+        return False
+    await db.solicitudes.drop()
+    ahora = datetime.now(timezone.utc)
+    for inicio in range(0, documentos, lote):
+        await db.solicitudes.insert_many(
+            [documento(i, ahora) for i in range(inicio, min(documentos, inicio + lote))], ordered=False
+        )
+        print(json.dumps({"sembradas": min(documentos, inicio + lote)}), file=sys.stderr)
+    return True
+
+
+def etapas(plan):
+    nombres = []
+    while plan:
+        nombres.append(plan.get("stage"))
+        plan = plan.get("inputStage") or (plan.get("inputStages") or [None])[0]
+    return nombres
+
+
+async def correr(args):
+    from busqueda import buscar_solicitudes, crear_indice_busqueda, filtro_busqueda
+    from nucleo import db
+
+    sembrada = await sembrar(db, args.documentos)
+    inicio = time.perf_counter()
+    await crear_indice_busqueda()
+    indice_s = time.perf_counter() - inicio
+
+    resultados = []
+    for consulta in CONSULTAS:
+        filtros = {k: v for k, v in consulta.items() if k != "texto"}
+        if filtros.get("desde") == "semana":
+            filtros["desde"] = datetime.now(timezone.utc) - timedelta(days=7)
+        tiempos, encontrados = [], 0
+        for _ in range(args.repeticiones):
+            inicio = time.perf_counter()
+            encontrados = len(await buscar_solicitudes(consulta["texto"], args.limite, **filtros))
+            tiempos.append((time.perf_counter() - inicio) * 1e3)
+        tiempos.sort()
+        plan = await db.command(
+            "explain", {"find": "solicitudes", "filter": filtro_busqueda(consulta["texto"], **filtros), "limit": args.limite},
+            verbosity="queryPlanner",
+        )
+        resultados.append({
+            "consulta": consulta,
+            "resultados": encontrados,
+            "p50_ms": round(tiempos[len(tiempos) // 2], 2),
+            "p95_ms": round(tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.95))], 2),
+            "max_ms": round(tiempos[-1], 2),
+            "plan": etapas(plan["queryPlanner"]["winningPlan"]),
+        })
+    return {
+        "documentos": await db.solicitudes.estimated_document_count(),
+        "sembrada_en_esta_corrida": sembrada,
+        "crear_indice_s": round(indice_s, 2),
+        "consultas": resultados,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo", required=True, help="URL de un MongoDB real")
+    parser.add_argument("--db", default="changared_bench_busqueda")
+    parser.add_argument("--documentos", type=int, default=1000000)
+    parser.add_argument("--repeticiones", type=int, default=50)
+    parser.add_argument("--limite", type=int, default=20)
+    parser.add_argument("--semilla", type=int, default=42)
+    args = parser.parse_args()
+    random.seed(args.semilla)
+
+    os.environ.update({"MONGO_URL": args.mongo, "DB_NAME": args.db, "LOG_NIVEL": os.environ.get("LOG_NIVEL", "WARNING")})
+    print(json.dumps(asyncio.run(correr(args)), indent=2, ensure_ascii=False, default=str))
+
+
+if __name__ == "__main__":
+    main()
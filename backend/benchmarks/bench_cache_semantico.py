@@ -0,0 +1,147 @@
+"""
+Caché semántico del LLM: recall, precisión, latencia y memoria.
+
+El corpus (corpus_clasificacion.jsonl) son pedidos reales de a pares: dos
+formas de pedir lo mismo, con el servicio correcto. Se carga el caché con
+un mensaje de cada par, como si el LLM lo hubiera clasificado, y se busca
+el otro; y al revés. Para cada umbral reporta:
+- recall: pares en los que el caché respondió (llamadas al LLM ahorradas),
+- precisión: de esas respuestas, cuántas traían el servicio correcto,
+- lo mismo con el control de palabras clave de clasificacion.py, que
+  descarta la respuesta si las palabras clave dicen otro servicio.
+
+Después llena un caché de --entradas con mensajes sintéticos (palabras al
+azar con frecuencia Zipf entre las del corpus y 20.000 inventadas), le
+agrega una mitad del corpus y busca la otra: recall y precisión con el
+caché lleno (el tope de candidatos del índice no tiene que perder vecinos)
+y µs por búsqueda. Sigue guardando para forzar desalojos (µs por guardado)
+y mide la memoria por entrada con tracemalloc.
+
+Uso:
+    python benchmarks/bench_cache_semantico.py --entradas 5000
+"""
+import argparse
+import json
+import os
+import random
+import string
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from cache_semantico import CacheSemantico  # noqa: E402
+
+CORPUS = Path(__file__).resolve().parent / "corpus_clasificacion.jsonl"
+UMBRALES = [0.3, 0.4, 0.5, 0.55, 0.6, 0.7, 0.8]
+
+
+def leer_corpus():
+    pedidos = [json.loads(linea) for linea in CORPUS.read_text().splitlines() if linea.strip()]
+    return list(zip(pedidos[0::2], pedidos[1::2]))
+
+
+def percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p / 100))]
+
+
+def evaluar(pares, umbral, servicio_por_palabras):
+    respondidas = correctas = respondidas_control = correctas_control = 0
+    for guardados, buscados in ((0, 1), (1, 0)):
+        cache = CacheSemantico(umbral=umbral)
+        for par in pares:
+            cache.guardar(par[guardados]["mensaje"], par[guardados]["servicio"])
+        for par in pares:
+            pedido = par[buscados]
+            encontrado = cache.buscar(pedido["mensaje"])
+            if encontrado is None:
+                continue
+            respondidas += 1
+            correctas += encontrado[0] == pedido["servicio"]
+            palabras = servicio_por_palabras(pedido["mensaje"])
+            if palabras is None or palabras == encontrado[0]:
+                respondidas_control += 1
+                correctas_control += encontrado[0] == pedido["servicio"]
+    total = 2 * len(pares)
+    return {
+        "umbral": umbral,
+        "recall": round(respondidas / total, 3),
+        "precision": round(correctas / respondidas, 3) if respondidas else None,
+        "recall_con_control": round(respondidas_control / total, 3),
+        "precision_con_control": round(correctas_control / respondidas_control, 3) if respondidas_control else None,
+    }
+
+
+def sinteticos(pares, n):
+    palabras = sorted({p for par in pares for pedido in par for p in pedido["mensaje"].replace(",", "").split()})
+    palabras += ["".join(random.choices(string.ascii_lowercase, k=random.randint(4, 9))) for _ in range(20000)]
+    random.shuffle(palabras)
+    frecuencias = [1 / (i + 1) for i in range(len(palabras))]
+    return [" ".join(random.choices(palabras, frecuencias, k=random.randint(3, 10))) for _ in range(n)]
+
+
+def medir_escala(pares, entradas, umbral):
+    mensajes = sinteticos(pares, entradas * 2)
+    tracemalloc.start()
+    antes = tracemalloc.get_traced_memory()[0]
+    cache = CacheSemantico(max_entradas=entradas + len(pares), umbral=umbral)
+    for mensaje in mensajes[:entradas]:
+        cache.guardar(mensaje, "sintético")
+    memoria = tracemalloc.get_traced_memory()[0] - antes
+    tracemalloc.stop()
+
+    for guardado, _ in pares:
+        cache.guardar(guardado["mensaje"], guardado["servicio"])
+    busqueda, respondidas, correctas = [], 0, 0
+    for _, buscado in pares:
+        inicio = time.perf_counter()
+        encontrado = cache.buscar(buscado["mensaje"])
+        busqueda.append(time.perf_counter() - inicio)
+        if encontrado is not None:
+            respondidas += 1
+            correctas += encontrado[0] == buscado["servicio"]
+
+    guardado = []
+    for mensaje in mensajes[entradas:]:
+        inicio = time.perf_counter()
+        cache.guardar(mensaje, "sintético")
+        guardado.append(time.perf_counter() - inicio)
+    return {
+        "entradas": len(cache.entradas),
+        "desalojos": cache.desalojos,
+        "rasgos": len(cache.indice),
+        "memoria_mb": round(memoria / 1e6, 2),
+        "bytes_por_entrada": round(memoria / entradas),
+        "recall": round(respondidas / len(pares), 3),
+        "precision": round(correctas / respondidas, 3) if respondidas else None,
+        "buscar_us": {"p50": round(percentil(busqueda, 50) * 1e6, 1), "p99": round(percentil(busqueda, 99) * 1e6, 1)},
+        "guardar_us": {"p50": round(percentil(guardado, 50) * 1e6, 1), "p99": round(percentil(guardado, 99) * 1e6, 1)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entradas", type=int, default=5000, help="tamaño del caché para medir latencia y memoria")
+    parser.add_argument("--umbral", type=float, default=0.5, help="umbral para la medición a escala")
+    parser.add_argument("--semilla", type=int, default=42)
+    args = parser.parse_args()
+    random.seed(args.semilla)
+
+    # clasificacion importa el núcleo; no se conecta a nada
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    os.environ.setdefault("LOG_NIVEL", "WARNING")
+    from clasificacion import servicio_por_palabras
+
+    pares = leer_corpus()
+    print(json.dumps({
+        "pares": len(pares),
+        "por_umbral": [evaluar(pares, umbral, servicio_por_palabras) for umbral in UMBRALES],
+        "escala": medir_escala(pares, args.entradas, args.umbral),
+    }, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
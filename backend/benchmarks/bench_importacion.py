@@ -0,0 +1,145 @@
+"""
+Importación masiva de profesionales: filas por segundo de cada etapa.
+
+Mide, sobre mongomock-motor o un MongoDB real (--mongo, base --db):
+- lectura y validación de --filas filas en CSV y NDJSON, sin guardar
+  (lo que no depende de bcrypt),
+- la importación completa de --filas-completas filas (hash en el pool de
+  HASH_HILOS threads + insert_many por lote), con el tiempo de cada etapa,
+- la misma importación repetida: todas ya registradas, no se hashea nada,
+- la importación de --filas-con-hash filas que ya traen password_hash,
+- el alta de a una como en /api/register (un hash y dos inserts por fila),
+  como referencia.
+
+mongomock revisa los índices únicos recorriendo la colección, así que con
+mock la etapa "mongo" crece con lo ya insertado: para medirla de verdad,
+--mongo. Los emails llevan un prefijo por corrida.
+
+Uso:
+    python benchmarks/bench_importacion.py --filas 50000 --filas-completas 200
+    python benchmarks/bench_importacion.py --mongo mongodb://localhost:27017 --filas-con-hash 50000
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import orjson
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+SERVICIOS = ["electricista", "plomero", "gasista", "pintor", "cerrajero"]
+ZONAS = ["Posadas", "Oberá", "Garupá", "Eldorado", "Apóstoles"]
+
+
+def filas(n, prefijo, password_hash=None):
+    for i in range(n):
+        clave = {"password_hash": password_hash} if password_hash else {"password": f"clave-{i}"}
+        yield {
+            "nombre": f"Profesional {i}",
+            "telefono": f"3764-{i:06d}",
+            "email": f"{prefijo}{i}@bench.changared",
+            **clave,
+            "tipo_servicio": SERVICIOS[i % len(SERVICIOS)],
+            "zona": ZONAS[i % len(ZONAS)],
+        }
+
+
+def como_csv(n, prefijo, password_hash=None):
+    columnas = "password_hash" if password_hash else "password"
+    lineas = [f"nombre,telefono,email,{columnas},tipo_servicio,zona"]
+    lineas += [",".join(fila.values()) for fila in filas(n, prefijo, password_hash)]
+    return ("\n".join(lineas) + "\n").encode()
+
+
+def como_ndjson(n, prefijo):
+    return b"".join(orjson.dumps(fila) + b"\n" for fila in filas(n, prefijo))
+
+
+async def bloques(datos, tamano=1 << 16):
+    for i in range(0, len(datos), tamano):
+        yield datos[i:i + tamano]
+
+
+async def medir_lectura(formato, datos):
+    from importacion import FORMATOS, validar
+
+    inicio = time.perf_counter()
+    validas = 0
+    async for _, fila, error in FORMATOS[formato](bloques(datos)):
+        if error is None:
+            validar(fila)
+            validas += 1
+    duracion = time.perf_counter() - inicio
+    return {"filas": validas, "mb": round(len(datos) / 1e6, 2), "filas_por_s": round(validas / duracion)}
+
+
+async def de_a_una(n, prefijo):
+    from autenticacion import armar_cuenta, hash_password
+    from datos import registrar_usuario
+    from modelos import UserRegister
+
+    inicio = time.perf_counter()
+    for fila in filas(n, prefijo):
+        datos = UserRegister(rol="profesional", **fila)
+        user, profesional = armar_cuenta(datos, await asyncio.to_thread(hash_password, datos.password))
+        await registrar_usuario(user.model_dump(), profesional.model_dump())
+    return {"filas": n, "filas_por_s": round(n / (time.perf_counter() - inicio), 1)}
+
+
+async def correr(args):
+    from benchmarks import app_bench  # noqa: F401  (apunta nucleo.db a mongomock con --mongo mock)
+    from autenticacion import hash_password
+    from datos import crear_indices_registro
+    from importacion import FORMATOS, importar
+    from nucleo import HASH_HILOS
+
+    await crear_indices_registro()
+    corrida = uuid.uuid4().hex[:8]
+    lectura = {
+        "csv": await medir_lectura("csv", como_csv(args.filas, "lectura-")),
+        "ndjson": await medir_lectura("ndjson", como_ndjson(args.filas, "lectura-")),
+    }
+    archivo = como_csv(args.filas_completas, f"completa-{corrida}-")
+    completa = await importar(FORMATOS["csv"](bloques(archivo)), lote=args.lote)
+    repetida = await importar(FORMATOS["csv"](bloques(archivo)), lote=args.lote)
+    archivo = como_csv(args.filas_con_hash, f"hash-{corrida}-", hash_password("clave-bench"))
+    con_hash = await importar(FORMATOS["csv"](bloques(archivo)), lote=args.lote)
+    for reporte in (completa, repetida, con_hash):
+        reporte.pop("errores")
+    return {
+        "hash_hilos": HASH_HILOS,
+        "cpus": os.cpu_count(),
+        "lectura_y_validacion": lectura,
+        "importacion": completa,
+        "importacion_repetida": repetida,
+        "importacion_con_password_hash": con_hash,
+        "de_a_una": await de_a_una(args.filas_completas, f"una-{corrida}-"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filas", type=int, default=50000, help="filas para medir lectura y validación")
+    parser.add_argument("--filas-completas", type=int, default=200, help="filas importadas con bcrypt")
+    parser.add_argument("--filas-con-hash", type=int, default=1000, help="filas importadas con password_hash")
+    parser.add_argument("--lote", type=int, default=500)
+    parser.add_argument("--mongo", default="mock", help="'mock' (mongomock-motor) o una URL de MongoDB")
+    parser.add_argument("--db", default="changared_bench", help="base a usar con --mongo")
+    args = parser.parse_args()
+
+    os.environ.update({"DB_NAME": args.db, "LOG_NIVEL": os.environ.get("LOG_NIVEL", "WARNING")})
+    if args.mongo == "mock":
+        os.environ["BENCH_MONGO"] = "mock"
+    else:
+        os.environ["BENCH_MONGO"] = "real"
+        os.environ["MONGO_URL"] = args.mongo
+    print(json.dumps(asyncio.run(correr(args)), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Costo de loguear en el thread que atiende el pedido.
+
+Compara el logging anterior (basicConfig + f-string, el handler formatea y
+escribe en el mismo thread) con el de logs.py (sólo se encola el record; el
+formateo JSON y la escritura los hace el listener). La salida va a
+/dev/null; con --escritura-lenta-us cada write demora ese tiempo, como un
+pipe lleno hacia el colector de logs.
+
+Uso:
+    python benchmarks/bench_logs.py --registros 100000
+    python benchmarks/bench_logs.py --registros 5000 --escritura-lenta-us 200
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import logs  # noqa: E402
+
+
+class SalidaLenta:
+    def __init__(self, destino, demora):
+        self.destino = destino
+        self.demora = demora
+
+    def write(self, texto):
+        time.sleep(self.demora)
+        return self.destino.write(texto)
+
+    def flush(self):
+        self.destino.flush()
+
+
+def medir_debug(logger, registros, lazy):
+    # Registros DEBUG con nivel INFO: se descartan, pero la f-string se arma igual
+    inicio = time.perf_counter()
+    for i in range(registros):
+        if lazy:
+            logger.debug("detalle %d", i)
+        else:
+            logger.debug(f"detalle {i}")
+    return (time.perf_counter() - inicio) / registros * 1e6
+
+
+def medir(logger, registros, lazy):
+    solicitud_id, servicio, tarifa = "d1a5bf66-4449", "electricista", 15000.0
+    inicio = time.perf_counter()
+    for i in range(registros):
+        if lazy:
+            logger.info("Solicitud creada", extra={"solicitud_id": solicitud_id, "servicio": servicio, "tarifa": tarifa, "i": i})
+        else:
+            logger.info(f"Solicitud {solicitud_id} | {servicio} | tarifa: ${tarifa:,.0f} | {i}")
+    return (time.perf_counter() - inicio) / registros * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--registros", type=int, default=50000)
+    parser.add_argument("--escritura-lenta-us", type=float, default=0)
+    args = parser.parse_args()
+
+    nulo = open(os.devnull, "w")
+    if args.escritura_lenta_us:
+        nulo = SalidaLenta(nulo, args.escritura_lenta_us / 1e6)
+    raiz = logging.getLogger()
+    logger = logging.getLogger("bench")
+
+    # Antes: StreamHandler síncrono con el formato por defecto de basicConfig
+    logging.basicConfig(level=logging.INFO, stream=nulo, force=True)
+    antes = medir(logger, args.registros, lazy=False)
+    debug_antes = medir_debug(logger, args.registros, lazy=False)
+
+    # Después: cola en memoria + listener con FormatoJSON
+    sys.stderr, stderr = nulo, sys.stderr
+    try:
+        logs.configurar_logs(nivel="INFO", formato="json")
+        despues = medir(logger, args.registros, lazy=True)
+        debug_despues = medir_debug(logger, args.registros, lazy=True)
+        inicio = time.perf_counter()
+        logs.detener_logs()
+        vaciado = time.perf_counter() - inicio
+    finally:
+        sys.stderr = stderr
+        for handler in list(raiz.handlers):
+            raiz.removeHandler(handler)
+
+    print(json.dumps({
+        "registros": args.registros,
+        "escritura_lenta_us": args.escritura_lenta_us,
+        "info_us_por_llamada": {"antes": round(antes, 2), "despues": round(despues, 2)},
+        "debug_descartado_us_por_llamada": {
+            "antes": round(debug_antes, 3),
+            "despues": round(debug_despues, 3),
+        },
+        "vaciado_listener_s": round(vaciado, 3),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Registro concurrente: cuentas duplicadas, huérfanos y throughput.
+
+Lanza a la vez --intentos registros por cada uno de --emails emails (mitad
+clientes, mitad profesionales, en orden aleatorio) contra la app en el
+mismo proceso (httpx + ASGI, con su ciclo de vida y sus índices). Después
+revisa en Mongo que haya exactamente un usuario por email, que cada
+usuario profesional tenga un solo perfil y que no haya perfiles sin
+usuario (en la API de deploy los perfiles se dan de alta aparte, así que
+ahí sólo se revisan los usuarios). Sale con código 1 si encuentra duplicados o huérfanos.
+
+Los 503 del control de admisión (clase "auth") se reintentan como lo haría
+un cliente, después de un tiempo al azar dentro del Retry-After; se
+cuentan aparte y la latencia reportada incluye esas esperas.
+
+Corre contra mongomock-motor (por defecto) o contra un MongoDB real con
+--mongo, en la base --db; contra un replica set el registro usa
+transacciones. Los emails llevan un prefijo por corrida, así que se puede
+repetir sobre la misma base.
+
+Uso:
+    python benchmarks/bench_registro.py --emails 20 --intentos 5
+    python benchmarks/bench_registro.py --mongo mongodb://localhost:27017 --emails 100 --intentos 3
+    python benchmarks/bench_registro.py --api deploy
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+RUTA_REGISTRO = {"changared": "/api/register", "deploy": "/api/auth/register"}
+
+
+def percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p / 100))] if valores else 0.0
+
+
+async def esperar_indices(recursos, plazo_s=30):
+    # Los índices se crean en segundo plano al arrancar; sin ellos no hay garantía
+    componente = recursos.componentes["indices"]
+    limite = time.monotonic() + plazo_s
+    while not all(tarea.done() for tarea in componente.tareas):
+        if time.monotonic() > limite:
+            raise RuntimeError("Los índices no terminaron de crearse")
+        await asyncio.sleep(0.05)
+
+
+async def verificar(db, prefijo, con_perfiles):
+    filtro = {"email": {"$regex": f"^{prefijo}"}}
+    por_email = await db.users.aggregate([
+        {"$match": filtro}, {"$group": {"_id": "$email", "n": {"$sum": 1}}},
+    ]).to_list(None)
+    usuarios = await db.users.find(filtro, {"_id": 0, "id": 1, "rol": 1}).to_list(None)
+    perfiles = await db.profesionales.find(filtro, {"_id": 0, "id": 1}).to_list(None)
+    ids_usuarios = {u["id"] for u in usuarios}
+    perfiles_por_id = {}
+    for perfil in perfiles:
+        perfiles_por_id[perfil["id"]] = perfiles_por_id.get(perfil["id"], 0) + 1
+    return {
+        "usuarios": len(usuarios),
+        "emails_duplicados": sum(1 for e in por_email if e["n"] > 1),
+        "perfiles": len(perfiles),
+        "perfiles_duplicados": sum(1 for n in perfiles_por_id.values() if n > 1),
+        "perfiles_sin_usuario": sum(1 for i in perfiles_por_id if i not in ids_usuarios),
+        "profesionales_sin_perfil": sum(
+            1 for u in usuarios if con_perfiles and u["rol"] == "profesional" and u["id"] not in perfiles_por_id
+        ),
+    }
+
+
+async def correr(args):
+    from benchmarks import app_bench
+    from datos import soporta_transacciones
+
+    nucleo = app_bench.nucleo
+    prefijo = f"stress-{uuid.uuid4().hex[:8]}-"
+    pedidos = []
+    for i in range(args.emails):
+        rol = "profesional" if i % 2 else "cliente"
+        pedidos += [(f"{prefijo}{i}@bench.changared", rol)] * args.intentos
+    random.shuffle(pedidos)
+
+    async with nucleo.recursos.ciclo_de_vida(app_bench.app):
+        await esperar_indices(nucleo.recursos)
+        transporte = httpx.ASGITransport(app=app_bench.app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://bench", timeout=args.timeout) as http:
+            async def registrar(email, rol):
+                datos = {"nombre": "Stress", "telefono": "3764-000000", "email": email, "password": "bench-pass", "rol": rol}
+                if rol == "profesional" and args.api == "changared":
+                    datos.update(tipo_servicio="electricista", zona="Posadas")
+                inicio, rechazos = time.perf_counter(), 0
+                while True:
+                    r = await http.post(RUTA_REGISTRO[args.api], json=datos)
+                    if r.status_code != 503:
+                        return r.status_code, time.perf_counter() - inicio, rechazos
+                    rechazos += 1
+                    await asyncio.sleep(random.uniform(0, float(r.headers.get("Retry-After", 1))))
+
+            inicio = time.perf_counter()
+            resultados = await asyncio.gather(*(registrar(email, rol) for email, rol in pedidos))
+            duracion = time.perf_counter() - inicio
+        verificacion = await verificar(nucleo.db, prefijo, con_perfiles=args.api == "changared")
+        transacciones = soporta_transacciones()
+
+    estados = {}
+    for estado, _, _ in resultados:
+        estados[str(estado)] = estados.get(str(estado), 0) + 1
+    latencias = [lat for _, lat, _ in resultados]
+    return {
+        "config": {k: v for k, v in vars(args).items() if k != "salida"},
+        "transacciones": transacciones,
+        "pedidos": len(pedidos),
+        "estados": estados,
+        "rechazos_admision": sum(rechazos for _, _, rechazos in resultados),
+        "duracion_s": round(duracion, 3),
+        "registros_por_s": round(len(pedidos) / duracion, 2),
+        "altas_por_s": round(estados.get("200", 0) / duracion, 2),
+        "p50_ms": round(percentil(latencias, 50) * 1e3, 2),
+        "p95_ms": round(percentil(latencias, 95) * 1e3, 2),
+        "p99_ms": round(percentil(latencias, 99) * 1e3, 2),
+        "verificacion": verificacion,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--api", choices=sorted(RUTA_REGISTRO), default="changared")
+    parser.add_argument("--emails", type=int, default=20)
+    parser.add_argument("--intentos", type=int, default=5, help="registros simultáneos por email")
+    parser.add_argument("--mongo", default="mock", help="'mock' (mongomock-motor) o una URL de MongoDB")
+    parser.add_argument("--db", default="changared_bench", help="base a usar con --mongo")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--salida", help="archivo JSON para el reporte (por defecto stdout)")
+    args = parser.parse_args()
+    random.seed(args.semilla)
+
+    os.environ.update({
+        "API_RUTAS": args.api,
+        "DB_NAME": args.db,
+        "PRECARGA": "false",
+        "LOG_NIVEL": os.environ.get("LOG_NIVEL", "WARNING"),
+        # Todo sale de la misma IP: sin límites de tasa
+        "LIMITES_TASA": json.dumps({"register": []}),
+    })
+    if args.mongo == "mock":
+        os.environ["BENCH_MONGO"] = "mock"
+    else:
+        os.environ["BENCH_MONGO"] = "real"
+        os.environ["MONGO_URL"] = args.mongo
+
+    reporte = asyncio.run(correr(args))
+    texto = json.dumps(reporte, indent=2, ensure_ascii=False)
+    if args.salida:
+        Path(args.salida).write_text(texto)
+    else:
+        print(texto)
+
+    v = reporte["verificacion"]
+    fallas = v["emails_duplicados"] + v["perfiles_duplicados"] + v["perfiles_sin_usuario"] + v["profesionales_sin_perfil"]
+    if fallas or reporte["estados"].get("200", 0) != args.emails:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Benchmark de serialización de listas de solicitudes.
+
+Compara el camino anterior (documentos crudos con `_id`, loop de
+`sol.pop("_id")`, jsonable_encoder + JSONResponse) contra el actual
+(proyección en Mongo + ORJSONResponse) y mide los bytes enviados sin
+comprimir, con gzip y con brotli.
+
+Uso:
+    python benchmarks/bench_serializacion.py --solicitudes 2000 --repeticiones 20
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+
+from bson import ObjectId  # noqa: E402
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse, ORJSONResponse  # noqa: E402
+
+from compresion import brotli, comprimir  # noqa: E402
+from modelos import PROYECCION_SOLICITUD  # noqa: E402
+
+
+def generar(n):
+    docs = []
+    for i in range(n):
+        docs.append({
+            "_id": ObjectId(),
+            "id": str(uuid.uuid4()),
+            "cliente_id": str(uuid.uuid4()),
+            "cliente_nombre": f"Cliente {i}",
+            "cliente_telefono": "3764-123456",
+            "cliente_email": f"cliente{i}@example.com",
+            "mensaje": "Se me cortó la luz en la cocina y salta la térmica cuando enchufo la heladera",
+            "servicio": "electricista",
+            "zona": "Oberá",
+            "urgente": i % 3 == 0,
+            "estado": "esperando_pago",
+            "profesional_id": str(uuid.uuid4()),
+            "profesional_nombre": "Juan Pérez",
+            "profesional_telefono": "3764-654321",
+            "tarifa_estimada_min": 19500.0,
+            "tarifa_estimada_max": 32500.0,
+            "tarifa_final": None,
+            "pago_id": None,
+            # Como vuelven de Mongo (fechas.py): datetime con zona, en ms
+            "created_at": datetime(2026, 2, 10, 14, 3, 11, 123000, tzinfo=timezone.utc),
+            "updated_at": datetime(2026, 2, 10, 15, 20, 41, 654000, tzinfo=timezone.utc),
+            "version": i,
+        })
+    return docs
+
+
+def antes(docs):
+    solicitudes = []
+    for sol in docs:
+        sol = dict(sol)
+        sol.pop("_id", None)
+        solicitudes.append(sol)
+    return JSONResponse(jsonable_encoder(solicitudes)).body
+
+
+def despues(docs):
+    # Los documentos ya llegan proyectados desde Mongo (sin _id)
+    return ORJSONResponse(docs).body
+
+
+def medir(funcion, docs, repeticiones):
+    cpu = time.process_time()
+    for _ in range(repeticiones):
+        cuerpo = funcion(docs)
+    return (time.process_time() - cpu) / repeticiones, cuerpo
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--solicitudes", type=int, default=2000)
+    parser.add_argument("--repeticiones", type=int, default=20)
+    args = parser.parse_args()
+
+    crudos = generar(args.solicitudes)
+    proyectados = [{k: v for k, v in d.items() if PROYECCION_SOLICITUD.get(k)} for d in crudos]
+
+    cpu_antes, cuerpo_antes = medir(antes, crudos, args.repeticiones)
+    cpu_despues, cuerpo_despues = medir(despues, proyectados, args.repeticiones)
+
+    bytes_red = {"sin_comprimir": len(cuerpo_despues)}
+    for codificacion in ("gzip", "br"):
+        if codificacion == "br" and brotli is None:
+            continue
+        inicio = time.process_time()
+        bytes_red[codificacion] = len(comprimir(cuerpo_despues, codificacion))
+        bytes_red[f"{codificacion}_cpu_ms"] = round((time.process_time() - inicio) * 1e3, 2)
+
+    print(json.dumps({
+        "solicitudes": args.solicitudes,
+        "antes": {"cpu_ms": round(cpu_antes * 1e3, 2), "bytes": len(cuerpo_antes)},
+        "despues": {"cpu_ms": round(cpu_despues * 1e3, 2), "bytes": bytes_red},
+        "aceleracion_cpu": round(cpu_antes / cpu_despues, 1) if cpu_despues else None,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Motor de tarifas: costo de cotizar y de observar, y error de los cuantiles.
+
+Carga el motor con N tarifas sintéticas (lognormales, distinta mediana por
+servicio y zona) y mide:
+- cotizar con el rango ya calculado y recién invalidado (peor caso),
+- observar una tarifa nueva,
+- el error relativo de p25/p75 del sketch contra los cuantiles exactos,
+- el tamaño del sketch (cubos) frente a guardar todas las tarifas.
+
+Uso:
+    python benchmarks/bench_tarifas.py --tarifas 100000
+"""
+import argparse
+import json
+import math
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from tarifas import MotorTarifas, SketchPrecios  # noqa: E402
+
+SERVICIOS = ["electricista", "plomero", "gasista", "pintor", "cerrajero", "albañil"]
+ZONAS = ["posadas", "oberá", "garupá", "eldorado", "apóstoles"]
+
+
+def exacto(valores, q):
+    valores = sorted(valores)
+    return valores[int(q * (len(valores) - 1))]
+
+
+def medir_us(funcion, repeticiones):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        funcion()
+    return (time.perf_counter() - inicio) / repeticiones * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tarifas", type=int, default=100000)
+    parser.add_argument("--repeticiones", type=int, default=100000)
+    parser.add_argument("--semilla", type=int, default=42)
+    args = parser.parse_args()
+    random.seed(args.semilla)
+
+    medianas = {(s, z): random.uniform(12000, 40000) for s in SERVICIOS for z in ZONAS}
+    historial = {clave: [] for clave in medianas}
+    motor = MotorTarifas(db=None)
+    inicio = time.perf_counter()
+    for _ in range(args.tarifas):
+        clave = random.choice(list(medianas))
+        tarifa = random.lognormvariate(math.log(medianas[clave]), 0.35)
+        historial[clave].append(tarifa)
+        motor.observar(*clave, tarifa)
+    observar_us = (time.perf_counter() - inicio) / args.tarifas * 1e6
+
+    clave = ("electricista", "posadas")
+    motor.cotizar(*clave)
+    cacheada_us = medir_us(lambda: motor.cotizar(*clave), args.repeticiones)
+
+    def invalidada():
+        motor._rangos.pop(clave, None)
+        motor.cotizar(*clave)
+    invalidada_us = medir_us(invalidada, min(args.repeticiones, 10000))
+
+    errores = []
+    for clave, valores in historial.items():
+        sketch = motor.sketches[clave]
+        for q in motor.cuantiles:
+            errores.append(abs(sketch.cuantil(q) - exacto(valores, q)) / exacto(valores, q))
+
+    cubos = sum(len(s.cubos) for s in motor.sketches.values())
+    print(json.dumps({
+        "tarifas": args.tarifas,
+        "claves": len(motor.sketches),
+        "observar_us": round(observar_us, 2),
+        "cotizar_us": {"cacheada": round(cacheada_us, 3), "recalculada": round(invalidada_us, 2)},
+        "error_relativo_cuantiles": {
+            "max": round(max(errores), 5),
+            "medio": round(sum(errores) / len(errores), 5),
+            "cota": SketchPrecios.ERROR_RELATIVO,
+        },
+        "cubos_totales": cubos,
+        "cubos_por_sketch": round(cubos / len(motor.sketches), 1),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Benchmark de fan-out del canal en tiempo real en un solo worker.
+
+Abre miles de suscriptores (clientes, profesionales y algunos admins),
+publica eventos de solicitudes y mide el costo de publicar y la latencia
+hasta que cada suscriptor recibe el evento.
+
+Uso:
+    python benchmarks/bench_tiempo_real.py --suscriptores 5000 --eventos 500
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from tiempo_real import CanalEventos  # noqa: E402
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p / 100))]
+
+
+async def consumir(sub, latencias, recibidos):
+    while True:
+        mensaje = await sub.cola.get()
+        datos = json.loads(mensaje.split("data: ", 1)[1])
+        latencias.append(time.perf_counter() - datos["ts"])
+        recibidos[0] += 1
+
+
+async def correr(args):
+    canal = CanalEventos(cola_max=args.cola)
+    clientes = max(1, int(args.suscriptores * 0.7))
+    profesionales = max(1, args.suscriptores - clientes - args.admins)
+
+    latencias, recibidos, tareas, subs = [], [0], [], []
+    topicos = (
+        [["admin"]] * args.admins
+        + [[f"cliente:{i}"] for i in range(clientes)]
+        + [[f"profesional:{i}"] for i in range(profesionales)]
+    )
+    for t in topicos:
+        sub = canal.suscribir(t)
+        subs.append(sub)
+        tareas.append(asyncio.create_task(consumir(sub, latencias, recibidos)))
+    await asyncio.sleep(0)
+
+    costos_publicar, entregas_esperadas = [], 0
+    inicio = time.perf_counter()
+    for n in range(args.eventos):
+        solicitud = {
+            "id": f"sol-{n}",
+            "estado": "esperando_pago",
+            "cliente_id": str(random.randrange(clientes)),
+            "profesional_id": str(random.randrange(profesionales)),
+        }
+        t0 = time.perf_counter()
+        datos = {**solicitud, "ts": t0}
+        entregas_esperadas += canal.publicar("solicitud_actualizada", datos, [
+            "admin", f"cliente:{solicitud['cliente_id']}", f"profesional:{solicitud['profesional_id']}"
+        ])
+        costos_publicar.append(time.perf_counter() - t0)
+        if n % args.rafaga == 0:
+            await asyncio.sleep(0)
+
+    while recibidos[0] < entregas_esperadas and time.perf_counter() - inicio < 60:
+        await asyncio.sleep(0.001)
+    duracion = time.perf_counter() - inicio
+
+    for t in tareas:
+        t.cancel()
+    await asyncio.gather(*tareas, return_exceptions=True)
+
+    return {
+        "suscriptores": len(subs),
+        "eventos": args.eventos,
+        "entregas": recibidos[0],
+        "entregas_esperadas": entregas_esperadas,
+        "perdidos": sum(s.perdidos for s in subs),
+        "duracion_s": round(duracion, 4),
+        "entregas_por_s": round(recibidos[0] / duracion, 1),
+        "publicar_us": {
+            "p50": round(percentil(costos_publicar, 50) * 1e6, 1),
+            "p99": round(percentil(costos_publicar, 99) * 1e6, 1),
+            "media": round(statistics.mean(costos_publicar) * 1e6, 1),
+        },
+        "latencia_ms": {
+            "p50": round(percentil(latencias, 50) * 1e3, 3),
+            "p95": round(percentil(latencias, 95) * 1e3, 3),
+            "p99": round(percentil(latencias, 99) * 1e3, 3),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--suscriptores", type=int, default=5000)
+    parser.add_argument("--admins", type=int, default=5)
+    parser.add_argument("--eventos", type=int, default=500)
+    parser.add_argument("--rafaga", type=int, default=10, help="eventos publicados entre cada ceder el loop")
+    parser.add_argument("--cola", type=int, default=100)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(correr(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
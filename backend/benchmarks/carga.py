@@ -0,0 +1,401 @@
+"""
+Prueba de carga reproducible de las APIs de ChangaRed.
+
+Levanta los stubs externos (LLM, Telegram, Mercado Pago) y la app con
+uvicorn en procesos separados, contra MongoDB local o mongomock-motor, y
+genera tráfico mixto con N usuarios virtuales concurrentes. Con --api se
+elige el conjunto de rutas montado (API_RUTAS) y su escenario:
+
+  changared (por defecto):
+    cliente:     registro -> login -> [crear solicitud -> listar -> pagar -> listar] x iteraciones
+    profesional: registro -> login -> listar
+    admin:       login -> [listar -> asignar pendientes] mientras haya clientes activos
+
+  deploy:
+    admin:       login -> alta de N profesionales -> [métricas -> listar] mientras haya clientes activos
+    cliente:     registro -> login -> [crear solicitud -> listar -> ver -> completar] x iteraciones
+
+Reporta throughput y p50/p95/p99 por ruta en JSON, para comparar corridas,
+y los bloqueos del event loop que detectó el vigía de la app. Con
+--max-bloqueo-ms la corrida falla (exit 1) si alguna ruta bloqueó el loop
+más que eso. Con --mongo incluye además el estado del pool de conexiones
+al terminar (`pool_mongo`).
+
+Con --reenvios P, cada alta de solicitud se reenvía con probabilidad P una
+o dos veces más mientras la primera sigue en curso (el cliente impaciente
+que toca otra vez), y con --idempotencia cada alta lleva su
+Idempotency-Key. `deduplicacion` dice cuántas se respondieron con la
+original y qué se ahorró; `llamadas_externas` cuenta lo que llegó al LLM
+y a Telegram (para comparar, la misma corrida con DEDUP_VENTANA_S=0).
+
+Uso:
+    python benchmarks/carga.py --clientes 50 --iteraciones 5 --salida carga.json
+    python benchmarks/carga.py --mongo mongodb://localhost:27017/bench --latencia-stub-ms 80
+    python benchmarks/carga.py --max-bloqueo-ms 50
+    python benchmarks/carga.py --api deploy --clientes 50
+    python benchmarks/carga.py --reenvios 0.3
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import uuid
+from collections import defaultdict
+from pathlib import Path
+
+import httpx
+
+BACKEND = Path(__file__).resolve().parent.parent
+ADMIN_EMAIL = "admin@bench.changared"
+ADMIN_PASSWORD = "bench-admin"
+MENSAJES = [
+    "Se me cortó la luz en toda la casa",
+    "Pierde agua la canilla del baño",
+    "Huele a gas cerca del calefón",
+    "Quiero pintar dos habitaciones",
+    "Se trabó la cerradura de la puerta",
+    "El aire acondicionado no enfría",
+    "Necesito cortar el pasto del patio",
+]
+ZONAS = ["Posadas", "Oberá", "Garupá", "Eldorado", "Apóstoles"]
+SERVICIOS = ["electricista", "plomero", "gasista"]
+RUTA_LOGIN = {"changared": "/api/login", "deploy": "/api/auth/login"}
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p / 100))]
+
+
+class Registro:
+    def __init__(self):
+        self.latencias = defaultdict(list)
+        self.errores = defaultdict(int)
+        self.estados = defaultdict(lambda: defaultdict(int))
+        self.reenvios = 0
+
+    async def pedir(self, http, metodo, ruta, plantilla=None, esperado=200, **kwargs):
+        plantilla = plantilla or ruta
+        clave = f"{metodo} {plantilla}"
+        inicio = time.perf_counter()
+        try:
+            r = await http.request(metodo, ruta, **kwargs)
+        except httpx.HTTPError as e:
+            self.latencias[clave].append(time.perf_counter() - inicio)
+            self.errores[clave] += 1
+            self.estados[clave][type(e).__name__] += 1
+            return None
+        self.latencias[clave].append(time.perf_counter() - inicio)
+        self.estados[clave][str(r.status_code)] += 1
+        if r.status_code != esperado:
+            self.errores[clave] += 1
+            return None
+        return r.json()
+
+    def reporte(self, duracion):
+        rutas = {}
+        for clave, lat in sorted(self.latencias.items()):
+            rutas[clave] = {
+                "pedidos": len(lat),
+                "errores": self.errores[clave],
+                "estados": dict(self.estados[clave]),
+                "rps": round(len(lat) / duracion, 2),
+                "p50_ms": round(percentil(lat, 50) * 1e3, 2),
+                "p95_ms": round(percentil(lat, 95) * 1e3, 2),
+                "p99_ms": round(percentil(lat, 99) * 1e3, 2),
+                "max_ms": round(max(lat) * 1e3, 2),
+            }
+        total = sum(len(lat) for lat in self.latencias.values())
+        return {
+            "duracion_s": round(duracion, 3),
+            "pedidos": total,
+            "errores": sum(self.errores.values()),
+            "rps": round(total / duracion, 2),
+            "rutas": rutas,
+        }
+
+
+def auth(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+async def registrar(reg, http, rol, **extra):
+    email = f"{rol}-{uuid.uuid4().hex[:10]}@bench.changared"
+    datos = {"nombre": f"Bench {rol}", "telefono": "3764-000000", "email": email, "password": "bench-pass", "rol": rol, **extra}
+    if await reg.pedir(http, "POST", "/api/register", json=datos) is None:
+        return None
+    return await reg.pedir(http, "POST", "/api/login", json={"email": email, "password": "bench-pass"})
+
+
+async def crear_solicitud(reg, http, h, datos, args):
+    if args.idempotencia:
+        h = {**h, "Idempotency-Key": uuid.uuid4().hex}
+    reenvios = random.randint(1, 2) if random.random() < args.reenvios else 0
+    reg.reenvios += reenvios
+
+    async def enviar(demora):
+        await asyncio.sleep(demora)
+        return await reg.pedir(http, "POST", "/api/solicitudes", headers=h, json=datos)
+
+    respuestas = await asyncio.gather(enviar(0), *(enviar(random.uniform(0.01, 0.3)) for _ in range(reenvios)))
+    return next((r for r in respuestas if r is not None), None)
+
+
+async def cliente(reg, http, args, pendientes):
+    sesion = await registrar(reg, http, "cliente")
+    if not sesion:
+        return
+    h = auth(sesion["token"])
+    for _ in range(args.iteraciones):
+        sol = await crear_solicitud(reg, http, h, {
+            "mensaje": random.choice(MENSAJES),
+            "zona": random.choice(ZONAS),
+            "urgente": random.random() < 0.2,
+        }, args)
+        await reg.pedir(http, "GET", "/api/solicitudes", headers=h)
+        if sol is None:
+            continue
+        asignada = asyncio.get_running_loop().create_future()
+        await pendientes.put((sol["id"], asignada))
+        if await asignada:
+            await reg.pedir(http, "POST", f"/api/solicitudes/{sol['id']}/pago", "/api/solicitudes/{id}/pago", headers=h)
+        await reg.pedir(http, "GET", "/api/solicitudes", headers=h)
+
+
+async def profesional(reg, http):
+    sesion = await registrar(reg, http, "profesional", tipo_servicio=random.choice(SERVICIOS), zona=random.choice(ZONAS))
+    if sesion:
+        await reg.pedir(http, "GET", "/api/solicitudes", headers=auth(sesion["token"]))
+
+
+async def admin(reg, http, pendientes, fin):
+    sesion = await reg.pedir(http, "POST", "/api/login", json={"email": ADMIN_EMAIL, "password": ADMIN_PASSWORD})
+    if not sesion:
+        raise RuntimeError("No se pudo iniciar sesión como admin de benchmark")
+    h = auth(sesion["token"])
+    while not (fin.is_set() and pendientes.empty()):
+        try:
+            solicitud_id, asignada = await asyncio.wait_for(pendientes.get(), 0.2)
+        except asyncio.TimeoutError:
+            continue
+        if random.random() < 0.1:
+            await reg.pedir(http, "GET", "/api/solicitudes", headers=h)
+        r = await reg.pedir(
+            http, "PUT", f"/api/admin/solicitudes/{solicitud_id}/accion", "/api/admin/solicitudes/{id}/accion",
+            headers=h, json={"accion": "aceptar"},
+        )
+        asignada.set_result(r is not None)
+
+
+async def trafico_changared(reg, http, args):
+    await asyncio.gather(*(profesional(reg, http) for _ in range(args.profesionales)))
+    pendientes, fin = asyncio.Queue(), asyncio.Event()
+    admins = [asyncio.create_task(admin(reg, http, pendientes, fin)) for _ in range(args.admins)]
+    inicio = time.perf_counter()
+    await asyncio.gather(*(cliente(reg, http, args, pendientes) for _ in range(args.clientes)))
+    fin.set()
+    await asyncio.gather(*admins)
+    return time.perf_counter() - inicio
+
+
+def coordenadas():
+    # Alrededor de Posadas: ~20 km de lado
+    return -27.37 + random.uniform(-0.1, 0.1), -55.9 + random.uniform(-0.1, 0.1)
+
+
+async def login_admin_deploy(reg, http):
+    sesion = await reg.pedir(http, "POST", "/api/auth/login", json={"email": ADMIN_EMAIL, "password": ADMIN_PASSWORD})
+    if not sesion:
+        raise RuntimeError("No se pudo iniciar sesión como admin de benchmark")
+    return auth(sesion["token"])
+
+
+async def alta_profesional_deploy(reg, http, h):
+    lat, lon = coordenadas()
+    await reg.pedir(http, "POST", "/api/profesionales", headers=h, json={
+        "nombre": "Bench profesional",
+        "telefono": "3764-000000",
+        "email": f"profesional-{uuid.uuid4().hex[:10]}@bench.changared",
+        "tipo_servicio": random.choice(SERVICIOS),
+        "latitud": lat,
+        "longitud": lon,
+        "tarifa_base": random.choice([4000.0, 5000.0, 6500.0]),
+    })
+
+
+async def cliente_deploy(reg, http, args):
+    email = f"cliente-{uuid.uuid4().hex[:10]}@bench.changared"
+    datos = {"nombre": "Bench cliente", "telefono": "3764-000000", "email": email, "password": "bench-pass"}
+    if await reg.pedir(http, "POST", "/api/auth/register", json=datos) is None:
+        return
+    sesion = await reg.pedir(http, "POST", "/api/auth/login", json={"email": email, "password": "bench-pass"})
+    if not sesion:
+        return
+    h = auth(sesion["token"])
+    for _ in range(args.iteraciones):
+        lat, lon = coordenadas()
+        sol = await crear_solicitud(reg, http, h, {
+            "mensaje_cliente": random.choice(MENSAJES),
+            "latitud": lat,
+            "longitud": lon,
+            "urgencia": "urgente" if random.random() < 0.2 else "normal",
+        }, args)
+        await reg.pedir(http, "GET", "/api/solicitudes", headers=h)
+        if sol is None:
+            continue
+        await reg.pedir(http, "GET", f"/api/solicitudes/{sol['id']}", "/api/solicitudes/{id}", headers=h)
+        await reg.pedir(
+            http, "PUT", f"/api/solicitudes/{sol['id']}/estado", "/api/solicitudes/{id}/estado",
+            headers=h, params={"estado": "completado"},
+        )
+
+
+async def admin_deploy(reg, http, h, fin):
+    while not fin.is_set():
+        await reg.pedir(http, "GET", "/api/admin/metrics", headers=h)
+        if random.random() < 0.2:
+            await reg.pedir(http, "GET", "/api/solicitudes", headers=h)
+        try:
+            await asyncio.wait_for(fin.wait(), 0.2)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def trafico_deploy(reg, http, args):
+    h = await login_admin_deploy(reg, http)
+    await asyncio.gather(*(alta_profesional_deploy(reg, http, h) for _ in range(args.profesionales)))
+    fin = asyncio.Event()
+    admins = [asyncio.create_task(admin_deploy(reg, http, h, fin)) for _ in range(args.admins)]
+    inicio = time.perf_counter()
+    await asyncio.gather(*(cliente_deploy(reg, http, args) for _ in range(args.clientes)))
+    fin.set()
+    await asyncio.gather(*admins)
+    return time.perf_counter() - inicio
+
+
+ESCENARIOS = {"changared": trafico_changared, "deploy": trafico_deploy}
+
+
+async def generar_trafico(args, base_url):
+    reg = Registro()
+    limites = httpx.Limits(max_connections=args.clientes + args.admins + 10)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limites) as http:
+        duracion = await ESCENARIOS[args.api](reg, http, args)
+        contadores = (await http.get(f"{args.stubs_url}/contadores")).json()
+        sesion = (await http.post(RUTA_LOGIN[args.api], json={"email": ADMIN_EMAIL, "password": ADMIN_PASSWORD})).json()
+        bloqueos = (await http.get("/api/admin/bloqueos", headers=auth(sesion["token"]))).json()
+        estado = (await http.get("/api/admin/recursos", headers=auth(sesion["token"]))).json()
+    mongo = estado["componentes"].get("mongo")
+    deduplicacion = {"reenvios": reg.reenvios, **estado["componentes"]["deduplicacion"]["estado"]}
+    return reg.reporte(duracion), contadores, bloqueos, mongo and mongo["estado"], deduplicacion
+
+
+def levantar(modulo, puerto, env, verboso=False, ruta_lista="/openapi.json"):
+    salida = None if verboso else subprocess.DEVNULL
+    proceso = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", modulo, "--port", str(puerto), "--log-level", "warning"],
+        cwd=BACKEND, env=env, stdout=salida, stderr=salida,
+    )
+    url = f"http://127.0.0.1:{puerto}"
+    for _ in range(100):
+        try:
+            httpx.get(f"{url}{ruta_lista}", timeout=1).raise_for_status()
+            return proceso, url
+        except httpx.HTTPError:
+            if proceso.poll() is not None:
+                raise RuntimeError(f"{modulo} terminó al arrancar")
+            time.sleep(0.1)
+    proceso.terminate()
+    raise RuntimeError(f"{modulo} no respondió en el puerto {puerto}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--api", choices=sorted(ESCENARIOS), default="changared", help="conjunto de rutas a probar")
+    parser.add_argument("--clientes", type=int, default=20, help="clientes virtuales concurrentes")
+    parser.add_argument("--profesionales", type=int, default=10)
+    parser.add_argument("--admins", type=int, default=2)
+    parser.add_argument("--iteraciones", type=int, default=5, help="solicitudes por cliente")
+    parser.add_argument("--reenvios", type=float, default=0, help="probabilidad de reenviar cada alta")
+    parser.add_argument("--idempotencia", action="store_true", help="mandar Idempotency-Key en cada alta")
+    parser.add_argument("--mongo", default="mock", help="'mock' (mongomock-motor) o una URL de MongoDB")
+    parser.add_argument("--latencia-stub-ms", type=float, default=0)
+    parser.add_argument("--puerto", type=int, default=8099)
+    parser.add_argument("--puerto-stubs", type=int, default=8100)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--salida", help="archivo JSON para el reporte (por defecto stdout)")
+    parser.add_argument("--verboso", action="store_true", help="mostrar los logs de la app y los stubs")
+    parser.add_argument("--max-bloqueo-ms", type=float, help="fallar si el event loop se bloquea más que esto")
+    args = parser.parse_args()
+    random.seed(args.semilla)
+
+    env = {
+        **os.environ,
+        "STUB_LATENCIA_MS": str(args.latencia_stub_ms),
+        "BENCH_ADMIN_EMAIL": ADMIN_EMAIL,
+        "BENCH_ADMIN_PASSWORD": ADMIN_PASSWORD,
+        "EMERGENT_API_KEY": "bench",
+        "MERCADOPAGO_ACCESS_TOKEN": "bench",
+        "TELEGRAM_BOT_TOKEN": "bench",
+        "TELEGRAM_ADMIN_CHAT_ID": "1",
+        "SMTP_USER": "",
+        "API_RUTAS": args.api,
+        # Todo el tráfico sale de 127.0.0.1: sin límites de tasa
+        "LIMITES_TASA": json.dumps({"register": [], "login": [], "solicitudes": [], "pago": []}),
+    }
+    if args.max_bloqueo_ms:
+        env["VIGIA_UMBRAL_MS"] = str(args.max_bloqueo_ms)
+    if args.mongo == "mock":
+        env["BENCH_MONGO"] = "mock"
+        env.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    else:
+        env["BENCH_MONGO"] = "real"
+        env["MONGO_URL"] = args.mongo
+
+    procesos = []
+    try:
+        stubs, args.stubs_url = levantar("benchmarks.stubs:app", args.puerto_stubs, env, args.verboso)
+        procesos.append(stubs)
+        env.update({
+            "LLM_BASE_URL": f"{args.stubs_url}/v1",
+            "TELEGRAM_API_URL": args.stubs_url,
+            "MERCADOPAGO_API_URL": args.stubs_url,
+        })
+        # /api/health y no /openapi.json: generar el schema bloquea el loop la primera vez
+        app, base_url = levantar("benchmarks.app_bench:app", args.puerto, env, args.verboso, "/api/health")
+        procesos.append(app)
+        resultado, contadores, bloqueos, pool_mongo, deduplicacion = asyncio.run(generar_trafico(args, base_url))
+    finally:
+        for proceso in procesos:
+            proceso.terminate()
+            proceso.wait(timeout=10)
+
+    reporte = {
+        "config": {k: v for k, v in vars(args).items() if k not in ("salida", "stubs_url", "verboso")},
+        "llamadas_externas": contadores,
+        "deduplicacion": deduplicacion,
+        **resultado,
+        "bloqueos_event_loop": bloqueos,
+        **({"pool_mongo": pool_mongo} if pool_mongo else {}),
+    }
+    texto = json.dumps(reporte, indent=2, ensure_ascii=False)
+    if args.salida:
+        Path(args.salida).write_text(texto)
+    else:
+        print(texto)
+
+    if args.max_bloqueo_ms and bloqueos["bloqueos"]:
+        for b in bloqueos["bloqueos"]:
+            print(f"BLOQUEO {b['ms']} ms en {b['ruta']}\n{b['pila'] or ''}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Servidor stub de los servicios externos para benchmarks: API compatible con
+OpenAI (chat completions), Telegram Bot API y Mercado Pago (preferencias y
+pagos). Responde siempre OK, con una latencia configurable por
+STUB_LATENCIA_MS para simular la red.
+
+Uso:
+    STUB_LATENCIA_MS=50 uvicorn benchmarks.stubs:app --port 8100
+"""
+import asyncio
+import json
+import os
+import time
+import uuid
+
+from fastapi import FastAPI
+
+from clasificacion import detectar_servicio_por_palabras
+
+LATENCIA = float(os.environ.get("STUB_LATENCIA_MS", "0")) / 1000
+
+app = FastAPI(title="ChangaRed stubs")
+contadores = {"llm": 0, "telegram": 0, "mercadopago": 0}
+
+
+async def demora():
+    if LATENCIA:
+        await asyncio.sleep(LATENCIA)
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(body: dict):
+    await demora()
+    contadores["llm"] += 1
+    mensaje = body["messages"][-1]["content"]
+    servicio = detectar_servicio_por_palabras(mensaje)
+    contenido = json.dumps({
+        "servicio": servicio,
+        "tarifa_min": 15000,
+        "tarifa_max": 25000,
+        "descripcion": f"Servicio de {servicio}",
+    })
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "gpt-4o-mini"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": contenido},
+            "finish_reason": "stop",
+        }],
+        "usage": {"prompt_tokens": 100, "completion_tokens": 40, "total_tokens": 140},
+    }
+
+
+@app.post("/bot{token}/sendMessage")
+async def telegram_send_message(token: str, body: dict):
+    await demora()
+    contadores["telegram"] += 1
+    return {"ok": True, "result": {"message_id": contadores["telegram"], "text": body.get("text", "")}}
+
+
+@app.post("/checkout/preferences")
+async def mp_preferencia(body: dict):
+    await demora()
+    contadores["mercadopago"] += 1
+    pref_id = f"stub-{uuid.uuid4().hex[:12]}"
+    return {
+        "id": pref_id,
+        "init_point": f"https://stub.mp/checkout?pref_id={pref_id}",
+        "sandbox_init_point": f"https://sandbox.stub.mp/checkout?pref_id={pref_id}",
+        "external_reference": body.get("external_reference"),
+    }
+
+
+@app.get("/v1/payments/{payment_id}")
+async def mp_pago(payment_id: str):
+    await demora()
+    contadores["mercadopago"] += 1
+    return {"id": payment_id, "status": "approved", "status_detail": "accredited"}
+
+
+@app.get("/contadores")
+async def ver_contadores():
+    return contadores
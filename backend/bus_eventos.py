@@ -0,0 +1,202 @@
+"""
+Bus de eventos sobre change streams de MongoDB.
+
+Con varios workers o réplicas, lo que un proceso escribe no lo ve el resto
+en memoria. El bus abre un único change stream sobre las colecciones
+observadas y reparte cada cambio a los suscriptores locales, así todos los
+workers ven todas las escrituras. Por ahora el único suscriptor es el canal
+en tiempo real, y sólo se observa `solicitudes`: cada colección observada
+le manda a cada worker el documento entero de cada cambio.
+
+- Con BUS_NOMBRE (distinto en cada worker) los resume tokens se guardan en
+  `bus_tokens`, así un worker que reinicia con el mismo nombre retoma desde
+  el último evento entregado (entrega al-menos-una-vez). Sin él el nombre
+  es host:pid, uno por proceso, y no se guarda token: un worker que
+  reinicia empieza desde ahora. Los tokens sin actualizar hace
+  TOKENS_TTL_S se borran (índice TTL); para entonces ya no están en el
+  oplog.
+- Cada suscriptor tiene una cola acotada; si se llena, el bus espera en vez
+  de descartar (backpressure hacia el change stream, que es pull).
+
+Requiere que MongoDB corra como replica set (Atlas lo es siempre).
+"""
+import asyncio
+import logging
+import os
+import socket
+import time
+from datetime import datetime, timezone
+from typing import Iterable, List, Literal, Optional, Set
+
+from pydantic import BaseModel, ConfigDict
+from pymongo.errors import OperationFailure, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+COLECCIONES = ("solicitudes",)
+COLA_MAX = 1000
+CHECKPOINT_EVENTOS = 100
+CHECKPOINT_SEGUNDOS = 5.0
+REINTENTO_MAX_SEGUNDOS = 30.0
+TOKENS_TTL_S = 7 * 86400
+# Códigos de Mongo para un resume token que ya no está en el oplog
+CODIGOS_HISTORIA_PERDIDA = {260, 280, 286}
+
+
+class EventoCambio(BaseModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+    coleccion: str
+    operacion: Literal["insert", "update", "replace", "delete"]
+    id: Optional[str] = None
+    documento: Optional[dict] = None
+    anterior: Optional[dict] = None
+    campos: List[str] = []
+    token: Optional[dict] = None
+
+    @classmethod
+    def desde_cambio(cls, cambio: dict) -> "EventoCambio":
+        documento = cambio.get("fullDocument")
+        anterior = cambio.get("fullDocumentBeforeChange")
+        for doc in (documento, anterior):
+            if doc:
+                doc.pop("_id", None)
+        descripcion = cambio.get("updateDescription") or {}
+        return cls(
+            coleccion=cambio["ns"]["coll"],
+            operacion=cambio["operationType"],
+            id=(documento or anterior or {}).get("id"),
+            documento=documento,
+            anterior=anterior,
+            campos=list(descripcion.get("updatedFields", {})),
+            token=cambio["_id"],
+        )
+
+
+class SuscripcionBus:
+    def __init__(self, colecciones: Optional[Iterable[str]], cola_max: int):
+        self.colecciones: Optional[Set[str]] = set(colecciones) if colecciones else None
+        self.cola: asyncio.Queue = asyncio.Queue(maxsize=cola_max)
+
+    def acepta(self, evento: EventoCambio) -> bool:
+        return self.colecciones is None or evento.coleccion in self.colecciones
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> EventoCambio:
+        return await self.cola.get()
+
+
+class BusEventos:
+    def __init__(
+        self,
+        db,
+        colecciones: Iterable[str] = COLECCIONES,
+        nombre: Optional[str] = None,
+        preimagenes: bool = False,
+    ):
+        self.db = db
+        self.colecciones = list(colecciones)
+        nombre = nombre or os.environ.get("BUS_NOMBRE")
+        # Sólo un nombre fijo retoma: host:pid no se repite entre reinicios
+        # (y si se repite, es de otro proceso)
+        self.retoma = bool(nombre)
+        self.nombre = nombre or f"{socket.gethostname()}:{os.getpid()}"
+        self.preimagenes = preimagenes
+        self._suscripciones: List[SuscripcionBus] = []
+        self._tarea: Optional[asyncio.Task] = None
+        self._token: Optional[dict] = None
+        self._pendientes = 0
+        self._ultimo_checkpoint = time.monotonic()
+        self.eventos = 0
+
+    def suscribir(self, colecciones: Optional[Iterable[str]] = None, cola_max: int = COLA_MAX) -> SuscripcionBus:
+        sub = SuscripcionBus(colecciones, cola_max)
+        self._suscripciones.append(sub)
+        return sub
+
+    def desuscribir(self, sub: SuscripcionBus) -> None:
+        if sub in self._suscripciones:
+            self._suscripciones.remove(sub)
+
+    async def iniciar(self) -> None:
+        if self.retoma:
+            await self.db.bus_tokens.create_index("updated_at", expireAfterSeconds=int(TOKENS_TTL_S))
+            doc = await self.db.bus_tokens.find_one({"_id": self.nombre})
+            self._token = doc["token"] if doc else None
+        self._tarea = asyncio.create_task(self._correr())
+        logger.info("Bus de eventos '%s' iniciado (resume=%s)", self.nombre, "si" if self._token else "no")
+
+    async def detener(self) -> None:
+        if self._tarea:
+            self._tarea.cancel()
+            try:
+                await self._tarea
+            except asyncio.CancelledError:
+                pass
+            self._tarea = None
+        await self._guardar_token()
+
+    async def _correr(self) -> None:
+        espera = 1.0
+        while True:
+            try:
+                await self._escuchar()
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                if e.code in CODIGOS_HISTORIA_PERDIDA:
+                    logger.error("Resume token del bus vencido, se retoma desde ahora: %s", e)
+                    self._token = None
+                else:
+                    logger.error("Error en change stream: %s", e)
+            except PyMongoError as e:
+                logger.error("Error en change stream: %s", e)
+            await asyncio.sleep(espera)
+            espera = min(espera * 2, REINTENTO_MAX_SEGUNDOS)
+
+    async def _escuchar(self) -> None:
+        opciones = {"full_document": "updateLookup"}
+        if self.preimagenes:
+            opciones["full_document_before_change"] = "whenAvailable"
+        if self._token:
+            opciones["resume_after"] = self._token
+        pipeline = [{"$match": {
+            "ns.coll": {"$in": self.colecciones},
+            "operationType": {"$in": ["insert", "update", "replace", "delete"]},
+        }}]
+        async with self.db.watch(pipeline, **opciones) as stream:
+            while stream.alive:
+                cambio = await stream.try_next()
+                if cambio is None:
+                    await self._checkpoint()
+                    continue
+                await self._despachar(EventoCambio.desde_cambio(cambio))
+                self._token = cambio["_id"]
+                self._pendientes += 1
+                await self._checkpoint()
+
+    async def _despachar(self, evento: EventoCambio) -> None:
+        self.eventos += 1
+        for sub in self._suscripciones:
+            if sub.acepta(evento):
+                # put() espera si la cola está llena: backpressure, sin pérdida
+                await sub.cola.put(evento)
+
+    async def _checkpoint(self) -> None:
+        if not self._pendientes:
+            return
+        if self._pendientes < CHECKPOINT_EVENTOS and time.monotonic() - self._ultimo_checkpoint < CHECKPOINT_SEGUNDOS:
+            return
+        await self._guardar_token()
+
+    async def _guardar_token(self) -> None:
+        if not self.retoma or self._token is None or not self._pendientes:
+            return
+        await self.db.bus_tokens.update_one(
+            {"_id": self.nombre},
+            {"$set": {"token": self._token, "updated_at": datetime.now(timezone.utc)}},
+            upsert=True,
+        )
+        self._pendientes = 0
+        self._ultimo_checkpoint = time.monotonic()
@@ -0,0 +1,68 @@
+"""
+Búsqueda de texto sobre las solicitudes, para el admin.
+
+Un índice de texto de Mongo sobre mensaje, cliente_nombre, servicio y
+zona, en español: no distingue mayúsculas ni acentos ("Oberá" = "obera"),
+ignora las stopwords ("de", "la", "en") y compara raíces ("fugas" =
+"fuga"). Mongo lo actualiza con cada escritura, así que no hay nada que
+reconstruir ni memoria por worker, y anda igual en serverless.
+
+Los resultados salen por relevancia (textScore, con más peso en servicio
+y zona que en el mensaje) y, a igual puntaje, los más nuevos primero. La
+consulta usa la sintaxis de $text: cualquiera de las palabras suma, una
+frase entre comillas ("fuga de gas") es obligatoria y -agua excluye. Los
+filtros se aplican sobre lo que encontró el índice.
+
+Una colección admite un solo índice de texto: para cambiar campos o pesos
+hay que borrar antes el viejo (NOMBRE_INDICE). mongomock no implementa
+$text: la búsqueda necesita un MongoDB real.
+"""
+from datetime import datetime
+from typing import List, Optional
+
+from pymongo import TEXT
+
+from modelos import PROYECCION_SOLICITUD
+from nucleo import db
+from plazos import etapa, max_time_ms
+
+NOMBRE_INDICE = "busqueda_solicitudes"
+PESOS = {"servicio": 5, "zona": 5, "cliente_nombre": 3, "mensaje": 1}
+MAX_RESULTADOS = 100
+
+async def crear_indice_busqueda() -> None:
+    # language_override apunta a un campo que no existe: si no, un campo
+    # "language" en una solicitud cambiaría el idioma de ese documento
+    await db.solicitudes.create_index(
+        [(campo, TEXT) for campo in PESOS], name=NOMBRE_INDICE, weights=PESOS,
+        default_language="spanish", language_override="idioma_busqueda",
+    )
+
+def filtro_busqueda(texto: str, estado: Optional[str] = None, servicio: Optional[str] = None,
+                    zona: Optional[str] = None, desde: Optional[datetime] = None,
+                    hasta: Optional[datetime] = None) -> dict:
+    """
+    Las fechas filtran por created_at; las que siguen en texto (ver
+    fechas.py) no entran en un filtro por fecha.
+    """
+    filtro = {"$text": {"$search": texto, "$language": "spanish"}}
+    if estado:
+        filtro["estado"] = estado
+    if servicio:
+        filtro["servicio"] = servicio.strip().lower()
+    if zona:
+        filtro["zona"] = zona
+    if desde or hasta:
+        filtro["created_at"] = {
+            **({"$gte": desde} if desde else {}),
+            **({"$lt": hasta} if hasta else {}),
+        }
+    return filtro
+
+async def buscar_solicitudes(texto: str, limite: int = 20, **filtros) -> List[dict]:
+    limite = max(1, min(limite, MAX_RESULTADOS))
+    proyeccion = {**PROYECCION_SOLICITUD, "puntaje": {"$meta": "textScore"}}
+    async with etapa("mongo"):
+        cursor = db.solicitudes.find(filtro_busqueda(texto, **filtros), proyeccion, max_time_ms=max_time_ms())
+        cursor = cursor.sort([("puntaje", {"$meta": "textScore"}), ("created_at", -1)]).limit(limite)
+        return await cursor.to_list(limite)
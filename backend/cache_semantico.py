@@ -0,0 +1,207 @@
+"""
+Caché semántico de las clasificaciones del LLM.
+
+Un caché por texto exacto casi no acierta: "no tengo luz en casa" y "se
+cortó la luz" piden lo mismo con otras palabras. Acá cada mensaje se
+vectoriza con hashing (palabras y sus raíces, sin acentos ni palabras de
+relleno, con las negaciones y lo que niegan, pesadas por IDF) y se busca el más parecido entre los que ya
+clasificó el LLM; si el coseno llega a `umbral`, se reusa esa
+clasificación y no se llama al LLM.
+
+La búsqueda es aproximada, con un índice invertido: sólo se comparan las
+entradas que comparten algún rasgo con el mensaje, empezando por los rasgos
+más raros y hasta `max_candidatos`. El IDF sale de las mismas entradas del
+caché, así que una palabra que aparece en todos los pedidos ("arreglar",
+"casa") pesa poco sin tener que listarla.
+
+La memoria está acotada: a lo sumo `max_entradas` (se desaloja la usada
+hace más tiempo) y cada entrada vence a los `ttl_s` (el planificador purga
+las vencidas cada diez minutos). Todo en memoria, por worker; el recall y
+la latencia se miden en benchmarks/bench_cache_semantico.py.
+
+Configuración por entorno:
+    CACHE_LLM_MAX=5000        entradas por worker (0 lo apaga)
+    CACHE_LLM_UMBRAL=0.5      coseno mínimo para reusar
+    CACHE_LLM_TTL_S=86400
+"""
+import math
+import re
+import time
+import unicodedata
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, Optional, Set, Tuple
+
+DIMENSIONES = 1 << 20
+LARGO_RAIZ = 5
+
+# Artículos, preposiciones y lo que se repite en cualquier pedido
+RELLENO = frozenset("""
+    a al algo algun alguna alguien ante aca ahi alla asi aunque ayer bien buen buenas buenos como con cual cuando
+    da de del desde donde dos e el ella en entre es esa ese eso esta estan este esto favor gracias hace hay hola
+    hoy la las le les lo los mas me mi mis muy necesito nos o para pero por porfa porque puede q que quiero se
+    si solo son su sus tambien te tengo tiene tienen todo toda todos un una uno unos unas urgente y ya yo
+""".split())
+
+# No son relleno: "no hay agua caliente" no pide lo mismo que "hay agua caliente"
+NEGACIONES = frozenset(["no", "sin", "ni", "nunca", "tampoco"])
+# Palabras que alcanza una negación, hasta la puntuación o el conector
+ALCANCE_NEGACION = 2
+CORTES = frozenset(["pero", "y", "que", "cuando", "porque"])
+
+TOKEN = re.compile(r"[a-z0-9]+|[.,;:!?]")
+
+
+def normalizar(texto: str) -> str:
+    descompuesto = unicodedata.normalize("NFKD", texto.lower())
+    return "".join(c for c in descompuesto if not unicodedata.combining(c))
+
+
+def rasgos_de(texto: str) -> FrozenSet[int]:
+    """
+    Rasgos hasheados del mensaje: cada palabra (sin la "s" del plural) y,
+    si es larga, su raíz de LARGO_RAIZ letras ("pérdida" y "perdiendo"
+    comparten "perdi"). La negación es un rasgo más y las
+    ALCANCE_NEGACION palabras que le siguen en la frase cuentan como
+    negadas ("no~agua" no comparte rasgo con "agua").
+    """
+    rasgos = set()
+    negadas = 0
+    for palabra in TOKEN.findall(normalizar(texto)):
+        if not palabra[0].isalnum() or palabra in CORTES:
+            negadas = 0
+            continue
+        if palabra in NEGACIONES:
+            rasgos.add(zlib.crc32(palabra.encode()) % DIMENSIONES)
+            negadas = ALCANCE_NEGACION
+            continue
+        if palabra in RELLENO or len(palabra) < 2:
+            continue
+        if len(palabra) > 3 and palabra.endswith("s"):
+            palabra = palabra[:-1]
+        prefijo = b"no~" if negadas else b""
+        negadas = max(0, negadas - 1)
+        rasgos.add(zlib.crc32(prefijo + palabra.encode()) % DIMENSIONES)
+        if len(palabra) > LARGO_RAIZ:
+            rasgos.add(zlib.crc32(prefijo + b"~" + palabra[:LARGO_RAIZ].encode()) % DIMENSIONES)
+    return frozenset(rasgos)
+
+
+class Entrada:
+    __slots__ = ("rasgos", "valor", "vence")
+
+    def __init__(self, rasgos: Tuple[int, ...], valor: Any, vence: float):
+        self.rasgos = rasgos
+        self.valor = valor
+        self.vence = vence
+
+
+class CacheSemantico:
+    def __init__(self, max_entradas: int = 5000, umbral: float = 0.5, ttl_s: float = 86400,
+                 max_candidatos: int = 200):
+        self.max_entradas = max_entradas
+        self.umbral = umbral
+        self.ttl_s = ttl_s
+        self.max_candidatos = max_candidatos
+        # Orden de uso: la primera es la candidata a desalojar
+        self.entradas: "OrderedDict[int, Entrada]" = OrderedDict()
+        self.indice: Dict[int, Set[int]] = {}
+        self._siguiente = 0
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+
+    def _idf(self, rasgo: int) -> float:
+        return math.log((len(self.entradas) + 1) / (len(self.indice.get(rasgo, ())) + 1)) + 1
+
+    def _candidatos(self, rasgos: FrozenSet[int]) -> Set[int]:
+        candidatos: Set[int] = set()
+        for rasgo in sorted(rasgos, key=lambda r: len(self.indice.get(r, ()))):
+            for clave in self.indice.get(rasgo, ()):
+                candidatos.add(clave)
+                if len(candidatos) >= self.max_candidatos:
+                    return candidatos
+        return candidatos
+
+    def buscar(self, texto: str) -> Optional[Tuple[Any, float]]:
+        """
+        (valor, similitud) de la entrada más parecida si llega al umbral;
+        None si no hay ninguna.
+        """
+        rasgos = rasgos_de(texto)
+        mejor, similitud = None, 0.0
+        if rasgos and self.entradas:
+            # idf² por rasgo, calculado una vez por búsqueda
+            pesos: Dict[int, float] = {}
+
+            def peso(rasgo: int) -> float:
+                if rasgo not in pesos:
+                    pesos[rasgo] = self._idf(rasgo) ** 2
+                return pesos[rasgo]
+
+            norma = math.sqrt(sum(map(peso, rasgos)))
+            momento = time.monotonic()
+            for clave in self._candidatos(rasgos):
+                entrada = self.entradas[clave]
+                if entrada.vence < momento:
+                    self._quitar(clave)
+                    continue
+                comun = sum(pesos[rasgo] for rasgo in entrada.rasgos if rasgo in rasgos)
+                coseno = comun / (norma * math.sqrt(sum(map(peso, entrada.rasgos))))
+                if coseno > similitud:
+                    mejor, similitud = clave, coseno
+        if mejor is None or similitud < self.umbral:
+            self.fallos += 1
+            return None
+        self.aciertos += 1
+        self.entradas.move_to_end(mejor)
+        return self.entradas[mejor].valor, similitud
+
+    def guardar(self, texto: str, valor: Any) -> None:
+        rasgos = rasgos_de(texto)
+        if not rasgos or self.max_entradas <= 0:
+            return
+        clave, self._siguiente = self._siguiente, self._siguiente + 1
+        # Tupla: ocupa bastante menos que un frozenset
+        self.entradas[clave] = Entrada(tuple(rasgos), valor, time.monotonic() + self.ttl_s)
+        for rasgo in rasgos:
+            self.indice.setdefault(rasgo, set()).add(clave)
+        while len(self.entradas) > self.max_entradas:
+            self._quitar(next(iter(self.entradas)))
+            self.desalojos += 1
+
+    def _quitar(self, clave: int) -> None:
+        entrada = self.entradas.pop(clave)
+        for rasgo in entrada.rasgos:
+            claves = self.indice[rasgo]
+            claves.discard(clave)
+            if not claves:
+                del self.indice[rasgo]
+
+    def purgar(self) -> int:
+        """
+        Quita las entradas vencidas (en la búsqueda sólo se quitan las que
+        salen como candidatas). Devuelve cuántas.
+        """
+        momento = time.monotonic()
+        vencidas = [clave for clave, entrada in self.entradas.items() if entrada.vence < momento]
+        for clave in vencidas:
+            self._quitar(clave)
+        return len(vencidas)
+
+    def vaciar(self) -> None:
+        self.entradas.clear()
+        self.indice.clear()
+
+    def estado(self) -> dict:
+        consultas = self.aciertos + self.fallos
+        return {
+            "entradas": len(self.entradas),
+            "max_entradas": self.max_entradas,
+            "rasgos": len(self.indice),
+            "umbral": self.umbral,
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "desalojos": self.desalojos,
+            "tasa_aciertos": round(self.aciertos / consultas, 3) if consultas else None,
+        }
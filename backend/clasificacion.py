@@ -0,0 +1,174 @@
+"""
+Clasificación de solicitudes: qué servicio pide el cliente y qué rango de
+tarifa corresponde.
+
+Se le pregunta al LLM (cliente compartido del núcleo) y, si no responde a
+tiempo o devuelve algo que no es JSON, se clasifica por palabras clave.
+Con cotizar_solicitud el rango sale del historial (motor de tarifas) y el
+LLM sólo se consulta para servicios o zonas sin historial. Lo que responde
+el LLM queda en un caché semántico (cache_semantico.py): de un mensaje
+parecido se reusa el servicio, no la descripción (la escribió sobre el
+mensaje de otro) ni el rango, que depende de la zona.
+"""
+import json
+import logging
+from typing import Optional
+
+from metricas import medido, Indicador, REGISTRO
+from nucleo import cache_llm, cliente_llm, motor_tarifas
+from plazos import etapa, timeout_http
+from tarifas import normalizar
+
+logger = logging.getLogger(__name__)
+
+def servicio_por_palabras(mensaje: str) -> Optional[str]:
+    mensaje_lower = mensaje.lower()
+    keywords = {
+        "electricista":               ["luz", "electricidad", "corto", "enchufe", "cable", "interruptor", "tomacorriente", "electricista", "fusible", "tablero"],
+        "plomero":                    ["agua", "caño", "pérdida", "perdida", "canilla", "inodoro", "baño", "desagüe", "plomero", "tubería", "cañería", "pileta"],
+        "gasista":                    ["gas", "garrafa", "calefón", "calefon", "estufa", "calefaccion", "gasista", "termotanque"],
+        "pintor":                     ["pintura", "pintar", "pincel", "rodillo", "pintor", "empapelar"],
+        "carpintero":                 ["madera", "mueble", "carpintero", "bisagra", "placard", "estante"],
+        "limpieza":                   ["limpieza", "limpiar", "alfombra", "ordenar", "limpieza profunda", "mucama"],
+        "jardinero":                  ["jardín", "jardin", "pasto", "plantas", "poda", "cortar pasto", "jardinero", "césped", "cesped"],
+        "cerrajero":                  ["cerradura", "llave", "candado", "cerrajero", "trabada", "quede afuera"],
+        "técnico aire acondicionado": ["aire acondicionado", "split", "no enfría el aire", "calor no baja", "refrigeración aire"],
+        "técnico lavarropas":         ["lavarropas", "lavadora", "lavar ropa", "centrifuga", "centrifugado"],
+        "técnico heladeras":          ["heladera", "freezer", "refrigerador", "no enfría", "no enfria", "heladera rota"],
+        "técnico electrodomésticos":  ["electrodoméstico", "microondas", "horno", "licuadora", "batidora", "televisor", "tv roto", "pantalla"],
+        "albañil":                    ["albañil", "albanil", "revoque", "cemento", "construcción", "rajadura", "grieta", "humedad", "pared rota"],
+        "mudanza":                    ["mudanza", "mudar", "mover muebles", "flete", "transporte muebles"],
+        "técnico general":            ["técnico", "tecnico", "reparación", "reparacion", "arreglo", "no funciona", "roto", "falla"],
+    }
+    for servicio, palabras in keywords.items():
+        if any(p in mensaje_lower for p in palabras):
+            return servicio
+    return None
+
+def detectar_servicio_por_palabras(mensaje: str) -> str:
+    return servicio_por_palabras(mensaje) or "técnico general"
+
+@medido("llm", "clasificar")
+async def preguntar_al_llm(mensaje: str, zona: str) -> dict:
+    try:
+        # Reserva 3 s del plazo: si el LLM no llega, se clasifica por palabras
+        # y todavía alcanza para guardar y notificar
+        async with etapa("llm", reserva=3):
+            llm = await cliente_llm.aobtener()
+            response = await llm.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=[
+                    {
+                        "role": "system",
+                        "content": """Eres un clasificador de servicios para ChangaRed, plataforma de servicios en Misiones, Argentina.
+
+Dado un mensaje de cliente, devuelve SOLO un JSON válido con este formato exacto:
+{
+  "servicio": "tipo_de_servicio",
+  "tarifa_min": 15000,
+  "tarifa_max": 25000,
+  "descripcion": "descripcion breve"
+}
+
+Servicios válidos: electricista, plomero, gasista, pintor, carpintero, limpieza, jardinero, cerrajero, técnico aire acondicionado, técnico lavarropas, técnico heladeras, técnico electrodomésticos, albañil, mudanza, técnico general
+Tarifas en pesos argentinos para Misiones (rango típico 15000-50000).
+NO incluyas texto adicional, SOLO el JSON."""
+                    },
+                    {
+                        "role": "user",
+                        "content": f"Clasificar: {mensaje} (zona: {zona})"
+                    }
+                ],
+                timeout=timeout_http(20)
+            )
+        text = response.choices[0].message.content.strip()
+        if "```" in text:
+            text = text.split("```")[1]
+            if text.startswith("json"):
+                text = text[4:]
+        text = text.strip()
+        clasificacion = json.loads(text)
+        # Sólo lo que respondió el LLM: la clasificación por palabras no se guarda
+        if isinstance(clasificacion, dict) and clasificacion.get("servicio"):
+            cache_llm.guardar(mensaje, {
+                "servicio": clasificacion["servicio"],
+                "zona": normalizar(zona),
+                "tarifa_min": clasificacion.get("tarifa_min"),
+                "tarifa_max": clasificacion.get("tarifa_max"),
+            })
+        return clasificacion
+    except Exception as e:
+        logger.error("Error IA: %s", e)
+        servicio = detectar_servicio_por_palabras(mensaje)
+        return {
+            "servicio": servicio,
+            "tarifa_min": 15000,
+            "tarifa_max": 25000,
+            "descripcion": f"Servicio de {servicio}",
+            # El LLM no respondió: ni el servicio ni el rango son suyos
+            "de_palabras": True,
+        }
+
+def clasificacion_guardada(mensaje: str, zona: str) -> Optional[dict]:
+    """
+    El servicio que dio el LLM para un mensaje parecido, salvo que las
+    palabras clave digan otro. El rango sale del historial del servicio o,
+    si no hay, del que dio el LLM para la misma zona; si tampoco, se le
+    pregunta.
+    """
+    encontrada = cache_llm.buscar(mensaje)
+    if encontrada is None:
+        return None
+    guardada, _ = encontrada
+    servicio = guardada["servicio"]
+    palabras = servicio_por_palabras(mensaje)
+    if palabras and palabras != servicio:
+        return None
+    clasificacion = {"servicio": servicio, "descripcion": f"Servicio de {servicio}", "de_cache": True}
+    if motor_tarifas.cotizar(servicio, zona):
+        # cotizar_solicitud le pone el rango del historial
+        return clasificacion
+    if guardada["zona"] == normalizar(zona) and guardada["tarifa_min"] and guardada["tarifa_max"]:
+        return {**clasificacion, "tarifa_min": guardada["tarifa_min"], "tarifa_max": guardada["tarifa_max"]}
+    return None
+
+async def clasificar_solicitud_ia(mensaje: str, zona: str) -> dict:
+    return clasificacion_guardada(mensaje, zona) or await preguntar_al_llm(mensaje, zona)
+
+REGISTRO.append(Indicador(
+    "changared_llm_cache_total", "Búsquedas en el caché semántico del LLM por resultado", ("resultado",),
+    lambda: {("acierto",): cache_llm.aciertos, ("fallo",): cache_llm.fallos},
+    tipo="counter",
+))
+
+# ─── COTIZACIÓN ──────────────────────────────────────────────────────────────
+
+cotizaciones = {"historial": 0, "llm": 0, "palabras_clave": 0}
+
+REGISTRO.append(Indicador(
+    "changared_tarifas_cotizaciones_total", "Solicitudes cotizadas por origen del rango de tarifa", ("fuente",),
+    lambda: {(fuente,): n for fuente, n in cotizaciones.items()},
+    tipo="counter",
+))
+
+async def cotizar_solicitud(mensaje: str, zona: str) -> dict:
+    """
+    Clasificación con el rango de tarifa (sin recargo de urgencia) y su
+    `fuente_tarifa`: "historial", "llm" o "palabras_clave" (el rango fijo
+    cuando el LLM no respondió). Si las palabras clave ya dicen el servicio
+    y hay historial para él, no se llama al LLM.
+    """
+    servicio = servicio_por_palabras(mensaje)
+    rango = servicio and motor_tarifas.cotizar(servicio, zona)
+    if rango:
+        clasificacion = {"servicio": servicio, "descripcion": f"Servicio de {servicio}"}
+    else:
+        clasificacion = await clasificar_solicitud_ia(mensaje, zona)
+        rango = motor_tarifas.cotizar(clasificacion.get("servicio", ""), zona)
+    if rango:
+        clasificacion["tarifa_min"], clasificacion["tarifa_max"] = rango
+        clasificacion["fuente_tarifa"] = "historial"
+    else:
+        clasificacion["fuente_tarifa"] = "palabras_clave" if clasificacion.get("de_palabras") else "llm"
+    cotizaciones[clasificacion["fuente_tarifa"]] += 1
+    return clasificacion
@@ -0,0 +1,87 @@
+"""
+Compresión de respuestas (brotli o gzip) según Accept-Encoding.
+
+Sólo se comprimen respuestas de un único bloque y por encima de un tamaño
+mínimo; las respuestas en streaming (SSE) pasan sin tocar.
+"""
+import gzip
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional, sin él se negocia sólo gzip
+    brotli = None
+
+TAMANO_MINIMO = 1024
+NIVEL_GZIP = 6
+CALIDAD_BROTLI = 5
+TIPOS_COMPRIMIBLES = ("application/json", "text/", "application/javascript")
+
+
+def elegir_codificacion(accept_encoding: str):
+    aceptadas = {parte.split(";")[0].strip() for parte in accept_encoding.lower().split(",")}
+    if brotli is not None and "br" in aceptadas:
+        return "br"
+    if "gzip" in aceptadas:
+        return "gzip"
+    return None
+
+
+def comprimir(cuerpo: bytes, codificacion: str) -> bytes:
+    if codificacion == "br":
+        return brotli.compress(cuerpo, quality=CALIDAD_BROTLI)
+    return gzip.compress(cuerpo, compresslevel=NIVEL_GZIP)
+
+
+class CompresionMiddleware:
+    def __init__(self, app, tamano_minimo: int = TAMANO_MINIMO):
+        self.app = app
+        self.tamano_minimo = tamano_minimo
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept = ""
+        for nombre, valor in scope["headers"]:
+            if nombre == b"accept-encoding":
+                accept = valor.decode("latin-1")
+                break
+        codificacion = elegir_codificacion(accept)
+        if codificacion is None:
+            await self.app(scope, receive, send)
+            return
+
+        inicio = {}
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start":
+                inicio.update(mensaje)
+                return
+            if not inicio:
+                await send(mensaje)
+                return
+            start, cuerpo = dict(inicio), mensaje.get("body", b"")
+            inicio.clear()
+            headers = [(k, v) for k, v in start["headers"]]
+            tipo = next((v.decode("latin-1") for k, v in headers if k == b"content-type"), "")
+            ya_codificada = any(k == b"content-encoding" for k, _ in headers)
+            if (
+                mensaje.get("more_body", False)
+                or ya_codificada
+                or len(cuerpo) < self.tamano_minimo
+                or not tipo.startswith(TIPOS_COMPRIMIBLES)
+            ):
+                await send(start)
+                await send(mensaje)
+                return
+            cuerpo = comprimir(cuerpo, codificacion)
+            headers = [(k, v) for k, v in headers if k != b"content-length"]
+            headers += [
+                (b"content-encoding", codificacion.encode()),
+                (b"content-length", str(len(cuerpo)).encode()),
+                (b"vary", b"Accept-Encoding"),
+            ]
+            await send({**start, "headers": headers})
+            await send({"type": "http.response.body", "body": cuerpo})
+
+        await self.app(scope, receive, enviar)
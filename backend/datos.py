@@ -0,0 +1,290 @@
+"""
+Acceso a Mongo compartido por las APIs.
+
+Cada consulta corre como etapa "mongo" del plazo del pedido y lleva
+maxTimeMS con lo que queda de él. Las escrituras sobre solicitudes pasan
+todas por acá: así siempre toman versión (sincronización incremental),
+registran la baja si cambian de profesional, se publican en el canal de
+tiempo real y, al completarse, alimentan el motor de tarifas, las haga la
+API que las haga.
+"""
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from archivo import buscar_archivada, listar_archivadas
+from fechas import ahora
+from modelos import PROYECCION_PROFESIONAL, PROYECCION_SOLICITUD
+from nucleo import db, motor_tarifas
+from plazos import etapa, max_time_ms
+from sincronizacion import marca_cambio, registrar_bajas, siguiente_version
+from tiempo_real import canal
+
+# ─── USUARIOS ────────────────────────────────────────────────────────────────
+
+async def usuario_por_email(email: str) -> Optional[dict]:
+    async with etapa("mongo"):
+        return await db.users.find_one({"email": email}, {"_id": 0}, max_time_ms=max_time_ms())
+
+async def usuario_por_id(user_id: str) -> Optional[dict]:
+    async with etapa("mongo"):
+        return await db.users.find_one({"id": user_id}, {"_id": 0}, max_time_ms=max_time_ms())
+
+class EmailDuplicado(Exception):
+    pass
+
+# Un Mongo standalone (desarrollo) no tiene transacciones; Atlas sí
+TOPOLOGIAS_CON_TRANSACCIONES = ("ReplicaSetWithPrimary", "Sharded", "LoadBalanced")
+
+def soporta_transacciones() -> bool:
+    return db.client.topology_description.topology_type_name in TOPOLOGIAS_CON_TRANSACCIONES
+
+async def registrar_usuario(usuario: dict, profesional: Optional[dict] = None) -> None:
+    """
+    Guarda el usuario y, si lo hay, su perfil de profesional, todo o nada.
+    No se pregunta antes si el email existe: lo garantizan los índices
+    únicos (crear_indices_registro) y se levanta EmailDuplicado.
+
+    Con transacciones van las dos inserciones en una; sin ellas, si falla
+    el profesional se borra el usuario recién creado.
+    """
+    try:
+        async with etapa("mongo"):
+            if soporta_transacciones():
+                async def insertar(sesion):
+                    await db.users.insert_one(usuario, session=sesion)
+                    if profesional:
+                        await db.profesionales.insert_one(profesional, session=sesion)
+
+                async with await db.client.start_session() as sesion:
+                    await sesion.with_transaction(insertar)
+            else:
+                await db.users.insert_one(usuario)
+                if profesional:
+                    try:
+                        await db.profesionales.insert_one(profesional)
+                    except BaseException:
+                        await db.users.delete_one({"id": usuario["id"]})
+                        raise
+    except DuplicateKeyError as e:
+        raise EmailDuplicado(usuario["email"]) from e
+
+async def emails_registrados(emails: Iterable[str]) -> Set[str]:
+    async with etapa("mongo"):
+        docs = await db.users.find({"email": {"$in": list(emails)}}, {"_id": 0, "email": 1}).to_list(None)
+    return {doc["email"] for doc in docs}
+
+def _fallas_de_lote(error: BulkWriteError) -> Dict[int, str]:
+    return {
+        falla["index"]: "Email ya registrado" if falla["code"] == 11000 else falla["errmsg"]
+        for falla in error.details["writeErrors"]
+    }
+
+async def insertar_cuentas(usuarios: List[dict], profesionales: List[Optional[dict]]) -> Dict[int, str]:
+    """
+    Alta en lote: insert_many sin orden, así una cuenta repetida no frena
+    al resto. Devuelve {índice: motivo} de las que no entraron; como en
+    registrar_usuario, si el perfil no entra se borra su usuario.
+    """
+    fallas: Dict[int, str] = {}
+    async with etapa("mongo"):
+        try:
+            await db.users.insert_many(usuarios, ordered=False)
+        except BulkWriteError as e:
+            fallas.update(_fallas_de_lote(e))
+        perfiles = [i for i, perfil in enumerate(profesionales) if perfil and i not in fallas]
+        if perfiles:
+            try:
+                await db.profesionales.insert_many([profesionales[i] for i in perfiles], ordered=False)
+            except BulkWriteError as e:
+                sin_perfil = {perfiles[j]: motivo for j, motivo in _fallas_de_lote(e).items()}
+                await db.users.delete_many({"id": {"$in": [usuarios[i]["id"] for i in sin_perfil]}})
+                fallas.update(sin_perfil)
+    return fallas
+
+async def crear_indices_registro() -> None:
+    # Son los que impiden dos cuentas con el mismo email: el registro no
+    # consulta antes de insertar
+    await db.users.create_index("email", unique=True)
+    await db.users.create_index("id", unique=True)
+    await db.profesionales.create_index("email", unique=True)
+    await db.profesionales.create_index("id", unique=True)
+
+async def duplicados_registro(muestra: int = 20) -> Dict[str, List[str]]:
+    """
+    Emails (hasta `muestra` por colección) con más de una cuenta: los que
+    dejó el registro anterior, que consultaba antes de insertar, e impiden
+    crear los índices únicos. Se corrigen a mano.
+    """
+    duplicados = {}
+    for coleccion in ("users", "profesionales"):
+        async with etapa("mongo"):
+            grupos = await db[coleccion].aggregate([
+                {"$group": {"_id": "$email", "cuentas": {"$sum": 1}}},
+                {"$match": {"cuentas": {"$gt": 1}}},
+                {"$limit": muestra},
+            ]).to_list(muestra)
+        if grupos:
+            duplicados[coleccion] = [grupo["_id"] for grupo in grupos]
+    return duplicados
+
+# ─── PROFESIONALES ───────────────────────────────────────────────────────────
+
+async def profesional_por_id(profesional_id: str, proyeccion: dict = PROYECCION_PROFESIONAL) -> Optional[dict]:
+    async with etapa("mongo"):
+        return await db.profesionales.find_one({"id": profesional_id}, proyeccion, max_time_ms=max_time_ms())
+
+async def profesional_por_email(email: str, proyeccion: dict = PROYECCION_PROFESIONAL) -> Optional[dict]:
+    async with etapa("mongo"):
+        return await db.profesionales.find_one({"email": email}, proyeccion, max_time_ms=max_time_ms())
+
+async def listar_profesionales(filtro: dict, proyeccion: dict = PROYECCION_PROFESIONAL,
+                               limite: Optional[int] = None) -> List[dict]:
+    async with etapa("mongo"):
+        return await db.profesionales.find(filtro, proyeccion, max_time_ms=max_time_ms()).to_list(limite)
+
+async def insertar_profesional(doc: dict) -> None:
+    try:
+        async with etapa("mongo"):
+            await db.profesionales.insert_one(doc)
+    except DuplicateKeyError as e:
+        raise EmailDuplicado(doc["email"]) from e
+
+async def actualizar_profesional(profesional_id: str, cambios: dict,
+                                 proyeccion: dict = PROYECCION_PROFESIONAL) -> Optional[dict]:
+    """
+    Devuelve el profesional ya actualizado (None si no existe), en un solo viaje.
+    """
+    try:
+        async with etapa("mongo"):
+            return await db.profesionales.find_one_and_update(
+                {"id": profesional_id}, {"$set": cambios}, proyeccion,
+                return_document=ReturnDocument.AFTER, max_time_ms=max_time_ms(),
+            )
+    except DuplicateKeyError as e:
+        raise EmailDuplicado(cambios.get("email", "")) from e
+
+async def borrar_profesional(profesional_id: str) -> bool:
+    async with etapa("mongo"):
+        resultado = await db.profesionales.delete_one({"id": profesional_id})
+    return resultado.deleted_count > 0
+
+async def sumar_servicio_profesional(profesional_id: str, ganado: float) -> None:
+    async with etapa("mongo"):
+        await db.profesionales.update_one(
+            {"id": profesional_id}, {"$inc": {"total_servicios": 1, "total_ganado": ganado}}
+        )
+
+# ─── SOLICITUDES ─────────────────────────────────────────────────────────────
+
+async def buscar_solicitud(solicitud_id: str, archivadas: bool = False) -> Optional[dict]:
+    """
+    Con `archivadas`, si no está en `solicitudes` la busca en el archivo
+    (archivo.py).
+    """
+    async with etapa("mongo"):
+        solicitud = await db.solicitudes.find_one({"id": solicitud_id}, {"_id": 0}, max_time_ms=max_time_ms())
+    if solicitud is None and archivadas:
+        solicitud = await buscar_archivada(solicitud_id)
+    return solicitud
+
+async def listar_solicitudes(filtro: dict, proyeccion: dict = PROYECCION_SOLICITUD,
+                             orden: Optional[list] = None, limite: Optional[int] = None,
+                             archivadas: bool = False) -> List[dict]:
+    """
+    Con `archivadas`, después de las de `solicitudes` (y hasta `limite`)
+    vienen las archivadas, de la más nueva a la más vieja.
+    """
+    async with etapa("mongo"):
+        cursor = db.solicitudes.find(filtro, proyeccion, max_time_ms=max_time_ms())
+        if orden:
+            cursor = cursor.sort(orden)
+        if limite:
+            # El límite va al servidor: to_list sólo corta lo que ya llegó
+            cursor = cursor.limit(limite)
+        solicitudes = await cursor.to_list(limite)
+    if archivadas and (not limite or len(solicitudes) < limite):
+        solicitudes += await listar_archivadas(filtro, proyeccion, limite and limite - len(solicitudes))
+    return solicitudes
+
+async def insertar_solicitud(doc: dict) -> None:
+    """
+    Agrega versión y updated_at a `doc`, lo guarda y lo publica.
+    """
+    async with etapa("mongo"):
+        doc.update(await marca_cambio(db))
+        await db.solicitudes.insert_one(doc)
+    doc.pop("_id", None)
+    canal.publicar_solicitud("solicitud_creada", doc)
+
+async def actualizar_solicitud(solicitud: dict, cambios: dict) -> dict:
+    """
+    Aplica `cambios` (con versión nueva) sobre `solicitud` y devuelve el
+    documento resultante.
+    """
+    async with etapa("mongo"):
+        cambios = {**cambios, **await marca_cambio(db)}
+        await db.solicitudes.update_one({"id": solicitud["id"]}, {"$set": cambios})
+        anterior = solicitud.get("profesional_id")
+        if anterior and cambios.get("profesional_id") not in (None, anterior):
+            await registrar_bajas(db, [solicitud], "reasignada", solo_profesional=anterior)
+    actualizada = {**solicitud, **cambios}
+    motor_tarifas.observar_cierre(solicitud, actualizada)
+    canal.publicar_solicitud("solicitud_actualizada", actualizada, anterior=solicitud)
+    return actualizada
+
+async def actualizar_solicitudes(pares: List[Tuple[dict, dict]], condicion: Optional[dict] = None) -> List[dict]:
+    """
+    actualizar_solicitud para muchas (solicitud, cambios) a la vez: las
+    versiones se reservan juntas y los cambios van en un solo bulk_write.
+    Con `condicion` (p. ej. el estado que se leyó) sólo se aplican a las que
+    todavía la cumplen; se devuelven, publican y observan sólo esas.
+    """
+    if not pares:
+        return []
+    async with etapa("mongo"):
+        ultima = await siguiente_version(db, len(pares))
+        momento = ahora()
+        pares = [
+            (solicitud, {**cambios, "version": ultima - len(pares) + 1 + n, "updated_at": momento})
+            for n, (solicitud, cambios) in enumerate(pares)
+        ]
+        resultado = await db.solicitudes.bulk_write([
+            UpdateOne({"id": solicitud["id"], **(condicion or {})}, {"$set": cambios}) for solicitud, cambios in pares
+        ], ordered=False)
+        if resultado.matched_count < len(pares):
+            # Las versiones no se repiten: se aplicó donde quedó la reservada
+            aplicadas = {
+                (doc["id"], doc["version"]) async for doc in db.solicitudes.find(
+                    {"id": {"$in": [solicitud["id"] for solicitud, _ in pares]}}, {"_id": 0, "id": 1, "version": 1}
+                )
+            }
+            pares = [
+                (solicitud, cambios) for solicitud, cambios in pares if (solicitud["id"], cambios["version"]) in aplicadas
+            ]
+        reasignadas: Dict[str, List[dict]] = {}
+        for solicitud, cambios in pares:
+            anterior = solicitud.get("profesional_id")
+            if anterior and cambios.get("profesional_id") not in (None, anterior):
+                reasignadas.setdefault(anterior, []).append(solicitud)
+        for anterior, solicitudes in reasignadas.items():
+            await registrar_bajas(db, solicitudes, "reasignada", solo_profesional=anterior)
+    actualizadas = []
+    for solicitud, cambios in pares:
+        actualizada = {**solicitud, **cambios}
+        motor_tarifas.observar_cierre(solicitud, actualizada)
+        canal.publicar_solicitud("solicitud_actualizada", actualizada, anterior=solicitud)
+        actualizadas.append(actualizada)
+    return actualizadas
+
+async def marcar_solicitudes(ids: List[str], marcas: dict) -> None:
+    """
+    Campos internos de las tareas de mantenimiento (qué ya se recordó o
+    concilió): no están en la proyección de ninguna API, así que no toman
+    versión ni se publican.
+    """
+    if not ids:
+        return
+    async with etapa("mongo"):
+        await db.solicitudes.update_many({"id": {"$in": ids}}, {"$set": marcas})
@@ -0,0 +1,291 @@
+"""
+Altas de solicitudes repetidas.
+
+Cuando la app tarda, el cliente vuelve a mandar el mismo pedido, y cada
+reenvío clasificaba otra vez (LLM), guardaba otra solicitud y avisaba otra
+vez por Telegram. Ahora cada alta se identifica por un hash de (cliente,
+mensaje normalizado, zona) y, si el cliente lo manda, por su header
+Idempotency-Key. Un pedido con una clave ya vista dentro de la ventana no
+hace nada: devuelve la respuesta del original con el header
+Idempotent-Replayed: true.
+
+Las claves viven en dos lugares:
+- en memoria del worker, con la respuesta, y los pedidos en curso: un
+  reenvío que llega al mismo worker se resuelve sin ir a Mongo (o espera
+  al original);
+- en la colección `pedidos`, con `_id` = clave e índice TTL sobre `vence`:
+  el insert es lo que reclama la clave entre workers. Si el original sigue
+  en curso en otro worker, el reenvío consulta hasta que termine, dentro
+  de su plazo (si no, 409).
+
+Si el original falla, libera la clave y el reenvío hace el alta. Una
+Idempotency-Key reusada con otro pedido responde 422. Cuántas
+clasificaciones del LLM y notificaciones se ahorraron queda en
+`estado()` y en /metrics.
+
+Configuración por entorno:
+    DEDUP_VENTANA_S=600          repetidos por contenido (0 lo apaga)
+    DEDUP_IDEMPOTENCIA_S=86400   Idempotency-Key
+"""
+import asyncio
+import hashlib
+import logging
+import re
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, Response
+from pymongo.errors import DuplicateKeyError
+
+from cache_semantico import normalizar
+from fechas import ahora
+from plazos import etapa, restante
+
+logger = logging.getLogger(__name__)
+
+# (clave, segundos que vale)
+Clave = Tuple[str, float]
+# (respuesta, lo que ahorra cada repetición: {"llm": 1, "notificaciones": 1})
+Resultado = Tuple[dict, Dict[str, int]]
+
+NO_ALFANUMERICO = re.compile(r"[^a-z0-9]+")
+
+
+class PedidoEnCurso(Exception):
+    pass
+
+
+class ClaveReusada(Exception):
+    pass
+
+
+def huella(cliente_id: str, *campos: Optional[str]) -> str:
+    # "Se cortó la luz!!" y "se corto la luz" son el mismo pedido
+    texto = "\x1f".join(NO_ALFANUMERICO.sub(" ", normalizar(campo or "")).strip() for campo in campos)
+    return hashlib.sha256(f"{cliente_id}\x1f{texto}".encode()).hexdigest()
+
+
+class Deduplicador:
+    def __init__(self, db, ventana_s: float = 600, idempotencia_s: float = 86400, abandono_s: float = 60,
+                 max_memoria: int = 10000, sondeo_s: float = 0.1):
+        self.db = db
+        self.ventana_s = ventana_s
+        self.idempotencia_s = idempotencia_s
+        # Un "en curso" más viejo que esto es de un worker que se cayó
+        self.abandono_s = abandono_s
+        self.max_memoria = max_memoria
+        self.sondeo_s = sondeo_s
+        # clave -> (vence, huella, resultado), en orden de llegada
+        self.recientes: "OrderedDict[str, Tuple[float, str, Resultado]]" = OrderedDict()
+        # clave -> (resultado del pedido en curso en este worker, None si falla; su huella)
+        self.en_curso: Dict[str, Tuple[asyncio.Future, str]] = {}
+        self.contadores = {"nuevos": 0, "repetidos": 0, "repetidos_en_memoria": 0}
+        self.ahorros: Dict[str, int] = {}
+
+    def claves(self, cliente_id: str, contenido: str, idempotency_key: Optional[str] = None) -> List[Clave]:
+        claves = []
+        if idempotency_key:
+            clave = hashlib.sha256(f"{cliente_id}\x1f{idempotency_key}".encode()).hexdigest()
+            claves.append((f"k:{clave}", self.idempotencia_s))
+        if self.ventana_s > 0:
+            claves.append((f"c:{contenido}", self.ventana_s))
+        return claves
+
+    # ─── ALTA ────────────────────────────────────────────────────────────────
+
+    async def una_vez(self, claves: List[Clave], contenido: str,
+                      crear: Callable[[], Awaitable[Resultado]]) -> Tuple[dict, bool]:
+        """
+        (respuesta, repetido). Corre `crear` sólo si ninguna de las claves
+        se vio dentro de su ventana; si no, devuelve la respuesta guardada.
+        """
+        if not claves:
+            self.contadores["nuevos"] += 1
+            return (await crear())[0], False
+        limite = time.monotonic() + min(self.abandono_s, restante() or self.abandono_s)
+        while True:
+            previo = self._en_memoria(claves, contenido)
+            if isinstance(previo, asyncio.Future):
+                resultado = await self._esperar(previo, limite)
+                if resultado is None:
+                    # El original falló: se intenta de nuevo
+                    continue
+                return self._repetido(resultado, en_memoria=True)
+            if previo is not None:
+                return self._repetido(previo, en_memoria=True)
+            break
+
+        futuro = asyncio.get_running_loop().create_future()
+        for clave, _ in claves:
+            self.en_curso[clave] = (futuro, contenido)
+        resultado = None
+        try:
+            previo = await self._reclamar(claves, contenido, limite)
+            if previo is not None:
+                resultado = previo
+                return self._repetido(previo, en_memoria=False)
+            resultado = await crear()
+            await self._completar(claves, contenido, resultado)
+            self.contadores["nuevos"] += 1
+            return resultado[0], False
+        except BaseException:
+            if resultado is None:
+                await asyncio.shield(self._liberar(claves))
+            raise
+        finally:
+            for clave, _ in claves:
+                self.en_curso.pop(clave, None)
+            if not futuro.done():
+                futuro.set_result(resultado)
+
+    def _en_memoria(self, claves: List[Clave], contenido: str):
+        momento = time.monotonic()
+        for clave, _ in claves:
+            if clave in self.en_curso:
+                futuro, huella_previa = self.en_curso[clave]
+                if huella_previa != contenido:
+                    raise ClaveReusada()
+                return futuro
+            guardado = self.recientes.get(clave)
+            if guardado is None:
+                continue
+            vence, huella_previa, resultado = guardado
+            if vence < momento:
+                del self.recientes[clave]
+            elif huella_previa != contenido:
+                raise ClaveReusada()
+            else:
+                return resultado
+        return None
+
+    async def _esperar(self, futuro: asyncio.Future, limite: float) -> Optional[Resultado]:
+        try:
+            return await asyncio.wait_for(asyncio.shield(futuro), max(0.0, limite - time.monotonic()))
+        except asyncio.TimeoutError:
+            raise PedidoEnCurso()
+
+    def _repetido(self, resultado: Resultado, en_memoria: bool) -> Tuple[dict, bool]:
+        respuesta, ahorro = resultado
+        self.contadores["repetidos"] += 1
+        if en_memoria:
+            self.contadores["repetidos_en_memoria"] += 1
+        for tipo, veces in ahorro.items():
+            self.ahorros[tipo] = self.ahorros.get(tipo, 0) + veces
+        return respuesta, True
+
+    def _recordar(self, clave: str, vence: float, contenido: str, resultado: Resultado) -> None:
+        self.recientes[clave] = (vence, contenido, resultado)
+        self.recientes.move_to_end(clave)
+        while len(self.recientes) > self.max_memoria:
+            self.recientes.popitem(last=False)
+
+    # ─── MONGO ───────────────────────────────────────────────────────────────
+
+    async def _reclamar(self, claves: List[Clave], contenido: str, limite: float) -> Optional[Resultado]:
+        reclamadas = []
+        for clave, vigencia_s in claves:
+            previo = await self._reclamar_clave(clave, vigencia_s, contenido, limite)
+            if previo is not None:
+                await self._liberar(reclamadas)
+                for otra, otra_vigencia_s in reclamadas:
+                    self._recordar(otra, time.monotonic() + otra_vigencia_s, contenido, previo)
+                return previo
+            reclamadas.append((clave, vigencia_s))
+        return None
+
+    async def _reclamar_clave(self, clave: str, vigencia_s: float, contenido: str,
+                              limite: float) -> Optional[Resultado]:
+        while True:
+            momento = ahora()
+            nuevo = {
+                "huella": contenido, "en_curso": True, "creado": momento,
+                "vence": momento + timedelta(seconds=vigencia_s),
+            }
+            async with etapa("mongo"):
+                try:
+                    await self.db.pedidos.insert_one({"_id": clave, **nuevo})
+                    return None
+                except DuplicateKeyError:
+                    pass
+                # Vencida (el TTL de Mongo borra con hasta un minuto de atraso) o abandonada
+                reemplazo = await self.db.pedidos.replace_one({
+                    "_id": clave,
+                    "$or": [
+                        {"vence": {"$lt": momento}},
+                        {"en_curso": True, "creado": {"$lt": momento - timedelta(seconds=self.abandono_s)}},
+                    ],
+                }, nuevo)
+                if reemplazo.matched_count:
+                    return None
+                doc = await self.db.pedidos.find_one({"_id": clave})
+            if doc is None:
+                continue
+            if doc["huella"] != contenido:
+                raise ClaveReusada()
+            if not doc["en_curso"]:
+                resultado = (doc["respuesta"], doc.get("ahorro", {}))
+                self._recordar(clave, time.monotonic() + vigencia_s, contenido, resultado)
+                return resultado
+            if time.monotonic() + self.sondeo_s > limite:
+                raise PedidoEnCurso()
+            await asyncio.sleep(self.sondeo_s)
+
+    async def _completar(self, claves: List[Clave], contenido: str, resultado: Resultado) -> None:
+        respuesta, ahorro = resultado
+        for clave, vigencia_s in claves:
+            self._recordar(clave, time.monotonic() + vigencia_s, contenido, resultado)
+        try:
+            async with etapa("mongo"):
+                await self.db.pedidos.update_many(
+                    {"_id": {"$in": [clave for clave, _ in claves]}},
+                    {"$set": {"en_curso": False, "respuesta": respuesta, "ahorro": ahorro}},
+                )
+        except Exception as e:
+            # La solicitud ya está guardada: no se falla el pedido por esto
+            logger.warning("No se pudo guardar la respuesta del alta: %s", e)
+
+    async def _liberar(self, claves: List[Clave]) -> None:
+        if not claves:
+            return
+        try:
+            await self.db.pedidos.delete_many({"_id": {"$in": [clave for clave, _ in claves]}, "en_curso": True})
+        except Exception:
+            # Queda "en curso" hasta abandono_s: los reenvíos esperan y después la reclaman
+            pass
+
+    async def crear_indices(self) -> None:
+        await self.db.pedidos.create_index("vence", expireAfterSeconds=0)
+
+    def estado(self) -> dict:
+        return {
+            **self.contadores,
+            "ahorros": dict(self.ahorros),
+            "en_memoria": len(self.recientes),
+            "en_curso": len(self.en_curso),
+            "ventana_s": self.ventana_s,
+        }
+
+
+async def sin_repetir(deduplicador: Deduplicador, cliente_id: str, campos: Tuple[Optional[str], ...],
+                      idempotency_key: Optional[str], crear: Callable[[], Awaitable[Resultado]],
+                      response: Response) -> Any:
+    """
+    Para las rutas de alta: corre `crear` una vez por pedido (`campos` del
+    cliente, o su Idempotency-Key) y responde los repetidos con lo del
+    original.
+    """
+    contenido = huella(cliente_id, *campos)
+    try:
+        respuesta, repetido = await deduplicador.una_vez(
+            deduplicador.claves(cliente_id, contenido, idempotency_key), contenido, crear
+        )
+    except PedidoEnCurso:
+        raise HTTPException(status_code=409, detail="El mismo pedido todavía se está procesando",
+                            headers={"Retry-After": "1"})
+    except ClaveReusada:
+        raise HTTPException(status_code=422, detail="Idempotency-Key ya usada con otro pedido")
+    if repetido:
+        response.headers["Idempotent-Replayed"] = "true"
+    return respuesta
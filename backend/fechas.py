@@ -0,0 +1,58 @@
+"""
+Fechas en Mongo: siempre datetime BSON en UTC, nunca texto ISO.
+
+Como texto, cada filtro por rango, orden o agregado por fecha era una
+comparación de strings, y no se podían usar índices TTL ni colecciones de
+series de tiempo. La convención:
+
+- Se escribe `ahora()` (o un datetime con zona); nunca `.isoformat()`.
+- El cliente de Mongo se crea con tz_aware=True: lo leído vuelve en UTC
+  con zona, y orjson/pydantic lo devuelven en la API como el ISO 8601 de
+  antes ("2026-02-10T14:03:11.123000+00:00", ahora con milisegundos).
+- Los campos de fecha de cada colección están en CAMPOS_FECHA; los
+  documentos viejos se convierten con migrar_fechas.py, en línea.
+
+Mientras dure la migración conviven los dos tipos: en un filtro por fecha
+hay que contemplar también los que siguen siendo texto ({"$type": "string"}).
+"""
+from datetime import datetime, timezone
+from typing import Any, List
+
+CAMPOS_FECHA = {
+    "users": ("created_at",),
+    "profesionales": ("created_at",),
+    "solicitudes": ("created_at", "updated_at"),
+    "solicitudes_bajas": ("deleted_at",),
+    "tarifas": ("actualizado",),
+}
+
+
+def ahora() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def a_fecha(valor: Any) -> Any:
+    """
+    Texto ISO 8601 (con o sin zona; sin zona se asume UTC) -> datetime con
+    zona. Lo que no es una fecha en texto se devuelve igual.
+    """
+    if isinstance(valor, str):
+        try:
+            valor = datetime.fromisoformat(valor.replace("Z", "+00:00"))
+        except ValueError:
+            return valor
+    if isinstance(valor, datetime) and valor.tzinfo is None:
+        return valor.replace(tzinfo=timezone.utc)
+    return valor
+
+
+def anterior_a(limite: datetime, campo: str = "updated_at", respaldo: str = "created_at") -> dict:
+    """
+    Filtro de los documentos con `campo` anterior a `limite`. Los que no lo
+    tienen (escritos antes de que existiera) se comparan por `respaldo`, y
+    las fechas todavía en texto, por su ISO en UTC, que ordena igual.
+    """
+    def antes(nombre: str) -> List[dict]:
+        return [{nombre: {"$lt": limite}}, {nombre: {"$type": "string", "$lt": limite.isoformat()}}]
+
+    return {"$or": antes(campo) + [{campo: None, **filtro} for filtro in antes(respaldo)]}
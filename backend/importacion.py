@@ -0,0 +1,302 @@
+"""
+Alta masiva de profesionales desde CSV o NDJSON.
+
+El admin junta los profesionales reclutados (grupos de WhatsApp, planillas)
+en un archivo y los da de alta de una vez, por la ruta
+POST /api/admin/profesionales/importar o por línea de comandos, en lugar
+de registrarlos uno por uno.
+
+El archivo se lee a medida que llega, sin cargarlo entero. Cada fila se
+valida como un UserRegister (rol "profesional" si no trae otro) y las
+válidas se guardan por lotes:
+- se descartan antes de hashear los emails repetidos en el lote o ya
+  registrados (bcrypt es lo caro; igual los rechazaría el índice único),
+- las contraseñas se hashean en paralelo en el pool de bcrypt
+  (HASH_HILOS, uno por núcleo),
+- usuarios y perfiles entran con insert_many sin orden (datos.insertar_cuentas).
+
+El ritmo lo pone bcrypt: leer, validar e insertar van a miles de filas por
+segundo, hashear a unas pocas por núcleo (ver benchmarks/bench_importacion.py).
+Las filas que ya traen `password_hash` (bcrypt, p. ej. exportado de otro
+sistema) en lugar de `password` no se hashean y entran a ese ritmo.
+
+El reporte trae las filas leídas, las cuentas creadas, el tiempo de cada
+etapa y un error por fila rechazada, con su línea del archivo. Nunca
+incluye las contraseñas.
+
+CSV: primera línea con los nombres de columna (nombre, telefono, email,
+password o password_hash, y opcionales tipo_servicio, zona, rol). NDJSON:
+un objeto por línea con los mismos campos.
+
+Uso:
+    python importacion.py profesionales.csv
+    python importacion.py altas.ndjson --lote 1000 --salida reporte.json
+    cat altas.csv | python importacion.py - --formato csv
+"""
+import argparse
+import asyncio
+import codecs
+import csv
+import json
+import re
+import sys
+import time
+from pathlib import Path
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import orjson
+from pydantic import ValidationError, field_validator, model_validator
+
+from autenticacion import armar_cuenta, hashear_en_lote
+from datos import emails_registrados, insertar_cuentas
+from modelos import UserRegister
+
+# (línea, fila, error de lectura)
+Fila = Tuple[int, Optional[dict], Optional[str]]
+
+TIPOS_DE_CONTENIDO = {
+    "text/csv": "csv",
+    "application/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+    "application/x-jsonlines": "ndjson",
+}
+
+# $2b$<costo>$<22 de sal><31 de hash>, lo que guarda passlib
+HASH_BCRYPT = re.compile(r"^\$2[aby]?\$\d{2}\$[./A-Za-z0-9]{53}$")
+
+
+class FilaImportacion(UserRegister):
+    password: Optional[str] = None
+    password_hash: Optional[str] = None
+
+    @field_validator("password_hash")
+    @classmethod
+    def es_bcrypt(cls, valor: Optional[str]) -> Optional[str]:
+        if valor is not None and not HASH_BCRYPT.match(valor):
+            raise ValueError("no es un hash bcrypt")
+        return valor
+
+    @model_validator(mode="after")
+    def una_clave(self) -> "FilaImportacion":
+        if (self.password is None) == (self.password_hash is None):
+            raise ValueError("va password o password_hash (uno solo)")
+        return self
+
+
+async def lineas(bloques: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    # Incremental: un carácter UTF-8 puede quedar partido entre dos bloques
+    decodificador = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    resto = ""
+    async for bloque in bloques:
+        *completas, resto = (resto + decodificador.decode(bloque)).split("\n")
+        for linea in completas:
+            yield linea + "\n"
+    resto += decodificador.decode(b"", final=True)
+    if resto:
+        yield resto
+
+
+async def filas_csv(bloques: AsyncIterator[bytes]) -> AsyncIterator[Fila]:
+    columnas = None
+    registro, inicio, numero = "", 0, 0
+    async for linea in lineas(bloques):
+        numero += 1
+        if not registro:
+            inicio = numero
+        registro += linea
+        if registro.count('"') % 2:
+            # Campo entre comillas con un salto de línea adentro: sigue en la próxima
+            continue
+        valores = next(csv.reader([registro]), [])
+        registro = ""
+        if not any(valor.strip() for valor in valores):
+            continue
+        if columnas is None:
+            columnas = [columna.strip().lower() for columna in valores]
+        elif len(valores) > len(columnas):
+            yield inicio, None, f"{len(valores)} columnas, el encabezado tiene {len(columnas)}"
+        else:
+            yield inicio, dict(zip(columnas, valores)), None
+    if registro:
+        yield inicio, None, "Comillas sin cerrar"
+
+
+async def filas_ndjson(bloques: AsyncIterator[bytes]) -> AsyncIterator[Fila]:
+    numero = 0
+    async for linea in lineas(bloques):
+        numero += 1
+        if not linea.strip():
+            continue
+        try:
+            fila = orjson.loads(linea)
+        except orjson.JSONDecodeError:
+            yield numero, None, "JSON inválido"
+            continue
+        if isinstance(fila, dict):
+            yield numero, fila, None
+        else:
+            yield numero, None, "Se esperaba un objeto JSON"
+
+
+FORMATOS: Dict[str, Callable[[AsyncIterator[bytes]], AsyncIterator[Fila]]] = {
+    "csv": filas_csv,
+    "ndjson": filas_ndjson,
+}
+
+
+def formato_de(tipo_de_contenido: str) -> Optional[str]:
+    return TIPOS_DE_CONTENIDO.get(tipo_de_contenido.split(";")[0].strip().lower())
+
+
+def validar(fila: dict) -> FilaImportacion:
+    # En un CSV las columnas opcionales vacías llegan como ""
+    valores = {
+        clave: valor.strip() if isinstance(valor, str) else valor
+        for clave, valor in fila.items() if clave and valor not in ("", None)
+    }
+    return FilaImportacion.model_validate({"rol": "profesional", **valores})
+
+
+def resumir(error: ValidationError) -> str:
+    # Sólo campo y motivo: el input puede ser la contraseña
+    return "; ".join(f"{'.'.join(map(str, e['loc'])) or 'fila'}: {e['msg']}" for e in error.errors())
+
+
+class Importacion:
+    def __init__(self, lote: int = 500):
+        self.lote = lote
+        self.filas = 0
+        self.creadas = 0
+        self.errores: List[dict] = []
+        self.etapas = {"lectura": 0.0, "hash": 0.0, "mongo": 0.0}
+        self.inicio = time.monotonic()
+
+    def rechazar(self, linea: int, fila: Optional[dict], motivo: str) -> None:
+        email = fila.get("email") if isinstance(fila, dict) else None
+        self.errores.append({"linea": linea, "email": email if isinstance(email, str) else None, "error": motivo})
+
+    async def correr(self, filas: AsyncIterator[Fila], reportar: Optional[Callable[[dict], None]] = None) -> dict:
+        pendientes: List[Tuple[int, FilaImportacion]] = []
+        marca = time.monotonic()
+        async for linea, fila, error in filas:
+            self.filas += 1
+            if error is None:
+                try:
+                    pendientes.append((linea, validar(fila)))
+                except ValidationError as e:
+                    error = resumir(e)
+            if error is not None:
+                self.rechazar(linea, fila, error)
+            if len(pendientes) >= self.lote:
+                self.etapas["lectura"] += time.monotonic() - marca
+                await self.guardar(pendientes)
+                pendientes = []
+                if reportar:
+                    reportar(self.reporte(con_errores=False))
+                marca = time.monotonic()
+        self.etapas["lectura"] += time.monotonic() - marca
+        if pendientes:
+            await self.guardar(pendientes)
+        return self.reporte()
+
+    async def guardar(self, lote: List[Tuple[int, FilaImportacion]]) -> None:
+        marca = time.monotonic()
+        registrados = await emails_registrados({datos.email for _, datos in lote})
+        nuevas, vistos = [], set()
+        for linea, datos in lote:
+            if datos.email in registrados or datos.email in vistos:
+                self.rechazar(linea, {"email": datos.email}, "Email ya registrado")
+            else:
+                vistos.add(datos.email)
+                nuevas.append((linea, datos))
+        self.etapas["mongo"] += time.monotonic() - marca
+        if not nuevas:
+            return
+
+        marca = time.monotonic()
+        hashes = iter(await hashear_en_lote([datos.password for _, datos in nuevas if datos.password_hash is None]))
+        cuentas = [armar_cuenta(datos, datos.password_hash or next(hashes)) for _, datos in nuevas]
+        self.etapas["hash"] += time.monotonic() - marca
+
+        marca = time.monotonic()
+        fallas = await insertar_cuentas(
+            [user.model_dump() for user, _ in cuentas],
+            [profesional and profesional.model_dump() for _, profesional in cuentas],
+        )
+        self.etapas["mongo"] += time.monotonic() - marca
+        for i, motivo in fallas.items():
+            linea, datos = nuevas[i]
+            self.rechazar(linea, {"email": datos.email}, motivo)
+        self.creadas += len(nuevas) - len(fallas)
+
+    def reporte(self, con_errores: bool = True) -> dict:
+        duracion = time.monotonic() - self.inicio
+        reporte = {
+            "filas": self.filas,
+            "creadas": self.creadas,
+            "rechazadas": len(self.errores),
+            "duracion_s": round(duracion, 3),
+            "filas_por_s": round(self.filas / duracion, 1) if duracion else None,
+            "etapas_s": {etapa: round(segundos, 3) for etapa, segundos in self.etapas.items()},
+        }
+        if con_errores:
+            reporte["errores"] = sorted(self.errores, key=lambda error: error["linea"])
+        return reporte
+
+
+async def importar(filas: AsyncIterator[Fila], lote: int = 500,
+                   reportar: Optional[Callable[[dict], None]] = None) -> dict:
+    return await Importacion(lote).correr(filas, reportar)
+
+
+async def bloques_de_archivo(archivo, tamano: int = 1 << 16) -> AsyncIterator[bytes]:
+    while bloque := await asyncio.to_thread(archivo.read, tamano):
+        yield bloque
+
+
+async def importar_archivo(archivo, formato: str, lote: int) -> dict:
+    from autenticacion import pool_hash
+    from datos import crear_indices_registro
+
+    # Sin los índices únicos nada impide dos cuentas con el mismo email
+    await crear_indices_registro()
+
+    def reportar(avance):
+        print(json.dumps(avance, ensure_ascii=False), file=sys.stderr)
+
+    try:
+        return await importar(FORMATOS[formato](bloques_de_archivo(archivo)), lote, reportar)
+    finally:
+        if (pool := pool_hash.descartar()) is not None:
+            pool.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("archivo", help="CSV o NDJSON; '-' para leer de stdin")
+    parser.add_argument("--formato", choices=sorted(FORMATOS), help="por defecto, según la extensión")
+    parser.add_argument("--lote", type=int, default=500, help="filas por insert_many")
+    parser.add_argument("--salida", help="archivo JSON para el reporte (por defecto stdout)")
+    args = parser.parse_args()
+
+    formato = args.formato or {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson"}.get(Path(args.archivo).suffix)
+    if formato is None:
+        parser.error("no se puede deducir el formato: usar --formato")
+
+    if args.archivo == "-":
+        reporte = asyncio.run(importar_archivo(sys.stdin.buffer, formato, args.lote))
+    else:
+        with open(args.archivo, "rb") as archivo:
+            reporte = asyncio.run(importar_archivo(archivo, formato, args.lote))
+
+    texto = json.dumps(reporte, indent=2, ensure_ascii=False)
+    if args.salida:
+        Path(args.salida).write_text(texto)
+    else:
+        print(texto)
+
+
+if __name__ == "__main__":
+    main()
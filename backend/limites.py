@@ -0,0 +1,203 @@
+"""
+Límites de tasa con token buckets, por usuario y por IP.
+
+Cada regla (una por ruta) tiene uno o más límites "por:capacidad/segundos":
+la cubeta admite ráfagas de `capacidad` pedidos y se recarga a
+capacidad/segundos tokens por segundo. Un pedido pasa si lo admiten todas
+las cubetas de su regla, y sólo entonces se descuenta de todas: lo
+rechazado por IP no gasta la cuota del usuario. Si no, 429 con Retry-After.
+
+El chequeo es O(1) y sin Mongo: el usuario sale del `sub` del JWT (firma
+verificada, sin buscarlo en la base) y las cubetas viven en memoria del
+worker. Con LIMITES_REDIS_URL se comparten entre workers/réplicas en Redis
+(paquete `redis` opcional); si Redis falla, se deja pasar.
+
+Detrás de un proxy (Railway, Vercel) todas las conexiones llegan desde
+el proxy: la IP del cliente sale de X-Forwarded-For. Cada proxy agrega al
+final la dirección que lo llamó, así que con LIMITES_PROXIES=N la del
+cliente es la N-ésima desde la derecha; lo que está más a la izquierda lo
+escribe el cliente y no se usa. Con 0 (por defecto) vale la conexión, como
+cuando uvicorn corre con --proxy-headers --forwarded-allow-ips (no usar
+las dos cosas juntas).
+
+Configuración por entorno:
+    LIMITES_TASA='{"login": ["ip:10/60"], "solicitudes": []}'   pisa reglas; [] desactiva
+    LIMITES_REDIS_URL=redis://...
+    LIMITES_PROXIES=1             proxies confiables delante de la app
+"""
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, Request
+
+logger = logging.getLogger(__name__)
+
+
+class Limite:
+    def __init__(self, por: str, capacidad: float, periodo_s: float):
+        if por not in ("usuario", "ip"):
+            raise ValueError(f"Límite por '{por}' no soportado")
+        self.por = por
+        self.capacidad = capacidad
+        self.tasa = capacidad / periodo_s
+
+    @classmethod
+    def desde_texto(cls, texto: str) -> "Limite":
+        """
+        "usuario:10/3600" -> 10 pedidos de ráfaga, 10 por hora sostenidos.
+        """
+        por, cuota = texto.split(":")
+        capacidad, periodo = cuota.split("/")
+        return cls(por.strip(), float(capacidad), float(periodo))
+
+
+# ─── ALMACENES ───────────────────────────────────────────────────────────────
+
+# (clave, capacidad, tasa) de cada cubeta que tiene que admitir el pedido
+Cubeta = Tuple[str, float, float]
+
+
+class AlmacenMemoria:
+    """
+    Cubetas en un dict ordenado por último uso; pasado `max_claves` se
+    descartan las más viejas (una cubeta descartada vuelve llena).
+    """
+
+    def __init__(self, max_claves: int = 100_000):
+        self.max_claves = max_claves
+        self._cubetas: "OrderedDict[str, list]" = OrderedDict()
+
+    def _recargar(self, clave: str, capacidad: float, tasa: float, ahora: float) -> list:
+        cubeta = self._cubetas.get(clave)
+        if cubeta is None:
+            cubeta = self._cubetas[clave] = [capacidad, ahora]
+            if len(self._cubetas) > self.max_claves:
+                self._cubetas.popitem(last=False)
+        else:
+            self._cubetas.move_to_end(clave)
+            cubeta[0] = min(capacidad, cubeta[0] + (ahora - cubeta[1]) * tasa)
+            cubeta[1] = ahora
+        return cubeta
+
+    async def consumir(self, cubetas: List[Cubeta], costo: float = 1) -> float:
+        """
+        Devuelve 0 si todas alcanzaban y se consumió de todas, o los
+        segundos hasta que alcance la más lejana (y no se consume de
+        ninguna: un pedido rechazado no gasta la cuota de las otras).
+        """
+        ahora = time.monotonic()
+        recargadas = [(self._recargar(clave, capacidad, tasa, ahora), tasa) for clave, capacidad, tasa in cubetas]
+        espera = max(((costo - cubeta[0]) / tasa for cubeta, tasa in recargadas if cubeta[0] < costo), default=0.0)
+        if espera == 0:
+            for cubeta, _ in recargadas:
+                cubeta[0] -= costo
+        return espera
+
+
+# Misma cuenta que AlmacenMemoria, atómica en Redis: KEYS son las cubetas y
+# ARGV, costo y después capacidad y tasa de cada una. Devuelve texto porque
+# Redis trunca los números de Lua a enteros.
+_SCRIPT_REDIS = """
+local costo = tonumber(ARGV[1])
+local t = redis.call('TIME')
+local ahora = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local tokens = {}
+local espera = 0
+for i, clave in ipairs(KEYS) do
+    local capacidad = tonumber(ARGV[2 * i])
+    local tasa = tonumber(ARGV[2 * i + 1])
+    local v = redis.call('HMGET', clave, 'tokens', 'ts')
+    local ts = tonumber(v[2]) or ahora
+    tokens[i] = math.min(capacidad, (tonumber(v[1]) or capacidad) + (ahora - ts) * tasa)
+    if tokens[i] < costo then
+        espera = math.max(espera, (costo - tokens[i]) / tasa)
+    end
+end
+for i, clave in ipairs(KEYS) do
+    local capacidad = tonumber(ARGV[2 * i])
+    local tasa = tonumber(ARGV[2 * i + 1])
+    if espera == 0 then
+        tokens[i] = tokens[i] - costo
+    end
+    redis.call('HSET', clave, 'tokens', tostring(tokens[i]), 'ts', tostring(ahora))
+    redis.call('EXPIRE', clave, math.ceil(capacidad / tasa) + 1)
+end
+return tostring(espera)
+"""
+
+
+class AlmacenRedis:
+    def __init__(self, url: str, prefijo: str = "changared:limites:"):
+        # Import diferido: sólo se paga si se configura Redis
+        try:
+            import redis.asyncio as redis_asyncio
+        except ImportError:
+            raise RuntimeError("LIMITES_REDIS_URL requiere el paquete 'redis'") from None
+        self.prefijo = prefijo
+        self._redis = redis_asyncio.from_url(url)
+        self._script = self._redis.register_script(_SCRIPT_REDIS)
+
+    async def consumir(self, cubetas: List[Cubeta], costo: float = 1) -> float:
+        argumentos = [costo]
+        for _, capacidad, tasa in cubetas:
+            argumentos += [capacidad, tasa]
+        try:
+            espera = await self._script(keys=[self.prefijo + clave for clave, _, _ in cubetas], args=argumentos)
+        except Exception as e:
+            logger.warning("Redis de limites no disponible, se deja pasar: %s", e)
+            return 0.0
+        return float(espera)
+
+    async def cerrar(self):
+        await self._redis.aclose()
+
+
+# ─── LIMITADOR ───────────────────────────────────────────────────────────────
+
+class LimitadorTasa:
+    def __init__(self, reglas: Dict[str, List[str]], almacen=None,
+                 usuario_de_token: Optional[Callable[[str], Optional[str]]] = None, proxies: int = 0):
+        self.almacen = almacen or AlmacenMemoria()
+        self.usuario_de_token = usuario_de_token
+        self.proxies = proxies
+        self.reglas = {nombre: [Limite.desde_texto(t) for t in limites] for nombre, limites in reglas.items()}
+
+    def ip_cliente(self, request: Request) -> Optional[str]:
+        if self.proxies:
+            saltos = [ip.strip() for ip in request.headers.get("x-forwarded-for", "").split(",") if ip.strip()]
+            if saltos:
+                # Con menos saltos que proxies, todo el header lo escribieron proxies
+                return saltos[-min(self.proxies, len(saltos))]
+        return request.client.host if request.client else None
+
+    def clave(self, limite: Limite, request: Request) -> Optional[str]:
+        if limite.por == "ip":
+            return self.ip_cliente(request)
+        autorizacion = request.headers.get("authorization", "")
+        if self.usuario_de_token is None or not autorizacion.lower().startswith("bearer "):
+            return None
+        return self.usuario_de_token(autorizacion[7:])
+
+    def regla(self, nombre: str):
+        """
+        Dependencia de FastAPI que aplica la regla `nombre`:
+        `@router.post(..., dependencies=[Depends(limitador.regla("login"))])`.
+        """
+        async def limitar(request: Request):
+            cubetas = []
+            for limite in self.reglas.get(nombre, ()):
+                clave = self.clave(limite, request)
+                if clave is not None:
+                    cubetas.append((f"{nombre}:{limite.por}:{clave}", limite.capacidad, limite.tasa))
+            # Todas juntas: se consume sólo si todas lo admiten
+            espera = await self.almacen.consumir(cubetas) if cubetas else 0.0
+            if espera > 0:
+                raise HTTPException(
+                    status_code=429,
+                    detail="Demasiados pedidos, intentá de nuevo más tarde",
+                    headers={"Retry-After": str(math.ceil(espera))},
+                )
+        return limitar
@@ -0,0 +1,153 @@
+"""
+Logging estructurado y asíncrono.
+
+Los handlers sólo encolan el LogRecord; el formateo (incluido el `%` de los
+argumentos) y la escritura a stderr ocurren en el thread de un
+QueueListener, fuera del event loop. Cada registro sale como una línea
+JSON con el request_id del pedido que lo generó y los campos de `extra=`.
+
+Configuración por entorno:
+    LOG_NIVEL=INFO
+    LOG_FORMATO=json | texto
+    LOG_MUESTREO_DEBUG=0.01   fracción de registros DEBUG que se conservan
+"""
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import uuid
+from contextvars import ContextVar
+from typing import Optional
+
+request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# Atributos propios de LogRecord; el resto vino por extra=
+_ATRIBUTOS_RECORD = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+
+
+class FormatoJSON(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        datos = {
+            "ts": round(record.created, 6),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "mensaje": record.getMessage(),
+        }
+        if record.request_id:
+            datos["request_id"] = record.request_id
+        for clave, valor in record.__dict__.items():
+            if clave not in _ATRIBUTOS_RECORD:
+                datos[clave] = valor
+        if record.exc_info:
+            datos["excepcion"] = self.formatException(record.exc_info)
+        return json.dumps(datos, default=str, ensure_ascii=False)
+
+
+class FiltroContexto(logging.Filter):
+    """
+    Copia el request_id del contexto al record. Corre en el thread que
+    loguea, antes de encolar, porque el ContextVar no existe en el listener.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id.get()
+        return True
+
+
+class FiltroMuestreo(logging.Filter):
+    """
+    Conserva sólo una fracción de los registros de nivel DEBUG.
+    """
+
+    def __init__(self, tasa: float):
+        super().__init__()
+        self.tasa = tasa
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno > logging.DEBUG or random.random() < self.tasa
+
+
+class ColaHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # La cola es en memoria: no hace falta serializar el record acá.
+        # Se deja el formateo entero al listener.
+        return record
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def configurar_logs(nivel: Optional[str] = None, formato: Optional[str] = None) -> logging.handlers.QueueListener:
+    global _listener
+    if _listener is not None:
+        return _listener
+    nivel = (nivel or os.environ.get("LOG_NIVEL", "INFO")).upper()
+    formato = formato or os.environ.get("LOG_FORMATO", "json")
+    tasa_debug = float(os.environ.get("LOG_MUESTREO_DEBUG", "1"))
+
+    salida = logging.StreamHandler(sys.stderr)
+    if formato == "json":
+        salida.setFormatter(FormatoJSON())
+    else:
+        salida.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"))
+
+    cola = ColaHandler(queue.SimpleQueue())
+    cola.addFilter(FiltroContexto())
+    if tasa_debug < 1:
+        cola.addFilter(FiltroMuestreo(tasa_debug))
+
+    raiz = logging.getLogger()
+    for handler in list(raiz.handlers):
+        raiz.removeHandler(handler)
+    raiz.addHandler(cola)
+    raiz.setLevel(nivel)
+
+    _listener = logging.handlers.QueueListener(cola.queue, salida, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def detener_logs() -> None:
+    """
+    Vacía la cola y detiene el thread del listener.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+class RequestIdMiddleware:
+    """
+    Toma X-Request-ID del pedido (o genera uno), lo deja en el contexto para
+    los logs y lo devuelve en la respuesta.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        rid = None
+        for nombre, valor in scope["headers"]:
+            if nombre == b"x-request-id":
+                rid = valor.decode("latin-1")[:64]
+                break
+        rid = rid or uuid.uuid4().hex
+        token = request_id.set(rid)
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start":
+                mensaje["headers"] = list(mensaje.get("headers", [])) + [(b"x-request-id", rid.encode("latin-1"))]
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            request_id.reset(token)
+
@@ -0,0 +1,141 @@
+"""
+Tareas de mantenimiento sobre las solicitudes (ver planificador.py), cada
+una en una sola réplica.
+
+- vencer_pendientes: las que siguen en pendiente_admin sin cambios hace
+  MANT_VENCER_DIAS pasan a cancelado, con motivo "vencida" (las anteriores
+  a updated_at, por su created_at).
+- recordar_pagos: a los clientes con una solicitud en esperando_pago hace
+  más de MANT_RECORDAR_HORAS les llega un email por la cola de emails, una
+  sola vez por solicitud.
+- conciliar_pagos: busca en Mercado Pago los pagos de las solicitudes en
+  esperando_pago, empezando por las que hace más que no se revisan, y
+  aplica lo que el webhook no llegó a avisar.
+
+Ninguna recorre la colección: leen de a MANT_LOTE por un índice (estado +
+fecha o marca), y lo procesado sale del filtro, así que el próximo lote es
+la siguiente página del índice. Cada corrida hace a lo sumo
+MANT_MAX_LOTES; lo que quede, en el próximo disparo.
+
+Configuración por entorno (horarios en cron o segundos, ver planificador.py):
+    MANT_VENCER_CRON="*/30 * * * *"     MANT_VENCER_DIAS=7
+    MANT_RECORDAR_CRON="0 9-21 * * *"   MANT_RECORDAR_HORAS=24
+    MANT_CONCILIAR_CRON="*/10 * * * *"  MANT_CONCILIAR_LOTE=50
+    MANT_LOTE=200                       MANT_MAX_LOTES=50
+"""
+import asyncio
+import logging
+import os
+from datetime import timedelta
+from typing import Optional
+
+from datos import actualizar_solicitudes, listar_solicitudes, marcar_solicitudes
+from fechas import ahora, anterior_a
+from mercadopago_routes import actualizar_pago_solicitud, mp_access_token, sdk
+from metricas import medir
+from notificaciones import cola_emails, email_recordatorio_pago
+from nucleo import db, planificador
+
+logger = logging.getLogger(__name__)
+
+VENCER_CRON = os.environ.get("MANT_VENCER_CRON", "*/30 * * * *")
+VENCER_DIAS = float(os.environ.get("MANT_VENCER_DIAS", "7"))
+RECORDAR_CRON = os.environ.get("MANT_RECORDAR_CRON", "0 9-21 * * *")
+RECORDAR_HORAS = float(os.environ.get("MANT_RECORDAR_HORAS", "24"))
+CONCILIAR_CRON = os.environ.get("MANT_CONCILIAR_CRON", "*/10 * * * *")
+CONCILIAR_LOTE = int(os.environ.get("MANT_CONCILIAR_LOTE", "50"))
+LOTE = int(os.environ.get("MANT_LOTE", "200"))
+MAX_LOTES = int(os.environ.get("MANT_MAX_LOTES", "50"))
+
+async def crear_indices_mantenimiento() -> None:
+    await db.solicitudes.create_index([("estado", 1), ("updated_at", 1)])
+    await db.solicitudes.create_index([("estado", 1), ("recordatorio_pago", 1), ("updated_at", 1)])
+    await db.solicitudes.create_index([("estado", 1), ("conciliado", 1)])
+
+# ─── VENCIMIENTOS ────────────────────────────────────────────────────────────
+
+async def vencer_pendientes() -> dict:
+    filtro = {"estado": "pendiente_admin", **anterior_a(ahora() - timedelta(days=VENCER_DIAS))}
+    vencidas = 0
+    for _ in range(MAX_LOTES):
+        lote = await listar_solicitudes(filtro, {"_id": 0}, orden=[("updated_at", 1)], limite=LOTE)
+        # Las que el admin tomó entre la lectura y la escritura no se tocan
+        canceladas = await actualizar_solicitudes(
+            [(sol, {"estado": "cancelado", "motivo_cancelacion": "vencida"}) for sol in lote],
+            condicion={"estado": "pendiente_admin"},
+        )
+        vencidas += len(canceladas)
+        if len(lote) < LOTE:
+            break
+    return {"vencidas": vencidas}
+
+# ─── RECORDATORIOS ───────────────────────────────────────────────────────────
+
+async def recordar_pagos() -> dict:
+    filtro = {
+        "estado": "esperando_pago",
+        "recordatorio_pago": None,
+        **anterior_a(ahora() - timedelta(hours=RECORDAR_HORAS)),
+    }
+    proyeccion = {
+        "_id": 0, "id": 1, "cliente_email": 1, "cliente_nombre": 1, "servicio": 1, "mensaje": 1,
+        "profesional_nombre": 1, "tarifa_final": 1, "tarifa_estimada_max": 1,
+    }
+    recordadas = encoladas = 0
+    for _ in range(MAX_LOTES):
+        lote = await listar_solicitudes(filtro, proyeccion, orden=[("updated_at", 1)], limite=LOTE)
+        for sol in lote:
+            if sol.get("cliente_email"):
+                encoladas += cola_emails.encolar(sol["cliente_email"], *email_recordatorio_pago(sol))
+        # Con o sin email: no se vuelve a intentar
+        await marcar_solicitudes([sol["id"] for sol in lote], {"recordatorio_pago": ahora()})
+        recordadas += len(lote)
+        if len(lote) < LOTE:
+            break
+    return {"recordadas": recordadas, "emails": encoladas}
+
+# ─── CONCILIACIÓN CON MERCADO PAGO ───────────────────────────────────────────
+
+async def pago_de_solicitud(mp, solicitud_id: str) -> Optional[dict]:
+    """
+    El pago aprobado con external_reference = la solicitud, si hay; si no,
+    el más reciente.
+    """
+    filtros = {"external_reference": solicitud_id, "sort": "date_created", "criteria": "desc"}
+    with medir("mercadopago", "payment.search"):
+        respuesta = await asyncio.to_thread(mp.payment().search, filtros)
+    pagos = respuesta.get("response", {}).get("results") or []
+    return next((pago for pago in pagos if pago.get("status") == "approved"), pagos[0] if pagos else None)
+
+async def conciliar_pagos() -> dict:
+    if not mp_access_token:
+        return {"omitida": "Mercado Pago no configurado"}
+    # Quedan en el filtro: cada corrida revisa las que hace más que no se revisan
+    lote = await listar_solicitudes(
+        {"estado": "esperando_pago"}, {"_id": 0, "id": 1, "pago_id": 1, "estado_pago": 1},
+        orden=[("conciliado", 1)], limite=CONCILIAR_LOTE,
+    )
+    if not lote:
+        return {"revisadas": 0}
+    mp = await sdk.aobtener()
+    actualizadas = errores = 0
+    for sol in lote:
+        try:
+            pago = await pago_de_solicitud(mp, sol["id"])
+        except Exception as e:
+            errores += 1
+            logger.warning("No se pudo consultar el pago en Mercado Pago: %s", e, extra={"solicitud_id": sol["id"]})
+            continue
+        if pago is None:
+            continue
+        estado_pago = "pagado" if pago.get("status") == "approved" else pago.get("status")
+        if str(pago["id"]) != sol.get("pago_id") or estado_pago != sol.get("estado_pago"):
+            await actualizar_pago_solicitud(db, sol["id"], pago["id"], pago.get("status"))
+            actualizadas += 1
+            logger.info("Pago conciliado", extra={"solicitud_id": sol["id"], "estado_pago": estado_pago})
+    await marcar_solicitudes([sol["id"] for sol in lote], {"conciliado": ahora()})
+    return {"revisadas": len(lote), "actualizadas": actualizadas, "errores": errores}
+
+planificador.tarea("vencer_pendientes", VENCER_CRON, vencer_pendientes)
+planificador.tarea("recordar_pagos", RECORDAR_CRON, recordar_pagos)
+planificador.tarea("conciliar_pagos", CONCILIAR_CRON, conciliar_pagos)
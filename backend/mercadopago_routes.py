@@ -1,21 +1,30 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
 from pydantic import BaseModel, EmailStr
+from pymongo import ReturnDocument
 from typing import Optional
-import mercadopago
+import asyncio
 import os
 import logging
 from datetime import datetime, timezone
+from tiempo_real import canal
+from sincronizacion import marca_cambio
+from metricas import medir
+from plazos import etapa
+from recursos import Perezoso
 
 router = APIRouter(prefix="/api/payments", tags=["payments"])
 logger = logging.getLogger(__name__)
 
-# Inicializar SDK de Mercado Pago
+# SDK de Mercado Pago: se importa y crea al primer pago, no al arrancar
 mp_access_token = os.environ.get('MERCADOPAGO_ACCESS_TOKEN')
 if not mp_access_token:
     logger.warning("MERCADOPAGO_ACCESS_TOKEN no configurado")
-    sdk = None
-else:
-    sdk = mercadopago.SDK(mp_access_token)
+
+def crear_sdk():
+    import mercadopago
+    return mercadopago.SDK(mp_access_token)
+
+sdk = Perezoso(crear_sdk)
 
 class CreatePaymentRequest(BaseModel):
     solicitud_id: str
@@ -39,7 +48,7 @@ async def create_payment_preference(request: CreatePaymentRequest):
     El cliente paga el total, ChangaRed recibe todo,
     y luego se transfiere el 80% al profesional.
     """
-    if not sdk:
+    if not mp_access_token:
         raise HTTPException(
             status_code=503,
             detail="Mercado Pago no está configurado"
@@ -82,10 +91,14 @@ async def create_payment_preference(request: CreatePaymentRequest):
         }
         
         # Crear preferencia
-        preference_response = sdk.preference().create(preference_data)
+        with medir("mercadopago", "preference.create"):
+            # El SDK usa requests (bloqueante): se corre en un thread
+            async with etapa("mercadopago"):
+                mp = await sdk.aobtener()
+                preference_response = await asyncio.to_thread(mp.preference().create, preference_data)
         preference = preference_response["response"]
         
-        logger.info(f"Preferencia creada: {preference['id']} para solicitud {request.solicitud_id}")
+        logger.info("Preferencia creada: %s", preference["id"], extra={"solicitud_id": request.solicitud_id})
         
         return PaymentPreferenceResponse(
             preference_id=preference["id"],
@@ -97,39 +110,68 @@ async def create_payment_preference(request: CreatePaymentRequest):
         )
         
     except Exception as e:
-        logger.error(f"Error creando preferencia de pago: {str(e)}")
+        logger.error("Error creando preferencia de pago: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Error al crear preferencia de pago: {str(e)}"
         )
 
+async def actualizar_pago_solicitud(db, solicitud_id: str, payment_id, status: Optional[str]):
+    """
+    Registra el pago en la solicitud y avisa por el canal en tiempo real
+    al cliente, al profesional asignado y al admin.
+    """
+    cambios = {
+        "pago_id": str(payment_id),
+        "estado_pago": "pagado" if status == "approved" else status,
+        **await marca_cambio(db),
+    }
+    if status == "approved":
+        cambios["estado"] = "confirmado"
+    solicitud = await db.solicitudes.find_one_and_update(
+        {"id": solicitud_id},
+        {"$set": cambios},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER,
+    )
+    if solicitud:
+        canal.publicar_solicitud("pago_actualizado", solicitud)
+
 @router.post("/webhook")
-async def payment_webhook(notification_data: dict):
+async def payment_webhook(notification_data: dict, request: Request):
     """
     Webhook para recibir notificaciones de Mercado Pago
     cuando cambia el estado de un pago.
     """
     try:
-        logger.info(f"Webhook recibido: {notification_data}")
+        # Sólo tipo e id: el payload completo no aporta y puede ser grande
+        logger.info(
+            "Webhook recibido",
+            extra={"tipo": notification_data.get("type"), "data_id": notification_data.get("data", {}).get("id")}
+        )
         
         # Mercado Pago envía el tipo y el ID del pago
         if notification_data.get("type") == "payment":
             payment_id = notification_data.get("data", {}).get("id")
             
-            if payment_id and sdk:
+            if payment_id and mp_access_token:
                 # Obtener información del pago
-                payment_info = sdk.payment().get(payment_id)
+                with medir("mercadopago", "payment.get"):
+                    async with etapa("mercadopago"):
+                        mp = await sdk.aobtener()
+                        payment_info = await asyncio.to_thread(mp.payment().get, payment_id)
                 payment = payment_info["response"]
                 
-                logger.info(f"Estado del pago {payment_id}: {payment.get('status')}")
+                logger.info("Estado del pago %s: %s", payment_id, payment.get("status"))
                 
-                # Aquí podrías actualizar el estado en la base de datos
-                # Por ejemplo, marcar la solicitud como "pagada"
+                solicitud_id = payment.get("external_reference")
+                if solicitud_id:
+                    await actualizar_pago_solicitud(request.app.state.db, solicitud_id, payment_id, payment.get("status"))
                 
         return {"status": "received"}
         
     except Exception as e:
-        logger.error(f"Error procesando webhook: {str(e)}")
+        logger.error("Error procesando webhook: %s", e)
         return {"status": "error", "message": str(e)}
 
 @router.get("/status/{payment_id}")
@@ -137,14 +179,17 @@ async def get_payment_status(payment_id: str):
     """
     Obtiene el estado de un pago específico.
     """
-    if not sdk:
+    if not mp_access_token:
         raise HTTPException(
             status_code=503,
             detail="Mercado Pago no está configurado"
         )
     
     try:
-        payment_info = sdk.payment().get(payment_id)
+        with medir("mercadopago", "payment.get"):
+            async with etapa("mercadopago"):
+                mp = await sdk.aobtener()
+                payment_info = await asyncio.to_thread(mp.payment().get, payment_id)
         payment = payment_info["response"]
         
         return {
@@ -156,7 +201,7 @@ async def get_payment_status(payment_id: str):
         }
         
     except Exception as e:
-        logger.error(f"Error obteniendo estado del pago: {str(e)}")
+        logger.error("Error obteniendo estado del pago: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Error al obtener estado del pago: {str(e)}"
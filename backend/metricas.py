@@ -0,0 +1,217 @@
+"""
+Métricas en formato Prometheus.
+
+- Histograma de duración por ruta (método, plantilla de ruta, status),
+  medido por un middleware ASGI.
+- Histograma de spans por componente: cada comando de Mongo (vía un
+  CommandListener de pymongo, sin tocar los handlers), el LLM, Telegram,
+  email, Mercado Pago y la serialización de respuestas.
+- Histograma de duración de las tareas periódicas (planificador.py).
+
+Todo vive en memoria del worker y se expone en GET /metrics. Observar un
+valor es una búsqueda binaria sobre los buckets y dos sumas.
+"""
+import functools
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Tuple
+
+from fastapi.responses import ORJSONResponse
+from pymongo import monitoring
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histograma:
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Tuple[str, ...], buckets=BUCKETS):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self.buckets = tuple(buckets)
+        self._series: Dict[tuple, list] = {}
+        # Los eventos de Mongo llegan desde los threads de Motor
+        self._lock = threading.Lock()
+
+    def observar(self, valor: float, *etiquetas: str) -> None:
+        indice = bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._series.get(etiquetas)
+            if serie is None:
+                # [conteos por bucket..., +Inf, suma]
+                serie = self._series[etiquetas] = [0] * (len(self.buckets) + 1) + [0.0]
+            serie[indice] += 1
+            serie[-1] += valor
+
+    def exponer(self) -> str:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        with self._lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        for valores, serie in sorted(series.items()):
+            base = ",".join(f'{k}="{_escapar(v)}"' for k, v in zip(self.etiquetas, valores))
+            sep = "," if base else ""
+            acumulado = 0
+            for limite, conteo in zip(self.buckets + (float("inf"),), serie[:-1]):
+                acumulado += conteo
+                le = "+Inf" if limite == float("inf") else repr(limite)
+                lineas.append(f'{self.nombre}_bucket{{{base}{sep}le="{le}"}} {acumulado}')
+            etiquetas = f"{{{base}}}" if base else ""
+            lineas.append(f"{self.nombre}_sum{etiquetas} {serie[-1]}")
+            lineas.append(f"{self.nombre}_count{etiquetas} {acumulado}")
+        return "\n".join(lineas)
+
+
+class Indicador:
+    """
+    Gauge o counter cuyo valor se lee al exponer, con `leer()` devolviendo
+    {(valores de etiquetas...): valor}.
+    """
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Tuple[str, ...], leer, tipo: str = "gauge"):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self.leer = leer
+        self.tipo = tipo
+
+    def exponer(self) -> str:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+        for valores, valor in sorted(self.leer().items()):
+            base = ",".join(f'{k}="{_escapar(v)}"' for k, v in zip(self.etiquetas, valores))
+            lineas.append(f"{self.nombre}{{{base}}} {valor}" if base else f"{self.nombre} {valor}")
+        return "\n".join(lineas)
+
+
+def _escapar(valor: str) -> str:
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+duracion_http = Histograma(
+    "changared_http_request_duration_seconds",
+    "Duracion de los pedidos HTTP por ruta",
+    ("method", "route", "status"),
+)
+duracion_span = Histograma(
+    "changared_span_duration_seconds",
+    "Duracion de llamadas a Mongo, LLM, Telegram, email, Mercado Pago y serializacion",
+    ("componente", "operacion"),
+)
+lag_event_loop = Histograma(
+    "changared_event_loop_lag_seconds",
+    "Demora del event loop en despertar el latido del vigia",
+    (),
+)
+bloqueos_event_loop = Histograma(
+    "changared_event_loop_blocked_seconds",
+    "Bloqueos del event loop por encima del umbral del vigia, por ruta",
+    ("route",),
+)
+duracion_tarea = Histograma(
+    "changared_job_duration_seconds",
+    "Duracion de las tareas periodicas por resultado",
+    ("tarea", "resultado"),
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0),
+)
+REGISTRO = [duracion_http, duracion_span, lag_event_loop, bloqueos_event_loop, duracion_tarea]
+
+
+def exponer_todo() -> str:
+    return "\n".join(h.exponer() for h in REGISTRO) + "\n"
+
+
+# ─── SPANS ───────────────────────────────────────────────────────────────────
+
+@contextmanager
+def medir(componente: str, operacion: str):
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        duracion_span.observar(time.perf_counter() - inicio, componente, operacion)
+
+
+def medido(componente: str, operacion: str):
+    """
+    Decorador para corrutinas: registra la duración de cada llamada.
+    """
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        async def envoltura(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                return await funcion(*args, **kwargs)
+            finally:
+                duracion_span.observar(time.perf_counter() - inicio, componente, operacion)
+        return envoltura
+    return decorador
+
+
+class ListenerMongo(monitoring.CommandListener):
+    """
+    Mide cada comando enviado a Mongo como span ("mongo", "<coleccion>.<comando>").
+    La colección sólo viene en el evento de inicio: se recuerda por request_id.
+    """
+
+    def __init__(self):
+        self._colecciones: Dict[int, str] = {}
+
+    def started(self, event):
+        coleccion = event.command.get(event.command_name)
+        if isinstance(coleccion, str):
+            self._colecciones[event.request_id] = coleccion
+
+    def succeeded(self, event):
+        self._observar(event)
+
+    def failed(self, event):
+        self._observar(event)
+
+    def _observar(self, event):
+        coleccion = self._colecciones.pop(event.request_id, "-")
+        duracion_span.observar(event.duration_micros / 1e6, "mongo", f"{coleccion}.{event.command_name}")
+
+
+class RespuestaJSON(ORJSONResponse):
+    """
+    ORJSONResponse que mide el tiempo de serialización como span.
+    """
+
+    def render(self, content) -> bytes:
+        with medir("serializacion", "orjson"):
+            return super().render(content)
+
+
+# ─── MIDDLEWARE ──────────────────────────────────────────────────────────────
+
+class MetricasMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        inicio = time.perf_counter()
+        estado = {"status": 500, "streaming": False}
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start":
+                estado["status"] = mensaje["status"]
+                for nombre, valor in mensaje.get("headers", ()):
+                    if nombre == b"content-type" and valor.startswith(b"text/event-stream"):
+                        estado["streaming"] = True
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            # Las conexiones SSE duran minutos: no son latencia de un pedido
+            if not estado["streaming"]:
+                ruta = scope.get("route")
+                duracion_http.observar(
+                    time.perf_counter() - inicio,
+                    scope["method"],
+                    ruta.path if ruta is not None else "sin_ruta",
+                    str(estado["status"]),
+                )
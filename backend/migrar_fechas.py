@@ -0,0 +1,135 @@
+"""
+Migración en línea de las fechas guardadas como texto a datetime BSON
+(convención en fechas.py).
+
+Recorre cada colección en orden de _id, en lotes, y convierte los campos
+de CAMPOS_FECHA que siguen siendo texto con un bulk_write por lote. Cada
+UpdateOne filtra también por el valor viejo: si la app reescribió el
+documento mientras tanto, no se pisa. La app puede seguir atendiendo
+durante toda la migración.
+
+Es reanudable: después de cada lote el último _id y los contadores de la
+colección quedan en `migraciones` (_id "fechas:<colección>"); si se corta,
+la próxima corrida sigue desde ahí. --pausa-ms frena entre lotes para no
+competir con el tráfico.
+
+Se corre con la app que ya escribe datetime desplegada: lo que una versión
+vieja escriba después de terminada la colección quedaría en texto.
+
+Uso:
+    python migrar_fechas.py
+    python migrar_fechas.py --colecciones solicitudes users --lote 500 --pausa-ms 100
+    python migrar_fechas.py --simular        # cuenta lo que convertiría, sin escribir
+    python migrar_fechas.py --desde-cero     # descarta el avance guardado
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from datetime import datetime
+from typing import Callable, Iterable, Optional
+
+from pymongo import UpdateOne
+
+from fechas import CAMPOS_FECHA, a_fecha, ahora
+
+
+def conversiones(doc: dict, campos: Iterable[str]) -> dict:
+    """
+    {campo: datetime} de los campos de `doc` que son fechas en texto.
+    """
+    cambios = {}
+    for campo in campos:
+        valor = doc.get(campo)
+        if isinstance(valor, str) and isinstance(fecha := a_fecha(valor), datetime):
+            cambios[campo] = fecha
+    return cambios
+
+
+async def migrar_coleccion(db, coleccion: str, campos: Iterable[str], lote: int = 1000, pausa_s: float = 0,
+                           simular: bool = False, reportar: Optional[Callable[[dict], None]] = None) -> dict:
+    campos = tuple(campos)
+    clave = f"fechas:{coleccion}"
+    avance = await db.migraciones.find_one({"_id": clave}) or {}
+    if avance.get("terminado"):
+        return {"coleccion": coleccion, **{k: avance.get(k, 0) for k in ("revisados", "convertidos")}, "terminado": True}
+    ultimo = avance.get("ultimo_id")
+    revisados, convertidos = avance.get("revisados", 0), avance.get("convertidos", 0)
+    total = await db[coleccion].estimated_document_count()
+    inicio, revisados_al_inicio = time.monotonic(), revisados
+
+    while True:
+        filtro = {} if ultimo is None else {"_id": {"$gt": ultimo}}
+        docs = await db[coleccion].find(filtro, {campo: 1 for campo in campos}).sort("_id", 1).limit(lote).to_list(lote)
+        if not docs:
+            break
+        operaciones = []
+        for doc in docs:
+            cambios = conversiones(doc, campos)
+            if cambios:
+                # Con el valor viejo en el filtro, una escritura concurrente de la app gana
+                operaciones.append(UpdateOne({"_id": doc["_id"], **{c: doc[c] for c in cambios}}, {"$set": cambios}))
+        if simular:
+            convertidos += len(operaciones)
+        elif operaciones:
+            convertidos += (await db[coleccion].bulk_write(operaciones, ordered=False)).modified_count
+        revisados += len(docs)
+        ultimo = docs[-1]["_id"]
+        if not simular:
+            await db.migraciones.update_one(
+                {"_id": clave},
+                {"$set": {"ultimo_id": ultimo, "revisados": revisados, "convertidos": convertidos, "actualizado": ahora()}},
+                upsert=True,
+            )
+        if reportar:
+            segundos = time.monotonic() - inicio
+            reportar({
+                "coleccion": coleccion,
+                "revisados": revisados,
+                "total_estimado": total,
+                "convertidos": convertidos,
+                "docs_por_s": round((revisados - revisados_al_inicio) / segundos) if segundos else None,
+            })
+        if pausa_s:
+            await asyncio.sleep(pausa_s)
+
+    if not simular:
+        await db.migraciones.update_one(
+            {"_id": clave}, {"$set": {"terminado": True, "actualizado": ahora()}}, upsert=True
+        )
+    return {"coleccion": coleccion, "revisados": revisados, "convertidos": convertidos, "terminado": not simular}
+
+
+async def migrar(db, colecciones: Iterable[str], desde_cero: bool = False, **opciones) -> list:
+    resultados = []
+    for coleccion in colecciones:
+        if desde_cero:
+            await db.migraciones.delete_one({"_id": f"fechas:{coleccion}"})
+        resultados.append(await migrar_coleccion(db, coleccion, CAMPOS_FECHA[coleccion], **opciones))
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--colecciones", nargs="+", choices=sorted(CAMPOS_FECHA), default=list(CAMPOS_FECHA))
+    parser.add_argument("--lote", type=int, default=1000, help="documentos por bulk_write")
+    parser.add_argument("--pausa-ms", type=float, default=0, help="pausa entre lotes")
+    parser.add_argument("--simular", action="store_true")
+    parser.add_argument("--desde-cero", action="store_true")
+    args = parser.parse_args()
+
+    from nucleo import db
+
+    def reportar(avance):
+        print(json.dumps(avance, ensure_ascii=False), file=sys.stderr)
+
+    resultados = asyncio.run(migrar(
+        db, args.colecciones, desde_cero=args.desde_cero,
+        lote=args.lote, pausa_s=args.pausa_ms / 1000, simular=args.simular, reportar=reportar,
+    ))
+    print(json.dumps(resultados, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Modelos del dominio compartidos por las APIs.
+
+Los de request/response propios de un conjunto de rutas viven en su
+módulo (rutas_deploy); acá quedan los documentos de Mongo (usuarios,
+profesionales, solicitudes) y los modelos de salida que definen qué
+campos se piden a Mongo.
+"""
+import uuid
+from datetime import datetime
+from typing import Annotated, List, Literal, Optional
+
+from pydantic import BaseModel, Field, ConfigDict, EmailStr, PlainSerializer
+
+from fechas import ahora
+
+# Las fechas se guardan como datetime BSON (fechas.py) y la API las devuelve
+# en ISO 8601 con "+00:00", igual que orjson en las listas
+Fecha = Annotated[datetime, PlainSerializer(lambda fecha: fecha.isoformat(), return_type=str, when_used="json")]
+
+class UserRegister(BaseModel):
+    nombre: str
+    telefono: str
+    email: EmailStr
+    password: str
+    rol: Literal["cliente", "profesional"]
+    tipo_servicio: Optional[str] = None
+    zona: Optional[str] = None
+
+class UserLogin(BaseModel):
+    email: EmailStr
+    password: str
+
+class SolicitudCreate(BaseModel):
+    mensaje: str
+    zona: Optional[str] = "Posadas"
+    urgente: bool = False
+
+class AdminAccion(BaseModel):
+    accion: Literal["aceptar", "rechazar"]
+    profesional_id: Optional[str] = None
+
+class AdminAccionItem(AdminAccion):
+    solicitud_id: str
+
+# Tope por pedido: el lote entero va en un bulk_write
+MAX_ACCIONES_LOTE = 200
+
+class AdminAccionLote(BaseModel):
+    acciones: List[AdminAccionItem] = Field(min_length=1, max_length=MAX_ACCIONES_LOTE)
+
+class SolicitudUpdate(BaseModel):
+    estado: Optional[str] = None
+    profesional_id: Optional[str] = None
+
+class SolicitudCierre(BaseModel):
+    # Lo cobrado: alimenta el motor de tarifas y el monto del pago
+    tarifa_final: float = Field(gt=0)
+
+class User(BaseModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    nombre: str
+    telefono: str
+    email: str
+    password_hash: str
+    rol: str
+    created_at: datetime = Field(default_factory=ahora)
+
+class Profesional(BaseModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+    id: str
+    nombre: str
+    telefono: str
+    email: str
+    tipo_servicio: str
+    latitud: float
+    longitud: float
+    disponible: bool = True
+    tarifa_base: float = 15000.0
+    calificacion: float = 5.0
+    zona: Optional[str] = "Posadas"
+    total_servicios: int = 0
+    total_ganado: float = 0.0
+    created_at: datetime = Field(default_factory=ahora)
+
+class Solicitud(BaseModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    cliente_id: str
+    cliente_nombre: str
+    cliente_telefono: str = ""
+    cliente_email: str = ""
+    mensaje: str
+    servicio: str
+    zona: str
+    urgente: bool = False
+    estado: str = "pendiente_admin"
+    profesional_id: Optional[str] = None
+    profesional_nombre: Optional[str] = None
+    profesional_telefono: Optional[str] = None
+    tarifa_estimada_min: Optional[float] = None
+    tarifa_estimada_max: Optional[float] = None
+    tarifa_final: Optional[float] = None
+    pago_id: Optional[str] = None
+    created_at: datetime = Field(default_factory=ahora)
+
+# Modelos de respuesta: documentan el esquema y definen la proyección que se
+# pide a Mongo, así las listas se serializan directo con orjson sin recorrerlas.
+
+class SolicitudOut(BaseModel):
+    id: str
+    cliente_id: str
+    cliente_nombre: str
+    cliente_telefono: str = ""
+    cliente_email: str = ""
+    mensaje: str
+    servicio: str
+    zona: str
+    urgente: bool = False
+    estado: str
+    estado_pago: Optional[str] = None
+    profesional_id: Optional[str] = None
+    profesional_nombre: Optional[str] = None
+    profesional_telefono: Optional[str] = None
+    tarifa_estimada_min: Optional[float] = None
+    tarifa_estimada_max: Optional[float] = None
+    tarifa_final: Optional[float] = None
+    pago_id: Optional[str] = None
+    created_at: Optional[Fecha] = None
+    updated_at: Optional[Fecha] = None
+    version: Optional[int] = None
+
+class SolicitudEncontrada(SolicitudOut):
+    # textScore de Mongo: sólo sirve para comparar resultados de la misma búsqueda
+    puntaje: float
+
+class ProfesionalOut(BaseModel):
+    id: str
+    nombre: str
+    telefono: str
+    email: str
+    tipo_servicio: str
+    latitud: float
+    longitud: float
+    disponible: bool = True
+    tarifa_base: float = 15000.0
+    calificacion: float = 5.0
+    zona: Optional[str] = "Posadas"
+    total_servicios: int = 0
+    total_ganado: float = 0.0
+
+def proyeccion(modelo) -> dict:
+    return {"_id": 0, **{campo: 1 for campo in modelo.model_fields}}
+
+PROYECCION_SOLICITUD = proyeccion(SolicitudOut)
+PROYECCION_PROFESIONAL = proyeccion(ProfesionalOut)
@@ -0,0 +1,274 @@
+"""
+Notificaciones y cobros hacia afuera: Telegram al admin, email al
+profesional asignado y preferencias de Mercado Pago.
+
+Todas usan el cliente HTTP compartido del núcleo, corren como etapa del
+plazo del pedido y nunca hacen fallar el pedido: un error se loguea. Los
+emails de las acciones en lote no se esperan: van a `cola_emails`.
+"""
+import asyncio
+import logging
+import os
+from typing import List, Tuple
+
+from metricas import medido
+from nucleo import http_externo, recursos
+from plazos import etapa, timeout_http
+
+logger = logging.getLogger(__name__)
+
+# Telegram
+TELEGRAM_BOT_TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN", "")
+TELEGRAM_ADMIN_CHAT_ID = os.environ.get("TELEGRAM_ADMIN_CHAT_ID", "")
+TELEGRAM_API_URL = os.environ.get("TELEGRAM_API_URL", "https://api.telegram.org")
+
+# Email
+SMTP_HOST = os.environ.get("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.environ.get("SMTP_PORT", "587"))
+SMTP_USER = os.environ.get("SMTP_USER", "")
+SMTP_PASS = os.environ.get("SMTP_PASS", "")
+
+# Mercado Pago
+MP_ACCESS_TOKEN = os.environ.get("MERCADOPAGO_ACCESS_TOKEN", "")
+MP_PUBLIC_KEY = os.environ.get("MERCADOPAGO_PUBLIC_KEY", "")
+MP_API_URL = os.environ.get("MERCADOPAGO_API_URL", "https://api.mercadopago.com")
+
+# ─── TELEGRAM ────────────────────────────────────────────────────────────────
+
+@medido("telegram", "sendMessage")
+async def notificar_telegram(mensaje: str):
+    if not TELEGRAM_BOT_TOKEN or not TELEGRAM_ADMIN_CHAT_ID:
+        logger.warning("Telegram no configurado")
+        return
+    try:
+        url = f"{TELEGRAM_API_URL}/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
+        async with etapa("telegram"):
+            http = await http_externo.aobtener()
+            await http.post(url, json={
+                "chat_id": TELEGRAM_ADMIN_CHAT_ID,
+                "text": mensaje,
+                "parse_mode": "HTML"
+            }, timeout=timeout_http(10))
+        logger.info("Notificacion Telegram enviada")
+    except Exception as e:
+        logger.error("Error Telegram: %s", e)
+
+# ─── EMAIL ────────────────────────────────────────────────────────────────────
+
+def armar_mensaje(destino: str, asunto: str, cuerpo: str):
+    from email.mime.text import MIMEText
+    from email.mime.multipart import MIMEMultipart
+
+    msg = MIMEMultipart("alternative")
+    msg["Subject"] = asunto
+    msg["From"] = SMTP_USER
+    msg["To"] = destino
+    msg.attach(MIMEText(cuerpo, "plain"))
+    return msg
+
+def enviar_smtp(destino: str, asunto: str, cuerpo: str):
+    # smtplib es bloqueante (conexión, TLS, login): se llama con asyncio.to_thread.
+    # smtplib y email.mime se importan acá, sólo si se manda algún mail.
+    import smtplib
+
+    msg = armar_mensaje(destino, asunto, cuerpo)
+    with smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=15) as server:
+        server.starttls()
+        server.login(SMTP_USER, SMTP_PASS)
+        server.sendmail(SMTP_USER, destino, msg.as_string())
+
+def enviar_smtp_lote(mensajes: List[Tuple[str, str, str]]) -> int:
+    """
+    Varios (destino, asunto, cuerpo) por una sola conexión: TLS y login una
+    vez. Devuelve cuántos salieron; un destino rechazado no frena al resto.
+    """
+    import smtplib
+
+    enviados = 0
+    with smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=15) as server:
+        server.starttls()
+        server.login(SMTP_USER, SMTP_PASS)
+        for destino, asunto, cuerpo in mensajes:
+            try:
+                server.sendmail(SMTP_USER, destino, armar_mensaje(destino, asunto, cuerpo).as_string())
+                enviados += 1
+            except smtplib.SMTPRecipientsRefused as e:
+                logger.error("Email rechazado: %s", e, extra={"profesional_email": destino})
+    return enviados
+
+def detalle_trabajo(solicitud: dict) -> str:
+    tarifa_min = solicitud.get("tarifa_estimada_min") or 0
+    tarifa_max = solicitud.get("tarifa_estimada_max") or 0
+    return f"""
+Servicio: {solicitud.get('servicio', '').upper()}
+Problema: {solicitud.get('mensaje', '')}
+Zona: {solicitud.get('zona', '')}
+{'*** URGENTE ***' if solicitud.get('urgente') else ''}
+
+Cliente: {solicitud.get('cliente_nombre', '')}
+Telefono: {solicitud.get('cliente_telefono', 'Ver en app')}
+
+Tu pago: ${tarifa_min * 0.85:,.0f} - ${tarifa_max * 0.85:,.0f}
+"""
+
+def email_asignacion(profesional_nombre: str, solicitudes: List[dict]) -> Tuple[str, str]:
+    """
+    (asunto, cuerpo) del aviso de uno o varios trabajos asignados.
+    """
+    if len(solicitudes) == 1:
+        asunto = f"ChangaRed - Nuevo trabajo de {solicitudes[0].get('servicio', '').upper()}"
+        encabezado = "Tenes un nuevo trabajo asignado en ChangaRed:"
+    else:
+        asunto = f"ChangaRed - {len(solicitudes)} trabajos nuevos"
+        encabezado = f"Tenes {len(solicitudes)} trabajos nuevos asignados en ChangaRed:"
+    trabajos = "\n---\n".join(detalle_trabajo(solicitud) for solicitud in solicitudes)
+    cuerpo = f"""
+Hola {profesional_nombre}!
+
+{encabezado}
+{trabajos}
+Saludos,
+Equipo ChangaRed
+        """
+    return asunto, cuerpo
+
+def email_recordatorio_pago(solicitud: dict) -> Tuple[str, str]:
+    """
+    (asunto, cuerpo) del recordatorio al cliente de una solicitud asignada sin pagar.
+    """
+    servicio = solicitud.get("servicio", "").upper()
+    monto = solicitud.get("tarifa_final") or solicitud.get("tarifa_estimada_max") or 0
+    cuerpo = f"""
+Hola {solicitud.get('cliente_nombre', '')}!
+
+Tu pedido de {servicio} ya tiene profesional asignado: {solicitud.get('profesional_nombre', '')}.
+Solo falta el pago (${monto:,.0f}) para confirmarlo. Podes pagar desde la app.
+
+Problema: {solicitud.get('mensaje', '')}
+
+Saludos,
+Equipo ChangaRed
+        """
+    return f"ChangaRed - Tu pedido de {servicio} espera el pago", cuerpo
+
+@medido("email", "smtp")
+async def notificar_changarin_email(profesional_email: str, profesional_nombre: str, solicitud: dict):
+    if not SMTP_USER or not SMTP_PASS:
+        logger.warning("Email SMTP no configurado - saltando notificacion")
+        return
+    try:
+        asunto, cuerpo = email_asignacion(profesional_nombre, [solicitud])
+        # El thread no se puede cancelar: al vencer el plazo sólo se deja de esperarlo
+        async with etapa("email"):
+            await asyncio.to_thread(enviar_smtp, profesional_email, asunto, cuerpo)
+
+        logger.info("Email enviado a %s", profesional_nombre, extra={"profesional_email": profesional_email})
+    except Exception as e:
+        logger.error("Error enviando email: %s", e)
+
+class ColaEmails:
+    """
+    Emails que no se esperan dentro del pedido (acciones en lote). El
+    trabajador "emails" los junta de a `lote` y los manda por una sola
+    conexión SMTP. Vive en memoria: si el proceso muere, lo encolado se
+    pierde; al apagar se manda lo pendiente dentro del plazo de cierre.
+    """
+
+    def __init__(self, maximo: int = 1000, lote: int = 50):
+        self.cola: asyncio.Queue = asyncio.Queue(maxsize=maximo)
+        self.lote = lote
+        self.enviados = 0
+        self.fallidos = 0
+        self.descartados = 0
+
+    def encolar(self, destino: str, asunto: str, cuerpo: str) -> bool:
+        try:
+            self.cola.put_nowait((destino, asunto, cuerpo))
+            return True
+        except asyncio.QueueFull:
+            self.descartados += 1
+            logger.error("Cola de emails llena: se descarta", extra={"profesional_email": destino})
+            return False
+
+    def _tomar(self) -> List[Tuple[str, str, str]]:
+        mensajes = []
+        while len(mensajes) < self.lote and not self.cola.empty():
+            mensajes.append(self.cola.get_nowait())
+        return mensajes
+
+    async def _enviar(self, mensajes: List[Tuple[str, str, str]]) -> None:
+        if not SMTP_USER or not SMTP_PASS:
+            logger.warning("Email SMTP no configurado - saltando %d notificaciones", len(mensajes))
+            return
+        try:
+            enviados = await asyncio.to_thread(enviar_smtp_lote, mensajes)
+        except Exception as e:
+            enviados = 0
+            logger.error("Error enviando emails: %s", e)
+        self.enviados += enviados
+        self.fallidos += len(mensajes) - enviados
+
+    async def correr(self) -> None:
+        while True:
+            primero = await self.cola.get()
+            await self._enviar([primero, *self._tomar()])
+
+    async def vaciar(self) -> None:
+        while mensajes := self._tomar():
+            await self._enviar(mensajes)
+
+    def estado(self) -> dict:
+        return {
+            "pendientes": self.cola.qsize(),
+            "enviados": self.enviados,
+            "fallidos": self.fallidos,
+            "descartados": self.descartados,
+        }
+
+cola_emails = ColaEmails()
+recursos.trabajador("emails", cola_emails.correr, detener=cola_emails.vaciar, estado=cola_emails.estado)
+
+# ─── MERCADO PAGO ─────────────────────────────────────────────────────────────
+
+@medido("mercadopago", "checkout.preferences")
+async def crear_preferencia_mp(solicitud_id: str, servicio: str, monto: float, cliente_email: str) -> dict:
+    if not MP_ACCESS_TOKEN:
+        logger.warning("MERCADOPAGO_ACCESS_TOKEN no configurado")
+        return {"error": "Pago no configurado"}
+    try:
+        payload = {
+            "items": [{
+                "title": f"ChangaRed - {servicio.capitalize()}",
+                "quantity": 1,
+                "unit_price": float(monto),
+                "currency_id": "ARS"
+            }],
+            "payer": {"email": cliente_email},
+            "external_reference": solicitud_id,
+            "back_urls": {
+                "success": "https://changared.com/pago/exitoso",
+                "failure": "https://changared.com/pago/fallido",
+                "pending": "https://changared.com/pago/pendiente"
+            },
+            "auto_return": "approved"
+        }
+        async with etapa("mercadopago"):
+            http = await http_externo.aobtener()
+            response = await http.post(
+                f"{MP_API_URL}/checkout/preferences",
+                json=payload,
+                headers={
+                    "Authorization": f"Bearer {MP_ACCESS_TOKEN}",
+                    "Content-Type": "application/json"
+                },
+                timeout=timeout_http(15)
+            )
+        data = response.json()
+        return {
+            "preference_id": data.get("id"),
+            "init_point": data.get("init_point"),
+            "sandbox_url": data.get("sandbox_init_point")
+        }
+    except Exception as e:
+        logger.error("Error Mercado Pago: %s", e)
+        return {"error": str(e)}
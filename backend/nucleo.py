@@ -0,0 +1,200 @@
+"""
+Núcleo compartido por las APIs de ChangaRed.
+
+Lo que cualquier conjunto de rutas necesita y debe existir una sola vez por
+proceso: configuración, logs, el contenedor de recursos (lifespan), el pool
+de Mongo y los clientes HTTP/LLM compartidos. Los módulos de más arriba
+(datos, autenticacion, clasificacion, asignacion, notificaciones) y los
+routers (rutas_changared, rutas_deploy) se apoyan en esto.
+"""
+import json
+import os
+
+from dotenv import load_dotenv
+
+from logs import configurar_logs, detener_logs
+from metricas import ListenerMongo, Indicador, REGISTRO
+from recursos import Perezoso, Recursos, ClienteMongo
+from cache_semantico import CacheSemantico
+from deduplicacion import Deduplicador
+from planificador import Planificador
+from tarifas import MotorTarifas
+
+load_dotenv()
+
+configurar_logs()
+
+# Clientes, pools y trabajadores del proceso: se inician en el arranque y se
+# cierran al apagar, en orden inverso, dentro de PLAZO_CIERRE_S
+recursos = Recursos(plazo_cierre_s=float(os.environ.get("PLAZO_CIERRE_S", "10")))
+
+# Primero en registrarse, último en cerrarse: no se pierden los logs del cierre
+recursos.registrar("logs", detener=detener_logs)
+
+# Con PRECARGA (por defecto) los clientes se calientan en segundo plano al
+# arrancar; en serverless conviene apagarlo y pagar sólo lo que se usa
+PRECARGA = os.environ.get("PRECARGA", "true").lower() in ("1", "true", "si")
+
+# ─── MONGO ───────────────────────────────────────────────────────────────────
+
+MONGO_URL = os.environ.get("MONGO_URL", "")
+DB_NAME = os.environ.get("DB_NAME", "changared")
+
+# Pool ajustado al plazo de los pedidos: con el default de 30 s para elegir
+# servidor, un Mongo caído se come todo el presupuesto del pedido
+mongo = ClienteMongo(
+    MONGO_URL,
+    max_pool=int(os.environ.get("MONGO_POOL_MAX", "50")),
+    min_pool=int(os.environ.get("MONGO_POOL_MIN", "5")),
+    compresores=os.environ.get("MONGO_COMPRESORES", "zstd,snappy,zlib"),
+    timeout_conexion_ms=int(os.environ.get("MONGO_TIMEOUT_CONEXION_MS", "5000")),
+    timeout_seleccion_ms=int(os.environ.get("MONGO_TIMEOUT_SELECCION_MS", "5000")),
+    timeout_espera_pool_ms=int(os.environ.get("MONGO_TIMEOUT_ESPERA_POOL_MS", "5000")),
+    listeners=[ListenerMongo()],
+)
+client = mongo.cliente
+db = client[DB_NAME]
+
+recursos.trabajador("mongo", mongo.calentar, detener=mongo.cerrar, estado=mongo.estado)
+
+REGISTRO.extend([
+    Indicador(
+        "changared_mongo_pool_connections", "Conexiones del pool de Mongo por servidor y estado",
+        ("servidor", "estado"),
+        lambda: {
+            (servidor, estado): pool.get(estado, 0)
+            for servidor, pool in mongo.pool.estado().items() for estado in ("abiertas", "en_uso")
+        },
+    ),
+    Indicador(
+        "changared_mongo_pool_wait_queue", "Operaciones esperando una conexion del pool de Mongo", ("servidor",),
+        lambda: {(servidor,): pool.get("esperando", 0) for servidor, pool in mongo.pool.estado().items()},
+    ),
+    Indicador(
+        "changared_mongo_pool_checkout_failed_total", "Conexiones de Mongo que no se pudieron obtener del pool",
+        ("servidor",),
+        lambda: {(servidor,): pool.get("fallidas", 0) for servidor, pool in mongo.pool.estado().items()},
+        tipo="counter",
+    ),
+])
+
+# ─── TAREAS PERIÓDICAS ───────────────────────────────────────────────────────
+
+# Mantenimiento en segundo plano; las tareas de una sola réplica se reparten
+# con arriendos en Mongo. Lo registra server como trabajador, después de
+# agregar las de mantenimiento.py.
+planificador = Planificador(
+    db,
+    zona=os.environ.get("PLANIFICADOR_ZONA", "America/Argentina/Buenos_Aires"),
+    activo=os.environ.get("PLANIFICADOR", "true").lower() in ("1", "true", "si"),
+)
+
+REGISTRO.append(Indicador(
+    "changared_job_runs_total", "Disparos de las tareas periodicas por resultado (sin_arriendo: corrio otra replica)",
+    ("tarea", "resultado"),
+    lambda: {
+        (nombre, resultado): n
+        for nombre, tarea in planificador.tareas.items() for resultado, n in tarea.corridas.items()
+    },
+    tipo="counter",
+))
+
+# ─── TARIFAS ─────────────────────────────────────────────────────────────────
+
+# Rangos de precio aprendidos de las solicitudes completadas; se cotiza en
+# memoria y el LLM queda para lo que no tiene historial
+motor_tarifas = MotorTarifas(
+    db,
+    min_muestras=int(os.environ.get("TARIFAS_MIN_MUESTRAS", "5")),
+)
+
+recursos.registrar("tarifas", detener=motor_tarifas.persistir, estado=motor_tarifas.estado)
+# En todos los workers: cada uno suma lo suyo y relee lo de los demás
+planificador.tarea(
+    "tarifas", os.environ.get("TARIFAS_PERSISTIR_S", "60"), motor_tarifas.sincronizar,
+    lider=False, jitter_s=5, plazo_s=60, al_iniciar=True,
+)
+
+# Clasificaciones del LLM reusadas para mensajes parecidos (no sólo iguales)
+cache_llm = CacheSemantico(
+    max_entradas=int(os.environ.get("CACHE_LLM_MAX", "5000")),
+    umbral=float(os.environ.get("CACHE_LLM_UMBRAL", "0.5")),
+    ttl_s=float(os.environ.get("CACHE_LLM_TTL_S", "86400")),
+)
+
+recursos.registrar("cache_llm", estado=cache_llm.estado)
+
+async def purgar_cache_llm():
+    return {"vencidas": cache_llm.purgar()}
+
+planificador.tarea("cache_llm", "*/10 * * * *", purgar_cache_llm, lider=False, jitter_s=60, plazo_s=10)
+
+# ─── ALTAS REPETIDAS ─────────────────────────────────────────────────────────
+
+# Reenvíos de la misma solicitud (o con la misma Idempotency-Key): se
+# responden con la original, sin LLM, alta ni notificación
+deduplicador = Deduplicador(
+    db,
+    ventana_s=float(os.environ.get("DEDUP_VENTANA_S", "600")),
+    idempotencia_s=float(os.environ.get("DEDUP_IDEMPOTENCIA_S", "86400")),
+)
+
+recursos.registrar("deduplicacion", estado=deduplicador.estado)
+
+REGISTRO.extend([
+    Indicador(
+        "changared_altas_repetidas_total", "Altas de solicitudes por resultado (nueva o repetida)", ("resultado",),
+        lambda: {("nueva",): deduplicador.contadores["nuevos"], ("repetida",): deduplicador.contadores["repetidos"]},
+        tipo="counter",
+    ),
+    Indicador(
+        "changared_altas_repetidas_ahorro_total", "Trabajo evitado por las altas repetidas", ("tipo",),
+        lambda: {(tipo,): n for tipo, n in deduplicador.ahorros.items()},
+        tipo="counter",
+    ),
+])
+
+# ─── CLIENTES EXTERNOS ───────────────────────────────────────────────────────
+
+# LLM
+EMERGENT_API_KEY = os.environ.get("EMERGENT_API_KEY") or os.environ.get("EMERGENT_LLM_KEY", "")
+LLM_BASE_URL = os.environ.get("LLM_BASE_URL") or None
+
+# Clientes HTTP compartidos: crear uno por llamada arma un contexto SSL
+# (cientos de ms de CPU) dentro del event loop. Se crean al primer uso, en
+# un thread, para no pagar openai/httpx en el cold start.
+def crear_http_externo():
+    import httpx
+    return httpx.AsyncClient(
+        timeout=15,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=30),
+    )
+
+def crear_cliente_llm():
+    from openai import AsyncOpenAI
+    cliente = AsyncOpenAI(api_key=EMERGENT_API_KEY, base_url=LLM_BASE_URL, timeout=20, max_retries=1)
+    # openai importa sus recursos al primer acceso (~1 s): que sea acá
+    cliente.chat.completions
+    return cliente
+
+http_externo = Perezoso(crear_http_externo)
+cliente_llm = Perezoso(crear_cliente_llm)
+
+recursos.cliente("http_externo", http_externo, cerrar=lambda http: http.aclose(), precargar=PRECARGA)
+recursos.cliente("cliente_llm", cliente_llm, cerrar=lambda llm: llm.close(), precargar=PRECARGA)
+
+# ─── AUTH ────────────────────────────────────────────────────────────────────
+
+# JWT_* son los nombres que usaba el backend de deploy
+SECRET_KEY = os.environ.get("SECRET_KEY") or os.environ.get("JWT_SECRET", "changared-secret-key-2024")
+ALGORITHM = os.environ.get("JWT_ALGORITHM", "HS256")
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.environ.get("JWT_EXPIRATION_MINUTES", "1440"))
+
+# Límites de tasa: JSON que pisa reglas de REGLAS_LIMITES; Redis opcional para compartirlas
+LIMITES_TASA = json.loads(os.environ.get("LIMITES_TASA") or "{}")
+LIMITES_REDIS_URL = os.environ.get("LIMITES_REDIS_URL", "")
+# Proxies confiables delante de la app (Railway: 1); la IP del cliente sale de X-Forwarded-For
+LIMITES_PROXIES = int(os.environ.get("LIMITES_PROXIES", "0"))
+
+# Threads para bcrypt en las importaciones en lote (uno por núcleo)
+HASH_HILOS = int(os.environ.get("HASH_HILOS") or os.cpu_count() or 1)
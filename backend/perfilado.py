@@ -0,0 +1,241 @@
+"""
+Perfilado bajo demanda de un worker en producción.
+
+Un admin lo enciende por un tiempo acotado y mientras dura:
+
+- Un thread toma muestras del stack del thread del event loop cada
+  `intervalo_ms` y las cuenta como pilas colapsadas ("a;b;c N"), el formato
+  que leen flamegraph.pl y speedscope. Cada muestra lleva delante la ruta
+  que estaba atendiendo la tarea en ejecución.
+- Una tarea mide el lag del event loop (cuánto tarda en despertar un sleep).
+- Se activa el modo debug de asyncio para registrar los callbacks que
+  tardan más de `umbral_callback_ms`.
+
+Apagado, el único costo es que PerfiladoMiddleware lee un booleano por pedido
+(más un alta y baja en un dict si el vigía del event loop usa las rutas).
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Tope de pilas distintas por sesión, para acotar la memoria
+MAX_PILAS = 20000
+MAX_DURACION_S = 600
+
+
+def nombre_frame(frame) -> str:
+    modulo = os.path.splitext(os.path.basename(frame.f_code.co_filename))[0]
+    return f"{modulo}:{frame.f_code.co_name}"
+
+
+def pila_colapsada(frame, limite: int = 128) -> str:
+    """
+    Pila desde la raíz hasta `frame`, separada por ';'.
+    """
+    nombres = []
+    while frame is not None and len(nombres) < limite:
+        nombres.append(nombre_frame(frame))
+        frame = frame.f_back
+    return ";".join(reversed(nombres))
+
+
+class _CapturaCallbacksLentos(logging.Handler):
+    """
+    asyncio en modo debug avisa con "Executing <handle> took X seconds".
+    """
+
+    def __init__(self, destino: deque):
+        super().__init__(logging.WARNING)
+        self.destino = destino
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if isinstance(record.msg, str) and record.msg.startswith("Executing") and len(record.args or ()) == 2:
+            handle, segundos = record.args
+            self.destino.append({"ts": record.created, "callback": str(handle)[:300], "ms": round(segundos * 1e3, 2)})
+
+
+class Perfilador:
+    def __init__(self):
+        self.activo = False
+        # tarea -> scope ASGI del pedido que atiende; la ruta se resuelve al
+        # muestrear porque el router la agrega al scope después del middleware
+        self.tareas: Dict[asyncio.Task, dict] = {}
+        # El vigía del event loop también etiqueta por ruta: mantiene el dict
+        # aunque el perfilador esté apagado
+        self.seguir_tareas = False
+        self.muestras: Counter = Counter()
+        self._lock_muestras = threading.Lock()
+        self.lags: deque = deque(maxlen=5000)
+        self.callbacks_lentos: deque = deque(maxlen=200)
+        self.config: dict = {}
+        self.inicio: Optional[float] = None
+        self.fin: Optional[float] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._parar = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._tarea_lag: Optional[asyncio.Task] = None
+        self._captura: Optional[_CapturaCallbacksLentos] = None
+        self._debug_previo = False
+        self._umbral_previo = 0.1
+
+    def iniciar(self, intervalo_ms: float = 5, umbral_callback_ms: float = 50,
+                duracion_s: float = 60, callbacks_lentos: bool = True) -> None:
+        if self.activo:
+            raise RuntimeError("El perfilador ya está activo")
+        self._loop = asyncio.get_running_loop()
+        self.config = {
+            "intervalo_ms": intervalo_ms,
+            "umbral_callback_ms": umbral_callback_ms,
+            "duracion_s": min(duracion_s, MAX_DURACION_S),
+            "callbacks_lentos": callbacks_lentos,
+        }
+        with self._lock_muestras:
+            self.muestras = Counter()
+        self.lags.clear()
+        self.callbacks_lentos.clear()
+        self.inicio, self.fin = time.time(), None
+        self._parar.clear()
+
+        if callbacks_lentos:
+            self._debug_previo = self._loop.get_debug()
+            self._umbral_previo = self._loop.slow_callback_duration
+            self._loop.set_debug(True)
+            self._loop.slow_callback_duration = umbral_callback_ms / 1e3
+            self._captura = _CapturaCallbacksLentos(self.callbacks_lentos)
+            logging.getLogger("asyncio").addHandler(self._captura)
+
+        self.activo = True
+        self._tarea_lag = asyncio.create_task(self._medir_lag(intervalo_ms / 1e3))
+        self._thread = threading.Thread(
+            target=self._muestrear,
+            args=(threading.get_ident(), intervalo_ms / 1e3, self.config["duracion_s"]),
+            name="perfilador",
+            daemon=True,
+        )
+        self._thread.start()
+        logger.warning("Perfilador iniciado", extra={"perfilado": self.config})
+
+    def detener(self) -> None:
+        if not self.activo:
+            return
+        self.activo = False
+        self.fin = time.time()
+        self._parar.set()
+        if self._tarea_lag is not None:
+            self._tarea_lag.cancel()
+            self._tarea_lag = None
+        if self._captura is not None:
+            logging.getLogger("asyncio").removeHandler(self._captura)
+            self._captura = None
+            self._loop.set_debug(self._debug_previo)
+            self._loop.slow_callback_duration = self._umbral_previo
+        if not self.seguir_tareas:
+            self.tareas.clear()
+        logger.warning("Perfilador detenido")
+
+    # ─── Muestreo (thread propio) ──────────────────────────────────────────
+
+    def _muestrear(self, ident_loop: int, intervalo: float, duracion: float):
+        limite = time.monotonic() + duracion
+        while not self._parar.wait(intervalo):
+            frame = sys._current_frames().get(ident_loop)
+            if frame is None:
+                break
+            etiqueta = self.etiqueta(asyncio.current_task(self._loop))
+            clave = f"{etiqueta};{pila_colapsada(frame)}"
+            del frame
+            with self._lock_muestras:
+                if clave not in self.muestras and len(self.muestras) >= MAX_PILAS:
+                    clave = f"{etiqueta};(otras)"
+                self.muestras[clave] += 1
+            if time.monotonic() > limite:
+                # Se apaga solo aunque nadie llame a detener
+                self._loop.call_soon_threadsafe(self.detener)
+                break
+
+    def etiqueta(self, tarea: Optional[asyncio.Task]) -> str:
+        if tarea is None:
+            return "(loop)"
+        scope = self.tareas.get(tarea)
+        if scope is None:
+            coro = tarea.get_coro()
+            return f"(tarea {getattr(coro, '__qualname__', '?')})"
+        ruta = scope.get("route")
+        return f"{scope['method']} {ruta.path if ruta is not None else scope['path']}"
+
+    # ─── Lag del event loop ────────────────────────────────────────────────
+
+    async def _medir_lag(self, intervalo: float):
+        loop = asyncio.get_running_loop()
+        while True:
+            antes = loop.time()
+            await asyncio.sleep(intervalo)
+            self.lags.append(max(0.0, loop.time() - antes - intervalo))
+
+    # ─── Reportes ──────────────────────────────────────────────────────────
+
+    def estado(self) -> dict:
+        lags = sorted(self.lags)
+        por_ruta: Counter = Counter()
+        with self._lock_muestras:
+            muestras = list(self.muestras.items())
+        for clave, n in muestras:
+            por_ruta[clave.split(";", 1)[0]] += n
+
+        def percentil(p):
+            return round(lags[min(len(lags) - 1, int(len(lags) * p / 100))] * 1e3, 2) if lags else 0.0
+
+        return {
+            "activo": self.activo,
+            "pid": os.getpid(),
+            "config": self.config,
+            "inicio": self.inicio,
+            "fin": self.fin,
+            "muestras": sum(por_ruta.values()),
+            "muestras_por_ruta": dict(por_ruta.most_common(50)),
+            "lag_ms": {"p50": percentil(50), "p99": percentil(99), "max": round(lags[-1] * 1e3, 2) if lags else 0.0},
+            "callbacks_lentos": list(self.callbacks_lentos),
+        }
+
+    def colapsado(self, ruta: Optional[str] = None) -> str:
+        """
+        Pilas colapsadas, una por línea: "<ruta>;<frame>;...;<frame> <muestras>".
+        """
+        with self._lock_muestras:
+            muestras = self.muestras.most_common()
+        lineas = [
+            f"{clave} {n}" for clave, n in muestras
+            if ruta is None or clave.split(";", 1)[0] == ruta
+        ]
+        return "\n".join(lineas) + "\n"
+
+
+perfilador = Perfilador()
+
+
+class PerfiladoMiddleware:
+    """
+    Mientras el perfilador (o el vigía) está activo, asocia la tarea actual
+    con el scope del pedido para etiquetar las muestras con la ruta.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not (perfilador.activo or perfilador.seguir_tareas) or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        tarea = asyncio.current_task()
+        perfilador.tareas[tarea] = scope
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            perfilador.tareas.pop(tarea, None)
@@ -0,0 +1,271 @@
+"""
+Tareas periódicas del proceso, con horarios tipo cron.
+
+El mantenimiento que no responde a ningún pedido (vencer solicitudes
+olvidadas, recordar pagos, conciliar con Mercado Pago, refrescar tarifas y
+cachés) corre acá, en el event loop del worker, cada tarea en su propia
+asyncio.Task y con un plazo por corrida.
+
+El horario es una expresión cron de cinco campos ("*/15 * * * *",
+"0 9-21 * * 1-5"), evaluada en la zona del planificador, o un intervalo en
+segundos ("300") alineado a múltiplos del intervalo. A cada disparo se le
+suma un jitter al azar entre 0 y `jitter_s`: las réplicas no van a Mongo
+todas en el mismo instante.
+
+Con varias réplicas, una tarea `lider=True` corre en una sola por disparo.
+Antes de correr toma su arriendo: un documento de `arriendos` con `_id` =
+nombre de la tarea, su titular y hasta cuándo vale, tomado con un único
+find_one_and_update con upsert; si está vigente y es de otro, el upsert
+choca con el `_id` y la tarea no corre. El titular lo renueva en cada
+disparo hasta pasado el siguiente, así que lo conserva mientras siga vivo;
+si se cae, el arriendo vence y lo toma otra réplica en su próximo disparo.
+Al apagar se suelta. Las tareas `lider=False` (lo que cada worker tiene en
+memoria) corren en todos.
+
+La duración de cada corrida va a changared_job_duration_seconds{tarea,
+resultado} y lo último de cada tarea a `estado()`.
+
+Configuración por entorno:
+    PLANIFICADOR=true     false: este proceso no corre las tareas de una sola réplica
+    PLANIFICADOR_ZONA=America/Argentina/Buenos_Aires
+"""
+import asyncio
+import logging
+import os
+import random
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, Optional, Union
+from zoneinfo import ZoneInfo
+
+from pymongo.errors import DuplicateKeyError
+
+from fechas import ahora
+from metricas import duracion_tarea
+
+logger = logging.getLogger(__name__)
+
+# (nombre, mínimo, máximo); en el día de la semana 0 y 7 son domingo
+CAMPOS_CRON = (("minuto", 0, 59), ("hora", 0, 23), ("dia", 1, 31), ("mes", 1, 12), ("dia_semana", 0, 7))
+
+
+def valores_cron(texto: str, minimo: int, maximo: int) -> FrozenSet[int]:
+    """
+    Un campo de cron: "*", "5", "1-5", "*/15", "10-50/20", "5/15" o una
+    lista de esos separados por coma.
+    """
+    valores = set()
+    for parte in texto.split(","):
+        rango, _, paso = parte.partition("/")
+        if rango == "*":
+            desde, hasta = minimo, maximo
+        elif "-" in rango:
+            desde, hasta = (int(v) for v in rango.split("-", 1))
+        else:
+            desde = int(rango)
+            hasta = maximo if paso else desde
+        paso = int(paso) if paso else 1
+        if not minimo <= desde <= hasta <= maximo or paso < 1:
+            raise ValueError(f"Campo de cron inválido: '{texto}'")
+        valores.update(range(desde, hasta + 1, paso))
+    return frozenset(valores)
+
+
+class Cron:
+    def __init__(self, expresion: str):
+        campos = expresion.split()
+        if len(campos) != len(CAMPOS_CRON):
+            raise ValueError(f"Cron inválido: '{expresion}' (van cinco campos)")
+        self.expresion = expresion
+        self.minutos, self.horas, self.dias, self.meses, dias_semana = (
+            valores_cron(texto, minimo, maximo) for texto, (_, minimo, maximo) in zip(campos, CAMPOS_CRON)
+        )
+        self.dias_semana = frozenset(dia % 7 for dia in dias_semana)
+        # Como en cron: con día del mes y de la semana restringidos, alcanza con uno
+        self.cualquier_dia = campos[2] == "*" or campos[4] == "*"
+
+    def _dia_coincide(self, fecha: datetime) -> bool:
+        del_mes = fecha.day in self.dias
+        # weekday(): lunes = 0; en cron domingo = 0
+        de_la_semana = (fecha.weekday() + 1) % 7 in self.dias_semana
+        return del_mes and de_la_semana if self.cualquier_dia else del_mes or de_la_semana
+
+    def siguiente(self, desde: datetime) -> datetime:
+        """
+        Primer minuto que coincide estrictamente después de `desde`.
+        """
+        fecha = desde.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limite = fecha + timedelta(days=366 * 4)
+        while fecha < limite:
+            if fecha.month not in self.meses:
+                fecha = (fecha.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._dia_coincide(fecha):
+                fecha = fecha.replace(hour=0, minute=0) + timedelta(days=1)
+            elif fecha.hour not in self.horas:
+                fecha = fecha.replace(minute=0) + timedelta(hours=1)
+            elif fecha.minute not in self.minutos:
+                fecha += timedelta(minutes=1)
+            else:
+                return fecha
+        raise ValueError(f"Cron sin próxima fecha: '{self.expresion}'")
+
+    def __str__(self) -> str:
+        return self.expresion
+
+
+class Intervalo:
+    def __init__(self, segundos: float):
+        if segundos <= 0:
+            raise ValueError("El intervalo tiene que ser positivo")
+        self.segundos = segundos
+
+    def siguiente(self, desde: datetime) -> datetime:
+        # Alineado: todas las réplicas disparan en los mismos instantes
+        marca = (desde.timestamp() // self.segundos + 1) * self.segundos
+        return datetime.fromtimestamp(marca, desde.tzinfo)
+
+    def __str__(self) -> str:
+        return f"cada {self.segundos:g} s"
+
+
+Horario = Union[Cron, Intervalo]
+
+
+def horario_de(texto: str) -> Horario:
+    """
+    "300" -> cada 300 s; cualquier otra cosa se lee como cron.
+    """
+    try:
+        return Intervalo(float(texto))
+    except ValueError:
+        return Cron(texto)
+
+
+class Tarea:
+    def __init__(self, nombre: str, horario: Horario, funcion: Callable[[], Awaitable[Any]], lider: bool,
+                 jitter_s: float, plazo_s: float, al_iniciar: bool):
+        self.nombre = nombre
+        self.horario = horario
+        self.funcion = funcion
+        self.lider = lider
+        self.jitter_s = jitter_s
+        self.plazo_s = plazo_s
+        self.al_iniciar = al_iniciar
+        self.corridas = {"ok": 0, "error": 0, "sin_arriendo": 0}
+        self.proxima: Optional[datetime] = None
+        self.ultima: Optional[dict] = None
+
+
+class Planificador:
+    def __init__(self, db, zona: str = "UTC", activo: bool = True, gracia_s: float = 60):
+        self.db = db
+        self.zona = ZoneInfo(zona)
+        # Si corre las tareas `lider`; las de cada worker corren igual
+        self.activo = activo
+        # Margen del arriendo sobre el próximo disparo del titular
+        self.gracia_s = gracia_s
+        self.titular = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.tareas: Dict[str, Tarea] = {}
+
+    def tarea(self, nombre: str, horario: Union[Horario, str], funcion: Callable[[], Awaitable[Any]],
+              lider: bool = True, jitter_s: float = 30, plazo_s: float = 300, al_iniciar: bool = False) -> Tarea:
+        """
+        Registra `funcion` (una corutina sin argumentos; lo que devuelva
+        queda como detalle de la corrida). Con `al_iniciar` corre también
+        apenas arranca el planificador.
+        """
+        if nombre in self.tareas:
+            raise ValueError(f"Tarea '{nombre}' ya registrada")
+        if isinstance(horario, str):
+            horario = horario_de(horario)
+        tarea = self.tareas[nombre] = Tarea(nombre, horario, funcion, lider, jitter_s, plazo_s, al_iniciar)
+        return tarea
+
+    # ─── CICLO ───────────────────────────────────────────────────────────────
+
+    async def correr(self) -> None:
+        tareas = [tarea for tarea in self.tareas.values() if self.activo or not tarea.lider]
+        await asyncio.gather(*(self._ciclo(tarea) for tarea in tareas))
+
+    async def _ciclo(self, tarea: Tarea) -> None:
+        if tarea.al_iniciar:
+            await self.ejecutar(tarea)
+        while True:
+            momento = datetime.now(self.zona)
+            # Desde el disparo anterior si el sleep despertó antes: no se repite
+            tarea.proxima = tarea.horario.siguiente(max(momento, tarea.proxima or momento))
+            espera = (tarea.proxima - momento).total_seconds() + random.uniform(0, tarea.jitter_s)
+            await asyncio.sleep(max(0.0, espera))
+            await self.ejecutar(tarea)
+
+    async def ejecutar(self, tarea: Tarea) -> None:
+        if tarea.lider and not await self._arrendar(tarea):
+            tarea.corridas["sin_arriendo"] += 1
+            return
+        inicio, momento = time.perf_counter(), ahora()
+        resultado, detalle = "ok", None
+        try:
+            async with asyncio.timeout(tarea.plazo_s):
+                detalle = await tarea.funcion()
+        except Exception as e:
+            resultado, detalle = "error", str(e) or type(e).__name__
+            logger.error("Falló la tarea %s: %s", tarea.nombre, detalle)
+        duracion = time.perf_counter() - inicio
+        duracion_tarea.observar(duracion, tarea.nombre, resultado)
+        tarea.corridas[resultado] += 1
+        tarea.ultima = {"inicio": momento, "duracion_s": round(duracion, 3), "resultado": resultado, "detalle": detalle}
+        logger.info("Tarea periódica", extra={
+            "tarea": tarea.nombre, "resultado": resultado, "duracion_ms": round(duracion * 1e3, 1),
+        })
+
+    # ─── ARRIENDOS ───────────────────────────────────────────────────────────
+
+    async def _arrendar(self, tarea: Tarea) -> bool:
+        momento = ahora()
+        # Hasta pasado el próximo disparo (y el plazo de esta corrida): ahí lo renueva el mismo titular
+        siguiente = tarea.horario.siguiente(datetime.now(self.zona))
+        vence = max(siguiente, momento + timedelta(seconds=tarea.plazo_s))
+        vence += timedelta(seconds=tarea.jitter_s + self.gracia_s)
+        try:
+            await self.db.arriendos.find_one_and_update(
+                {"_id": tarea.nombre, "$or": [{"vence": {"$lt": momento}}, {"titular": self.titular}]},
+                {"$set": {"titular": self.titular, "vence": vence, "renovado": momento}},
+                upsert=True,
+            )
+            return True
+        except DuplicateKeyError:
+            # Vigente y de otra réplica
+            return False
+        except Exception as e:
+            logger.warning("No se pudo tomar el arriendo de %s: %s", tarea.nombre, e)
+            return False
+
+    async def detener(self) -> None:
+        """
+        Suelta los arriendos de este proceso: otra réplica los toma en su
+        próximo disparo, sin esperar a que venzan.
+        """
+        if not self.activo or not any(tarea.lider for tarea in self.tareas.values()):
+            return
+        try:
+            await self.db.arriendos.update_many({"titular": self.titular}, {"$set": {"vence": ahora()}})
+        except Exception as e:
+            logger.warning("No se pudieron soltar los arriendos: %s", e)
+
+    def estado(self) -> dict:
+        return {
+            "activo": self.activo,
+            "titular": self.titular,
+            "tareas": {
+                nombre: {
+                    "horario": str(tarea.horario),
+                    "lider": tarea.lider,
+                    "proxima": tarea.proxima,
+                    "corridas": dict(tarea.corridas),
+                    "ultima": tarea.ultima,
+                }
+                for nombre, tarea in self.tareas.items()
+            },
+        }
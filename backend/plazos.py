@@ -0,0 +1,136 @@
+"""
+Plazos por pedido: un presupuesto de tiempo que comparten Mongo, el LLM y
+las llamadas HTTP del pedido.
+
+PlazosMiddleware fija el presupuesto según la ruta y lo deja en un
+ContextVar. Cada etapa lo consume:
+
+    async with etapa("llm", reserva=2):       # deja 2 s para lo que sigue
+        await cliente_llm...(timeout=timeout_http(20))
+    await db.users.find_one(filtro, max_time_ms=max_time_ms())
+
+Una etapa que se queda sin presupuesto se cancela con TimeoutError; si se
+agota el pedido entero, se cancela y responde 504. La respuesta lleva un
+header Server-Timing con cuánto usó cada etapa.
+"""
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+
+class Plazo:
+    def __init__(self, segundos: float):
+        self.presupuesto = segundos
+        self.inicio = time.monotonic()
+        self.vence = self.inicio + segundos
+        self.etapas: Dict[str, float] = defaultdict(float)
+
+    def restante(self) -> float:
+        return self.vence - time.monotonic()
+
+    def server_timing(self) -> str:
+        partes = [f"{nombre};dur={segundos * 1e3:.1f}" for nombre, segundos in self.etapas.items()]
+        partes.append(f"total;dur={(time.monotonic() - self.inicio) * 1e3:.1f}")
+        partes.append(f'plazo;desc="{self.presupuesto * 1e3:.0f}ms"')
+        return ", ".join(partes)
+
+
+plazo_actual: ContextVar[Optional[Plazo]] = ContextVar("plazo_actual", default=None)
+
+
+def restante() -> Optional[float]:
+    plazo = plazo_actual.get()
+    return plazo.restante() if plazo else None
+
+
+def max_time_ms() -> Optional[int]:
+    """
+    maxTimeMS para Mongo con lo que queda del plazo (None sin plazo).
+    """
+    plazo = plazo_actual.get()
+    return max(1, int(plazo.restante() * 1e3)) if plazo else None
+
+
+def timeout_http(por_defecto: float) -> float:
+    """
+    Timeout para un cliente HTTP: el menor entre su valor por defecto y el plazo.
+    """
+    plazo = plazo_actual.get()
+    return max(0.001, min(por_defecto, plazo.restante())) if plazo else por_defecto
+
+
+@asynccontextmanager
+async def etapa(nombre: str, reserva: float = 0.0):
+    """
+    Mide la etapa contra el plazo del pedido y la cancela con TimeoutError si
+    se pasa. `reserva` son segundos del plazo que la etapa no puede usar.
+    """
+    plazo = plazo_actual.get()
+    if plazo is None:
+        yield
+        return
+    inicio = time.monotonic()
+    try:
+        loop = asyncio.get_running_loop()
+        async with asyncio.timeout_at(loop.time() + plazo.restante() - reserva):
+            yield
+    finally:
+        plazo.etapas[nombre] += time.monotonic() - inicio
+
+
+class PlazosMiddleware:
+    def __init__(self, app, presupuesto: Callable[[str, str], Optional[float]]):
+        self.app = app
+        self.presupuesto = presupuesto
+
+    async def __call__(self, scope, receive, send):
+        segundos = self.presupuesto(scope["method"], scope["path"]) if scope["type"] == "http" else None
+        if segundos is None:
+            await self.app(scope, receive, send)
+            return
+        plazo = Plazo(segundos)
+        token = plazo_actual.set(plazo)
+        iniciada = False
+
+        async def enviar(mensaje):
+            nonlocal iniciada
+            if mensaje["type"] == "http.response.start":
+                iniciada = True
+                mensaje["headers"] = list(mensaje.get("headers", [])) + [
+                    (b"server-timing", plazo.server_timing().encode())
+                ]
+            await send(mensaje)
+
+        try:
+            async with asyncio.timeout(segundos):
+                await self.app(scope, receive, enviar)
+        except TimeoutError:
+            logger.warning(
+                "Pedido cancelado por plazo vencido", extra={
+                    "ruta": scope["path"],
+                    "plazo_s": segundos,
+                    "etapas_ms": {k: round(v * 1e3, 1) for k, v in plazo.etapas.items()},
+                },
+            )
+            if not iniciada:
+                cuerpo = orjson.dumps({"detail": "El pedido excedió su tiempo máximo"})
+                await send({
+                    "type": "http.response.start",
+                    "status": 504,
+                    "headers": [
+                        (b"content-type", b"application/json"),
+                        (b"content-length", str(len(cuerpo)).encode()),
+                        (b"server-timing", plazo.server_timing().encode()),
+                    ],
+                })
+                await send({"type": "http.response.body", "body": cuerpo})
+        finally:
+            plazo_actual.reset(token)
@@ -0,0 +1,317 @@
+"""
+Recursos del proceso: clientes, pools y trabajadores en segundo plano.
+
+Recursos (el contenedor) es el lifespan de la app: cada componente se
+registra con cómo arrancarlo y cómo cerrarlo; al arrancar se inician en
+orden de registro y al apagar se cierran en orden inverso, cada uno con lo
+que quede de un plazo común, así un cierre trabado no impide los demás.
+
+ClienteMongo arma el AsyncIOMotorClient con el pool ajustado, lo calienta
+al arrancar y cuenta conexiones abiertas, en uso y pedidos esperando una.
+
+Importar openai, el SDK de Mercado Pago o armar un contexto SSL cuesta
+cientos de ms: en un deploy serverless eso es tiempo de cold start que
+paga el primer pedido aunque no use esos recursos. Un Perezoso guarda la
+fábrica y construye el objeto al primer uso; `aobtener()` lo hace en un
+thread para no bloquear el event loop, y `precargar()` permite calentarlo
+en segundo plano después del arranque.
+"""
+import asyncio
+import importlib.util
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, Generic, List, Optional, TypeVar
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class Perezoso(Generic[T]):
+    def __init__(self, fabrica: Callable[[], T], nombre: str = ""):
+        self.fabrica = fabrica
+        self.nombre = nombre or getattr(fabrica, "__name__", "recurso")
+        self._valor: Optional[T] = None
+        self._creado = False
+        self._lock = threading.Lock()
+
+    @property
+    def creado(self) -> bool:
+        return self._creado
+
+    def obtener(self) -> T:
+        """
+        Versión síncrona: para código que ya corre en un thread.
+        """
+        if not self._creado:
+            with self._lock:
+                if not self._creado:
+                    self._valor = self.fabrica()
+                    self._creado = True
+        return self._valor
+
+    async def aobtener(self) -> T:
+        if self._creado:
+            return self._valor
+        return await asyncio.to_thread(self.obtener)
+
+    async def precargar(self) -> None:
+        await self.aobtener()
+
+    def descartar(self) -> Optional[T]:
+        """
+        Olvida el objeto (para cerrarlo) y lo devuelve si existía.
+        """
+        with self._lock:
+            valor, self._valor, self._creado = self._valor, None, False
+        return valor
+
+
+# ─── MONGO ───────────────────────────────────────────────────────────────────
+
+class ListenerPool(monitoring.ConnectionPoolListener):
+    """
+    Estado de los pools de conexiones de Motor, por servidor. Los eventos
+    llegan desde los threads de Motor: de ahí el lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pools: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    def _sumar(self, evento, **cambios):
+        direccion = "%s:%s" % evento.address
+        with self._lock:
+            pool = self._pools[direccion]
+            for clave, delta in cambios.items():
+                pool[clave] += delta
+
+    def pool_created(self, event):
+        self._sumar(event)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._sumar(event, limpiezas=1)
+
+    def pool_closed(self, event):
+        with self._lock:
+            self._pools.pop("%s:%s" % event.address, None)
+
+    def connection_created(self, event):
+        self._sumar(event, abiertas=1, creadas=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._sumar(event, abiertas=-1)
+
+    def connection_check_out_started(self, event):
+        self._sumar(event, esperando=1)
+
+    def connection_check_out_failed(self, event):
+        self._sumar(event, esperando=-1, fallidas=1)
+
+    def connection_checked_out(self, event):
+        self._sumar(event, esperando=-1, en_uso=1)
+
+    def connection_checked_in(self, event):
+        self._sumar(event, en_uso=-1)
+
+    def estado(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {direccion: dict(pool) for direccion, pool in self._pools.items()}
+
+
+def compresores_disponibles(pedidos: str) -> List[str]:
+    """
+    Filtra "zstd,snappy,zlib" a los que tienen su paquete instalado, en el
+    orden pedido (Mongo usa el primero que también soporte el servidor).
+    """
+    paquetes = {"zstd": "zstandard", "snappy": "snappy", "zlib": None}
+    elegidos = []
+    for nombre in (p.strip() for p in pedidos.split(",")):
+        if nombre not in paquetes:
+            logger.warning("Compresor de Mongo desconocido: %s", nombre)
+        elif paquetes[nombre] is None or importlib.util.find_spec(paquetes[nombre]):
+            elegidos.append(nombre)
+    return elegidos
+
+
+class ClienteMongo:
+    def __init__(self, url: str, max_pool: int = 50, min_pool: int = 5, compresores: str = "zstd,snappy,zlib",
+                 timeout_conexion_ms: int = 5000, timeout_seleccion_ms: int = 5000,
+                 timeout_espera_pool_ms: int = 5000, inactividad_ms: int = 300_000, listeners=()):
+        self.pool = ListenerPool()
+        self.config = {
+            "maxPoolSize": max_pool,
+            "minPoolSize": min_pool,
+            "compressors": compresores_disponibles(compresores),
+            "connectTimeoutMS": timeout_conexion_ms,
+            "serverSelectionTimeoutMS": timeout_seleccion_ms,
+            "waitQueueTimeoutMS": timeout_espera_pool_ms,
+            "maxIdleTimeMS": inactividad_ms,
+        }
+        # tz_aware: las fechas vuelven en UTC con zona (ver fechas.py)
+        self.cliente = AsyncIOMotorClient(url, event_listeners=[self.pool, *listeners], tz_aware=True, **self.config)
+        self.listo = False
+
+    async def calentar(self):
+        """
+        Un ping fuerza la selección de servidor; después Motor abre en
+        segundo plano las conexiones hasta minPoolSize.
+        """
+        inicio = time.monotonic()
+        try:
+            await self.cliente.admin.command("ping")
+        except Exception as e:
+            logger.warning("Mongo no respondió al calentar el pool: %s", e)
+            return
+        self.listo = True
+        logger.info("Pool de Mongo listo", extra={"duracion_ms": round((time.monotonic() - inicio) * 1e3, 1)})
+
+    def cerrar(self):
+        self.cliente.close()
+
+    def estado(self) -> dict:
+        return {"listo": self.listo, "config": self.config, "pools": self.pool.estado()}
+
+
+# ─── CONTENEDOR ──────────────────────────────────────────────────────────────
+
+Accion = Callable[[], Optional[Awaitable[Any]]]
+
+
+async def _ejecutar(accion: Optional[Accion]):
+    if accion is not None:
+        resultado = accion()
+        if asyncio.iscoroutine(resultado):
+            await resultado
+
+
+class Componente:
+    def __init__(self, nombre: str, iniciar: Optional[Accion], detener: Optional[Accion],
+                 estado: Optional[Callable[[], Any]]):
+        self.nombre = nombre
+        self.iniciar = iniciar
+        self.detener = detener
+        self.estado = estado
+        self.tareas: List[asyncio.Task] = []
+
+
+class Recursos:
+    def __init__(self, plazo_cierre_s: float = 10):
+        self.plazo_cierre_s = plazo_cierre_s
+        self.componentes: Dict[str, Componente] = {}
+        self.iniciado = False
+
+    def registrar(self, nombre: str, iniciar: Optional[Accion] = None, detener: Optional[Accion] = None,
+                  estado: Optional[Callable[[], Any]] = None) -> Componente:
+        """
+        `iniciar` y `detener` pueden ser funciones o corutinas. `iniciar` no
+        debería esperar a la red: lo lento va en un trabajador.
+        """
+        if nombre in self.componentes:
+            raise ValueError(f"Componente '{nombre}' ya registrado")
+        componente = self.componentes[nombre] = Componente(nombre, iniciar, detener, estado)
+        return componente
+
+    def trabajador(self, nombre: str, corutina: Callable[[], Awaitable[Any]], detener: Optional[Accion] = None,
+                   estado: Optional[Callable[[], Any]] = None) -> Componente:
+        """
+        Tarea en segundo plano que corre desde el arranque hasta que termina
+        o se apaga el proceso (ahí se cancela y después se llama `detener`).
+        """
+        componente = self.registrar(nombre, detener=detener, estado=estado)
+        componente.iniciar = lambda: componente.tareas.append(asyncio.create_task(corutina(), name=nombre))
+        return componente
+
+    def cliente(self, nombre: str, recurso: Perezoso, cerrar: Optional[Callable[[Any], Optional[Awaitable[Any]]]] = None,
+                precargar: bool = True) -> Componente:
+        """
+        Cliente perezoso: con `precargar` se calienta en segundo plano al
+        arrancar; al apagar se descarta y, si llegó a crearse, se cierra.
+        """
+        componente = self.registrar(nombre, estado=lambda: {"creado": recurso.creado})
+
+        async def precargar_recurso():
+            try:
+                await recurso.precargar()
+            except Exception as e:
+                # Se reintenta al primer uso
+                logger.warning("No se pudo precargar %s: %s", nombre, e)
+
+        def iniciar():
+            if precargar:
+                componente.tareas.append(asyncio.create_task(precargar_recurso(), name=nombre))
+
+        async def detener():
+            valor = recurso.descartar()
+            if valor is not None and cerrar is not None:
+                await _ejecutar(lambda: cerrar(valor))
+
+        componente.iniciar, componente.detener = iniciar, detener
+        return componente
+
+    async def iniciar(self):
+        for componente in self.componentes.values():
+            inicio = time.monotonic()
+            await _ejecutar(componente.iniciar)
+            logger.debug("Componente iniciado", extra={
+                "componente": componente.nombre, "duracion_ms": round((time.monotonic() - inicio) * 1e3, 1),
+            })
+        self.iniciado = True
+
+    async def detener(self):
+        """
+        En orden inverso al de registro: se cancelan las tareas del
+        componente y se llama a su `detener`. Cada uno tiene lo que quede del
+        plazo de cierre; un error o un cierre vencido no frena al resto.
+        """
+        vence = time.monotonic() + self.plazo_cierre_s
+        for componente in reversed(list(self.componentes.values())):
+            try:
+                async with asyncio.timeout(max(0.1, vence - time.monotonic())):
+                    for tarea in componente.tareas:
+                        tarea.cancel()
+                    await asyncio.gather(*componente.tareas, return_exceptions=True)
+                    await _ejecutar(componente.detener)
+            except TimeoutError:
+                logger.error("Cierre vencido", extra={"componente": componente.nombre})
+            except Exception as e:
+                logger.error("Error cerrando %s: %s", componente.nombre, e)
+            componente.tareas.clear()
+        self.iniciado = False
+
+    @asynccontextmanager
+    async def ciclo_de_vida(self, app):
+        """
+        Lifespan para FastAPI(lifespan=recursos.ciclo_de_vida).
+        """
+        await self.iniciar()
+        try:
+            yield
+        finally:
+            await self.detener()
+
+    def estado(self) -> dict:
+        resultado = {}
+        for componente in self.componentes.values():
+            tareas = [
+                "corriendo" if not t.done() else "cancelada" if t.cancelled()
+                else "error" if t.exception() else "terminada"
+                for t in componente.tareas
+            ]
+            resultado[componente.nombre] = {
+                "tareas": tareas,
+                **({"estado": componente.estado()} if componente.estado else {}),
+            }
+        return {"iniciado": self.iniciado, "componentes": resultado}
@@ -0,0 +1,450 @@
+"""
+Rutas de la API de ChangaRed (frontend principal).
+
+Registro y login en /api/register y /api/login, solicitudes cotizadas con
+el historial de tarifas (o el LLM) que el admin asigna a mano (o al más
+cercano del servicio), sincronización incremental y pago por solicitud.
+"""
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Request, Response
+
+from asignacion import candidatos_para, coordenadas_de_zona, mas_cercano, profesional_mas_cercano
+from autenticacion import (
+    limitador, get_current_user, hash_password, verificar_credenciales, create_token, armar_cuenta,
+)
+from busqueda import buscar_solicitudes
+from clasificacion import cotizar_solicitud
+from datos import (
+    EmailDuplicado, registrar_usuario, buscar_solicitud, listar_solicitudes, insertar_solicitud, actualizar_solicitud,
+    actualizar_solicitudes, profesional_por_id, listar_profesionales,
+)
+from deduplicacion import sin_repetir
+from fechas import a_fecha
+from importacion import FORMATOS, formato_de, importar
+from metricas import RespuestaJSON
+from modelos import (
+    UserRegister, UserLogin, SolicitudCreate, AdminAccion, AdminAccionLote, SolicitudUpdate, SolicitudCierre, Solicitud,
+    SolicitudOut, SolicitudEncontrada, ProfesionalOut, PROYECCION_SOLICITUD,
+)
+from notificaciones import (
+    notificar_telegram, notificar_changarin_email, crear_preferencia_mp, email_asignacion, cola_emails,
+)
+from nucleo import db, deduplicador
+from plazos import max_time_ms
+from sincronizacion import version_confirmada, version_segura
+from tarifas import RECARGO_URGENTE
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+@router.post("/api/register", dependencies=[Depends(limitador.regla("register"))])
+async def register(user_data: UserRegister):
+    # bcrypt tarda cientos de ms de CPU: fuera del event loop
+    user, profesional = armar_cuenta(user_data, await asyncio.to_thread(hash_password, user_data.password))
+
+    try:
+        await registrar_usuario(user.model_dump(), profesional and profesional.model_dump())
+    except EmailDuplicado:
+        raise HTTPException(status_code=400, detail="Email ya registrado")
+
+    if profesional:
+        logger.info(
+            "Profesional registrado",
+            extra={"user_id": user.id, "tipo_servicio": profesional.tipo_servicio, "zona": profesional.zona}
+        )
+
+    token = create_token(user.id, user.rol)
+    return {
+        "token": token,
+        "user": {"id": user.id, "nombre": user.nombre, "email": user.email, "rol": user.rol}
+    }
+
+@router.post("/api/login", dependencies=[Depends(limitador.regla("login"))])
+async def login(user_data: UserLogin):
+    user = await verificar_credenciales(user_data.email, user_data.password)
+    token = create_token(user["id"], user["rol"])
+    return {
+        "token": token,
+        "user": {"id": user["id"], "nombre": user["nombre"], "email": user["email"], "rol": user["rol"]}
+    }
+
+@router.get("/api/me")
+async def get_me(current_user: dict = Depends(get_current_user)):
+    return {
+        "id": current_user["id"],
+        "nombre": current_user["nombre"],
+        "email": current_user["email"],
+        "rol": current_user["rol"]
+    }
+
+@router.post("/api/solicitudes", dependencies=[Depends(limitador.regla("solicitudes"))])
+async def crear_solicitud(solicitud_data: SolicitudCreate, response: Response,
+                          current_user: dict = Depends(get_current_user),
+                          idempotency_key: Optional[str] = Header(default=None, max_length=255)):
+    if current_user["rol"] != "cliente":
+        raise HTTPException(status_code=403, detail="Solo clientes pueden crear solicitudes")
+
+    # Los reenvíos del mismo pedido devuelven la solicitud ya creada
+    return await sin_repetir(
+        deduplicador, current_user["id"], (solicitud_data.mensaje, solicitud_data.zona or "Posadas"),
+        idempotency_key, lambda: nueva_solicitud(solicitud_data, current_user), response,
+    )
+
+async def nueva_solicitud(solicitud_data: SolicitudCreate, current_user: dict) -> Tuple[dict, dict]:
+    clasificacion = await cotizar_solicitud(solicitud_data.mensaje, solicitud_data.zona)
+    servicio_detectado = clasificacion.get("servicio", "técnico general")
+
+    tarifa_min = clasificacion.get("tarifa_min", 15000)
+    tarifa_max = clasificacion.get("tarifa_max", 25000)
+
+    if solicitud_data.urgente:
+        tarifa_min = round(tarifa_min * RECARGO_URGENTE)
+        tarifa_max = round(tarifa_max * RECARGO_URGENTE)
+
+    solicitud = Solicitud(
+        cliente_id=current_user["id"],
+        cliente_nombre=current_user["nombre"],
+        cliente_telefono=current_user.get("telefono", ""),
+        cliente_email=current_user.get("email", ""),
+        mensaje=solicitud_data.mensaje,
+        servicio=servicio_detectado,
+        zona=solicitud_data.zona or "Posadas",
+        urgente=solicitud_data.urgente,
+        estado="pendiente_admin",
+        tarifa_estimada_min=tarifa_min,
+        tarifa_estimada_max=tarifa_max,
+    )
+
+    await insertar_solicitud(solicitud.model_dump())
+
+    pago_prof_min = round(tarifa_min * 0.85)
+    pago_prof_max = round(tarifa_max * 0.85)
+    comision_min  = round(tarifa_min * 0.15)
+    comision_max  = round(tarifa_max * 0.15)
+
+    logger.info(
+        "Solicitud creada",
+        extra={
+            "solicitud_id": solicitud.id,
+            "servicio": servicio_detectado,
+            "urgente": solicitud_data.urgente,
+            "tarifa": [tarifa_min, tarifa_max],
+            "fuente_tarifa": clasificacion["fuente_tarifa"],
+            "pago_profesional": [pago_prof_min, pago_prof_max],
+            "comision": [comision_min, comision_max],
+        }
+    )
+
+    urgente_txt = " - URGENTE" if solicitud_data.urgente else ""
+    lineas = [
+        f"NUEVA SOLICITUD{urgente_txt} - ChangaRed",
+        f"Servicio: {servicio_detectado.upper()}",
+        f"Problema: {solicitud_data.mensaje}",
+        f"Zona: {solicitud_data.zona}",
+        "",
+        f"Cliente: {current_user['nombre']}",
+        f"Tel: {current_user.get('telefono', 'N/A')}",
+        "",
+        f"Precio acordado: ${pago_prof_min:,.0f} - ${pago_prof_max:,.0f}",
+        "",
+        f"ID: {solicitud.id}"
+    ]
+    await notificar_telegram("\n".join(lineas))
+
+    respuesta = {
+        "id": solicitud.id,
+        "servicio": servicio_detectado,
+        "descripcion": clasificacion.get("descripcion", ""),
+        "urgente": solicitud_data.urgente,
+        "estado": "pendiente_admin",
+        "tarifa_estimada_min": tarifa_min,
+        "tarifa_estimada_max": tarifa_max,
+        "mensaje": "Solicitud enviada. Te notificaremos cuando un profesional acepte el trabajo."
+    }
+    # Lo que se ahorra cada reenvío de este pedido
+    llm = clasificacion["fuente_tarifa"] == "llm" and not clasificacion.get("de_cache")
+    return respuesta, {"llm": int(llm), "notificaciones": 1}
+
+@router.put("/api/admin/solicitudes/{solicitud_id}/accion")
+async def admin_accion_solicitud(solicitud_id: str, accion_data: AdminAccion, current_user: dict = Depends(get_current_user)):
+    if current_user["rol"] != "admin":
+        raise HTTPException(status_code=403, detail="Solo admin puede realizar esta accion")
+
+    solicitud = await buscar_solicitud(solicitud_id)
+    if not solicitud:
+        raise HTTPException(status_code=404, detail="Solicitud no encontrada")
+
+    if accion_data.accion == "rechazar":
+        await actualizar_solicitud(solicitud, {"estado": "cancelado"})
+        return {"mensaje": "Solicitud rechazada"}
+
+    profesional_doc = None
+    if accion_data.profesional_id:
+        profesional_doc = await profesional_por_id(accion_data.profesional_id)
+    else:
+        # El disponible más cercano a la zona de la solicitud
+        lat, lon = coordenadas_de_zona(solicitud.get("zona"))
+        cercano = await profesional_mas_cercano(lat, lon, solicitud["servicio"])
+        profesional_doc = cercano and cercano[0]
+
+    if not profesional_doc:
+        raise HTTPException(status_code=404, detail="No hay profesionales disponibles")
+
+    await actualizar_solicitud(solicitud, {
+        "estado": "esperando_pago",
+        "profesional_id": profesional_doc["id"],
+        "profesional_nombre": profesional_doc["nombre"],
+        "profesional_telefono": profesional_doc.get("telefono", ""),
+    })
+
+    await notificar_changarin_email(
+        profesional_email=profesional_doc["email"],
+        profesional_nombre=profesional_doc["nombre"],
+        solicitud=solicitud
+    )
+
+    return {
+        "mensaje": f"Asignado a {profesional_doc['nombre']}. Se notifico al profesional.",
+        "profesional": profesional_doc["nombre"],
+        "estado": "esperando_pago"
+    }
+
+@router.post("/api/admin/solicitudes/acciones")
+async def admin_acciones_lote(lote: AdminAccionLote, current_user: dict = Depends(get_current_user)):
+    """
+    Varias acciones de admin en un pedido, con resultado por ítem. Lee
+    solicitudes y profesionales con un $in cada uno (y los candidatos por
+    cercanía una vez por servicio), escribe todo en un bulk_write y encola
+    un email por profesional con todos sus trabajos nuevos.
+    """
+    if current_user["rol"] != "admin":
+        raise HTTPException(status_code=403, detail="Solo admin puede realizar esta accion")
+
+    ids = list({accion.solicitud_id for accion in lote.acciones})
+    solicitudes = {sol["id"]: sol for sol in await listar_solicitudes({"id": {"$in": ids}}, {"_id": 0})}
+    elegidos = list({a.profesional_id for a in lote.acciones if a.accion == "aceptar" and a.profesional_id})
+    profesionales = {p["id"]: p for p in await listar_profesionales({"id": {"$in": elegidos}})} if elegidos else {}
+    candidatos = {}
+
+    resultados, cambios, vistas = [], [], set()
+    asignadas = defaultdict(list)
+    for accion in lote.acciones:
+        solicitud = solicitudes.get(accion.solicitud_id)
+        if not solicitud or accion.solicitud_id in vistas:
+            motivo = "Solicitud repetida en el lote" if solicitud else "Solicitud no encontrada"
+            resultados.append({"solicitud_id": accion.solicitud_id, "ok": False, "error": motivo})
+            continue
+        vistas.add(accion.solicitud_id)
+
+        if accion.accion == "rechazar":
+            cambios.append((solicitud, {"estado": "cancelado"}))
+            resultados.append({"solicitud_id": accion.solicitud_id, "ok": True, "estado": "cancelado"})
+            continue
+
+        if accion.profesional_id:
+            profesional_doc = profesionales.get(accion.profesional_id)
+        else:
+            servicio = solicitud["servicio"]
+            if servicio not in candidatos:
+                candidatos[servicio] = await candidatos_para(servicio)
+            lat, lon = coordenadas_de_zona(solicitud.get("zona"))
+            cercano = mas_cercano(candidatos[servicio], lat, lon)
+            profesional_doc = cercano and cercano[0]
+        if not profesional_doc:
+            motivo = "Profesional no encontrado" if accion.profesional_id else "No hay profesionales disponibles"
+            resultados.append({"solicitud_id": accion.solicitud_id, "ok": False, "error": motivo})
+            continue
+
+        cambios.append((solicitud, {
+            "estado": "esperando_pago",
+            "profesional_id": profesional_doc["id"],
+            "profesional_nombre": profesional_doc["nombre"],
+            "profesional_telefono": profesional_doc.get("telefono", ""),
+        }))
+        asignadas[profesional_doc["id"]].append((profesional_doc, solicitud))
+        resultados.append({
+            "solicitud_id": accion.solicitud_id, "ok": True, "estado": "esperando_pago",
+            "profesional": profesional_doc["nombre"],
+        })
+
+    await actualizar_solicitudes(cambios)
+
+    for trabajos in asignadas.values():
+        profesional_doc = trabajos[0][0]
+        asunto, cuerpo = email_asignacion(profesional_doc["nombre"], [solicitud for _, solicitud in trabajos])
+        cola_emails.encolar(profesional_doc["email"], asunto, cuerpo)
+
+    return {
+        "aplicadas": len(cambios),
+        "fallidas": len(resultados) - len(cambios),
+        "resultados": resultados,
+    }
+
+@router.get("/api/admin/solicitudes/buscar", response_model=List[SolicitudEncontrada])
+async def buscar_solicitudes_admin(
+    q: str = Query(min_length=2, max_length=200),
+    estado: Optional[str] = None,
+    servicio: Optional[str] = None,
+    zona: Optional[str] = None,
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    limite: int = 20,
+    current_user: dict = Depends(get_current_user),
+):
+    """
+    Solicitudes que mencionan `q` (mensaje, cliente, servicio o zona), de
+    la más relevante a la menos; ver busqueda.py.
+    """
+    if current_user["rol"] != "admin":
+        raise HTTPException(status_code=403, detail="Solo admin puede buscar solicitudes")
+    return RespuestaJSON(await buscar_solicitudes(
+        q, limite, estado=estado, servicio=servicio, zona=zona, desde=a_fecha(desde), hasta=a_fecha(hasta),
+    ))
+
+def filtro_solicitudes(current_user: dict) -> dict:
+    if current_user["rol"] == "cliente":
+        return {"cliente_id": current_user["id"]}
+    if current_user["rol"] == "profesional":
+        return {"profesional_id": current_user["id"]}
+    return {}
+
+def filtro_bajas(current_user: dict) -> dict:
+    if current_user["rol"] == "admin":
+        return {"admin": True}
+    return filtro_solicitudes(current_user)
+
+@router.get("/api/solicitudes", response_model=List[SolicitudOut])
+async def listar_solicitudes_usuario(archivadas: bool = False, current_user: dict = Depends(get_current_user)):
+    # Con ?archivadas=true también las cerradas que ya pasaron al archivo (archivo.py)
+    return RespuestaJSON(await listar_solicitudes(filtro_solicitudes(current_user), archivadas=archivadas))
+
+@router.get("/api/solicitudes/changes")
+async def cambios_solicitudes(since: int = 0, limit: int = 500, current_user: dict = Depends(get_current_user)):
+    limit = max(1, min(limit, 1000))
+    filtro = filtro_solicitudes(current_user)
+
+    if since <= 0:
+        # Primera sincronización: foto completa. La versión se lee antes de la
+        # consulta, así cualquier escritura concurrente llega en el próximo delta.
+        version = await version_confirmada(db)
+        solicitudes = await listar_solicitudes(filtro)
+        return RespuestaJSON({"version": version, "solicitudes": solicitudes, "bajas": [], "hay_mas": False})
+
+    solicitudes = await db.solicitudes.find(
+        {**filtro, "version": {"$gt": since}}, PROYECCION_SOLICITUD, max_time_ms=max_time_ms()
+    ).sort("version", 1).to_list(limit)
+    hasta = solicitudes[-1]["version"] if len(solicitudes) == limit else None
+
+    rango = {"$gt": since} if hasta is None else {"$gt": since, "$lte": hasta}
+    bajas = await db.solicitudes_bajas.find(
+        {**filtro_bajas(current_user), "version": rango}, {"_id": 0, "id": 1, "version": 1, "deleted_at": 1},
+        max_time_ms=max_time_ms()
+    ).sort("version", 1).to_list(limit)
+    if len(bajas) == limit:
+        hasta = bajas[-1]["version"]
+        solicitudes = [sol for sol in solicitudes if sol["version"] <= hasta]
+
+    # Una baja vieja no debe borrar una solicitud que volvió a ser visible
+    vigentes = {sol["id"]: sol["version"] for sol in solicitudes}
+    ids_bajas = [b["id"] for b in bajas if b["version"] > vigentes.get(b["id"], 0)]
+
+    # El cursor no pasa de lo escrito en los últimos segundos: una versión
+    # menor puede no estar confirmada todavía (ver sincronizacion.py)
+    version = version_segura(
+        [(sol["version"], sol.get("updated_at")) for sol in solicitudes] + [(b["version"], b.get("deleted_at")) for b in bajas],
+        since,
+    )
+    return RespuestaJSON({
+        "version": version,
+        "solicitudes": solicitudes,
+        "bajas": ids_bajas,
+        # Si la página entera es reciente el cursor no avanza: que espere al próximo sondeo
+        "hay_mas": hasta is not None and version > since,
+    })
+
+def es_profesional_asignado(solicitud: dict, current_user: dict) -> bool:
+    return current_user["rol"] == "profesional" and solicitud.get("profesional_id") == current_user["id"]
+
+@router.put("/api/solicitudes/{solicitud_id}")
+async def actualizar_solicitud_usuario(solicitud_id: str, update_data: SolicitudUpdate, current_user: dict = Depends(get_current_user)):
+    solicitud = await buscar_solicitud(solicitud_id)
+    if not solicitud:
+        raise HTTPException(status_code=404, detail="Solicitud no encontrada")
+    update_dict = {k: v for k, v in update_data.model_dump().items() if v is not None}
+    # El admin cambia todo; el profesional asignado, el estado; el cliente sólo cancela la suya
+    if current_user["rol"] == "admin":
+        permitido = True
+    elif es_profesional_asignado(solicitud, current_user):
+        permitido = set(update_dict) <= {"estado"}
+    else:
+        permitido = solicitud.get("cliente_id") == current_user["id"] and update_dict == {"estado": "cancelado"}
+    if not permitido:
+        raise HTTPException(status_code=403, detail="No autorizado")
+    await actualizar_solicitud(solicitud, update_dict)
+    return {"mensaje": "Solicitud actualizada"}
+
+@router.post("/api/solicitudes/{solicitud_id}/completar")
+async def completar_solicitud(solicitud_id: str, cierre: SolicitudCierre, current_user: dict = Depends(get_current_user)):
+    # tarifa_final es lo que se cobra y alimenta las cotizaciones: sólo la carga el admin o el profesional asignado
+    solicitud = await buscar_solicitud(solicitud_id)
+    if not solicitud:
+        raise HTTPException(status_code=404, detail="Solicitud no encontrada")
+    if current_user["rol"] != "admin" and not es_profesional_asignado(solicitud, current_user):
+        raise HTTPException(status_code=403, detail="No autorizado")
+    if solicitud.get("estado") in ("completado", "cancelado"):
+        raise HTTPException(status_code=409, detail="La solicitud ya está cerrada")
+    await actualizar_solicitud(solicitud, {"estado": "completado", "tarifa_final": cierre.tarifa_final})
+    return {"mensaje": "Solicitud completada"}
+
+@router.get("/api/profesionales", response_model=List[ProfesionalOut])
+async def ver_profesionales(current_user: dict = Depends(get_current_user)):
+    return RespuestaJSON(await listar_profesionales({}))
+
+@router.post("/api/admin/profesionales/importar")
+async def importar_profesionales(request: Request, formato: Optional[str] = None,
+                                 current_user: dict = Depends(get_current_user)):
+    """
+    Alta masiva: el cuerpo es un CSV (text/csv) o NDJSON (application/x-ndjson)
+    que se procesa a medida que llega. Responde el reporte con un error por
+    fila rechazada (ver importacion.py).
+    """
+    if current_user["rol"] != "admin":
+        raise HTTPException(status_code=403, detail="Solo admin puede importar profesionales")
+    formato = formato or formato_de(request.headers.get("content-type", ""))
+    if formato not in FORMATOS:
+        raise HTTPException(status_code=415, detail="Formato no soportado: enviar CSV o NDJSON")
+
+    reporte = await importar(FORMATOS[formato](request.stream()))
+    logger.info(
+        "Importación de profesionales",
+        extra={"admin_id": current_user["id"], **{k: reporte[k] for k in ("filas", "creadas", "rechazadas")}}
+    )
+    return reporte
+
+@router.put("/api/profesionales/disponibilidad")
+async def actualizar_disponibilidad(disponible: bool, current_user: dict = Depends(get_current_user)):
+    if current_user["rol"] != "profesional":
+        raise HTTPException(status_code=403, detail="Solo profesionales")
+    await db.profesionales.update_one({"id": current_user["id"]}, {"$set": {"disponible": disponible}})
+    return {"mensaje": f"Disponibilidad actualizada a {disponible}"}
+
+@router.post("/api/solicitudes/{solicitud_id}/pago", dependencies=[Depends(limitador.regla("pago"))])
+async def iniciar_pago(solicitud_id: str, current_user: dict = Depends(get_current_user)):
+    solicitud = await buscar_solicitud(solicitud_id)
+    if not solicitud:
+        raise HTTPException(status_code=404, detail="Solicitud no encontrada")
+    if solicitud["cliente_id"] != current_user["id"]:
+        raise HTTPException(status_code=403, detail="No autorizado")
+    monto = solicitud.get("tarifa_final") or solicitud.get("tarifa_estimada_max", 25000)
+    return await crear_preferencia_mp(
+        solicitud_id=solicitud_id,
+        servicio=solicitud["servicio"],
+        monto=monto,
+        cliente_email=current_user["email"]
+    )
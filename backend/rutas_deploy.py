@@ -0,0 +1,300 @@
+"""
+Rutas de la API del paquete de deploy (frontend de changared-deploy).
+
+Auth en /api/auth/*, ABM de profesionales para el admin, solicitudes con
+coordenadas que se asignan solas al profesional más cercano del servicio
+y métricas de negocio en /api/admin/metrics.
+
+Corre sobre el mismo núcleo que rutas_changared: clasificación,
+asignación, auth, límites, plazos y el pool de Mongo son los mismos. El
+LLM sólo clasifica; el profesional lo elige la asignación por cercanía y
+el precio sale de su tarifa base.
+"""
+import asyncio
+import logging
+import uuid
+from typing import List, Literal, Optional, Tuple
+
+from fastapi import APIRouter, HTTPException, Depends, Header, Response
+from pydantic import BaseModel, EmailStr, Field
+
+from archivo import RESUMEN, resumen_archivado
+from asignacion import profesional_mas_cercano
+from autenticacion import (
+    limitador, get_current_user, hash_password, verificar_credenciales, create_token,
+)
+from clasificacion import clasificar_solicitud_ia
+from deduplicacion import sin_repetir
+from fechas import ahora
+from datos import (
+    EmailDuplicado, registrar_usuario, insertar_profesional, actualizar_profesional, borrar_profesional,
+    sumar_servicio_profesional, profesional_por_email, listar_profesionales, buscar_solicitud,
+    listar_solicitudes, insertar_solicitud, actualizar_solicitud,
+)
+from metricas import RespuestaJSON
+from modelos import User, Profesional, ProfesionalOut, Fecha, proyeccion
+from nucleo import db, deduplicador
+from plazos import etapa, max_time_ms
+from tarifas import RECARGO_URGENTE
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api")
+
+COMISION = 0.2
+
+# ─── MODELOS ─────────────────────────────────────────────────────────────────
+
+class RegistroDeploy(BaseModel):
+    email: EmailStr
+    password: str
+    nombre: str
+    telefono: str
+    # El rol admin no se autoasigna: se crea a mano en la base
+    rol: Literal["cliente", "profesional"] = "cliente"
+
+class LoginDeploy(BaseModel):
+    email: EmailStr
+    password: str
+
+class UsuarioOut(BaseModel):
+    id: str
+    email: str
+    nombre: str
+    telefono: str = ""
+    rol: str
+    created_at: Optional[Fecha] = None
+
+class TokenResponse(BaseModel):
+    token: str
+    user: UsuarioOut
+
+class ProfesionalCreate(BaseModel):
+    nombre: str
+    telefono: str
+    email: EmailStr
+    tipo_servicio: str
+    latitud: float
+    longitud: float
+    disponible: bool = True
+    tarifa_base: float = 5000.0
+
+class SolicitudDeployCreate(BaseModel):
+    mensaje_cliente: str
+    latitud: float
+    longitud: float
+    urgencia: Literal["normal", "urgente"] = "normal"
+
+class SolicitudDeploy(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    cliente_id: str
+    cliente_nombre: str
+    mensaje_cliente: str
+    servicio: str
+    profesional_id: str
+    profesional_nombre: str
+    latitud_cliente: float
+    longitud_cliente: float
+    distancia_km: float
+    precio_total: float
+    comision_changared: float
+    pago_profesional: float
+    urgencia: str
+    estado: str = "pendiente"
+    estado_pago: str = "sin_pagar"
+    mercadopago_preference_id: Optional[str] = None
+    mercadopago_payment_id: Optional[str] = None
+    mensaje_respuesta: str
+    created_at: Optional[Fecha] = None
+    version: Optional[int] = None
+
+class MetricasAdmin(BaseModel):
+    total_solicitudes: int
+    solicitudes_completadas: int
+    total_ingresos: float
+    total_comisiones: float
+    profesionales_activos: int
+
+PROYECCION_SOLICITUD_DEPLOY = proyeccion(SolicitudDeploy)
+
+def usuario_out(user: dict) -> UsuarioOut:
+    return UsuarioOut(**{campo: user.get(campo) for campo in UsuarioOut.model_fields if user.get(campo) is not None})
+
+# ─── AUTH ────────────────────────────────────────────────────────────────────
+
+@router.post("/auth/register", response_model=TokenResponse, dependencies=[Depends(limitador.regla("register"))])
+async def register(user_data: RegistroDeploy):
+    user = User(
+        email=user_data.email,
+        nombre=user_data.nombre,
+        telefono=user_data.telefono,
+        # bcrypt tarda cientos de ms de CPU: fuera del event loop
+        password_hash=await asyncio.to_thread(hash_password, user_data.password),
+        rol=user_data.rol,
+    )
+    doc = user.model_dump()
+    try:
+        await registrar_usuario(doc)
+    except EmailDuplicado:
+        raise HTTPException(status_code=400, detail="Email ya registrado")
+    return TokenResponse(token=create_token(user.id, user.rol), user=usuario_out(doc))
+
+@router.post("/auth/login", response_model=TokenResponse, dependencies=[Depends(limitador.regla("login"))])
+async def login(credentials: LoginDeploy):
+    user = await verificar_credenciales(credentials.email, credentials.password)
+    return TokenResponse(token=create_token(user["id"], user["rol"]), user=usuario_out(user))
+
+@router.get("/auth/me", response_model=UsuarioOut)
+async def get_me(current_user: dict = Depends(get_current_user)):
+    return usuario_out(current_user)
+
+# ─── PROFESIONALES ───────────────────────────────────────────────────────────
+
+def solo_admin(current_user: dict):
+    if current_user["rol"] != "admin":
+        raise HTTPException(status_code=403, detail="No autorizado")
+
+@router.get("/profesionales", response_model=List[ProfesionalOut])
+async def get_profesionales(current_user: dict = Depends(get_current_user)):
+    return RespuestaJSON(await listar_profesionales({}))
+
+@router.post("/profesionales", response_model=ProfesionalOut)
+async def create_profesional(prof_data: ProfesionalCreate, current_user: dict = Depends(get_current_user)):
+    solo_admin(current_user)
+    profesional = Profesional(id=str(uuid.uuid4()), **prof_data.model_dump())
+    try:
+        await insertar_profesional(profesional.model_dump())
+    except EmailDuplicado:
+        raise HTTPException(status_code=400, detail="Ya hay un profesional con ese email")
+    return profesional
+
+@router.put("/profesionales/{prof_id}", response_model=ProfesionalOut)
+async def update_profesional(prof_id: str, prof_data: ProfesionalCreate, current_user: dict = Depends(get_current_user)):
+    solo_admin(current_user)
+    try:
+        actualizado = await actualizar_profesional(prof_id, prof_data.model_dump())
+    except EmailDuplicado:
+        raise HTTPException(status_code=400, detail="Ya hay un profesional con ese email")
+    if not actualizado:
+        raise HTTPException(status_code=404, detail="Profesional no encontrado")
+    return actualizado
+
+@router.delete("/profesionales/{prof_id}")
+async def delete_profesional(prof_id: str, current_user: dict = Depends(get_current_user)):
+    solo_admin(current_user)
+    if not await borrar_profesional(prof_id):
+        raise HTTPException(status_code=404, detail="Profesional no encontrado")
+    return {"message": "Profesional eliminado"}
+
+# ─── SOLICITUDES ─────────────────────────────────────────────────────────────
+
+@router.post("/solicitudes", response_model=SolicitudDeploy, dependencies=[Depends(limitador.regla("solicitudes"))])
+async def create_solicitud(solicitud_data: SolicitudDeployCreate, response: Response,
+                           current_user: dict = Depends(get_current_user),
+                           idempotency_key: Optional[str] = Header(default=None, max_length=255)):
+    # Los reenvíos del mismo pedido devuelven la solicitud ya asignada (a ~100 m:
+    # el GPS del teléfono no da dos veces la misma posición)
+    ubicacion = f"{solicitud_data.latitud:.3f},{solicitud_data.longitud:.3f}"
+    return await sin_repetir(
+        deduplicador, current_user["id"], (solicitud_data.mensaje_cliente, ubicacion),
+        idempotency_key, lambda: nueva_solicitud(solicitud_data, current_user), response,
+    )
+
+async def nueva_solicitud(solicitud_data: SolicitudDeployCreate, current_user: dict) -> Tuple[dict, dict]:
+    lat, lon = solicitud_data.latitud, solicitud_data.longitud
+    clasificacion = await clasificar_solicitud_ia(solicitud_data.mensaje_cliente, f"{lat:.4f},{lon:.4f}")
+    cercano = await profesional_mas_cercano(lat, lon, clasificacion.get("servicio"))
+    if not cercano:
+        raise HTTPException(status_code=404, detail="No hay profesionales disponibles")
+    profesional, distancia = cercano
+
+    precio_total = profesional.get("tarifa_base", 5000.0)
+    if solicitud_data.urgencia == "urgente":
+        precio_total *= RECARGO_URGENTE
+    comision = round(precio_total * COMISION, 2)
+
+    solicitud = SolicitudDeploy(
+        cliente_id=current_user["id"],
+        cliente_nombre=current_user["nombre"],
+        mensaje_cliente=solicitud_data.mensaje_cliente,
+        servicio=profesional["tipo_servicio"],
+        profesional_id=profesional["id"],
+        profesional_nombre=profesional["nombre"],
+        latitud_cliente=lat,
+        longitud_cliente=lon,
+        distancia_km=distancia,
+        precio_total=round(precio_total, 2),
+        comision_changared=comision,
+        pago_profesional=round(precio_total - comision, 2),
+        urgencia=solicitud_data.urgencia,
+        mensaje_respuesta=(
+            f"Hola {current_user['nombre']}, hemos asignado un {profesional['tipo_servicio']} para tu "
+            f"solicitud. Precio: ${precio_total:.2f}. ¡Llegará pronto!"
+        ),
+    )
+    doc = solicitud.model_dump()
+    doc["created_at"] = ahora()
+    await insertar_solicitud(doc)
+    await sumar_servicio_profesional(profesional["id"], solicitud.pago_profesional)
+    logger.info(
+        "Solicitud asignada",
+        extra={"solicitud_id": solicitud.id, "profesional_id": profesional["id"], "distancia_km": distancia},
+    )
+    # Lo que se ahorra cada reenvío: la clasificación y una asignación (y su cobro) de más
+    llm = not clasificacion.get("de_cache") and not clasificacion.get("de_palabras")
+    return doc, {"llm": int(llm), "asignaciones": 1}
+
+@router.get("/solicitudes", response_model=List[SolicitudDeploy])
+async def get_solicitudes(archivadas: bool = False, current_user: dict = Depends(get_current_user)):
+    if current_user["rol"] == "admin":
+        query = {}
+    elif current_user["rol"] == "cliente":
+        query = {"cliente_id": current_user["id"]}
+    else:
+        # Los profesionales del ABM no son usuarios: se los vincula por email
+        prof = await profesional_por_email(current_user["email"], {"_id": 0, "id": 1})
+        query = {"profesional_id": prof["id"] if prof else "none"}
+    return RespuestaJSON(await listar_solicitudes(
+        query, PROYECCION_SOLICITUD_DEPLOY, orden=[("created_at", -1)], limite=1000, archivadas=archivadas
+    ))
+
+@router.get("/solicitudes/{solicitud_id}", response_model=SolicitudDeploy)
+async def get_solicitud(solicitud_id: str, archivadas: bool = False, current_user: dict = Depends(get_current_user)):
+    solicitud = await buscar_solicitud(solicitud_id, archivadas=archivadas)
+    if not solicitud:
+        raise HTTPException(status_code=404, detail="Solicitud no encontrada")
+    return solicitud
+
+@router.put("/solicitudes/{solicitud_id}/estado")
+async def update_solicitud_estado(solicitud_id: str, estado: str, current_user: dict = Depends(get_current_user)):
+    solicitud = await buscar_solicitud(solicitud_id)
+    if not solicitud:
+        raise HTTPException(status_code=404, detail="Solicitud no encontrada")
+    await actualizar_solicitud(solicitud, {"estado": estado})
+    return {"message": "Estado actualizado"}
+
+# ─── ADMIN ───────────────────────────────────────────────────────────────────
+
+@router.get("/admin/metrics", response_model=MetricasAdmin)
+async def get_admin_metrics(current_user: dict = Depends(get_current_user)):
+    solo_admin(current_user)
+    # Agregado en Mongo sobre la colección caliente: no se traen las
+    # solicitudes al worker y lo archivado suma desde su resumen
+    ms = max_time_ms()
+    opciones = {"maxTimeMS": ms} if ms else {}
+    async with etapa("mongo"):
+        resumen = await db.solicitudes.aggregate([{"$group": {"_id": None, **RESUMEN}}], **opciones).to_list(1)
+        activos = await db.profesionales.count_documents({"disponible": True}, **opciones)
+    resumen = resumen[0] if resumen else {}
+    archivado = await resumen_archivado()
+    return MetricasAdmin(
+        total_solicitudes=resumen.get("total", 0) + archivado["total"],
+        solicitudes_completadas=resumen.get("completadas", 0) + archivado["completadas"],
+        total_ingresos=resumen.get("ingresos", 0) + archivado["ingresos"],
+        total_comisiones=resumen.get("comisiones", 0) + archivado["comisiones"],
+        profesionales_activos=activos,
+    )
+
+@router.get("/")
+async def root():
+    return {"message": "ChangaRed API v1.0", "status": "operational"}
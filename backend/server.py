@@ -1,31 +1,88 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from dotenv import load_dotenv
+from fastapi import FastAPI, APIRouter, HTTPException, Depends
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from fastapi.security import HTTPAuthorizationCredentials
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import asyncio
 import logging
-import httpx
-import json
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional, Literal
-import uuid
-from datetime import datetime, timezone, timedelta
-from passlib.context import CryptContext
-import jwt
-from openai import AsyncOpenAI
-
-load_dotenv()
-
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional, Tuple
+# Primero el núcleo: carga el .env y configura los logs
+from nucleo import recursos, db, deduplicador, motor_tarifas, planificador, PRECARGA
+from tiempo_real import canal, topicos_de_usuario
+from bus_eventos import BusEventos
+from compresion import CompresionMiddleware
+from logs import RequestIdMiddleware
+from perfilado import perfilador, PerfiladoMiddleware
+from vigilancia import Vigia
+from plazos import PlazosMiddleware
+from admision import ControlAdmision, ClaseAdmision, AdmisionMiddleware
+from metricas import MetricasMiddleware, RespuestaJSON, Indicador, REGISTRO, exponer_todo
+from autenticacion import security_opcional, usuario_desde_token, get_current_user
+from notificaciones import MP_ACCESS_TOKEN
+from asignacion import crear_indices_asignacion
+from busqueda import crear_indice_busqueda
+from datos import crear_indices_registro, duplicados_registro
+from mantenimiento import crear_indices_mantenimiento
+from sincronizacion import crear_indices
 
-app = FastAPI(title="ChangaRed API", version="1.0.0")
+logger = logging.getLogger(__name__)
 
+app = FastAPI(
+    title="ChangaRed API", version="1.0.0",
+    default_response_class=RespuestaJSON, lifespan=recursos.ciclo_de_vida,
+)
+app.state.db = db
+
+# Control de admisión por clase de ruta. Health, /metrics y el SSE no tienen
+# clase: responden aunque el resto esté saturado, y auth tiene la suya para
+# que no compita con las escrituras que esperan al LLM.
+def clase_de_ruta(metodo: str, ruta: str) -> Optional[str]:
+    if ruta in ("/api/health", "/metrics", "/api/eventos", "/", "/api/") or ruta.startswith("/api/admin/"):
+        return None
+    if ruta in ("/api/login", "/api/register", "/api/auth/login", "/api/auth/register"):
+        return "auth"
+    if ruta.startswith("/api/payments/") or ruta.endswith("/pago"):
+        return "pagos"
+    if metodo == "POST" and ruta == "/api/solicitudes":
+        return "llm"
+    return "lectura" if metodo in ("GET", "HEAD") else "escritura"
+
+admision = ControlAdmision(
+    {
+        "lectura": ClaseAdmision(limite_inicial=64, minimo=8, maximo=512, objetivo_ms=1000),
+        "escritura": ClaseAdmision(limite_inicial=32, minimo=4, maximo=256, objetivo_ms=2000),
+        "llm": ClaseAdmision(limite_inicial=16, minimo=2, maximo=128, objetivo_ms=10000),
+        "pagos": ClaseAdmision(limite_inicial=16, minimo=2, maximo=64, objetivo_ms=5000),
+        "auth": ClaseAdmision(limite_inicial=16, minimo=4, maximo=64, objetivo_ms=3000),
+    },
+    clase_de_ruta,
+)
+REGISTRO.extend([
+    Indicador(
+        "changared_admission_limit", "Limite de concurrencia adaptativo por clase de ruta", ("clase",),
+        lambda: {(n,): c.limite for n, c in admision.clases.items()},
+    ),
+    Indicador(
+        "changared_admission_in_flight", "Pedidos en curso por clase de ruta", ("clase",),
+        lambda: {(n,): c.en_curso for n, c in admision.clases.items()},
+    ),
+    Indicador(
+        "changared_admission_rejected_total", "Pedidos rechazados con 503 por clase de ruta", ("clase",),
+        lambda: {(n,): c.rechazados for n, c in admision.clases.items()}, tipo="counter",
+    ),
+])
+
+# Presupuesto de tiempo por clase de ruta, compartido por Mongo, LLM y HTTP
+PLAZOS_S = {"lectura": 5, "escritura": 10, "llm": 25, "pagos": 15, "auth": 10}
+
+def plazo_de_ruta(metodo: str, ruta: str) -> Optional[float]:
+    return PLAZOS_S.get(clase_de_ruta(metodo, ruta))
+
+# Van antes que CORS para quedar por dentro: los 503/504 también llevan los
+# headers CORS. El plazo corre desde que el pedido fue admitido.
+app.add_middleware(PlazosMiddleware, presupuesto=plazo_de_ruta)
+app.add_middleware(AdmisionMiddleware, control=admision)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -39,577 +96,234 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(CompresionMiddleware)
+app.add_middleware(MetricasMiddleware)
+app.add_middleware(PerfiladoMiddleware)
+app.add_middleware(RequestIdMiddleware)
 
-# MongoDB
-MONGO_URL = os.environ.get("MONGO_URL", "")
-client = AsyncIOMotorClient(MONGO_URL)
-db = client.changared
-
-# Auth
-SECRET_KEY = os.environ.get("SECRET_KEY", "changared-secret-key-2024")
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_HOURS = 24
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-security = HTTPBearer()
-
-# LLM
-EMERGENT_API_KEY = os.environ.get("EMERGENT_API_KEY", "")
-
-# Mercado Pago
-MP_ACCESS_TOKEN = os.environ.get("MERCADOPAGO_ACCESS_TOKEN", "")
-MP_PUBLIC_KEY = os.environ.get("MERCADOPAGO_PUBLIC_KEY", "")
-
-# Telegram
-TELEGRAM_BOT_TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN", "")
-TELEGRAM_ADMIN_CHAT_ID = os.environ.get("TELEGRAM_ADMIN_CHAT_ID", "")
-
-# Email
-SMTP_HOST = os.environ.get("SMTP_HOST", "smtp.gmail.com")
-SMTP_PORT = int(os.environ.get("SMTP_PORT", "587"))
-SMTP_USER = os.environ.get("SMTP_USER", "")
-SMTP_PASS = os.environ.get("SMTP_PASS", "")
-
-# ─── MODELOS ────────────────────────────────────────────────────────────────
-
-class UserRegister(BaseModel):
-    nombre: str
-    telefono: str
-    email: EmailStr
-    password: str
-    rol: Literal["cliente", "profesional"]
-    tipo_servicio: Optional[str] = None
-    zona: Optional[str] = None
-
-class UserLogin(BaseModel):
-    email: EmailStr
-    password: str
-
-class SolicitudCreate(BaseModel):
-    mensaje: str
-    zona: Optional[str] = "Posadas"
-    urgente: bool = False
-
-class AdminAccion(BaseModel):
-    accion: Literal["aceptar", "rechazar"]
-    profesional_id: Optional[str] = None
-
-class SolicitudUpdate(BaseModel):
-    estado: Optional[str] = None
-    profesional_id: Optional[str] = None
-
-class User(BaseModel):
-    model_config = ConfigDict(arbitrary_types_allowed=True)
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    nombre: str
-    telefono: str
-    email: str
-    password_hash: str
-    rol: str
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
-
-class Profesional(BaseModel):
-    model_config = ConfigDict(arbitrary_types_allowed=True)
-    id: str
-    nombre: str
-    telefono: str
-    email: str
-    tipo_servicio: str
-    latitud: float
-    longitud: float
-    disponible: bool = True
-    tarifa_base: float = 15000.0
-    calificacion: float = 5.0
-    zona: Optional[str] = "Posadas"
-
-class Solicitud(BaseModel):
-    model_config = ConfigDict(arbitrary_types_allowed=True)
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    cliente_id: str
-    cliente_nombre: str
-    cliente_telefono: str = ""
-    cliente_email: str = ""
-    mensaje: str
-    servicio: str
-    zona: str
-    urgente: bool = False
-    estado: str = "pendiente_admin"
-    profesional_id: Optional[str] = None
-    profesional_nombre: Optional[str] = None
-    profesional_telefono: Optional[str] = None
-    tarifa_estimada_min: Optional[float] = None
-    tarifa_estimada_max: Optional[float] = None
-    tarifa_final: Optional[float] = None
-    pago_id: Optional[str] = None
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
-
-# ─── HELPERS AUTH ────────────────────────────────────────────────────────────
-
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
-
-def verify_password(plain: str, hashed: str) -> bool:
-    return pwd_context.verify(plain, hashed)
-
-def create_token(user_id: str, rol: str) -> str:
-    expire = datetime.now(timezone.utc) + timedelta(hours=ACCESS_TOKEN_EXPIRE_HOURS)
-    return jwt.encode({"sub": user_id, "rol": rol, "exp": expire}, SECRET_KEY, algorithm=ALGORITHM)
-
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id = payload.get("sub")
-        if not user_id:
-            raise HTTPException(status_code=401, detail="Token inválido")
-        user = await db.users.find_one({"id": user_id})
-        if not user:
-            raise HTTPException(status_code=401, detail="Usuario no encontrado")
-        return user
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(status_code=401, detail="Token expirado")
-    except jwt.InvalidTokenError:
-        raise HTTPException(status_code=401, detail="Token inválido")
-
-# ─── TELEGRAM ────────────────────────────────────────────────────────────────
-
-async def notificar_telegram(mensaje: str):
-    if not TELEGRAM_BOT_TOKEN or not TELEGRAM_ADMIN_CHAT_ID:
-        logger.warning("Telegram no configurado")
-        return
-    try:
-        url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-        async with httpx.AsyncClient() as client_http:
-            await client_http.post(url, json={
-                "chat_id": TELEGRAM_ADMIN_CHAT_ID,
-                "text": mensaje,
-                "parse_mode": "HTML"
-            })
-        logger.info("Notificacion Telegram enviada")
-    except Exception as e:
-        logger.error(f"Error Telegram: {e}")
-
-# ─── EMAIL ────────────────────────────────────────────────────────────────────
-
-async def notificar_changarin_email(profesional_email: str, profesional_nombre: str, solicitud: dict):
-    if not SMTP_USER or not SMTP_PASS:
-        logger.warning("Email SMTP no configurado - saltando notificacion")
-        return
-    try:
-        msg = MIMEMultipart("alternative")
-        msg["Subject"] = f"ChangaRed - Nuevo trabajo de {solicitud.get('servicio', '').upper()}"
-        msg["From"] = SMTP_USER
-        msg["To"] = profesional_email
-
-        tarifa_min = solicitud.get("tarifa_estimada_min", 0)
-        tarifa_max = solicitud.get("tarifa_estimada_max", 0)
-
-        cuerpo = f"""
-Hola {profesional_nombre}!
-
-Tenes un nuevo trabajo asignado en ChangaRed:
+# Bus de eventos (change streams) para varios workers/réplicas
+BUS_EVENTOS = os.environ.get("BUS_EVENTOS", "").lower() in ("1", "true", "si")
+BUS_PREIMAGENES = os.environ.get("BUS_PREIMAGENES", "").lower() in ("1", "true", "si")
 
-Servicio: {solicitud.get('servicio', '').upper()}
-Problema: {solicitud.get('mensaje', '')}
-Zona: {solicitud.get('zona', '')}
-{'*** URGENTE ***' if solicitud.get('urgente') else ''}
+# Métricas: si se define, GET /metrics exige "Authorization: Bearer <token>"
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
 
-Cliente: {solicitud.get('cliente_nombre', '')}
-Telefono: {solicitud.get('cliente_telefono', 'Ver en app')}
+# Vigía del event loop: bloqueos más largos que esto se reportan (0 lo apaga)
+VIGIA_UMBRAL_MS = float(os.environ.get("VIGIA_UMBRAL_MS", "100"))
+# Cada cuánto se reintentan los índices que no se pudieron crear
+INDICES_REINTENTO_S = float(os.environ.get("INDICES_REINTENTO_S", "300"))
 
-Tu pago: ${tarifa_min * 0.85:,.0f} - ${tarifa_max * 0.85:,.0f}
+# Conjuntos de rutas a montar sobre el núcleo, separados por coma:
+# "changared" (frontend principal) y/o "deploy" (paquete changared-deploy)
+API_RUTAS = [n.strip() for n in os.environ.get("API_RUTAS", "changared").split(",") if n.strip()]
 
-Saludos,
-Equipo ChangaRed
-        """
-        msg.attach(MIMEText(cuerpo, "plain"))
+class PerfiladoConfig(BaseModel):
+    intervalo_ms: float = Field(5, ge=1, le=1000)
+    umbral_callback_ms: float = Field(50, ge=1)
+    duracion_s: float = Field(60, gt=0, le=600)
+    callbacks_lentos: bool = True
 
-        with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as server:
-            server.starttls()
-            server.login(SMTP_USER, SMTP_PASS)
-            server.sendmail(SMTP_USER, profesional_email, msg.as_string())
-
-        logger.info(f"Email enviado a {profesional_nombre} ({profesional_email})")
-    except Exception as e:
-        logger.error(f"Error enviando email: {e}")
-
-# ─── MERCADO PAGO ─────────────────────────────────────────────────────────────
-
-async def crear_preferencia_mp(solicitud_id: str, servicio: str, monto: float, cliente_email: str) -> dict:
-    if not MP_ACCESS_TOKEN:
-        logger.warning("MERCADOPAGO_ACCESS_TOKEN no configurado")
-        return {"error": "Pago no configurado"}
-    try:
-        payload = {
-            "items": [{
-                "title": f"ChangaRed - {servicio.capitalize()}",
-                "quantity": 1,
-                "unit_price": float(monto),
-                "currency_id": "ARS"
-            }],
-            "payer": {"email": cliente_email},
-            "external_reference": solicitud_id,
-            "back_urls": {
-                "success": "https://changared.com/pago/exitoso",
-                "failure": "https://changared.com/pago/fallido",
-                "pending": "https://changared.com/pago/pendiente"
-            },
-            "auto_return": "approved"
-        }
-        async with httpx.AsyncClient() as client_http:
-            response = await client_http.post(
-                "https://api.mercadopago.com/checkout/preferences",
-                json=payload,
-                headers={
-                    "Authorization": f"Bearer {MP_ACCESS_TOKEN}",
-                    "Content-Type": "application/json"
-                }
-            )
-            data = response.json()
-            return {
-                "preference_id": data.get("id"),
-                "init_point": data.get("init_point"),
-                "sandbox_url": data.get("sandbox_init_point")
-            }
-    except Exception as e:
-        logger.error(f"Error Mercado Pago: {e}")
-        return {"error": str(e)}
-
-# ─── IA ──────────────────────────────────────────────────────────────────────
-
-def detectar_servicio_por_palabras(mensaje: str) -> str:
-    mensaje_lower = mensaje.lower()
-    keywords = {
-        "electricista":               ["luz", "electricidad", "corto", "enchufe", "cable", "interruptor", "tomacorriente", "electricista", "fusible", "tablero"],
-        "plomero":                    ["agua", "caño", "pérdida", "perdida", "canilla", "inodoro", "baño", "desagüe", "plomero", "tubería", "cañería", "pileta"],
-        "gasista":                    ["gas", "garrafa", "calefón", "calefon", "estufa", "calefaccion", "gasista", "termotanque"],
-        "pintor":                     ["pintura", "pintar", "pincel", "rodillo", "pintor", "empapelar"],
-        "carpintero":                 ["madera", "mueble", "carpintero", "bisagra", "placard", "estante"],
-        "limpieza":                   ["limpieza", "limpiar", "alfombra", "ordenar", "limpieza profunda", "mucama"],
-        "jardinero":                  ["jardín", "jardin", "pasto", "plantas", "poda", "cortar pasto", "jardinero", "césped", "cesped"],
-        "cerrajero":                  ["cerradura", "llave", "candado", "cerrajero", "trabada", "quede afuera"],
-        "técnico aire acondicionado": ["aire acondicionado", "split", "no enfría el aire", "calor no baja", "refrigeración aire"],
-        "técnico lavarropas":         ["lavarropas", "lavadora", "lavar ropa", "centrifuga", "centrifugado"],
-        "técnico heladeras":          ["heladera", "freezer", "refrigerador", "no enfría", "no enfria", "heladera rota"],
-        "técnico electrodomésticos":  ["electrodoméstico", "microondas", "horno", "licuadora", "batidora", "televisor", "tv roto", "pantalla"],
-        "albañil":                    ["albañil", "albanil", "revoque", "cemento", "construcción", "rajadura", "grieta", "humedad", "pared rota"],
-        "mudanza":                    ["mudanza", "mudar", "mover muebles", "flete", "transporte muebles"],
-        "técnico general":            ["técnico", "tecnico", "reparación", "reparacion", "arreglo", "no funciona", "roto", "falla"],
-    }
-    for servicio, palabras in keywords.items():
-        if any(p in mensaje_lower for p in palabras):
-            return servicio
-    return "técnico general"
-
-async def clasificar_solicitud_ia(mensaje: str, zona: str) -> dict:
-    try:
-        client_ai = AsyncOpenAI(api_key=EMERGENT_API_KEY)
-        response = await client_ai.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": """Eres un clasificador de servicios para ChangaRed, plataforma de servicios en Misiones, Argentina.
-
-Dado un mensaje de cliente, devuelve SOLO un JSON válido con este formato exacto:
-{
-  "servicio": "tipo_de_servicio",
-  "tarifa_min": 15000,
-  "tarifa_max": 25000,
-  "descripcion": "descripcion breve"
-}
-
-Servicios válidos: electricista, plomero, gasista, pintor, carpintero, limpieza, jardinero, cerrajero, técnico aire acondicionado, técnico lavarropas, técnico heladeras, técnico electrodomésticos, albañil, mudanza, técnico general
-Tarifas en pesos argentinos para Misiones (rango típico 15000-50000).
-NO incluyas texto adicional, SOLO el JSON."""
-                },
-                {
-                    "role": "user",
-                    "content": f"Clasificar: {mensaje} (zona: {zona})"
-                }
-            ]
-        )
-        text = response.choices[0].message.content.strip()
-        if "```" in text:
-            text = text.split("```")[1]
-            if text.startswith("json"):
-                text = text[4:]
-        text = text.strip()
-        return json.loads(text)
-    except Exception as e:
-        logger.error(f"Error IA: {e}")
-        servicio = detectar_servicio_por_palabras(mensaje)
-        return {
-            "servicio": servicio,
-            "tarifa_min": 15000,
-            "tarifa_max": 25000,
-            "descripcion": f"Servicio de {servicio}"
-        }
-
-# ─── RUTAS ───────────────────────────────────────────────────────────────────
+# ─── RUTAS DE INFRAESTRUCTURA ────────────────────────────────────────────────
+# Comunes a todas las APIs: SSE, métricas, health y administración del worker.
 
 router = APIRouter()
 
-@router.post("/api/register")
-async def register(user_data: UserRegister):
-    existing = await db.users.find_one({"email": user_data.email})
-    if existing:
-        raise HTTPException(status_code=400, detail="Email ya registrado")
-
-    user = User(
-        nombre=user_data.nombre,
-        telefono=user_data.telefono,
-        email=user_data.email,
-        password_hash=hash_password(user_data.password),
-        rol=user_data.rol
+@router.get("/api/eventos")
+async def eventos(
+    token: Optional[str] = None,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security_opcional),
+):
+    # EventSource del navegador no permite headers: se acepta ?token= como alternativa
+    if credentials:
+        token = credentials.credentials
+    if not token:
+        raise HTTPException(status_code=401, detail="Token requerido")
+    current_user = await usuario_desde_token(token)
+    sub = canal.suscribir(topicos_de_usuario(current_user))
+    return StreamingResponse(
+        canal.flujo(sub),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
-    user_doc = user.model_dump()
-    user_doc["created_at"] = user_doc["created_at"].isoformat()
-    await db.users.insert_one(user_doc)
-
-    if user_data.rol == "profesional":
-        coordenadas_zona = {
-            "Posadas":                (-27.3621, -55.8948),
-            "Garupá":                 (-27.4833, -55.8167),
-            "Candelaria":             (-27.4667, -55.7500),
-            "Santa Ana":              (-27.3667, -55.5833),
-            "San Ignacio":            (-27.2667, -55.5333),
-            "Jardín América":         (-27.0333, -55.2333),
-            "Oberá":                  (-27.4833, -55.1333),
-            "Apóstoles":              (-27.9167, -55.7500),
-            "Azara":                  (-28.0500, -55.6667),
-            "San José":               (-27.7667, -55.7833),
-            "Eldorado":               (-26.4000, -54.6333),
-            "Puerto Iguazú":          (-25.5972, -54.5789),
-            "Wanda":                  (-25.9667, -54.5667),
-            "Montecarlo":             (-26.5667, -54.7500),
-            "Puerto Rico":            (-26.8000, -55.0167),
-            "Leandro N. Alem":        (-27.6000, -55.3333),
-            "Campo Grande":           (-27.2167, -54.9667),
-            "Aristóbulo del Valle":   (-27.1000, -54.9000),
-            "San Vicente":            (-26.9667, -54.7333),
-            "Bernardo de Irigoyen":   (-26.2667, -53.6500),
-        }
-        lat, lon = coordenadas_zona.get(user_data.zona, (-27.3621, -55.8948))
-
-        profesional = Profesional(
-            id=user.id,
-            nombre=user_data.nombre,
-            telefono=user_data.telefono,
-            email=user_data.email,
-            tipo_servicio=user_data.tipo_servicio or "técnico general",
-            latitud=lat,
-            longitud=lon,
-            disponible=True,
-            tarifa_base=15000.0,
-            zona=user_data.zona or "Posadas"
-        )
-        prof_doc = profesional.model_dump()
-        await db.profesionales.insert_one(prof_doc)
-        logger.info(f"Profesional {user_data.nombre} registrado como {user_data.tipo_servicio} en {user_data.zona}")
-
-    token = create_token(user.id, user.rol)
-    return {
-        "token": token,
-        "user": {"id": user.id, "nombre": user.nombre, "email": user.email, "rol": user.rol}
-    }
-
-@router.post("/api/login")
-async def login(user_data: UserLogin):
-    user = await db.users.find_one({"email": user_data.email})
-    if not user or not verify_password(user_data.password, user["password_hash"]):
-        raise HTTPException(status_code=401, detail="Credenciales inválidas")
-    token = create_token(user["id"], user["rol"])
-    return {
-        "token": token,
-        "user": {"id": user["id"], "nombre": user["nombre"], "email": user["email"], "rol": user["rol"]}
-    }
-
-@router.get("/api/me")
-async def get_me(current_user: dict = Depends(get_current_user)):
-    return {
-        "id": current_user["id"],
-        "nombre": current_user["nombre"],
-        "email": current_user["email"],
-        "rol": current_user["rol"]
-    }
-
-@router.post("/api/solicitudes")
-async def crear_solicitud(solicitud_data: SolicitudCreate, current_user: dict = Depends(get_current_user)):
-    if current_user["rol"] != "cliente":
-        raise HTTPException(status_code=403, detail="Solo clientes pueden crear solicitudes")
-
-    clasificacion = await clasificar_solicitud_ia(solicitud_data.mensaje, solicitud_data.zona)
-    servicio_detectado = clasificacion.get("servicio", "técnico general")
-
-    tarifa_min = clasificacion.get("tarifa_min", 15000)
-    tarifa_max = clasificacion.get("tarifa_max", 25000)
-
-    if solicitud_data.urgente:
-        tarifa_min = round(tarifa_min * 1.30)
-        tarifa_max = round(tarifa_max * 1.30)
-
-    solicitud = Solicitud(
-        cliente_id=current_user["id"],
-        cliente_nombre=current_user["nombre"],
-        cliente_telefono=current_user.get("telefono", ""),
-        cliente_email=current_user.get("email", ""),
-        mensaje=solicitud_data.mensaje,
-        servicio=servicio_detectado,
-        zona=solicitud_data.zona or "Posadas",
-        urgente=solicitud_data.urgente,
-        estado="pendiente_admin",
-        tarifa_estimada_min=tarifa_min,
-        tarifa_estimada_max=tarifa_max,
-    )
-
-    sol_doc = solicitud.model_dump()
-    sol_doc["created_at"] = sol_doc["created_at"].isoformat()
-    await db.solicitudes.insert_one(sol_doc)
 
-    pago_prof_min = round(tarifa_min * 0.85)
-    pago_prof_max = round(tarifa_max * 0.85)
-    comision_min  = round(tarifa_min * 0.15)
-    comision_max  = round(tarifa_max * 0.15)
+@router.get("/metrics", include_in_schema=False)
+async def metrics(credentials: Optional[HTTPAuthorizationCredentials] = Depends(security_opcional)):
+    if METRICS_TOKEN and (not credentials or credentials.credentials != METRICS_TOKEN):
+        raise HTTPException(status_code=401, detail="No autorizado")
+    return PlainTextResponse(exponer_todo(), media_type="text/plain; version=0.0.4")
 
-    logger.info(
-        f"Solicitud {solicitud.id} | {servicio_detectado} | urgente={solicitud_data.urgente} | "
-        f"cliente ve: ${tarifa_min:,.0f}-${tarifa_max:,.0f} | "
-        f"profesional recibe: ${pago_prof_min:,.0f}-${pago_prof_max:,.0f} | "
-        f"comision: ${comision_min:,.0f}-${comision_max:,.0f}"
-    )
-
-    urgente_txt = " - URGENTE" if solicitud_data.urgente else ""
-    lineas = [
-        f"NUEVA SOLICITUD{urgente_txt} - ChangaRed",
-        f"Servicio: {servicio_detectado.upper()}",
-        f"Problema: {solicitud_data.mensaje}",
-        f"Zona: {solicitud_data.zona}",
-        "",
-        f"Cliente: {current_user['nombre']}",
-        f"Tel: {current_user.get('telefono', 'N/A')}",
-        "",
-        f"Precio acordado: ${pago_prof_min:,.0f} - ${pago_prof_max:,.0f}",
-        "",
-        f"ID: {solicitud.id}"
-    ]
-    await notificar_telegram("\n".join(lineas))
-
-    return {
-        "id": solicitud.id,
-        "servicio": servicio_detectado,
-        "descripcion": clasificacion.get("descripcion", ""),
-        "urgente": solicitud_data.urgente,
-        "estado": "pendiente_admin",
-        "tarifa_estimada_min": tarifa_min,
-        "tarifa_estimada_max": tarifa_max,
-        "mensaje": "Solicitud enviada. Te notificaremos cuando un profesional acepte el trabajo."
-    }
-
-@router.put("/api/admin/solicitudes/{solicitud_id}/accion")
-async def admin_accion_solicitud(solicitud_id: str, accion_data: AdminAccion, current_user: dict = Depends(get_current_user)):
+@router.post("/api/admin/perfilado/iniciar")
+async def iniciar_perfilado(config: PerfiladoConfig, current_user: dict = Depends(get_current_user)):
     if current_user["rol"] != "admin":
-        raise HTTPException(status_code=403, detail="Solo admin puede realizar esta accion")
-
-    solicitud = await db.solicitudes.find_one({"id": solicitud_id})
-    if not solicitud:
-        raise HTTPException(status_code=404, detail="Solicitud no encontrada")
-
-    if accion_data.accion == "rechazar":
-        await db.solicitudes.update_one({"id": solicitud_id}, {"$set": {"estado": "cancelado"}})
-        return {"mensaje": "Solicitud rechazada"}
+        raise HTTPException(status_code=403, detail="Solo admin puede perfilar")
+    try:
+        perfilador.iniciar(**config.model_dump())
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return perfilador.estado()
 
-    profesional_doc = None
-    if accion_data.profesional_id:
-        profesional_doc = await db.profesionales.find_one({"id": accion_data.profesional_id})
-    else:
-        profesional_doc = await db.profesionales.find_one({"tipo_servicio": solicitud["servicio"], "disponible": True})
-        if not profesional_doc:
-            profesional_doc = await db.profesionales.find_one({"disponible": True})
-
-    if not profesional_doc:
-        raise HTTPException(status_code=404, detail="No hay profesionales disponibles")
-
-    await db.solicitudes.update_one(
-        {"id": solicitud_id},
-        {"$set": {
-            "estado": "esperando_pago",
-            "profesional_id": profesional_doc["id"],
-            "profesional_nombre": profesional_doc["nombre"],
-            "profesional_telefono": profesional_doc.get("telefono", "")
-        }}
-    )
+@router.post("/api/admin/perfilado/detener")
+async def detener_perfilado(current_user: dict = Depends(get_current_user)):
+    if current_user["rol"] != "admin":
+        raise HTTPException(status_code=403, detail="Solo admin puede perfilar")
+    perfilador.detener()
+    return perfilador.estado()
 
-    await notificar_changarin_email(
-        profesional_email=profesional_doc["email"],
-        profesional_nombre=profesional_doc["nombre"],
-        solicitud=solicitud
-    )
+@router.get("/api/admin/perfilado")
+async def estado_perfilado(current_user: dict = Depends(get_current_user)):
+    if current_user["rol"] != "admin":
+        raise HTTPException(status_code=403, detail="Solo admin puede perfilar")
+    return perfilador.estado()
+
+@router.get("/api/admin/perfilado/flamegraph")
+async def flamegraph_perfilado(ruta: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    """
+    Pilas colapsadas del worker que atiende el pedido (flamegraph.pl, speedscope).
+    """
+    if current_user["rol"] != "admin":
+        raise HTTPException(status_code=403, detail="Solo admin puede perfilar")
+    return PlainTextResponse(perfilador.colapsado(ruta))
 
-    return {
-        "mensaje": f"Asignado a {profesional_doc['nombre']}. Se notifico al profesional.",
-        "profesional": profesional_doc["nombre"],
-        "estado": "esperando_pago"
-    }
-
-@router.get("/api/solicitudes")
-async def listar_solicitudes(current_user: dict = Depends(get_current_user)):
-    if current_user["rol"] == "cliente":
-        cursor = db.solicitudes.find({"cliente_id": current_user["id"]})
-    elif current_user["rol"] == "profesional":
-        cursor = db.solicitudes.find({"profesional_id": current_user["id"]})
-    else:
-        cursor = db.solicitudes.find({})
-    solicitudes = []
-    async for sol in cursor:
-        sol.pop("_id", None)
-        solicitudes.append(sol)
-    return solicitudes
-
-@router.put("/api/solicitudes/{solicitud_id}")
-async def actualizar_solicitud(solicitud_id: str, update_data: SolicitudUpdate, current_user: dict = Depends(get_current_user)):
-    solicitud = await db.solicitudes.find_one({"id": solicitud_id})
-    if not solicitud:
-        raise HTTPException(status_code=404, detail="Solicitud no encontrada")
-    update_dict = {k: v for k, v in update_data.model_dump().items() if v is not None}
-    await db.solicitudes.update_one({"id": solicitud_id}, {"$set": update_dict})
-    return {"mensaje": "Solicitud actualizada"}
-
-@router.get("/api/profesionales")
-async def listar_profesionales(current_user: dict = Depends(get_current_user)):
-    cursor = db.profesionales.find({})
-    profesionales = []
-    async for prof in cursor:
-        prof.pop("_id", None)
-        profesionales.append(prof)
-    return profesionales
-
-@router.put("/api/profesionales/disponibilidad")
-async def actualizar_disponibilidad(disponible: bool, current_user: dict = Depends(get_current_user)):
-    if current_user["rol"] != "profesional":
-        raise HTTPException(status_code=403, detail="Solo profesionales")
-    await db.profesionales.update_one({"id": current_user["id"]}, {"$set": {"disponible": disponible}})
-    return {"mensaje": f"Disponibilidad actualizada a {disponible}"}
-
-@router.post("/api/solicitudes/{solicitud_id}/pago")
-async def iniciar_pago(solicitud_id: str, current_user: dict = Depends(get_current_user)):
-    solicitud = await db.solicitudes.find_one({"id": solicitud_id})
-    if not solicitud:
-        raise HTTPException(status_code=404, detail="Solicitud no encontrada")
-    if solicitud["cliente_id"] != current_user["id"]:
-        raise HTTPException(status_code=403, detail="No autorizado")
-    monto = solicitud.get("tarifa_final") or solicitud.get("tarifa_estimada_max", 25000)
-    return await crear_preferencia_mp(
-        solicitud_id=solicitud_id,
-        servicio=solicitud["servicio"],
-        monto=monto,
-        cliente_email=current_user["email"]
-    )
+@router.get("/api/admin/admision")
+async def estado_admision(current_user: dict = Depends(get_current_user)):
+    if current_user["rol"] != "admin":
+        raise HTTPException(status_code=403, detail="Solo admin puede ver la admision")
+    return admision.estado()
+
+@router.get("/api/admin/bloqueos")
+async def listar_bloqueos(current_user: dict = Depends(get_current_user)):
+    """
+    Últimos bloqueos del event loop detectados en este worker, con su pila.
+    """
+    if current_user["rol"] != "admin":
+        raise HTTPException(status_code=403, detail="Solo admin puede ver los bloqueos")
+    return vigia.estado()
+
+@router.get("/api/admin/recursos")
+async def estado_recursos(current_user: dict = Depends(get_current_user)):
+    """
+    Pools de Mongo, clientes creados y trabajadores en segundo plano de este worker.
+    """
+    if current_user["rol"] != "admin":
+        raise HTTPException(status_code=403, detail="Solo admin puede ver los recursos")
+    return recursos.estado()
 
 @router.get("/api/health")
 async def health():
+    if "registro" in indices_fallidos:
+        # Sin los índices únicos de email el registro puede duplicar cuentas
+        return JSONResponse(status_code=503, content={
+            "status": "degradado", "app": "ChangaRed API", "indices": indices_fallidos,
+        })
     return {"status": "ok", "app": "ChangaRed API"}
 
 @router.get("/")
 async def root():
     return {"message": "ChangaRed API funcionando"}
 
-app.include_router(router)
+# ─── CONJUNTOS DE RUTAS ──────────────────────────────────────────────────────
+
+def routers_de_api(nombre: str) -> APIRouter:
+    # Import diferido: sólo se cargan los conjuntos que se montan
+    if nombre == "changared":
+        from rutas_changared import router as rutas
+    elif nombre == "deploy":
+        from rutas_deploy import router as rutas
+    else:
+        raise RuntimeError(f"API_RUTAS: conjunto de rutas desconocido '{nombre}'")
+    return rutas
+
+def montar_rutas(app: FastAPI, routers: List[Tuple[str, APIRouter]]) -> None:
+    """
+    Incluye los routers y falla al arrancar si dos definen el mismo método
+    y ruta (p. ej. "changared,deploy" comparten POST /api/solicitudes con
+    cuerpos distintos): si no, ganaría en silencio el primero.
+    """
+    vistas = {}
+    for nombre, rutas in routers:
+        for ruta in rutas.routes:
+            for metodo in getattr(ruta, "methods", None) or ():
+                clave = f"{metodo} {ruta.path}"
+                if clave in vistas:
+                    raise RuntimeError(f"{clave} está en las rutas '{vistas[clave]}' y '{nombre}'")
+                vistas[clave] = nombre
+        app.include_router(rutas)
+
+from mercadopago_routes import router as mercadopago_router, sdk as mercadopago_sdk
+montar_rutas(app, [
+    ("infra", router),
+    *((nombre, routers_de_api(nombre)) for nombre in API_RUTAS),
+    ("mercadopago", mercadopago_router),
+])
+
+# ─── RECURSOS ────────────────────────────────────────────────────────────────
+# El núcleo ya registró logs, Mongo y los clientes compartidos; lo de acá se
+# inicia después y se cierra antes que ellos.
+
+vigia = Vigia(VIGIA_UMBRAL_MS)
+recursos.registrar("vigia", iniciar=vigia.iniciar, detener=vigia.detener)
+
+recursos.registrar("perfilador", detener=perfilador.detener, estado=lambda: perfilador.activo)
+
+INDICES = {
+    "sincronizacion": lambda: crear_indices(db),
+    "asignacion": crear_indices_asignacion,
+    "registro": crear_indices_registro,
+    "busqueda": crear_indice_busqueda,
+    "deduplicacion": deduplicador.crear_indices,
+    "mantenimiento": crear_indices_mantenimiento,
+    "tarifas": motor_tarifas.crear_indices,
+}
+
+# Conjunto de índices -> último error, mientras no se pudo crear
+indices_fallidos: Dict[str, str] = {}
+
+async def avisar_duplicados():
+    try:
+        duplicados = await duplicados_registro()
+    except Exception as e:
+        logger.error("No se pudieron buscar emails duplicados: %s", e)
+        return
+    if duplicados:
+        logger.error(
+            "Hay emails con más de una cuenta: el registro queda sin índice único (health 503) hasta corregirlos",
+            extra={"duplicados": duplicados},
+        )
+
+async def crear_indices_en_segundo_plano():
+    # createIndexes es idempotente; esperarlo en el arranque demoraría el
+    # primer pedido de cada cold start. Cada conjunto por separado: uno que
+    # falla no deja sin crear al resto, y se reintenta hasta que sale.
+    pendientes = dict(INDICES)
+    while True:
+        for nombre, crear in list(pendientes.items()):
+            try:
+                await crear()
+            except Exception as e:
+                indices_fallidos[nombre] = str(e)
+                logger.error("Error creando indices de %s: %s", nombre, e)
+                if nombre == "registro":
+                    await avisar_duplicados()
+                continue
+            del pendientes[nombre]
+            indices_fallidos.pop(nombre, None)
+        if not pendientes:
+            return
+        await asyncio.sleep(INDICES_REINTENTO_S)
+
+recursos.trabajador("indices", crear_indices_en_segundo_plano, estado=lambda: {"fallidos": indices_fallidos})
+
+bus = BusEventos(db, preimagenes=BUS_PREIMAGENES)
+
+async def iniciar_bus_eventos():
+    if not BUS_EVENTOS:
+        return
+    componente_bus.tareas.append(asyncio.create_task(canal.alimentar_desde_bus(bus)))
+    await bus.iniciar()
+
+componente_bus = recursos.registrar("bus", iniciar=iniciar_bus_eventos, detener=bus.detener)
+
+recursos.cliente("mercadopago", mercadopago_sdk, precargar=PRECARGA and bool(MP_ACCESS_TOKEN))
+
+# Último: se detiene antes que los clientes y la cola de emails que usan sus tareas
+recursos.trabajador("planificador", planificador.correr, detener=planificador.detener, estado=planificador.estado)
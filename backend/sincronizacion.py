@@ -0,0 +1,116 @@
+"""
+Versionado de solicitudes para sincronización incremental.
+
+Cada escritura sobre `solicitudes` toma un número de `version` de un
+contador global monotónico (colección `contadores`) y actualiza `updated_at`.
+Un cliente guarda la última versión que vio y pide sólo lo posterior a
+GET /api/solicitudes/changes?since=<version>.
+
+Cuando una solicitud deja de ser visible para alguien (se borra, se archiva
+o se reasigna a otro profesional) queda una baja en `solicitudes_bajas`
+con su propia versión, para que el cliente la quite de su lista local.
+
+La versión se reserva antes de escribir, así que dos escrituras
+concurrentes pueden confirmarse en otro orden (la v6 visible antes que la
+v5). Por eso la versión que se le devuelve al cliente como cursor no es la
+mayor que vio sino la mayor escrita hace más de SYNC_MARGEN_S segundos
+(ver version_segura): lo más nuevo se le manda igual y vuelve a llegar en
+el próximo delta, que se aplica como reemplazo por id.
+"""
+import os
+from datetime import datetime, timedelta
+from typing import Iterable, Optional, Tuple
+
+from pymongo import ReturnDocument
+
+from fechas import a_fecha, ahora
+
+CONTADOR_SOLICITUDES = "solicitudes"
+# Lo que puede tardar una escritura entre reservar su versión y confirmarse
+MARGEN_S = float(os.environ.get("SYNC_MARGEN_S", "10"))
+
+
+async def siguiente_version(db, cantidad: int = 1) -> int:
+    """
+    Reserva `cantidad` versiones consecutivas y devuelve la última.
+    """
+    doc = await db.contadores.find_one_and_update(
+        {"_id": CONTADOR_SOLICITUDES},
+        {"$inc": {"valor": cantidad}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return doc["valor"]
+
+
+async def version_confirmada(db) -> int:
+    """
+    Cursor para una foto completa: la mayor versión escrita hace más de
+    MARGEN_S (en solicitudes o bajas). Se lee antes de la foto; por el
+    índice de versión, de la más nueva hacia atrás, sólo recorre lo escrito
+    en el margen.
+    """
+    limite = ahora() - timedelta(seconds=MARGEN_S)
+    versiones = [0]
+    for coleccion, campo in ((db.solicitudes, "updated_at"), (db.solicitudes_bajas, "deleted_at")):
+        docs = await coleccion.find(
+            {"version": {"$ne": None}, campo: {"$lt": limite}}, {"_id": 0, "version": 1}
+        ).sort("version", -1).limit(1).to_list(1)
+        versiones += [doc["version"] for doc in docs]
+    return max(versiones)
+
+
+async def marca_cambio(db) -> dict:
+    """
+    Campos a incluir en el $set (o en el documento insertado) de cualquier
+    escritura sobre `solicitudes`.
+    """
+    return {"version": await siguiente_version(db), "updated_at": ahora()}
+
+
+def version_segura(cambios: Iterable[Tuple[int, Optional[datetime]]], desde: int) -> int:
+    """
+    Hasta dónde puede avanzar el cursor de un cliente que recibió `cambios`
+    (versión, fecha de escritura). Toda versión menor que una escrita hace
+    más de MARGEN_S se reservó antes que ella, así que ya está confirmada:
+    el cursor no salta ninguna que todavía no se vea.
+    """
+    limite = ahora() - timedelta(seconds=MARGEN_S)
+    return max((version for version, fecha in cambios if fecha and a_fecha(fecha) < limite), default=desde)
+
+
+async def registrar_bajas(db, solicitudes: Iterable[dict], motivo: str, solo_profesional: Optional[str] = None) -> None:
+    """
+    Deja una baja por cada solicitud. Con `solo_profesional` la baja es
+    únicamente para ese profesional (reasignación); el cliente y el admin
+    la siguen viendo.
+    """
+    solicitudes = list(solicitudes)
+    if not solicitudes:
+        return
+    ultima = await siguiente_version(db, len(solicitudes))
+    momento = ahora()
+    bajas = []
+    for n, sol in enumerate(solicitudes):
+        baja = {
+            "id": sol["id"],
+            "version": ultima - len(solicitudes) + 1 + n,
+            "motivo": motivo,
+            "deleted_at": momento,
+            "profesional_id": solo_profesional or sol.get("profesional_id"),
+        }
+        if not solo_profesional:
+            baja["cliente_id"] = sol.get("cliente_id")
+            baja["admin"] = True
+        bajas.append(baja)
+    await db.solicitudes_bajas.insert_many(bajas)
+
+
+async def crear_indices(db) -> None:
+    await db.solicitudes.create_index("version")
+    await db.solicitudes.create_index([("cliente_id", 1), ("version", 1)])
+    await db.solicitudes.create_index([("profesional_id", 1), ("version", 1)])
+    await db.solicitudes_bajas.create_index([("cliente_id", 1), ("version", 1)])
+    await db.solicitudes_bajas.create_index([("profesional_id", 1), ("version", 1)])
+    await db.solicitudes_bajas.create_index([("admin", 1), ("version", 1)])
+    await db.solicitudes_bajas.create_index("version")
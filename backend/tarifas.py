@@ -0,0 +1,291 @@
+"""
+Motor de tarifas: rangos de precio por (servicio, zona) aprendidos de las
+solicitudes completadas.
+
+Cada vez que una solicitud pasa a "completado" con `tarifa_final`, el
+precio (sin el recargo de urgencia) entra a un sketch de cuantiles de su
+servicio y zona, y al de su servicio en todas las zonas. La cotización es
+el rango entre dos cuantiles (p25-p75 por defecto) y se responde en
+memoria, sin Mongo ni LLM; el LLM queda para los servicios y zonas que
+todavía no juntaron TARIFAS_MIN_MUESTRAS.
+
+Los sketches (DDSketch) guardan cuentas por cubo logarítmico, así que se
+mezclan sumando: cada worker acumula lo que observó y cada
+TARIFAS_PERSISTIR_S (una tarea del planificador, en todos los workers) lo
+suma con $inc en la colección `tarifas` y relee lo de los demás. La
+primera vez se arman desde el historial de solicitudes (una sola vez por
+base, ver reconstruir_historial).
+
+Configuración por entorno:
+    TARIFAS_MIN_MUESTRAS=5     muestras para cotizar sin el LLM
+    TARIFAS_PERSISTIR_S=60
+"""
+import asyncio
+import logging
+import math
+from datetime import timedelta
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from fechas import ahora
+
+logger = logging.getLogger(__name__)
+
+RECARGO_URGENTE = 1.30
+ESTADO_CERRADO = "completado"
+TODAS_LAS_ZONAS = "*"
+MARCA_HISTORIAL = "_historial"
+# Una reconstrucción en curso sin terminar después de esto se da por caída
+RECONSTRUIR_PLAZO_S = 600
+
+Clave = Tuple[str, str]
+
+
+class SketchPrecios:
+    """
+    Cuantiles con error relativo acotado (DDSketch). Cada precio cae en el
+    cubo ceil(log_gamma(precio)) y el cuantil q es el cubo donde la cuenta
+    acumulada pasa q·n: con ERROR_RELATIVO = 1% un p75 de $20.000 sale
+    entre $19.800 y $20.200, con unos cientos de cubos para todo el rango
+    de precios.
+    """
+
+    ERROR_RELATIVO = 0.01
+    GAMMA = (1 + ERROR_RELATIVO) / (1 - ERROR_RELATIVO)
+    LOG_GAMMA = math.log(GAMMA)
+
+    def __init__(self, cubos: Optional[Dict[int, int]] = None):
+        self.cubos: Dict[int, int] = dict(cubos or {})
+        self.cuenta = sum(self.cubos.values())
+
+    def agregar(self, precio: float, veces: int = 1) -> None:
+        if precio <= 0:
+            return
+        cubo = math.ceil(math.log(precio) / self.LOG_GAMMA)
+        self.cubos[cubo] = self.cubos.get(cubo, 0) + veces
+        self.cuenta += veces
+
+    def mezclar(self, otro: "SketchPrecios") -> None:
+        for cubo, veces in otro.cubos.items():
+            self.cubos[cubo] = self.cubos.get(cubo, 0) + veces
+        self.cuenta += otro.cuenta
+
+    def cuantil(self, q: float) -> Optional[float]:
+        if not self.cuenta:
+            return None
+        rango = q * (self.cuenta - 1)
+        acumulado = 0
+        for cubo in sorted(self.cubos):
+            acumulado += self.cubos[cubo]
+            if acumulado > rango:
+                break
+        # Punto medio (en error relativo) del cubo (gamma^(i-1), gamma^i]
+        return 2 * self.GAMMA ** cubo / (self.GAMMA + 1)
+
+    @classmethod
+    def desde_documento(cls, cubos: Dict[str, int]) -> "SketchPrecios":
+        return cls({int(cubo): veces for cubo, veces in cubos.items()})
+
+
+def normalizar(texto: Optional[str]) -> str:
+    return (texto or "").strip().lower()
+
+
+def claves_de(servicio: str, zona: str) -> Tuple[Clave, Clave]:
+    servicio = normalizar(servicio)
+    return (servicio, normalizar(zona)), (servicio, TODAS_LAS_ZONAS)
+
+
+def precio_base(tarifa: float, urgente: bool = False) -> float:
+    return tarifa / RECARGO_URGENTE if urgente else tarifa
+
+
+class MotorTarifas:
+    def __init__(self, db, min_muestras: int = 5,
+                 cuantiles: Tuple[float, float] = (0.25, 0.75), redondeo: int = 100):
+        self.db = db
+        self.min_muestras = min_muestras
+        self.cuantiles = cuantiles
+        self.redondeo = redondeo
+        self.sketches: Dict[Clave, SketchPrecios] = {}
+        # Lo observado por este worker que todavía no se sumó en Mongo
+        self.pendientes: Dict[Clave, SketchPrecios] = {}
+        # Rangos ya calculados; se invalidan al observar o recargar
+        self._rangos: Dict[Clave, Optional[Tuple[float, float]]] = {}
+        self.cargado = False
+        self._reconstruccion: Optional[asyncio.Task] = None
+
+    # ─── COTIZACIÓN ──────────────────────────────────────────────────────────
+
+    def cotizar(self, servicio: str, zona: Optional[str]) -> Optional[Tuple[float, float]]:
+        """
+        (tarifa_min, tarifa_max) sin recargo de urgencia, o None si ni la
+        zona ni el servicio en general tienen muestras suficientes.
+        """
+        servicio = normalizar(servicio)
+        return self._rango((servicio, normalizar(zona))) or self._rango((servicio, TODAS_LAS_ZONAS))
+
+    def _rango(self, clave: Clave) -> Optional[Tuple[float, float]]:
+        if clave in self._rangos:
+            return self._rangos[clave]
+        sketch = self.sketches.get(clave)
+        if sketch is None:
+            # Sin cachear: la zona es texto libre del cliente
+            return None
+        rango = None
+        if sketch.cuenta >= self.min_muestras:
+            rango = tuple(round(sketch.cuantil(q) / self.redondeo) * self.redondeo for q in self.cuantiles)
+        self._rangos[clave] = rango
+        return rango
+
+    # ─── OBSERVACIÓN ─────────────────────────────────────────────────────────
+
+    def observar(self, servicio: str, zona: str, tarifa: float, urgente: bool = False) -> None:
+        precio = precio_base(tarifa, urgente)
+        for clave in claves_de(servicio, zona):
+            self.sketches.setdefault(clave, SketchPrecios()).agregar(precio)
+            self.pendientes.setdefault(clave, SketchPrecios()).agregar(precio)
+            self._rangos.pop(clave, None)
+
+    def observar_cierre(self, antes: dict, despues: dict) -> None:
+        """
+        Suma `despues` si con este cambio quedó completada y con tarifa
+        final (y antes no lo estaba), sea cual sea la API que lo escribió.
+        """
+        def cerrada(sol):
+            return sol.get("estado") == ESTADO_CERRADO and (sol.get("tarifa_final") or 0) > 0
+
+        if cerrada(despues) and not cerrada(antes) and despues.get("servicio") and despues.get("zona"):
+            self.observar(despues["servicio"], despues["zona"], despues["tarifa_final"], despues.get("urgente", False))
+
+    # ─── PERSISTENCIA ────────────────────────────────────────────────────────
+
+    async def persistir(self) -> None:
+        pendientes, self.pendientes = self.pendientes, {}
+        if not pendientes:
+            return
+        momento = ahora()
+        # En el orden de las operaciones: los errores del bulk vienen por índice
+        claves = list(pendientes)
+        operaciones = [
+            UpdateOne(
+                {"_id": f"{servicio}|{zona}"},
+                {
+                    "$set": {"servicio": servicio, "zona": zona, "actualizado": momento},
+                    "$inc": {"cuenta": sketch.cuenta, **{f"cubos.{c}": v for c, v in sketch.cubos.items()}},
+                },
+                upsert=True,
+            )
+            for (servicio, zona), sketch in pendientes.items()
+        ]
+        try:
+            await self.db.tarifas.bulk_write(operaciones, ordered=False)
+        except BulkWriteError as e:
+            # Las demás ya se sumaron: sólo las fallidas vuelven para la próxima vuelta
+            self._reencolar(pendientes, [claves[error["index"]] for error in e.details.get("writeErrors", [])])
+            raise
+        except Exception:
+            # Sin respuesta no se sabe qué se aplicó: se reintenta todo
+            self._reencolar(pendientes, claves)
+            raise
+
+    def _reencolar(self, pendientes: Dict[Clave, SketchPrecios], claves: List[Clave]) -> None:
+        for clave in claves:
+            self.pendientes.setdefault(clave, SketchPrecios()).mezclar(pendientes[clave])
+
+    async def cargar(self) -> None:
+        """
+        Reemplaza los sketches por los de Mongo (lo de todos los workers)
+        más lo que este worker todavía no persistió.
+        """
+        sketches = {}
+        async for doc in self.db.tarifas.find({"servicio": {"$exists": True}}):
+            sketches[(doc["servicio"], doc["zona"])] = SketchPrecios.desde_documento(doc.get("cubos", {}))
+        for clave, sketch in self.pendientes.items():
+            sketches.setdefault(clave, SketchPrecios()).mezclar(sketch)
+        self.sketches = sketches
+        self._rangos = {}
+        self.cargado = True
+
+    async def reconstruir_historial(self) -> bool:
+        """
+        Observa las solicitudes completadas antes de la primera vez que se
+        corrió. Una sola vez por base: la marca en `tarifas` queda "en
+        curso" mientras se arma y se completa cuando el historial ya está en
+        `pendientes` y se intentó persistir (lo que no se sumó se reintenta
+        con ellos). Si el worker se cae antes, pasado RECONSTRUIR_PLAZO_S la
+        toma otro.
+        """
+        momento = ahora()
+        try:
+            marca = await self.db.tarifas.find_one_and_update(
+                {
+                    "_id": MARCA_HISTORIAL,
+                    "completa": False,
+                    "reclamada": {"$lt": momento - timedelta(seconds=RECONSTRUIR_PLAZO_S)},
+                },
+                {"$set": {"reclamada": momento}, "$setOnInsert": {"inicio": momento}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            # Completa, o la está armando otro worker
+            return False
+        # Lo completado desde la primera vez ya se observó en vivo; las
+        # fechas todavía en texto son anteriores a la migración (ver fechas.py).
+        # estado + tarifa_final van por el índice de crear_indices
+        filtro = {
+            "estado": ESTADO_CERRADO,
+            "tarifa_final": {"$gt": 0},
+            "$or": [
+                {"updated_at": {"$lt": marca["inicio"]}},
+                {"updated_at": {"$type": "string"}},
+                {"updated_at": {"$exists": False}},
+            ],
+        }
+        cursor = self.db.solicitudes.find(filtro, {"_id": 0, "servicio": 1, "zona": 1, "tarifa_final": 1, "urgente": 1})
+        # Aparte hasta terminar: un persistir a mitad de la recorrida (el
+        # del cierre de la app) sumaría sólo una parte
+        historial: Dict[Clave, SketchPrecios] = {}
+        observadas = 0
+        async for sol in cursor:
+            if sol.get("servicio") and sol.get("zona"):
+                precio = precio_base(sol["tarifa_final"], sol.get("urgente", False))
+                for clave in claves_de(sol["servicio"], sol["zona"]):
+                    historial.setdefault(clave, SketchPrecios()).agregar(precio)
+                observadas += 1
+        for clave, sketch in historial.items():
+            self.sketches.setdefault(clave, SketchPrecios()).mezclar(sketch)
+            self._rangos.pop(clave, None)
+        self._reencolar(historial, list(historial))
+        try:
+            await self.persistir()
+        finally:
+            await self.db.tarifas.update_one({"_id": MARCA_HISTORIAL}, {"$set": {"completa": True}})
+        logger.info("Tarifas reconstruidas desde el historial", extra={"solicitudes": observadas})
+        return True
+
+    async def sincronizar(self) -> None:
+        if not self.cargado:
+            # La recorrida puede durar más que el plazo de la tarea: sigue
+            # aparte y el próximo disparo la espera en vez de empezar otra
+            if self._reconstruccion is None or self._reconstruccion.cancelled() or (
+                self._reconstruccion.done() and self._reconstruccion.exception()
+            ):
+                self._reconstruccion = asyncio.create_task(self.reconstruir_historial())
+            await asyncio.shield(self._reconstruccion)
+        await self.persistir()
+        await self.cargar()
+
+    async def crear_indices(self) -> None:
+        await self.db.solicitudes.create_index([("estado", 1), ("tarifa_final", 1)])
+
+    def estado(self) -> dict:
+        return {
+            "cargado": self.cargado,
+            "sketches": len(self.sketches),
+            "cotizables": sum(1 for s in self.sketches.values() if s.cuenta >= self.min_muestras),
+            "pendientes": sum(s.cuenta for (_, zona), s in self.pendientes.items() if zona == TODAS_LAS_ZONAS),
+        }
@@ -0,0 +1,162 @@
+"""
+Canal de eventos en tiempo real (Server-Sent Events).
+
+Cada usuario se suscribe a su tópico (admin, cliente:<id> o profesional:<id>)
+y recibe los cambios de estado de sus solicitudes a medida que ocurren, en
+lugar de volver a pedir GET /api/solicitudes.
+
+Con un solo worker los handlers publican directo. Con varios workers el
+canal se alimenta del bus de eventos (change streams) y las publicaciones
+locales se ignoran, para que cada worker vea todas las escrituras una vez.
+"""
+import asyncio
+import json
+import logging
+from typing import Dict, Iterable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+TOPICO_ADMIN = "admin"
+COLA_MAX = 100
+KEEPALIVE_SEGUNDOS = 15.0
+
+# Campos de la solicitud que viajan en cada evento (no el documento entero)
+CAMPOS_EVENTO = (
+    "id", "estado", "estado_pago", "servicio", "zona", "urgente",
+    "cliente_id", "cliente_nombre", "profesional_id", "profesional_nombre",
+    "tarifa_estimada_min", "tarifa_estimada_max", "tarifa_final", "pago_id",
+    "version",
+)
+
+
+def topicos_de_usuario(user: dict) -> List[str]:
+    if user["rol"] == "admin":
+        return [TOPICO_ADMIN]
+    return [f"{user['rol']}:{user['id']}"]
+
+
+def topicos_de_solicitud(solicitud: dict) -> Set[str]:
+    topicos = {TOPICO_ADMIN}
+    if solicitud.get("cliente_id"):
+        topicos.add(f"cliente:{solicitud['cliente_id']}")
+    if solicitud.get("profesional_id"):
+        topicos.add(f"profesional:{solicitud['profesional_id']}")
+    return topicos
+
+
+class Suscripcion:
+    __slots__ = ("topicos", "cola", "perdidos")
+
+    def __init__(self, topicos: List[str], cola_max: int):
+        self.topicos = topicos
+        self.cola: asyncio.Queue = asyncio.Queue(maxsize=cola_max)
+        self.perdidos = 0
+
+    def entregar(self, mensaje: str) -> None:
+        # Un suscriptor lento no frena al resto: se descarta su evento más viejo
+        try:
+            self.cola.put_nowait(mensaje)
+        except asyncio.QueueFull:
+            self.cola.get_nowait()
+            self.perdidos += 1
+            self.cola.put_nowait(mensaje)
+
+
+class CanalEventos:
+    def __init__(self, cola_max: int = COLA_MAX, keepalive: float = KEEPALIVE_SEGUNDOS):
+        self.cola_max = cola_max
+        self.keepalive = keepalive
+        self._topicos: Dict[str, Set[Suscripcion]] = {}
+        self._via_bus = False
+
+    @property
+    def suscriptores(self) -> int:
+        return sum(len(subs) for subs in self._topicos.values())
+
+    def suscribir(self, topicos: List[str]) -> Suscripcion:
+        sub = Suscripcion(topicos, self.cola_max)
+        for topico in topicos:
+            self._topicos.setdefault(topico, set()).add(sub)
+        return sub
+
+    def desuscribir(self, sub: Suscripcion) -> None:
+        for topico in sub.topicos:
+            subs = self._topicos.get(topico)
+            if subs is None:
+                continue
+            subs.discard(sub)
+            if not subs:
+                del self._topicos[topico]
+
+    def publicar(self, tipo: str, datos: dict, topicos: Iterable[str]) -> int:
+        """
+        Publica un evento en los tópicos indicados y devuelve a cuántos
+        suscriptores se entregó. El mensaje se serializa una sola vez,
+        sin importar la cantidad de suscriptores.
+        """
+        destinatarios: Set[Suscripcion] = set()
+        for topico in topicos:
+            destinatarios.update(self._topicos.get(topico, ()))
+        if not destinatarios:
+            return 0
+        mensaje = f"event: {tipo}\ndata: {json.dumps(datos, default=str)}\n\n"
+        for sub in destinatarios:
+            sub.entregar(mensaje)
+        return len(destinatarios)
+
+    def publicar_solicitud(self, tipo: str, solicitud: dict, anterior: Optional[dict] = None) -> int:
+        if self._via_bus:
+            return 0
+        return self._publicar_solicitud(tipo, solicitud, anterior)
+
+    def _publicar_solicitud(self, tipo: str, solicitud: dict, anterior: Optional[dict]) -> int:
+        datos = {campo: solicitud[campo] for campo in CAMPOS_EVENTO if campo in solicitud}
+        topicos = topicos_de_solicitud(solicitud)
+        if anterior:
+            # Si cambió el profesional, el anterior también se entera
+            topicos |= topicos_de_solicitud(anterior)
+        return self.publicar(tipo, datos, topicos)
+
+    async def alimentar_desde_bus(self, bus) -> None:
+        """
+        Consume los cambios de `solicitudes` del bus de eventos y los publica
+        en los tópicos correspondientes. Mientras corre, las publicaciones
+        directas de los handlers se ignoran.
+        """
+        sub = bus.suscribir(["solicitudes"])
+        self._via_bus = True
+        try:
+            async for evento in sub:
+                if not evento.documento:
+                    continue
+                if evento.operacion == "insert":
+                    tipo = "solicitud_creada"
+                elif "estado_pago" in evento.campos:
+                    tipo = "pago_actualizado"
+                else:
+                    tipo = "solicitud_actualizada"
+                self._publicar_solicitud(tipo, evento.documento, evento.anterior)
+        finally:
+            self._via_bus = False
+            bus.desuscribir(sub)
+
+    async def flujo(self, sub: Suscripcion):
+        """
+        Generador de texto SSE para una suscripción. Envía un comentario de
+        keep-alive cuando no hay eventos, y se desuscribe al cortarse la conexión.
+        """
+        try:
+            yield f"retry: {int(self.keepalive * 1000)}\n\n"
+            while True:
+                try:
+                    mensaje = await asyncio.wait_for(sub.cola.get(), self.keepalive)
+                except asyncio.TimeoutError:
+                    mensaje = ": keepalive\n\n"
+                yield mensaje
+        finally:
+            self.desuscribir(sub)
+            if sub.perdidos:
+                logger.warning("Suscriptor %s perdio %d eventos", sub.topicos, sub.perdidos)
+
+
+canal = CanalEventos()
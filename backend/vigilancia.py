@@ -0,0 +1,141 @@
+"""
+Vigía del event loop: detecta llamadas síncronas que lo bloquean.
+
+Un latido corre en el loop cada `intervalo` y anota cuándo despertó y con
+cuánta demora (lag). Un thread aparte revisa ese latido: si el loop lleva
+más de `umbral` sin correrlo, hay código síncrono ocupándolo, y el thread
+toma en ese momento el stack del thread del loop, que muestra la llamada
+culpable. Si la pila es la del loop esperando en el selector, el latido
+se demoró por falta de CPU y no por código de la app: no se reporta.
+Cuando el loop se libera, el latido registra el bloqueo:
+
+- en la métrica changared_event_loop_blocked_seconds{route},
+- en un log WARNING con la pila,
+- en los últimos bloqueos que devuelve GET /api/admin/bloqueos.
+
+Configuración por entorno:
+    VIGIA_UMBRAL_MS=100   0 lo desactiva
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Optional
+
+from metricas import bloqueos_event_loop, lag_event_loop
+from perfilado import perfilador
+
+logger = logging.getLogger(__name__)
+
+# Frames más internos que se guardan de la pila del bloqueo
+PROFUNDIDAD_PILA = 25
+# (archivo, función) del loop esperando eventos en el selector
+ESPERAS_SELECTOR = (("selectors.py", "select"), ("base_events.py", "_run_once"))
+
+
+def en_espera(frame) -> bool:
+    """
+    Si `frame` (el más interno del thread del loop) es el loop esperando en
+    el selector: no corre código de la app. Pasa cuando el latido llega
+    tarde porque el proceso no tuvo CPU (o el GIL lo tiene otro thread).
+    """
+    codigo = frame.f_code
+    return any(codigo.co_filename.endswith(archivo) and codigo.co_name == funcion
+               for archivo, funcion in ESPERAS_SELECTOR)
+
+
+class Vigia:
+    def __init__(self, umbral_ms: float = 100):
+        self.umbral = umbral_ms / 1e3
+        self.intervalo = min(self.umbral / 2, 0.05)
+        self.activo = False
+        self.bloqueos: deque = deque(maxlen=100)
+        self._ultimo_latido = 0.0
+        self._captura: Optional[dict] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._parar = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._tarea: Optional[asyncio.Task] = None
+
+    def iniciar(self) -> None:
+        if self.activo or self.umbral <= 0:
+            return
+        self._loop = asyncio.get_running_loop()
+        self.activo = True
+        perfilador.seguir_tareas = True
+        self._ultimo_latido = time.monotonic()
+        self._parar.clear()
+        self._tarea = asyncio.create_task(self._latir())
+        self._thread = threading.Thread(target=self._vigilar, args=(threading.get_ident(),), name="vigia", daemon=True)
+        self._thread.start()
+
+    def detener(self) -> None:
+        if not self.activo:
+            return
+        self.activo = False
+        perfilador.seguir_tareas = False
+        self._parar.set()
+        if self._tarea is not None:
+            self._tarea.cancel()
+            self._tarea = None
+
+    # ─── Latido (en el loop) ───────────────────────────────────────────────
+
+    async def _latir(self):
+        while True:
+            antes = time.monotonic()
+            await asyncio.sleep(self.intervalo)
+            ahora = time.monotonic()
+            self._ultimo_latido = ahora
+            lag = max(0.0, ahora - antes - self.intervalo)
+            lag_event_loop.observar(lag)
+            if lag >= self.umbral and not (self._captura or {}).get("en_espera"):
+                self._registrar(lag)
+            else:
+                # Una captura sin bloqueo es una carrera con el thread, y una
+                # en el selector no es un bloqueo: se descartan
+                self._captura = None
+
+    def _registrar(self, lag: float):
+        captura = self._captura or {"ruta": "(desconocida)", "pila": None}
+        self._captura = None
+        bloqueos_event_loop.observar(lag, captura["ruta"])
+        reporte = {"ts": time.time(), "ms": round(lag * 1e3, 1), **captura}
+        self.bloqueos.append(reporte)
+        logger.warning(
+            "Event loop bloqueado %.0f ms en %s", lag * 1e3, captura["ruta"],
+            extra={"bloqueo_ms": reporte["ms"], "ruta": captura["ruta"], "pila": captura["pila"]},
+        )
+
+    # ─── Thread vigía ──────────────────────────────────────────────────────
+
+    def _vigilar(self, ident_loop: int):
+        reportado = None
+        while not self._parar.wait(self.intervalo / 2):
+            latido = self._ultimo_latido
+            if latido == reportado or time.monotonic() - latido < self.intervalo + self.umbral:
+                continue
+            # Un solo stack por bloqueo, tomado apenas pasa el umbral
+            reportado = latido
+            frame = sys._current_frames().get(ident_loop)
+            if frame is None:
+                continue
+            if en_espera(frame):
+                self._captura = {"en_espera": True}
+                del frame
+                continue
+            self._captura = {
+                "ruta": perfilador.etiqueta(asyncio.current_task(self._loop)),
+                "pila": "".join(traceback.format_stack(frame, limit=PROFUNDIDAD_PILA)),
+            }
+            del frame
+
+    def estado(self) -> dict:
+        return {
+            "activo": self.activo,
+            "umbral_ms": self.umbral * 1e3,
+            "bloqueos": list(self.bloqueos),
+        }
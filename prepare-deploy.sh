@@ -15,6 +15,8 @@ mkdir -p backend
 cp -r /app/backend/*.py backend/
 cp /app/backend/requirements.txt backend/
 cp /app/backend/.env backend/.env.example
+# Mismo backend, con las rutas que espera el frontend de deploy
+echo "API_RUTAS=deploy" >> backend/.env.example
 
 # Copiar frontend
 echo "📁 Copiando frontend..."
@@ -75,7 +77,9 @@ cat > ESTRUCTURA.md << 'EOF'
 ```
 changared/
 ├── backend/
-│   ├── server.py                 # Servidor FastAPI principal
+│   ├── server.py                 # App FastAPI: middlewares y montaje de rutas
+│   ├── nucleo.py, datos.py, ...  # Núcleo compartido (Mongo, auth, IA, asignación)
+│   ├── rutas_deploy.py           # Rutas de esta API (API_RUTAS=deploy)
 │   ├── mercadopago_routes.py     # Rutas de Mercado Pago
 │   ├── requirements.txt          # Dependencias Python
 │   └── .env.example             # Template de variables
@@ -150,6 +154,7 @@ railway variables set EMERGENT_LLM_KEY="sk-emergent-15f4145Dc92Ee013f7"
 railway variables set JWT_SECRET="cambia-esto-por-algo-unico"
 railway variables set JWT_ALGORITHM="HS256"
 railway variables set JWT_EXPIRATION_MINUTES="43200"
+railway variables set API_RUTAS="deploy"
 railway variables set MERCADOPAGO_ACCESS_TOKEN="APP_USR-6019407805410866-021915-c2dd9fe3649d3565e8edc6f15e771a58-120074805"
 
 # 5. Deploy
@@ -214,9 +219,9 @@ Tu app está online en:
 ### 🧪 Primer Login
 
 1. Ve a tu frontend
-2. Registrate como "admin"
-3. Email: tu@email.com
-4. Password: tu-password-seguro
+2. Registrate (el rol "admin" no se puede elegir al registrarse)
+3. En MongoDB Atlas, cambiá a "admin" el campo rol de tu usuario (colección users)
+4. Volvé a iniciar sesión
 5. ¡Empieza a agregar profesionales!
 
 ### 🆘 Problemas Comunes
@@ -0,0 +1,137 @@
+"""
+Archivo de solicitudes cerradas (backend/archivo.py): particiones por mes y
+totales de archivo_resumen, también con lotes cortados a la mitad, sobre
+mongomock.
+"""
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+# nucleo arma el cliente de Mongo al importarse; acá no se conecta
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+
+import archivo  # noqa: E402
+from archivo import archivar, archivar_cerradas, resumen_archivado, resumir_particiones, totales_de  # noqa: E402
+
+VIEJA = datetime(2026, 5, 10, tzinfo=timezone.utc)
+
+
+@pytest.fixture(autouse=True)
+def db(monkeypatch):
+    db = AsyncMongoMockClient(tz_aware=True).test_archivo
+    monkeypatch.setattr(archivo, "db", db)
+    monkeypatch.setattr(archivo, "particiones_listas", set())
+    return db
+
+
+def cerrada(n, estado="completado", creada=VIEJA, **campos):
+    return {
+        "id": f"s{n}", "estado": estado, "created_at": creada, "updated_at": creada, "version": n,
+        "cliente_id": "c1", "precio_total": 1000, "comision_changared": 100, **campos,
+    }
+
+
+async def cargar(db, solicitudes):
+    await db.solicitudes.insert_many(solicitudes)
+    return await db.solicitudes.find({}).to_list(None)
+
+
+def test_totales_de():
+    assert totales_de([cerrada(1), cerrada(2, "cancelado", precio_total=None)]) == {
+        "total": 2, "completadas": 1, "ingresos": 1000, "comisiones": 200,
+    }
+    assert totales_de([]) == {"total": 0, "completadas": 0, "ingresos": 0, "comisiones": 0}
+
+
+def test_archivar_un_lote(db):
+    async def prueba():
+        otro_mes = VIEJA - timedelta(days=40)
+        lote = await cargar(db, [cerrada(1), cerrada(2, "cancelado"), cerrada(3, creada=otro_mes)])
+        assert await archivar(lote) == 3
+        assert await db.solicitudes.count_documents({}) == 0
+        assert await db.solicitudes_archivo_2026_05.count_documents({}) == 2
+        assert await db.solicitudes_archivo_2026_03.count_documents({}) == 1
+        assert await archivo.particiones() == ["solicitudes_archivo_2026_05", "solicitudes_archivo_2026_03"]
+        assert await db.solicitudes_bajas.count_documents({"motivo": "archivada"}) == 3
+        assert await resumen_archivado() == totales_de(lote)
+
+    asyncio.run(prueba())
+
+
+def test_la_que_cambio_mientras_se_copiaba_sigue_en_caliente(db):
+    async def prueba():
+        lote = await cargar(db, [cerrada(1), cerrada(2)])
+        await db.solicitudes.update_one({"id": "s2"}, {"$set": {"estado": "en_disputa"}, "$inc": {"version": 1}})
+        assert await archivar(lote) == 1
+        assert [sol["id"] async for sol in db.solicitudes.find({})] == ["s2"]
+        assert [sol["id"] async for sol in db.solicitudes_archivo_2026_05.find({})] == ["s1"]
+        assert (await resumen_archivado())["total"] == 1
+
+    asyncio.run(prueba())
+
+
+def test_cortado_entre_copiar_y_borrar_no_cuenta_doble(db, monkeypatch):
+    async def prueba():
+        solicitudes = [cerrada(n) for n in range(1, 5)]
+        await cargar(db, solicitudes)
+        borrar = archivo.DeleteOne
+
+        def corte(*args, **kwargs):
+            raise RuntimeError("corte")
+
+        monkeypatch.setattr(archivo, "DeleteOne", corte)
+        with pytest.raises(RuntimeError):
+            await archivar_cerradas()
+        # Copiadas pero todavía en caliente: quedan fuera de la partición
+        assert await db.solicitudes.count_documents({}) == 4
+        assert await db.solicitudes_archivo_2026_05.count_documents({}) == 0
+        assert (await resumen_archivado())["total"] == 0
+
+        monkeypatch.setattr(archivo, "DeleteOne", borrar)
+        assert await archivar_cerradas() == {"archivadas": 4}
+        assert await resumen_archivado() == totales_de(solicitudes)
+
+    asyncio.run(prueba())
+
+
+def test_cortado_antes_de_sumar_se_recalcula(db, monkeypatch):
+    async def prueba():
+        lote = await cargar(db, [cerrada(1), cerrada(2, "cancelado")])
+
+        def corte(solicitudes):
+            raise RuntimeError("corte")
+
+        monkeypatch.setattr(archivo, "totales_de", corte)
+        with pytest.raises(RuntimeError):
+            await archivar(lote)
+        assert await db.archivo_resumen.count_documents({"sucio": True}) == 1
+        await resumir_particiones()
+        assert await db.archivo_resumen.count_documents({"sucio": True}) == 0
+        assert await resumen_archivado() == {"total": 2, "completadas": 1, "ingresos": 2000, "comisiones": 200}
+
+    asyncio.run(prueba())
+
+
+def test_archivar_cerradas_elige_por_fecha(db):
+    async def prueba():
+        reciente = datetime.now(timezone.utc)
+        sin_updated_at = cerrada(2)
+        del sin_updated_at["updated_at"]
+        await cargar(db, [
+            cerrada(1),
+            sin_updated_at,
+            # Anterior a la migración de fechas: en texto
+            cerrada(3, creada=VIEJA.isoformat()),
+            cerrada(4, creada=reciente),
+            cerrada(5, "pendiente_admin"),
+        ])
+        assert await archivar_cerradas() == {"archivadas": 3}
+        assert sorted([sol["id"] async for sol in db.solicitudes.find({})]) == ["s4", "s5"]
+
+    asyncio.run(prueba())
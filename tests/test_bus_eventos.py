@@ -0,0 +1,154 @@
+"""
+Bus de eventos (backend/bus_eventos.py) contra un MongoDB real.
+
+Los change streams necesitan un replica set; mongomock no los tiene. Con
+BUS_TEST_MONGO_URL apuntando a uno (alcanza un nodo solo, mongod 4.2 o más
+nuevo; motor y pymongo son los de backend/requirements.txt, pytest el de
+tests/requirements.txt) corren todos:
+
+    mongod --replSet rs0 --dbpath /tmp/rs0 --port 27018
+    mongosh --port 27018 --eval 'rs.initiate()'
+    BUS_TEST_MONGO_URL=mongodb://localhost:27018/?directConnection=true pytest tests/test_bus_eventos.py
+
+Sin esa variable, o si el servidor no es replica set, se saltean.
+"""
+import asyncio
+import os
+import sys
+import uuid
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from bus_eventos import BusEventos  # noqa: E402
+
+MONGO_URL = os.environ.get("BUS_TEST_MONGO_URL")
+
+
+def correr(prueba):
+    """
+    Corre `prueba(db)` en una base nueva que se borra al final; saltea si
+    no hay replica set.
+    """
+    if not MONGO_URL:
+        pytest.skip("BUS_TEST_MONGO_URL no configurado")
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    async def envoltura():
+        client = AsyncIOMotorClient(MONGO_URL, serverSelectionTimeoutMS=3000, tz_aware=True)
+        try:
+            hello = await client.admin.command("hello")
+        except Exception as e:
+            pytest.skip(f"MongoDB no disponible: {e}")
+        if not hello.get("setName"):
+            pytest.skip("MongoDB no corre como replica set")
+        nombre = f"test_bus_{uuid.uuid4().hex[:8]}"
+        try:
+            await prueba(client[nombre])
+        finally:
+            await client.drop_database(nombre)
+            client.close()
+
+    asyncio.run(envoltura())
+
+
+async def recibir(sub, n, plazo=10.0):
+    return [await asyncio.wait_for(sub.__anext__(), plazo) for _ in range(n)]
+
+
+async def esperar_stream():
+    # El stream se abre en la tarea del bus: lo escrito antes no se ve
+    await asyncio.sleep(0.5)
+
+
+def test_nombre_por_proceso(monkeypatch):
+    monkeypatch.delenv("BUS_NOMBRE", raising=False)
+    bus = BusEventos(None)
+    assert bus.nombre.endswith(f":{os.getpid()}") and not bus.retoma
+    monkeypatch.setenv("BUS_NOMBRE", "worker-1")
+    bus = BusEventos(None)
+    assert bus.nombre == "worker-1" and bus.retoma
+
+
+def test_reparte_a_todos_los_suscriptores():
+    async def prueba(db):
+        bus = BusEventos(db, nombre="a")
+        todos, solo_users = bus.suscribir(), bus.suscribir(["users"])
+        await bus.iniciar()
+        await esperar_stream()
+        try:
+            await db.solicitudes.insert_one({"id": "s1", "estado": "pendiente_admin"})
+            await db.solicitudes.update_one({"id": "s1"}, {"$set": {"estado": "asignado"}})
+            await db.users.insert_one({"id": "u1"})
+            eventos = await recibir(todos, 3)
+            assert [(e.coleccion, e.operacion, e.id) for e in eventos] == [
+                ("solicitudes", "insert", "s1"), ("solicitudes", "update", "s1"), ("users", "insert", "u1"),
+            ]
+            assert eventos[1].campos == ["estado"] and eventos[1].documento["estado"] == "asignado"
+            assert "_id" not in eventos[0].documento
+            assert [e.id for e in await recibir(solo_users, 1)] == ["u1"]
+            assert solo_users.cola.empty()
+        finally:
+            await bus.detener()
+
+    correr(prueba)
+
+
+def test_retoma_desde_el_ultimo_token():
+    async def prueba(db):
+        bus = BusEventos(db, nombre="worker")
+        sub = bus.suscribir()
+        await bus.iniciar()
+        await esperar_stream()
+        await db.solicitudes.insert_one({"id": "antes"})
+        assert (await recibir(sub, 1))[0].id == "antes"
+        await bus.detener()
+        assert await db.bus_tokens.find_one({"_id": "worker"})
+
+        # Lo escrito con el worker caído llega al volver, y lo ya entregado no
+        await db.solicitudes.insert_one({"id": "caido"})
+        bus = BusEventos(db, nombre="worker")
+        sub = bus.suscribir()
+        await bus.iniciar()
+        try:
+            assert (await recibir(sub, 1))[0].id == "caido"
+        finally:
+            await bus.detener()
+
+    correr(prueba)
+
+
+def test_workers_no_comparten_token():
+    async def prueba(db):
+        uno, otro = BusEventos(db, nombre="host:1"), BusEventos(db, nombre="host:2")
+        subs = [uno.suscribir(), otro.suscribir()]
+        for bus in (uno, otro):
+            await bus.iniciar()
+        await esperar_stream()
+        await db.solicitudes.insert_one({"id": "s1"})
+        for sub in subs:
+            assert (await recibir(sub, 1))[0].id == "s1"
+        for bus in (uno, otro):
+            await bus.detener()
+        assert await db.bus_tokens.count_documents({}) == 2
+
+    correr(prueba)
+
+
+def test_cola_llena_espera_sin_perder():
+    async def prueba(db):
+        bus = BusEventos(db, nombre="lento")
+        sub = bus.suscribir(cola_max=1)
+        await bus.iniciar()
+        await esperar_stream()
+        try:
+            await db.solicitudes.insert_many([{"id": f"s{i}"} for i in range(5)])
+            await asyncio.sleep(0.5)
+            assert sub.cola.qsize() == 1
+            assert [e.id for e in await recibir(sub, 5)] == [f"s{i}" for i in range(5)]
+        finally:
+            await bus.detener()
+
+    correr(prueba)
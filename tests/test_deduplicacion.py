@@ -0,0 +1,156 @@
+"""
+Altas repetidas (backend/deduplicacion.py): huellas, claves y una_vez en
+un worker y entre workers, sobre mongomock.
+"""
+import asyncio
+import sys
+from datetime import timedelta
+from pathlib import Path
+
+import pytest
+from fastapi import HTTPException, Response
+from mongomock_motor import AsyncMongoMockClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from deduplicacion import ClaveReusada, Deduplicador, PedidoEnCurso, huella, sin_repetir  # noqa: E402
+from fechas import ahora  # noqa: E402
+from plazos import Plazo, plazo_actual  # noqa: E402
+
+
+def base():
+    return AsyncMongoMockClient(tz_aware=True).test_deduplicacion
+
+
+class Alta:
+    """
+    `crear` de una ruta de alta: cuenta las veces que corre.
+    """
+
+    def __init__(self, espera: float = 0, falla: bool = False):
+        self.veces = 0
+        self.espera = espera
+        self.falla = falla
+
+    async def __call__(self):
+        self.veces += 1
+        await asyncio.sleep(self.espera)
+        if self.falla:
+            raise RuntimeError("falló el alta")
+        return {"id": f"s{self.veces}"}, {"llm": 1, "notificaciones": 1}
+
+
+def test_huella_normaliza_el_texto():
+    assert huella("c1", "Se cortó la luz!!", "Posadas") == huella("c1", "se corto   la LUZ", "posadas")
+    assert huella("c1", "se cortó la luz", "Posadas") != huella("c2", "se cortó la luz", "Posadas")
+    assert huella("c1", "se cortó la luz", "Posadas") != huella("c1", "se cortó la luz", "Oberá")
+    # Los campos no se mezclan entre sí
+    assert huella("c1", "a b", "c") != huella("c1", "a", "b c")
+
+
+def test_claves():
+    dedup = Deduplicador(None, ventana_s=600, idempotencia_s=86400)
+    claves = dedup.claves("c1", "h", "clave-1")
+    assert [vigencia for _, vigencia in claves] == [86400, 600]
+    assert claves[0][0].startswith("k:") and claves[1] == ("c:h", 600)
+    assert dedup.claves("c2", "h", "clave-1")[0] != claves[0]
+    assert Deduplicador(None, ventana_s=0).claves("c1", "h") == []
+
+
+def test_repetido_devuelve_el_original_y_cuenta_el_ahorro():
+    async def prueba():
+        dedup, alta = Deduplicador(base()), Alta()
+        claves = dedup.claves("c1", "h")
+        primero = await dedup.una_vez(claves, "h", alta)
+        segundo = await dedup.una_vez(claves, "h", alta)
+        assert primero == ({"id": "s1"}, False) and segundo == ({"id": "s1"}, True)
+        assert alta.veces == 1
+        assert dedup.estado()["ahorros"] == {"llm": 1, "notificaciones": 1}
+        assert dedup.contadores == {"nuevos": 1, "repetidos": 1, "repetidos_en_memoria": 1}
+
+    asyncio.run(prueba())
+
+
+def test_concurrentes_esperan_al_original():
+    async def prueba():
+        dedup, alta = Deduplicador(base()), Alta(espera=0.05)
+        claves = dedup.claves("c1", "h")
+        resultados = await asyncio.gather(*(dedup.una_vez(claves, "h", alta) for _ in range(5)))
+        assert alta.veces == 1
+        assert {r[0]["id"] for r in resultados} == {"s1"} and sum(r[1] for r in resultados) == 4
+
+    asyncio.run(prueba())
+
+
+def test_entre_workers_por_mongo():
+    async def prueba():
+        db = base()
+        uno, otro, alta = Deduplicador(db), Deduplicador(db), Alta()
+        await uno.una_vez(uno.claves("c1", "h"), "h", alta)
+        respuesta, repetido = await otro.una_vez(otro.claves("c1", "h"), "h", alta)
+        assert (respuesta, repetido, alta.veces) == ({"id": "s1"}, True, 1)
+        assert otro.contadores["repetidos_en_memoria"] == 0
+
+    asyncio.run(prueba())
+
+
+def test_en_curso_en_otro_worker():
+    async def prueba():
+        db = base()
+        uno, otro = Deduplicador(db), Deduplicador(db, sondeo_s=0.01)
+        lenta = asyncio.create_task(uno.una_vez(uno.claves("c1", "h"), "h", Alta(espera=0.5)))
+        await asyncio.sleep(0.05)
+        # El reenvío espera al original sólo lo que le queda de su plazo
+        plazo_actual.set(Plazo(0.1))
+        with pytest.raises(PedidoEnCurso):
+            await otro.una_vez(otro.claves("c1", "h"), "h", Alta())
+        await lenta
+
+    asyncio.run(prueba())
+
+
+def test_abandonado_se_reclama():
+    async def prueba():
+        db = base()
+        dedup, alta = Deduplicador(db, abandono_s=60), Alta()
+        (clave, _), = dedup.claves("c1", "h")
+        # Un worker que se cayó a mitad del alta
+        momento = ahora() - timedelta(minutes=5)
+        await db.pedidos.insert_one({
+            "_id": clave, "huella": "h", "en_curso": True, "creado": momento, "vence": momento + timedelta(hours=1),
+        })
+        assert await dedup.una_vez([(clave, 600)], "h", alta) == ({"id": "s1"}, False)
+
+    asyncio.run(prueba())
+
+
+def test_si_falla_se_libera():
+    async def prueba():
+        db = base()
+        dedup = Deduplicador(db)
+        claves = dedup.claves("c1", "h")
+        with pytest.raises(RuntimeError):
+            await dedup.una_vez(claves, "h", Alta(falla=True))
+        assert await db.pedidos.count_documents({}) == 0
+        assert await dedup.una_vez(claves, "h", Alta()) == ({"id": "s1"}, False)
+
+    asyncio.run(prueba())
+
+
+def test_idempotency_key_reusada_con_otro_pedido():
+    async def prueba():
+        dedup = Deduplicador(base())
+        await dedup.una_vez(dedup.claves("c1", "h1", "k"), "h1", Alta())
+        with pytest.raises(ClaveReusada):
+            await dedup.una_vez(dedup.claves("c1", "h2", "k"), "h2", Alta())
+
+        # Por la ruta: 422, y el repetido lleva el header
+        with pytest.raises(HTTPException) as error:
+            await sin_repetir(dedup, "c1", ("otro pedido",), "k", Alta(), Response())
+        assert error.value.status_code == 422
+        response = Response()
+        await sin_repetir(dedup, "c9", ("pedido",), None, Alta(), Response())
+        assert await sin_repetir(dedup, "c9", ("Pedido!",), None, Alta(), response) == {"id": "s1"}
+        assert response.headers["Idempotent-Replayed"] == "true"
+
+    asyncio.run(prueba())
@@ -0,0 +1,117 @@
+"""
+Límites de tasa (backend/limites.py): cubetas en memoria con un reloj
+falso, reglas con varias cubetas y la IP detrás de proxies.
+"""
+import asyncio
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import limites  # noqa: E402
+from limites import AlmacenMemoria, Limite, LimitadorTasa  # noqa: E402
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    reloj = SimpleNamespace(t=1000.0)
+    monkeypatch.setattr(limites, "time", SimpleNamespace(monotonic=lambda: reloj.t))
+    return reloj
+
+
+def pedido(ip="10.0.0.1", token=None, reenviado=None):
+    headers = []
+    if token:
+        headers.append((b"authorization", f"Bearer {token}".encode()))
+    if reenviado:
+        headers.append((b"x-forwarded-for", reenviado.encode()))
+    return Request({"type": "http", "method": "POST", "path": "/", "headers": headers, "client": (ip, 1234)})
+
+
+def test_limite_desde_texto():
+    limite = Limite.desde_texto("usuario:10/3600")
+    assert (limite.por, limite.capacidad) == ("usuario", 10)
+    assert limite.tasa == pytest.approx(10 / 3600)
+    with pytest.raises(ValueError):
+        Limite.desde_texto("pais:1/60")
+
+
+def test_cubeta_admite_rafaga_y_se_recarga(reloj):
+    almacen = AlmacenMemoria()
+    cubeta = [("c", 3, 1.0)]
+    for _ in range(3):
+        assert asyncio.run(almacen.consumir(cubeta)) == 0
+    assert asyncio.run(almacen.consumir(cubeta)) == pytest.approx(1.0)
+    reloj.t += 0.5
+    assert asyncio.run(almacen.consumir(cubeta)) == pytest.approx(0.5)
+    reloj.t += 0.5
+    assert asyncio.run(almacen.consumir(cubeta)) == 0
+    # No pasa de la capacidad por más que espere
+    reloj.t += 100
+    for _ in range(3):
+        assert asyncio.run(almacen.consumir(cubeta)) == 0
+    assert asyncio.run(almacen.consumir(cubeta)) > 0
+
+
+def test_rechazo_no_gasta_las_otras_cubetas(reloj):
+    almacen = AlmacenMemoria()
+    usuario, ip = ("usuario", 5, 1.0), ("ip", 1, 0.1)
+    assert asyncio.run(almacen.consumir([usuario, ip])) == 0
+    # La IP ya no admite: la espera es la suya y el usuario no pierde tokens
+    for _ in range(10):
+        assert asyncio.run(almacen.consumir([usuario, ip])) == pytest.approx(10.0)
+    for _ in range(4):
+        assert asyncio.run(almacen.consumir([usuario])) == 0
+    assert asyncio.run(almacen.consumir([usuario])) > 0
+
+
+def test_descarta_las_cubetas_mas_viejas(reloj):
+    almacen = AlmacenMemoria(max_claves=2)
+    for clave in ("a", "b", "a", "c"):
+        asyncio.run(almacen.consumir([(clave, 1, 0.001)]))
+    # "b" fue la menos usada: se descartó y vuelve llena; "a" sigue vacía
+    assert asyncio.run(almacen.consumir([("a", 1, 0.001)])) > 0
+    assert asyncio.run(almacen.consumir([("b", 1, 0.001)])) == 0
+
+
+def test_regla_responde_429_con_retry_after(reloj):
+    limitador = LimitadorTasa(
+        {"solicitudes": ["usuario:2/60", "ip:3/60"]}, usuario_de_token=lambda token: token or None,
+    )
+    limitar = limitador.regla("solicitudes")
+    asyncio.run(limitar(pedido(token="ana")))
+    asyncio.run(limitar(pedido(token="ana")))
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(limitar(pedido(token="ana")))
+    assert error.value.status_code == 429 and error.value.headers["Retry-After"] == "30"
+    # Otro usuario desde la misma IP: le queda un pedido de la cubeta de la IP
+    asyncio.run(limitar(pedido(token="beto")))
+    with pytest.raises(HTTPException):
+        asyncio.run(limitar(pedido(token="beto")))
+    # Rechazado por la IP: desde otra IP, beto todavía tiene su segundo pedido
+    asyncio.run(limitar(pedido(ip="10.0.0.2", token="beto")))
+
+
+def test_regla_sin_limites_o_sin_usuario_deja_pasar(reloj):
+    limitador = LimitadorTasa({"login": [], "pago": ["usuario:1/60"]})
+    for _ in range(5):
+        asyncio.run(limitador.regla("login")(pedido()))
+        asyncio.run(limitador.regla("pago")(pedido()))
+        asyncio.run(limitador.regla("sin_regla")(pedido()))
+
+
+def test_ip_detras_de_proxies():
+    directo = LimitadorTasa({})
+    assert directo.ip_cliente(pedido(reenviado="1.1.1.1")) == "10.0.0.1"
+    uno = LimitadorTasa({}, proxies=1)
+    # Lo de la izquierda lo escribe el cliente: vale lo que agregó el proxy
+    assert uno.ip_cliente(pedido(reenviado="6.6.6.6, 2.2.2.2")) == "2.2.2.2"
+    assert uno.ip_cliente(pedido()) == "10.0.0.1"
+    dos = LimitadorTasa({}, proxies=2)
+    assert dos.ip_cliente(pedido(reenviado="6.6.6.6, 2.2.2.2, 3.3.3.3")) == "2.2.2.2"
+    assert dos.ip_cliente(pedido(reenviado="2.2.2.2")) == "2.2.2.2"
@@ -0,0 +1,135 @@
+"""
+Planificador (backend/planificador.py): expresiones de cron, intervalos y
+arriendos entre réplicas sobre mongomock.
+"""
+import asyncio
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from planificador import Cron, Intervalo, Planificador, horario_de, valores_cron  # noqa: E402
+
+ZONA = ZoneInfo("America/Argentina/Buenos_Aires")
+# Lunes 19/10/2026, 10:07:30
+LUNES = datetime(2026, 10, 19, 10, 7, 30, tzinfo=ZONA)
+
+
+def test_valores_cron():
+    assert valores_cron("*/15", 0, 59) == {0, 15, 30, 45}
+    assert valores_cron("10-50/20", 0, 59) == {10, 30, 50}
+    assert valores_cron("5/20", 0, 59) == {5, 25, 45}
+    assert valores_cron("1,3-4", 0, 7) == {1, 3, 4}
+
+
+@pytest.mark.parametrize("expresion", ["* * * *", "61 * * * *", "*/0 * * * *", "a * * * *", "5-1 * * * *"])
+def test_cron_invalido(expresion):
+    with pytest.raises(ValueError):
+        Cron(expresion)
+
+
+@pytest.mark.parametrize("expresion, desde, esperado", [
+    ("*/15 * * * *", LUNES, LUNES.replace(minute=15, second=0)),
+    ("0 9-21 * * *", LUNES, LUNES.replace(hour=11, minute=0, second=0)),
+    ("0 9-21 * * *", LUNES.replace(hour=22), datetime(2026, 10, 20, 9, 0, tzinfo=ZONA)),
+    # Sábado con lunes a viernes: el lunes siguiente
+    ("0 9 * * 1-5", datetime(2026, 10, 24, 12, tzinfo=ZONA), datetime(2026, 10, 26, 9, tzinfo=ZONA)),
+    # Día del mes y de la semana restringidos: vale cualquiera de los dos
+    ("0 0 1 * 1", datetime(2026, 10, 27, tzinfo=ZONA), datetime(2026, 11, 1, tzinfo=ZONA)),
+    ("0 0 29 2 *", LUNES, datetime(2028, 2, 29, tzinfo=ZONA)),
+    # 7 también es domingo
+    ("0 0 * * 7", LUNES, datetime(2026, 10, 25, tzinfo=ZONA)),
+])
+def test_cron_siguiente(expresion, desde, esperado):
+    assert Cron(expresion).siguiente(desde) == esperado
+
+
+def test_cron_que_nunca_coincide():
+    with pytest.raises(ValueError):
+        Cron("0 0 31 2 *").siguiente(LUNES)
+
+
+def test_horario_de():
+    intervalo = horario_de("300")
+    assert isinstance(intervalo, Intervalo)
+    siguiente = intervalo.siguiente(LUNES)
+    assert siguiente > LUNES and siguiente.timestamp() % 300 == 0
+    assert str(horario_de("*/5 * * * *")) == "*/5 * * * *"
+
+
+def test_arriendo_de_una_sola_replica():
+    async def prueba():
+        db = AsyncMongoMockClient(tz_aware=True).test_planificador
+        una, otra = Planificador(db), Planificador(db)
+        corridas = []
+
+        async def tarea():
+            corridas.append(1)
+
+        for planificador in (una, otra):
+            planificador.tarea("x", "*/5 * * * *", tarea, jitter_s=1)
+        await una.ejecutar(una.tareas["x"])
+        await otra.ejecutar(otra.tareas["x"])
+        # El titular renueva su propio arriendo
+        await una.ejecutar(una.tareas["x"])
+        assert len(corridas) == 2 and otra.tareas["x"].corridas["sin_arriendo"] == 1
+        arriendo = await db.arriendos.find_one({"_id": "x"})
+        assert arriendo["titular"] == una.titular
+        assert arriendo["vence"] > datetime.now(timezone.utc) + timedelta(minutes=1)
+
+        # Al detenerse lo suelta: la otra lo toma sin esperar a que venza
+        await una.detener()
+        await asyncio.sleep(0.01)
+        await otra.ejecutar(otra.tareas["x"])
+        assert len(corridas) == 3
+        assert (await db.arriendos.find_one({"_id": "x"}))["titular"] == otra.titular
+
+    asyncio.run(prueba())
+
+
+def test_errores_y_plazo_quedan_en_el_estado():
+    async def prueba():
+        planificador = Planificador(AsyncMongoMockClient(tz_aware=True).test_planificador)
+
+        async def falla():
+            raise RuntimeError("boom")
+
+        async def lenta():
+            await asyncio.sleep(5)
+
+        planificador.tarea("falla", "60", falla, lider=False)
+        planificador.tarea("lenta", "60", lenta, lider=False, plazo_s=0.05)
+        await planificador.ejecutar(planificador.tareas["falla"])
+        await planificador.ejecutar(planificador.tareas["lenta"])
+        tareas = planificador.estado()["tareas"]
+        assert tareas["falla"]["ultima"]["resultado"] == "error" and tareas["falla"]["ultima"]["detalle"] == "boom"
+        assert tareas["lenta"]["ultima"]["detalle"] == "TimeoutError"
+        with pytest.raises(ValueError):
+            planificador.tarea("falla", "60", falla)
+
+    asyncio.run(prueba())
+
+
+def test_inactivo_corre_solo_las_de_cada_worker():
+    async def prueba():
+        planificador = Planificador(AsyncMongoMockClient(tz_aware=True).test_planificador, activo=False)
+        corridas = []
+
+        async def tarea():
+            corridas.append(1)
+
+        planificador.tarea("lider", "*/5 * * * *", tarea)
+        planificador.tarea("worker", "0.05", tarea, lider=False, jitter_s=0, al_iniciar=True)
+        ciclo = asyncio.create_task(planificador.correr())
+        await asyncio.sleep(0.3)
+        ciclo.cancel()
+        await asyncio.gather(ciclo, return_exceptions=True)
+        assert len(corridas) >= 3
+        assert planificador.tareas["lider"].corridas == {"ok": 0, "error": 0, "sin_arriendo": 0}
+
+    asyncio.run(prueba())
@@ -0,0 +1,192 @@
+"""
+Motor de tarifas (backend/tarifas.py): el sketch de cuantiles, la
+cotización por zona y la persistencia entre workers sobre mongomock.
+"""
+import asyncio
+import random
+import sys
+from datetime import timedelta
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+from pymongo.errors import BulkWriteError
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from fechas import ahora  # noqa: E402
+from tarifas import MARCA_HISTORIAL, MotorTarifas, SketchPrecios  # noqa: E402
+
+
+def base():
+    return AsyncMongoMockClient(tz_aware=True).test_tarifas
+
+
+def exacto(precios, q):
+    ordenados = sorted(precios)
+    return ordenados[int(q * (len(ordenados) - 1))]
+
+
+@pytest.mark.parametrize("q", [0, 0.25, 0.5, 0.75, 0.99, 1])
+def test_cuantil_con_error_relativo_acotado(q):
+    azar = random.Random(q)
+    precios = [azar.lognormvariate(10, 0.8) for _ in range(2000)]
+    sketch = SketchPrecios()
+    for precio in precios:
+        sketch.agregar(precio)
+    assert sketch.cuenta == 2000
+    assert sketch.cuantil(q) == pytest.approx(exacto(precios, q), rel=SketchPrecios.ERROR_RELATIVO)
+
+
+def test_sketch_vacio_y_precios_invalidos():
+    sketch = SketchPrecios()
+    assert sketch.cuantil(0.5) is None
+    sketch.agregar(0)
+    sketch.agregar(-100)
+    assert sketch.cuenta == 0
+
+
+def test_mezclar_es_sumar_cuentas():
+    uno, otro, juntos = SketchPrecios(), SketchPrecios(), SketchPrecios()
+    for precio in range(1000, 5000, 37):
+        (uno if precio % 2 else otro).agregar(precio)
+        juntos.agregar(precio)
+    uno.mezclar(otro)
+    assert (uno.cubos, uno.cuenta) == (juntos.cubos, juntos.cuenta)
+    # Como queda en Mongo: cubos con clave de texto
+    desde_mongo = SketchPrecios.desde_documento({str(c): v for c, v in juntos.cubos.items()})
+    assert desde_mongo.cuantil(0.5) == juntos.cuantil(0.5)
+
+
+def test_cotizar_por_zona_o_por_servicio():
+    motor = MotorTarifas(None, min_muestras=5)
+    for i in range(5):
+        motor.observar("Plomero", "Posadas", 10000 + i * 500)
+    for i in range(3):
+        motor.observar("plomero", "Oberá", 30000)
+    # Posadas tiene sus cinco; Oberá todavía no: cae al servicio en todas las zonas
+    minimo, maximo = motor.cotizar(" PLOMERO ", "posadas")
+    assert minimo == pytest.approx(10500, rel=0.01) and maximo == pytest.approx(11500, rel=0.01)
+    assert minimo % 100 == 0 and maximo % 100 == 0
+    assert motor.cotizar("plomero", "Oberá") == motor.cotizar("plomero", "Eldorado") != (minimo, maximo)
+    assert motor.cotizar("electricista", "Posadas") is None
+    # Una observación nueva invalida el rango calculado
+    for _ in range(5):
+        motor.observar("plomero", "Posadas", 50000)
+    assert motor.cotizar("plomero", "Posadas") != (minimo, maximo)
+
+
+def test_urgente_sin_recargo_y_cierres():
+    motor = MotorTarifas(None, min_muestras=1, cuantiles=(0.5, 0.5))
+    motor.observar("gasista", "Posadas", 13000, urgente=True)
+    assert motor.cotizar("gasista", "Posadas") == (10000, 10000)
+
+    abierta = {"estado": "en_proceso", "servicio": "pintor", "zona": "Posadas", "tarifa_final": 8000}
+    cerrada = {**abierta, "estado": "completado"}
+    motor.observar_cierre(abierta, cerrada)
+    # Una edición de la ya completada no la suma de nuevo
+    motor.observar_cierre(cerrada, {**cerrada, "descripcion": "otra"})
+    motor.observar_cierre(abierta, {**cerrada, "tarifa_final": None})
+    assert motor.sketches[("pintor", "posadas")].cuenta == 1
+
+
+def test_persistir_y_cargar_entre_workers():
+    async def prueba():
+        db = base()
+        uno, otro = MotorTarifas(db, min_muestras=4), MotorTarifas(db, min_muestras=4)
+        for i in range(2):
+            uno.observar("pintor", "Posadas", 10000 + i * 1000)
+            otro.observar("pintor", "Posadas", 12000 + i * 1000)
+        await uno.persistir()
+        await otro.persistir()
+        assert not uno.pendientes
+        assert (await db.tarifas.find_one({"_id": "pintor|posadas"}))["cuenta"] == 4
+        # Lo no persistido se conserva al recargar
+        uno.observar("pintor", "Oberá", 9000)
+        await uno.cargar()
+        assert uno.sketches[("pintor", "*")].cuenta == 5
+        assert uno.cotizar("pintor", "Posadas") is not None
+
+    asyncio.run(prueba())
+
+
+def test_persistir_reencola_solo_lo_que_fallo():
+    async def prueba():
+        motor = MotorTarifas(None)
+        motor.observar("pintor", "Posadas", 10000)
+
+        async def bulk_write(operaciones, ordered):
+            # La segunda operación (pintor|*) no se aplicó
+            raise BulkWriteError({"writeErrors": [{"index": 1, "code": 11000}]})
+
+        motor.db = SimpleNamespace(tarifas=SimpleNamespace(bulk_write=bulk_write))
+        with pytest.raises(BulkWriteError):
+            await motor.persistir()
+        assert list(motor.pendientes) == [("pintor", "*")]
+
+        async def sin_respuesta(operaciones, ordered):
+            raise ConnectionError("mongo")
+
+        motor.db.tarifas.bulk_write = sin_respuesta
+        motor.observar("pintor", "Posadas", 10000)
+        with pytest.raises(ConnectionError):
+            await motor.persistir()
+        assert {clave: s.cuenta for clave, s in motor.pendientes.items()} == {
+            ("pintor", "*"): 2, ("pintor", "posadas"): 1,
+        }
+
+    asyncio.run(prueba())
+
+
+def test_reconstruir_historial_una_sola_vez():
+    async def prueba():
+        db = base()
+        viejo = ahora() - timedelta(days=3)
+        await db.solicitudes.insert_many([
+            {"estado": "completado", "tarifa_final": 10000 + i * 100, "servicio": "Pintor", "zona": "Posadas",
+             "updated_at": viejo}
+            for i in range(20)
+        ] + [{"estado": "pendiente_admin", "tarifa_final": 99999, "servicio": "Pintor", "zona": "Posadas"}])
+        # Otro worker la está armando
+        await db.tarifas.insert_one({"_id": MARCA_HISTORIAL, "inicio": ahora(), "reclamada": ahora(), "completa": False})
+        assert await MotorTarifas(db).reconstruir_historial() is False
+        # Se cayó hace rato: la toma este
+        await db.tarifas.update_one({"_id": MARCA_HISTORIAL}, {"$set": {"reclamada": ahora() - timedelta(hours=1)}})
+        motor = MotorTarifas(db)
+        assert await motor.reconstruir_historial() is True
+        assert (await db.tarifas.find_one({"_id": MARCA_HISTORIAL}))["completa"] is True
+        assert (await db.tarifas.find_one({"_id": "pintor|*"}))["cuenta"] == 20
+        assert not motor.pendientes
+        # Completa: nadie la suma de nuevo
+        assert await MotorTarifas(db).reconstruir_historial() is False
+
+    asyncio.run(prueba())
+
+
+def test_sincronizar_sobrevive_al_plazo_de_la_tarea():
+    async def prueba():
+        db = base()
+        await db.solicitudes.insert_many([
+            {"estado": "completado", "tarifa_final": 10000, "servicio": "pintor", "zona": "Posadas",
+             "updated_at": ahora() - timedelta(days=1)}
+            for _ in range(5)
+        ])
+        motor = MotorTarifas(db)
+        reconstruir, corridas = motor.reconstruir_historial, []
+
+        async def lenta():
+            corridas.append(1)
+            await asyncio.sleep(0.2)
+            return await reconstruir()
+
+        motor.reconstruir_historial = lenta
+        with pytest.raises(TimeoutError):
+            async with asyncio.timeout(0.05):
+                await motor.sincronizar()
+        # El próximo disparo espera la misma recorrida en vez de empezar otra
+        await motor.sincronizar()
+        assert corridas == [1] and motor.cargado
+        assert motor.cotizar("pintor", "Posadas") == (10000, 10000)
+
+    asyncio.run(prueba())